@@ -0,0 +1,620 @@
+#!/usr/bin/env python3
+"""
+Deduplicación de anuncios recurrentes (MinHash + LSH)
+
+Anuncios como el de "RÓMULO MENCHOLA – VENDEDOR Y COBRADOR … Singer" se
+repiten en cientos de ediciones, y cada repetición se volvía a estructurar con
+el modelo y a guardar como una fila nueva. Este módulo mantiene un índice
+persistente (SQLite) de anuncios canónicos:
+- Cada anuncio se resume en una firma MinHash de las tejas (shingles) de
+  palabras normalizadas con text_normalization.fold_words de su propio
+  tramo de texto, así que las diferencias de tildes, mayúsculas u ortografía
+  del OCR no cuentan
+- Las firmas se reparten en bandas (LSH): solo se comparan los anuncios que
+  coinciden en alguna banda, sin recorrer todo el índice
+- Las secciones cuyos elementos son todos anuncios se guardan aparte; antes
+  de estructurar una página, las secciones que coinciden con una de ellas se
+  quitan del texto enviado al modelo y se reutiliza la estructura de sus
+  anuncios
+- Cada aparición queda enlazada a su ad_id canónico, con lo que se obtiene la
+  permanencia de cada anuncio (ediciones, primera y última fecha)
+
+Ejemplos:
+    python3 ad_dedup.py build data/el_martillo/lote
+    python3 ad_dedup.py report --limit 10
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from chunked_structuring import iter_section_blocks
+from rule_structurer import HEADER_LINES, extract_metadata
+from text_normalization import fold_text, fold_words
+
+DEFAULT_AD_INDEX_PATH = "data/el_martillo/anuncios.sqlite"
+
+# Palabras por teja
+SHINGLE_WORDS = 2
+# 32 bandas de 4 filas: un anuncio con similitud 0.6 es candidato con ~99 % de probabilidad
+NUM_PERM = 128
+BANDS = 32
+ROWS_PER_BAND = NUM_PERM // BANDS
+# Similitud de Jaccard estimada a partir de la cual dos textos son el mismo anuncio
+DUPLICATE_THRESHOLD = 0.6
+MINHASH_SEED = 1609
+DEFAULT_REPORT_LIMIT = 20
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+# Permutaciones (a·x + b) mod p, fijas para que las firmas guardadas sigan valiendo
+_random = np.random.RandomState(MINHASH_SEED)
+_PERM_A = _random.randint(1, (1 << 61) - 1, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _random.randint(0, (1 << 61) - 1, size=NUM_PERM, dtype=np.uint64)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ads (
+    ad_id INTEGER PRIMARY KEY,
+    headline TEXT,
+    item TEXT NOT NULL,
+    signature BLOB NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ad_bands (
+    band INTEGER NOT NULL,
+    bucket BLOB NOT NULL,
+    ad_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ad_bands_bucket ON ad_bands(band, bucket);
+CREATE TABLE IF NOT EXISTS ad_occurrences (
+    page_id TEXT NOT NULL,
+    item_index INTEGER NOT NULL,
+    ad_id INTEGER NOT NULL,
+    date TEXT,
+    issue_number INTEGER,
+    PRIMARY KEY (page_id, item_index)
+);
+CREATE INDEX IF NOT EXISTS ad_occurrences_ad ON ad_occurrences(ad_id);
+CREATE TABLE IF NOT EXISTS ad_blocks (
+    block_id INTEGER PRIMARY KEY,
+    ad_ids TEXT NOT NULL,
+    signature BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ad_block_bands (
+    band INTEGER NOT NULL,
+    bucket BLOB NOT NULL,
+    block_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ad_block_bands_bucket ON ad_block_bands(band, bucket);
+"""
+
+
+def shingles(text, size=SHINGLE_WORDS):
+    """
+    Tejas de palabras normalizadas de un texto
+
+    Un texto con menos palabras que size forma una sola teja.
+
+    Returns:
+        set: Tejas (cadenas de size palabras)
+    """
+    words = fold_words(text)
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash(shingle_set):
+    """
+    Firma MinHash de un conjunto de tejas
+
+    Args:
+        shingle_set: Tejas del texto (ver shingles)
+
+    Returns:
+        np.ndarray: NUM_PERM valores uint32, o None si no hay tejas
+    """
+    if not shingle_set:
+        return None
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=4).digest(), 'little')
+         for shingle in shingle_set),
+        dtype=np.uint64, count=len(shingle_set),
+    )
+    # Todas las permutaciones de todas las tejas en una sola operación
+    permuted = (np.outer(hashes, _PERM_A) + _PERM_B) % _MERSENNE_PRIME & _MAX_HASH
+    return permuted.min(axis=0).astype('<u4')
+
+
+def text_signature(text):
+    """
+    Firma MinHash de un texto (None si no tiene palabras)
+    """
+    return minhash(shingles(text))
+
+
+def band_keys(signature):
+    """
+    Claves LSH de una firma
+
+    Returns:
+        list: (banda, cubeta) por cada una de las BANDS bandas
+    """
+    return [(band, signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes())
+            for band in range(BANDS)]
+
+
+def estimate_similarity(first, second):
+    """
+    Similitud de Jaccard estimada entre dos firmas
+    """
+    return float(np.count_nonzero(first == second)) / len(first)
+
+
+def is_ad(item):
+    """
+    Indica si un elemento de 'content' es un anuncio
+    """
+    kind = fold_text(item.get('type') or '').strip()
+    section = fold_text(item.get('section') or '')
+    return kind.startswith('anunci') or 'anunci' in section
+
+
+def section_blocks(text):
+    """
+    Bloques de sección de un texto (los mismos límites que chunked_structuring)
+
+    Returns:
+        list: Texto de cada bloque, en orden
+    """
+    return ["\n".join(block) for block in iter_section_blocks(text.splitlines())]
+
+
+def _needle(item):
+    """
+    Texto normalizado con el que se busca un elemento (titular o inicio del extracto)
+    """
+    needle = fold_text((item.get('headline') or '').split(" / ")[0]).strip()
+    if not needle:
+        needle = fold_text(item.get('text_excerpt') or '').strip()[:60]
+    return needle
+
+
+def locate_items(items, blocks):
+    """
+    Bloque donde aparece cada elemento, buscando su titular en orden
+
+    Args:
+        items: Elementos de 'content', en orden
+        blocks: Textos de los bloques de sección
+
+    Returns:
+        list: Índice del bloque de cada elemento (None si no se encontró)
+    """
+    folded_blocks = [fold_text(block) for block in blocks]
+    positions = []
+    start = 0
+    for item in items:
+        needle = _needle(item)
+        found = None
+        if needle:
+            # Primero desde el último bloque encontrado, luego desde el principio
+            for index in list(range(start, len(blocks))) + list(range(start)):
+                if needle in folded_blocks[index]:
+                    found = index
+                    break
+        if found is not None:
+            start = found
+        positions.append(found)
+    return positions
+
+
+def item_spans(items, blocks, positions):
+    """
+    Tramo de texto propio de cada elemento dentro de su bloque de sección
+
+    Los elementos de un mismo bloque lo reparten en sus titulares: cada uno va
+    desde su titular hasta el del siguiente (el primero, desde el inicio del
+    bloque). fold_text conserva las posiciones, así que se busca en el texto
+    normalizado y se corta el original.
+
+    Args:
+        items: Elementos de 'content', en orden
+        blocks: Textos de los bloques de sección
+        positions: Bloque de cada elemento (ver locate_items)
+
+    Returns:
+        list: Tramo de cada elemento (None si no se ubicó)
+    """
+    spans = [None] * len(items)
+    by_block = {}
+    for item_index, position in enumerate(positions):
+        if position is not None:
+            by_block.setdefault(position, []).append(item_index)
+    for position, indices in by_block.items():
+        block = blocks[position]
+        folded = fold_text(block)
+        starts = []
+        offset = 0
+        for item_index in indices:
+            found = folded.find(_needle(items[item_index]), offset)
+            if found < 0:
+                found = folded.find(_needle(items[item_index]))
+            if found >= 0:
+                offset = found
+                starts.append((found, item_index))
+        starts.sort()
+        for order, (start, item_index) in enumerate(starts):
+            end = starts[order + 1][0] if order + 1 < len(starts) else len(block)
+            spans[item_index] = block[0 if order == 0 else start:end]
+    return spans
+
+
+class AdIndex:
+    """
+    Índice persistente de anuncios canónicos con LSH sobre firmas MinHash
+
+    Args:
+        path: Archivo SQLite del índice
+        threshold: Similitud estimada mínima para considerar dos textos el mismo anuncio
+    """
+
+    def __init__(self, path=DEFAULT_AD_INDEX_PATH, threshold=DUPLICATE_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        # Ahorro de la corrida: anuncios reutilizados y caracteres no enviados al modelo
+        self.reused_items = 0
+        self.skipped_chars = 0
+
+    def _best_match(self, signature, select, bands_table, id_column):
+        """
+        Candidato más parecido a una firma entre los que comparten alguna banda
+
+        Returns:
+            tuple: (id, similitud estimada, valor) o None
+        """
+        keys = band_keys(signature)
+        placeholders = ", ".join("(?, ?)" for _ in keys)
+        params = [value for key in keys for value in key]
+        candidates = self._conn.execute(
+            f"{select} IN (SELECT {id_column} FROM {bands_table} "
+            f"WHERE (band, bucket) IN (VALUES {placeholders}))",
+            params,
+        ).fetchall()
+
+        best = None
+        for row_id, stored, value in candidates:
+            similarity = estimate_similarity(signature, np.frombuffer(stored, dtype='<u4'))
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (row_id, similarity, value)
+        return best
+
+    def _find_locked(self, signature):
+        best = self._best_match(signature, "SELECT ad_id, signature, item FROM ads WHERE ad_id",
+                                "ad_bands", "ad_id")
+        if best is None:
+            return None
+        return best[0], best[1], json.loads(best[2])
+
+    def find(self, signature):
+        """
+        Busca el anuncio canónico más parecido a una firma
+
+        Returns:
+            tuple: (ad_id, similitud estimada, elemento canónico) o None
+        """
+        with self._lock:
+            return self._find_locked(signature)
+
+    def _add_locked(self, item, signature):
+        canonical = {field: value for field, value in item.items() if field != 'ad_id'}
+        cursor = self._conn.execute(
+            "INSERT INTO ads (headline, item, signature, created_at) VALUES (?, ?, ?, ?)",
+            (canonical.get('headline', ''), json.dumps(canonical, ensure_ascii=False),
+             signature.tobytes(), time.time()),
+        )
+        ad_id = cursor.lastrowid
+        self._conn.executemany("INSERT INTO ad_bands (band, bucket, ad_id) VALUES (?, ?, ?)",
+                               [(band, bucket, ad_id) for band, bucket in band_keys(signature)])
+        return ad_id
+
+    def _add_block_locked(self, ad_ids, signature):
+        """
+        Guarda una sección formada solo por anuncios (si no estaba ya con los mismos)
+        """
+        encoded = json.dumps(ad_ids)
+        best = self._best_match(signature,
+                                "SELECT block_id, signature, ad_ids FROM ad_blocks WHERE block_id",
+                                "ad_block_bands", "block_id")
+        if best is not None and best[2] == encoded:
+            return
+        cursor = self._conn.execute("INSERT INTO ad_blocks (ad_ids, signature) VALUES (?, ?)",
+                                    (encoded, signature.tobytes()))
+        self._conn.executemany(
+            "INSERT INTO ad_block_bands (band, bucket, block_id) VALUES (?, ?, ?)",
+            [(band, bucket, cursor.lastrowid) for band, bucket in band_keys(signature)])
+
+    def _find_block_locked(self, signature):
+        """
+        Anuncios canónicos de la sección registrada más parecida a una firma
+
+        Returns:
+            list: Elementos canónicos con su 'ad_id', en orden, o None
+        """
+        best = self._best_match(signature,
+                                "SELECT block_id, signature, ad_ids FROM ad_blocks WHERE block_id",
+                                "ad_block_bands", "block_id")
+        if best is None:
+            return None
+        items = []
+        for ad_id in json.loads(best[2]):
+            row = self._conn.execute("SELECT item FROM ads WHERE ad_id = ?", (ad_id,)).fetchone()
+            if row is None:
+                return None
+            items.append(dict(json.loads(row[0]), ad_id=ad_id))
+        return items
+
+    def split_known_ads(self, text):
+        """
+        Separa de una página las secciones formadas solo por anuncios conocidos
+
+        Una sección solo se quita si coincide con una sección ya registrada
+        cuyos elementos eran todos anuncios y contiene el titular de cada uno;
+        si mezcla un anuncio conocido con otro contenido, se envía entera al
+        modelo.
+
+        Args:
+            text: Texto completo de la página
+
+        Returns:
+            tuple: (bloques de sección, dict índice de bloque → lista de
+                    elementos canónicos con su 'ad_id')
+        """
+        blocks = section_blocks(text)
+        known = {}
+        for position, block in enumerate(blocks):
+            signature = text_signature(block)
+            if signature is None:
+                continue
+            with self._lock:
+                items = self._find_block_locked(signature)
+            # Además de la firma, cada anuncio debe conservar su titular en la sección
+            folded = fold_text(block)
+            if items and all(_needle(item) in folded for item in items):
+                known[position] = items
+        return blocks, known
+
+    def record_reuse(self, items, chars):
+        with self._lock:
+            self.reused_items += items
+            self.skipped_chars += chars
+
+    def register_page(self, page_id, structured_data, text=None):
+        """
+        Enlaza los anuncios de una página con su anuncio canónico
+
+        Los anuncios que no están en el índice pasan a ser canónicos. La firma
+        se calcula sobre el tramo del anuncio en el texto (ver item_spans) o,
+        si no se encuentra, sobre su titular y extracto. Cada anuncio recibe su
+        'ad_id' en structured_data. Las secciones cuyos elementos son todos
+        anuncios se registran para quitarlas del texto en las páginas
+        siguientes. Volver a registrar una página reemplaza sus apariciones.
+
+        Args:
+            page_id: Identificador de la página
+            structured_data: Estructura con 'metadata' y 'content'
+            text: Texto de la página (opcional)
+
+        Returns:
+            int: Número de anuncios enlazados
+        """
+        metadata = structured_data.get('metadata', {})
+        items = structured_data.get('content', [])
+        blocks = section_blocks(text) if text else []
+        positions = locate_items(items, blocks) if blocks else [None] * len(items)
+        spans = item_spans(items, blocks, positions)
+
+        linked = 0
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM ad_occurrences WHERE page_id = ?", (page_id,))
+            for item_index, (item, span) in enumerate(zip(items, spans)):
+                if not is_ad(item):
+                    continue
+                ad_id = item.get('ad_id')
+                if ad_id is not None and self._conn.execute(
+                        "SELECT 1 FROM ads WHERE ad_id = ?", (ad_id,)).fetchone() is None:
+                    # Enlace a otro índice (p. ej. un JSON de un lote anterior)
+                    ad_id = None
+                if ad_id is None:
+                    source = span if span is not None else \
+                        f"{item.get('headline', '')}\n{item.get('text_excerpt', '')}"
+                    signature = text_signature(source)
+                    if signature is None:
+                        continue
+                    match = self._find_locked(signature)
+                    ad_id = match[0] if match else self._add_locked(item, signature)
+                    item['ad_id'] = ad_id
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO ad_occurrences (page_id, item_index, ad_id, date, "
+                    "issue_number) VALUES (?, ?, ?, ?, ?)",
+                    (page_id, item_index, ad_id, metadata.get('date'), metadata.get('issue_number')),
+                )
+                linked += 1
+
+            for position, block in enumerate(blocks):
+                block_items = [item for item, found in zip(items, positions) if found == position]
+                if not block_items or not all(is_ad(item) and item.get('ad_id') is not None
+                                              for item in block_items):
+                    continue
+                signature = text_signature(block)
+                if signature is not None:
+                    self._add_block_locked([item['ad_id'] for item in block_items], signature)
+        return linked
+
+    def run_lengths(self, limit=None):
+        """
+        Permanencia de cada anuncio canónico en el corpus
+
+        Returns:
+            list: dict por anuncio (ad_id, headline, apariciones, ediciones,
+                  primera y última fecha), del más repetido al menos
+        """
+        sql = ("SELECT a.ad_id, a.headline, COUNT(o.ad_id), COUNT(DISTINCT o.issue_number), "
+               "MIN(o.date), MAX(o.date) FROM ads a LEFT JOIN ad_occurrences o ON o.ad_id = a.ad_id "
+               "GROUP BY a.ad_id ORDER BY COUNT(o.ad_id) DESC, a.ad_id")
+        params = []
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [{"ad_id": ad_id, "headline": headline, "occurrences": occurrences,
+                 "issues": issues, "first_date": first_date, "last_date": last_date}
+                for ad_id, headline, occurrences, issues, first_date, last_date in rows]
+
+    def stats(self):
+        with self._lock:
+            ads = self._conn.execute("SELECT COUNT(*) FROM ads").fetchone()[0]
+            occurrences = self._conn.execute("SELECT COUNT(*) FROM ad_occurrences").fetchone()[0]
+        return {"ads": ads, "occurrences": occurrences}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def structure_with_ad_index(text_content, ad_index, structure):
+    """
+    Estructura una página reutilizando los anuncios que ya están en el índice
+
+    Las secciones formadas solo por anuncios conocidos no se envían al modelo;
+    sus elementos canónicos se intercalan en la posición de su sección.
+
+    Args:
+        text_content: Texto completo de la página
+        ad_index: AdIndex
+        structure: Función texto → estructura (p. ej. structure_text_with_claude)
+
+    Returns:
+        dict: Estructura de la página ('metadata' y 'content')
+    """
+    blocks, known = ad_index.split_known_ads(text_content)
+    if not known:
+        return structure(text_content)
+
+    kept = [position for position in range(len(blocks)) if position not in known]
+    remaining = [blocks[position] for position in kept]
+    remaining_text = "\n".join(remaining)
+
+    if remaining_text.strip():
+        structured_data = structure(remaining_text)
+    else:
+        lines = [line for line in text_content.splitlines() if line.strip()][:HEADER_LINES]
+        structured_data = {"metadata": extract_metadata(lines), "content": []}
+
+    # Cada elemento nuevo va en la posición de su bloque (o tras el anterior)
+    ordered = []
+    last = -1
+    for order, (item, found) in enumerate(zip(structured_data.get('content', []),
+                                              locate_items(structured_data.get('content', []),
+                                                           remaining))):
+        if found is not None:
+            last = kept[found]
+        ordered.append((last, 1, order, item))
+    for position, items in known.items():
+        for order, item in enumerate(items):
+            ordered.append((position, 0, order, item))
+    ordered.sort(key=lambda entry: entry[:3])
+
+    ad_index.record_reuse(sum(len(items) for items in known.values()),
+                          sum(len(blocks[position]) for position in known))
+
+    return {"metadata": structured_data.get('metadata', {}),
+            "content": [item for *_, item in ordered]}
+
+
+def register_batch_output(ad_index, output_dir):
+    """
+    Registra los anuncios de las salidas por página de un lote de batch_ocr.py
+
+    Returns:
+        tuple: (páginas registradas, anuncios enlazados)
+    """
+    from process_ocr import read_extracted_text
+
+    pages = linked = 0
+    for json_path in sorted(glob.glob(os.path.join(output_dir, "paginas", "*.json"))):
+        page_id = os.path.splitext(os.path.basename(json_path))[0]
+        text_path = os.path.splitext(json_path)[0] + ".txt"
+        with open(json_path, encoding='utf-8') as f:
+            structured_data = json.load(f)
+        text = read_extracted_text(text_path) if os.path.exists(text_path) else None
+        linked += ad_index.register_page(page_id, structured_data, text)
+        pages += 1
+    return pages, linked
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Índice de anuncios recurrentes de El Martillo")
+    parser.add_argument("--ad-index", default=DEFAULT_AD_INDEX_PATH,
+                        help=f"Archivo del índice (por defecto: {DEFAULT_AD_INDEX_PATH})")
+    parser.add_argument("--threshold", type=float, default=DUPLICATE_THRESHOLD,
+                        help=f"Similitud mínima para considerar dos anuncios iguales "
+                             f"(por defecto: {DUPLICATE_THRESHOLD})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Registrar los anuncios de un lote de batch_ocr.py")
+    build.add_argument("output_dir", help="Directorio de salida del lote")
+
+    report = subparsers.add_parser("report", help="Anuncios más repetidos y su permanencia")
+    report.add_argument("--limit", type=int, default=DEFAULT_REPORT_LIMIT,
+                        help="Número de anuncios a mostrar")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    with AdIndex(args.ad_index, threshold=args.threshold) as ad_index:
+        if args.command == "build":
+            start = time.perf_counter()
+            pages, linked = register_batch_output(ad_index, args.output_dir)
+            stats = ad_index.stats()
+            print(f"✅ {pages} páginas, {linked} anuncios enlazados "
+                  f"en {time.perf_counter() - start:.2f} s")
+            print(f"📢 Índice: {stats['ads']} anuncios canónicos, "
+                  f"{stats['occurrences']} apariciones ({args.ad_index})")
+            return
+
+        runs = ad_index.run_lengths(args.limit)
+        print(f"📢 {len(runs)} anuncios más repetidos\n")
+        for run in runs:
+            period = f"{run['first_date']} → {run['last_date']}" if run['first_date'] else "sin fecha"
+            print(f"#{run['ad_id']:<5} {run['occurrences']:>4} apariciones, "
+                  f"{run['issues']:>4} ediciones ({period})  {run['headline']}")
+
+
+if __name__ == "__main__":
+    main()
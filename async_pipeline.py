@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Flujo asíncrono de OCR con etapas superpuestas
+
+Las páginas avanzan por tres etapas conectadas con colas acotadas:
+1. Extracción (llamada de visión a Claude) → .txt por página
+2. Estructuración (llamada de texto a Claude)
+3. Escritura de JSON/CSV por página
+
+Mientras la página N se estructura, la llamada de visión de la página N+1 ya
+está en curso y las filas de la página N-1 se están escribiendo. Las escrituras
+a disco se hacen en hilos (asyncio.to_thread) para no bloquear el event loop.
+
+Ejemplo sin red, comparando con el flujo en serie:
+    python3 async_pipeline.py data/paginas --fake --fake-latency 1.0 --compare
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from batch_ocr import (
+    DEFAULT_OUTPUT_DIR,
+    discover_pages,
+    load_image_base64,
+    page_id_for,
+    process_page,
+    write_corpus,
+    write_structured_outputs,
+)
+from client_provider import ClientProvider, get_async_client, set_provider
+from process_ocr import (
+    MAX_STRUCTURE_CONTINUATIONS,
+    build_extraction_request,
+    build_structure_request,
+    extraction_cache_key,
+    parse_structured_response,
+    request_cache_key,
+    write_extracted_text,
+)
+from rate_limiter import add_rate_limit_arguments, print_metrics, rate_limiter_from_args
+from response_cache import add_cache_arguments, cache_from_args
+from structured_output import StructureAssembler, read_tool_stream_async
+
+DEFAULT_EXTRACT_WORKERS = 4
+DEFAULT_STRUCTURE_WORKERS = 4
+DEFAULT_QUEUE_SIZE = 8
+
+# Marca de fin de cola
+_DONE = object()
+
+
+async def extract_text_async(image_data, media_type, client, cache=None):
+    """
+    Versión asíncrona de extract_text_with_claude
+
+    Args:
+        image_data: Imagen codificada en base64
+        media_type: Tipo de medio de la imagen
+        client: Cliente asíncrono (anthropic.AsyncAnthropic o FakeAsyncAnthropic)
+        cache: ResponseCache opcional
+
+    Returns:
+        str: Texto extraído de la imagen
+    """
+    cache_key = None
+    if cache is not None:
+        cache_key = extraction_cache_key(image_data, media_type)
+        cached_text = cache.get(cache_key)
+        if cached_text is not None:
+            return cached_text
+
+    message = await client.messages.create(**build_extraction_request(image_data, media_type))
+
+    extracted_text = message.content[0].text
+    if cache is not None:
+        cache.put(cache_key, extracted_text)
+    return extracted_text
+
+
+async def structure_text_async(text_content, client, cache=None):
+    """
+    Versión asíncrona de structure_text_with_claude
+
+    Args:
+        text_content: Texto extraído de la página
+        client: Cliente asíncrono (anthropic.AsyncAnthropic o FakeAsyncAnthropic)
+        cache: ResponseCache opcional
+
+    Returns:
+        dict: Estructura JSON con 'metadata' y 'content'
+    """
+    request = build_structure_request(text_content)
+
+    cache_key = None
+    if cache is not None:
+        cache_key = request_cache_key("structure", request)
+        cached_text = cache.get(cache_key)
+        if cached_text is not None:
+            return parse_structured_response(cached_text)
+
+    # Mismo rescate y continuaciones que structure_text_with_claude
+    assembler = StructureAssembler(text_content, MAX_STRUCTURE_CONTINUATIONS)
+    while True:
+        events = await client.messages.create(stream=True, **request)
+        raw, stop_reason = await read_tool_stream_async(events)
+        remaining = assembler.add_response(raw, stop_reason)
+        if remaining is None:
+            break
+        request = build_structure_request(remaining)
+
+    structured_data = assembler.structure()
+    if assembler.partial:
+        print(f"   ⚠️  Estructura parcial ({len(assembler.content)} elementos): "
+              f"no se guarda en caché")
+    elif cache is not None:
+        cache.put(cache_key, json.dumps(structured_data, ensure_ascii=False))
+    return structured_data
+
+
+async def run_pipeline(pages, output_dir=DEFAULT_OUTPUT_DIR, client=None, cache=None,
+                       extract_workers=DEFAULT_EXTRACT_WORKERS,
+                       structure_workers=DEFAULT_STRUCTURE_WORKERS,
+                       queue_size=DEFAULT_QUEUE_SIZE):
+    """
+    Procesa las páginas con las tres etapas superpuestas
+
+    Args:
+        pages: Lista de rutas de imágenes
+        output_dir: Directorio de salida (mismo formato que batch_ocr.py)
+        client: Cliente asíncrono de Anthropic (por defecto, el cliente compartido)
+        cache: ResponseCache opcional
+        extract_workers: Llamadas de visión simultáneas
+        structure_workers: Llamadas de estructuración simultáneas
+        queue_size: Capacidad de las colas entre etapas
+
+    Returns:
+        dict: Resumen con resultados, errores y rendimiento (mismo formato que run_batch)
+    """
+    if client is None:
+        client = get_async_client()
+
+    pages_dir = os.path.join(output_dir, "paginas")
+    os.makedirs(pages_dir, exist_ok=True)
+
+    extract_queue = asyncio.Queue(maxsize=queue_size)
+    structure_queue = asyncio.Queue(maxsize=queue_size)
+    write_queue = asyncio.Queue(maxsize=queue_size)
+    results = {}
+    errors = {}
+    start = time.perf_counter()
+
+    async def feed():
+        for page in pages:
+            await extract_queue.put(page)
+        for _ in range(extract_workers):
+            await extract_queue.put(_DONE)
+
+    async def extract_stage():
+        while (page := await extract_queue.get()) is not _DONE:
+            page_id = page_id_for(page)
+            stage_start = time.perf_counter()
+            try:
+                image_data, media_type = await asyncio.to_thread(load_image_base64, page)
+                text = await extract_text_async(image_data, media_type, client, cache)
+                await asyncio.to_thread(write_extracted_text,
+                                        os.path.join(pages_dir, f"{page_id}.txt"), text, page_id)
+            except Exception as exc:
+                errors[page] = repr(exc)
+                print(f"   ❌ {page_id} (extracción): {exc}")
+                continue
+            await structure_queue.put((page, text, time.perf_counter() - stage_start))
+
+    async def structure_stage():
+        while (item := await structure_queue.get()) is not _DONE:
+            page, text, extract_seconds = item
+            stage_start = time.perf_counter()
+            try:
+                structured_data = await structure_text_async(text, client, cache)
+            except Exception as exc:
+                errors[page] = repr(exc)
+                print(f"   ❌ {page_id_for(page)} (estructuración): {exc}")
+                continue
+            await write_queue.put((page, text, structured_data, extract_seconds,
+                                   time.perf_counter() - stage_start))
+
+    async def write_stage():
+        while (item := await write_queue.get()) is not _DONE:
+            page, text, structured_data, extract_seconds, structure_seconds = item
+            page_id = page_id_for(page)
+            try:
+                df = await asyncio.to_thread(write_structured_outputs, pages_dir, page_id,
+                                             structured_data)
+            except Exception as exc:
+                errors[page] = repr(exc)
+                print(f"   ❌ {page_id} (escritura): {exc}")
+                continue
+            results[page] = {
+                "page_id": page_id,
+                "image_path": page,
+                "text": text,
+                "structured": structured_data,
+                "rows": df,
+                "extract_seconds": extract_seconds,
+                "structure_seconds": structure_seconds,
+            }
+            print(f"   ✅ {page_id}")
+
+    extractors = [asyncio.create_task(extract_stage()) for _ in range(extract_workers)]
+    structurers = [asyncio.create_task(structure_stage()) for _ in range(structure_workers)]
+    writer = asyncio.create_task(write_stage())
+
+    # Cerrar cada etapa cuando termina la anterior
+    await asyncio.gather(feed(), *extractors)
+    for _ in range(structure_workers):
+        await structure_queue.put(_DONE)
+    await asyncio.gather(*structurers)
+    await write_queue.put(_DONE)
+    await writer
+
+    elapsed = time.perf_counter() - start
+    ordered = [results[page] for page in pages if page in results]
+    corpus_df = await asyncio.to_thread(write_corpus, ordered, output_dir)
+
+    return {
+        "results": ordered,
+        "errors": errors,
+        "corpus": corpus_df,
+        "elapsed_seconds": elapsed,
+        "pages_per_minute": len(ordered) / elapsed * 60 if elapsed > 0 else 0.0,
+    }
+
+
+def run_serial(pages, output_dir=DEFAULT_OUTPUT_DIR, client=None, cache=None):
+    """
+    Procesa las páginas una tras otra, como el main() original (línea base)
+
+    Returns:
+        dict: Tiempo total y páginas por minuto
+    """
+    pages_dir = os.path.join(output_dir, "paginas")
+    os.makedirs(pages_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    for page in pages:
+        process_page(page, pages_dir, client, cache)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "elapsed_seconds": elapsed,
+        "pages_per_minute": len(pages) / elapsed * 60 if elapsed > 0 else 0.0,
+    }
+
+
+async def _run_pipeline_and_close(provider, pages, output_dir, cache=None, **options):
+    """
+    run_pipeline con el cliente asíncrono del proveedor, que se cierra al final
+
+    El cliente asíncrono se crea y se cierra dentro del mismo event loop.
+    """
+    try:
+        return await run_pipeline(pages, output_dir, provider.get_async_client(), cache,
+                                  **options)
+    finally:
+        await provider.aclose()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Flujo OCR asíncrono con etapas superpuestas")
+    parser.add_argument("source", help="Directorio de imágenes o manifiesto (.txt/.json)")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR,
+                        help=f"Directorio de salida (por defecto: {DEFAULT_OUTPUT_DIR})")
+    parser.add_argument("--extract-workers", type=int, default=DEFAULT_EXTRACT_WORKERS,
+                        help="Llamadas de visión simultáneas")
+    parser.add_argument("--structure-workers", type=int, default=DEFAULT_STRUCTURE_WORKERS,
+                        help="Llamadas de estructuración simultáneas")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="Capacidad de las colas entre etapas")
+    parser.add_argument("--compare", action="store_true",
+                        help="Ejecutar también el flujo en serie y comparar tiempos "
+                             "(sin caché de respuestas)")
+    add_cache_arguments(parser)
+    parser.add_argument("--fake", action="store_true",
+                        help="Usar el cliente falso local (sin red ni API key ni caché de respuestas)")
+    parser.add_argument("--fake-latency", type=float, default=0.5,
+                        help="Latencia simulada por petición del cliente falso, en segundos")
+    add_rate_limit_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    pages = discover_pages(args.source)
+    if not pages:
+        print(f"⚠️  No se encontraron páginas en: {args.source}")
+        return
+
+    limiter, retry_policy = rate_limiter_from_args(args)
+    provider = ClientProvider(max_connections=args.extract_workers + args.structure_workers,
+                              limiter=limiter, retry_policy=retry_policy)
+    set_provider(provider)
+    if args.fake:
+        from fake_anthropic import FakeAnthropic, FakeAsyncAnthropic
+        provider.set_async_client(FakeAsyncAnthropic(latency=args.fake_latency))
+        provider.set_client(FakeAnthropic(latency=args.fake_latency))
+    cache = cache_from_args(args)
+
+    print("\n" + "="*80)
+    print(f"⚡ FLUJO ASÍNCRONO - {len(pages)} páginas")
+    print("="*80)
+
+    try:
+        summary = asyncio.run(_run_pipeline_and_close(
+            provider, pages, args.output_dir, cache,
+            extract_workers=args.extract_workers,
+            structure_workers=args.structure_workers,
+            queue_size=args.queue_size,
+        ))
+        print(f"\n⏱️  Asíncrono: {summary['elapsed_seconds']:.2f} s - "
+              f"{summary['pages_per_minute']:.1f} páginas/minuto "
+              f"({len(summary['results'])} correctas, {len(summary['errors'])} con error)")
+
+        if args.compare:
+            print("\n🐢 Ejecutando el flujo en serie para comparar...")
+            serial = run_serial(pages, os.path.join(args.output_dir, "serie"),
+                                provider.get_client(), cache)
+            print(f"⏱️  En serie:   {serial['elapsed_seconds']:.2f} s - "
+                  f"{serial['pages_per_minute']:.1f} páginas/minuto")
+            if summary['elapsed_seconds'] > 0:
+                print(f"🚀 Aceleración: "
+                      f"{serial['elapsed_seconds'] / summary['elapsed_seconds']:.1f}x")
+    finally:
+        provider.close()
+
+    if cache is not None:
+        cache_stats = cache.stats()
+        print(f"\n💾 Caché: {cache_stats['hits']} aciertos, {cache_stats['misses']} fallos, "
+              f"{cache_stats['entries']} entradas ({cache_stats['bytes'] / 1024:.0f} KB)")
+
+    if limiter is not None:
+        print_metrics(limiter.metrics)
+
+    print(f"\n📁 Corpus combinado en: {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,640 @@
+#!/usr/bin/env python3
+"""
+Procesamiento por lotes de páginas de El Martillo
+
+Toma un directorio de imágenes (o un manifiesto con una ruta por línea) y
+ejecuta la extracción y la estructuración de cada página en un pool de hilos
+con un límite de concurrencia configurable. Genera:
+1. Salidas por página (.txt, .json, .csv) en <salida>/paginas/
+2. Un corpus combinado (texto, JSON y CSV) en <salida>/
+
+Ejemplo sin red, midiendo páginas por minuto con distintas concurrencias:
+    python3 batch_ocr.py data/paginas --fake --fake-latency 1.0 --sweep 1 4 8
+"""
+
+import argparse
+import base64
+import json
+import mimetypes
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from ad_dedup import structure_with_ad_index
+from chunked_structuring import DEFAULT_TARGET_CHARS, structure_text_chunked
+from entity_index import BATCH_MENTIONS_NAME, DEFAULT_GAZETTEER_PATH
+from client_provider import ClientProvider, set_provider
+from corpus_stats import BATCH_STATS_NAME, CORPUS, print_corpus_summary
+from layout_segmentation import DEFAULT_REGION_WORKERS, extract_page_regions
+from ocr_backends import CLAUDE, add_backend_arguments, backend_from_args, print_backend_stats
+from image_preprocessing import (
+    add_preprocess_arguments,
+    load_preprocessed_base64,
+    preprocess_options_from_args,
+)
+from instrumentation import (
+    add_instrumentation_arguments,
+    print_summary,
+    set_tracer,
+    span,
+    tracer_from_args,
+)
+from process_ocr import (
+    CSV_COLUMNS,
+    extract_text_with_claude,
+    read_extracted_text,
+    structure_text_with_claude,
+    structured_data_to_dataframe,
+    write_extracted_text,
+)
+from rate_limiter import add_rate_limit_arguments, print_metrics, rate_limiter_from_args
+from response_cache import add_cache_arguments, cache_from_args
+from run_manifest import (
+    EXTRACTED,
+    MANIFEST_NAME,
+    RENDERED,
+    STRUCTURED,
+    RunManifest,
+    file_sha256,
+)
+from single_pass_ocr import extract_and_structure
+
+PAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+DEFAULT_OUTPUT_DIR = "data/el_martillo/lote"
+DEFAULT_WORKERS = 4
+
+
+def discover_pages(source):
+    """
+    Obtiene la lista de imágenes a procesar
+
+    Args:
+        source: Directorio con imágenes, o manifiesto (.txt con una ruta por línea
+                o .json con una lista de rutas). Las rutas relativas del manifiesto
+                se resuelven respecto a su propio directorio.
+
+    Returns:
+        list: Rutas de las imágenes, en orden
+    """
+    if os.path.isdir(source):
+        return sorted(
+            os.path.join(source, name) for name in os.listdir(source)
+            if name.lower().endswith(PAGE_EXTENSIONS)
+        )
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    with open(source, encoding='utf-8') as f:
+        if source.endswith('.json'):
+            entries = json.load(f)
+        else:
+            entries = [line.strip() for line in f
+                       if line.strip() and not line.lstrip().startswith('#')]
+
+    return [entry if os.path.isabs(entry) else os.path.join(base_dir, entry)
+            for entry in entries]
+
+
+def page_id_for(image_path):
+    """
+    Identificador de página a partir del nombre del archivo (sin extensión)
+    """
+    return os.path.splitext(os.path.basename(image_path))[0]
+
+
+def load_image_base64(image_path):
+    """
+    Lee una imagen y la codifica en base64
+
+    Returns:
+        tuple: (datos en base64, media type)
+    """
+    media_type = mimetypes.guess_type(image_path)[0] or "image/png"
+    with open(image_path, "rb") as image_file:
+        image_data = base64.standard_b64encode(image_file.read()).decode("utf-8")
+    return image_data, media_type
+
+
+def write_structured_outputs(pages_dir, page_id, structured_data):
+    """
+    Guarda el JSON y el CSV estructurados de una página
+
+    Args:
+        pages_dir: Directorio de salidas por página
+        page_id: Identificador de la página
+        structured_data: Estructura con 'metadata' y 'content'
+
+    Returns:
+        pd.DataFrame: Filas del CSV de la página
+    """
+    json_path = os.path.join(pages_dir, f"{page_id}.json")
+    with span("write_json", page_id=page_id, path=json_path) as current:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(structured_data, f, ensure_ascii=False, indent=2)
+        current.record_file(json_path)
+
+    csv_path = os.path.join(pages_dir, f"{page_id}.csv")
+    with span("write_csv", page_id=page_id, path=csv_path) as current:
+        df = structured_data_to_dataframe(structured_data)
+        df.to_csv(csv_path, index=False, encoding='utf-8')
+        current.record_file(csv_path)
+    return df
+
+
+def extract_page_text(image_path, client=None, cache=None, preprocess=None, segment=False,
+                      region_workers=DEFAULT_REGION_WORKERS, backend=None):
+    """
+    Extrae el texto de una página (completa, por regiones o con otro motor de OCR)
+
+    Returns:
+        tuple: (texto extraído, PreprocessReport o None)
+    """
+    if backend is not None:
+        return backend.extract(image_path).text, None
+    if segment:
+        regions = extract_page_regions(image_path, client=client, cache=cache,
+                                       max_workers=region_workers, preprocess=preprocess)
+        if regions["errors"]:
+            # Con caché, reprocesar la página solo repite las regiones fallidas
+            raise RuntimeError(f"{len(regions['errors'])} de "
+                               f"{len(regions['errors']) + len(regions['regions'])} regiones fallaron: "
+                               f"{regions['errors']}")
+        return regions["text"], None
+
+    report = None
+    if preprocess is not None:
+        image_data, media_type, report = load_preprocessed_base64(image_path, **preprocess)
+    else:
+        image_data, media_type = load_image_base64(image_path)
+    return extract_text_with_claude(image_data, media_type, client=client, cache=cache), report
+
+
+def extract_page_single_pass(image_path, client=None, cache=None, preprocess=None):
+    """
+    Transcribe y estructura una página con una sola llamada (single_pass_ocr.py)
+
+    Returns:
+        tuple: (texto extraído, estructura JSON, UsageReport, PreprocessReport o None)
+    """
+    report = None
+    if preprocess is not None:
+        image_data, media_type, report = load_preprocessed_base64(image_path, **preprocess)
+    else:
+        image_data, media_type = load_image_base64(image_path)
+    text, structured_data, usage = extract_and_structure(image_data, media_type, client=client,
+                                                         cache=cache)
+    return text, structured_data, usage, report
+
+
+def process_page(image_path, pages_dir, client=None, cache=None, preprocess=None,
+                 segment=False, region_workers=DEFAULT_REGION_WORKERS, manifest=None,
+                 single_pass=False, chunk_chars=None, ad_index=None, backend=None,
+                 page_id=None):
+    """
+    Extrae y estructura una página, guardando sus salidas individuales
+
+    Args:
+        image_path: Ruta de la imagen de la página
+        pages_dir: Directorio donde guardar las salidas de la página
+        client: Cliente de Anthropic (real o falso) compartido por los hilos
+        cache: ResponseCache opcional compartido por los hilos
+        preprocess: Opciones de image_preprocessing.preprocess_image (dict), o None
+                    para enviar la imagen original
+        segment: Extraer por columnas/artículos en paralelo (layout_segmentation.py)
+                 en lugar de con una sola llamada por página
+        region_workers: Regiones de la página extrayéndose a la vez
+        manifest: RunManifest opcional; los pasos que ya constan como hechos
+                  (con sus salidas intactas) se leen de disco en vez de repetirse
+        single_pass: Transcribir y estructurar con una sola llamada de visión; si
+                     la página ya estaba extraída, solo se repite la estructuración
+        chunk_chars: Estructurar por fragmentos de secciones de este tamaño, en
+                     paralelo (chunked_structuring.py); None, en una sola llamada
+        ad_index: AdIndex opcional (ad_dedup.py); los anuncios ya conocidos no se
+                  envían al modelo y cada anuncio queda enlazado a su ad_id
+        backend: Motor de OCR de ocr_backends.py (tesseract o auto); las páginas
+                 en las que no lee texto (en blanco) no se estructuran
+        page_id: Identificador de la página para las salidas (por defecto, el
+                 nombre de la imagen sin extensión)
+
+    Returns:
+        dict: Resultado con page_id, texto, estructura, tiempos, 'resumed' (si
+              no hizo falta ninguna llamada), si se preprocesó la imagen, el
+              PreprocessReport en 'preprocess' y, en modo de una llamada, el
+              UsageReport en 'usage'
+    """
+    page_id = page_id or page_id_for(image_path)
+    text_path = os.path.join(pages_dir, f"{page_id}.txt")
+    json_path = os.path.join(pages_dir, f"{page_id}.json")
+    csv_path = os.path.join(pages_dir, f"{page_id}.csv")
+    start = time.perf_counter()
+
+    if manifest is not None:
+        manifest.register(page_id, image_path, file_sha256(image_path))
+
+    report = None
+    usage = None
+    single_pass_data = None
+    extract_resumed = manifest is not None and manifest.reached(page_id, EXTRACTED)
+    if extract_resumed:
+        extracted_text = read_extracted_text(text_path)
+    else:
+        try:
+            if single_pass:
+                extracted_text, single_pass_data, usage, report = extract_page_single_pass(
+                    image_path, client, cache, preprocess)
+            else:
+                extracted_text, report = extract_page_text(image_path, client, cache, preprocess,
+                                                           segment, region_workers, backend)
+            write_extracted_text(text_path, extracted_text, page_id)
+        except Exception as exc:
+            if manifest is not None:
+                manifest.record_error(page_id, EXTRACTED, exc)
+            raise
+        if manifest is not None:
+            manifest.mark(page_id, EXTRACTED, [text_path])
+    extracted_at = time.perf_counter()
+
+    structure_resumed = manifest is not None and manifest.reached(page_id, STRUCTURED)
+    if structure_resumed:
+        with open(json_path, encoding='utf-8') as f:
+            structured_data = json.load(f)
+        df = structured_data_to_dataframe(structured_data)
+    else:
+        try:
+            if chunk_chars:
+                def structure(text):
+                    return structure_text_chunked(text, client=client, cache=cache,
+                                                  target_chars=chunk_chars)
+            else:
+                def structure(text):
+                    return structure_text_with_claude(text, client=client, cache=cache)
+
+            structured_data = single_pass_data
+            if structured_data is None and backend is not None and not extracted_text.strip():
+                # Página en blanco: no hay nada que enviar al modelo
+                structured_data = {"metadata": {}, "content": []}
+            elif structured_data is None and ad_index is not None:
+                structured_data = structure_with_ad_index(extracted_text, ad_index, structure)
+            elif structured_data is None:
+                structured_data = structure(extracted_text)
+            if ad_index is not None:
+                ad_index.register_page(page_id, structured_data, extracted_text)
+            df = write_structured_outputs(pages_dir, page_id, structured_data)
+        except Exception as exc:
+            if manifest is not None:
+                manifest.record_error(page_id, STRUCTURED, exc)
+            raise
+        if manifest is not None:
+            manifest.mark(page_id, STRUCTURED, [json_path, csv_path])
+
+    return {
+        "page_id": page_id,
+        "image_path": image_path,
+        "text": extracted_text,
+        "structured": structured_data,
+        "rows": df,
+        "extract_seconds": extracted_at - start,
+        "structure_seconds": time.perf_counter() - extracted_at,
+        "preprocess": report,
+        "usage": usage,
+        "resumed": extract_resumed and structure_resumed,
+    }
+
+
+def write_corpus(results, output_dir):
+    """
+    Combina los resultados por página en un corpus único
+
+    Args:
+        results: Resultados de process_page, en el orden de las páginas
+        output_dir: Directorio de salida del lote
+
+    Returns:
+        pd.DataFrame: Filas combinadas de todas las páginas (con columna page_id)
+    """
+    with open(os.path.join(output_dir, "corpus_texto.txt"), 'w', encoding='utf-8') as f:
+        for result in results:
+            f.write("="*80 + "\n")
+            f.write(f"PÁGINA: {result['page_id']}\n")
+            f.write("="*80 + "\n\n")
+            f.write(result["text"].strip() + "\n\n")
+
+    with open(os.path.join(output_dir, "corpus_structured.json"), 'w', encoding='utf-8') as f:
+        json.dump({r["page_id"]: r["structured"] for r in results}, f, ensure_ascii=False, indent=2)
+
+    frames = [r["rows"].assign(page_id=r["page_id"]) for r in results]
+    corpus_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=CSV_COLUMNS)
+    columns_order = ['page_id'] + [col for col in CSV_COLUMNS if col in corpus_df.columns]
+    corpus_df = corpus_df.reindex(columns=columns_order)
+    corpus_df.to_csv(os.path.join(output_dir, "corpus_structured.csv"), index=False, encoding='utf-8')
+
+    return corpus_df
+
+
+def run_batch(pages, output_dir=DEFAULT_OUTPUT_DIR, max_workers=DEFAULT_WORKERS, client=None,
+              cache=None, preprocess=None, segment=False, region_workers=DEFAULT_REGION_WORKERS,
+              manifest=None, store=None, index=None, single_pass=False, chunk_chars=None,
+              ad_index=None, entities=None, backend=None, stats=None):
+    """
+    Procesa un lote de páginas con un pool de hilos acotado
+
+    Args:
+        pages: Lista de rutas de imágenes
+        output_dir: Directorio de salida del lote
+        max_workers: Número máximo de páginas procesándose a la vez
+        client: Cliente de Anthropic (por defecto, el cliente compartido del proceso)
+        cache: ResponseCache opcional para no repetir llamadas ya resueltas
+        preprocess: Opciones de preprocesamiento de imagen (dict), o None
+        segment: Extraer cada página por regiones (columnas/artículos)
+        region_workers: Regiones por página extrayéndose a la vez
+        manifest: RunManifest opcional para registrar el avance y retomar
+        store: CorpusStore opcional (Parquet); cada página se añade al terminar
+        index: SearchIndex opcional; cada página se indexa al terminar
+        single_pass: Una sola llamada de visión por página (texto + estructura)
+        chunk_chars: Estructurar cada página por fragmentos de este tamaño (None: entera)
+        ad_index: AdIndex opcional para reutilizar y enlazar los anuncios recurrentes
+        entities: MentionIndex opcional; las menciones de cada página se registran al terminar
+        backend: Motor de OCR de ocr_backends.py; None extrae con Claude
+        stats: CorpusStats opcional; el aporte de cada página se suma al terminar
+
+    Returns:
+        dict: Resumen con resultados, errores y rendimiento (páginas por minuto)
+    """
+    pages_dir = os.path.join(output_dir, "paginas")
+    os.makedirs(pages_dir, exist_ok=True)
+
+    results = {}
+    errors = {}
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(process_page, page, pages_dir, client, cache, preprocess,
+                                   segment, region_workers, manifest, single_pass, chunk_chars,
+                                   ad_index, backend): page
+                   for page in pages}
+        for future in as_completed(futures):
+            page = futures[future]
+            try:
+                results[page] = future.result()
+                if store is not None and not (results[page]["resumed"]
+                                              and store.has_page(results[page]["page_id"])):
+                    store.append_page(results[page]["page_id"], results[page]["structured"])
+                if index is not None:
+                    index.index_page(results[page]["page_id"], results[page]["text"],
+                                     results[page]["structured"])
+                if entities is not None:
+                    with span("entities", page_id=results[page]["page_id"]):
+                        entities.index_page(results[page]["page_id"], results[page]["text"],
+                                            results[page]["structured"])
+                if stats is not None:
+                    with span("stats", page_id=results[page]["page_id"]):
+                        stats.add_page(results[page]["page_id"], results[page]["structured"])
+                report = results[page]["preprocess"]
+                if report is not None:
+                    print(f"   ✅ {page_id_for(page)} (imagen: {report.original_bytes / 1024:.0f} KB → "
+                          f"{report.output_bytes / 1024:.0f} KB, {report.encode_seconds * 1000:.0f} ms)")
+                else:
+                    print(f"   ✅ {page_id_for(page)}")
+            except Exception as exc:
+                errors[page] = repr(exc)
+                print(f"   ❌ {page_id_for(page)}: {exc}")
+
+    elapsed = time.perf_counter() - start
+    ordered = [results[page] for page in pages if page in results]
+    corpus_df = write_corpus(ordered, output_dir)
+
+    if manifest is not None:
+        for result in ordered:
+            manifest.mark(result["page_id"], RENDERED)
+        manifest.flush()
+
+    return {
+        "results": ordered,
+        "errors": errors,
+        "corpus": corpus_df,
+        "elapsed_seconds": elapsed,
+        "pages_per_minute": len(ordered) / elapsed * 60 if elapsed > 0 else 0.0,
+        "max_workers": max_workers,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Procesamiento OCR por lotes de El Martillo")
+    parser.add_argument("source", help="Directorio de imágenes o manifiesto (.txt/.json)")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR,
+                        help=f"Directorio de salida (por defecto: {DEFAULT_OUTPUT_DIR})")
+    parser.add_argument("--workers", type=int,
+                        help=f"Páginas procesadas en paralelo (por defecto: {DEFAULT_WORKERS}, o "
+                             "una por núcleo si hay más con un motor de OCR local)")
+    parser.add_argument("--sweep", type=int, nargs="+", metavar="N",
+                        help="Medir páginas por minuto con cada nivel de concurrencia indicado "
+                             "(sin caché de respuestas)")
+    add_cache_arguments(parser)
+    parser.add_argument("--fake", action="store_true",
+                        help="Usar el cliente falso local (sin red ni API key ni caché de respuestas)")
+    parser.add_argument("--fake-latency", type=float, default=0.5,
+                        help="Latencia simulada por petición del cliente falso, en segundos")
+    parser.add_argument("--preprocess", action="store_true",
+                        help="Reducir las imágenes antes de enviarlas (ver image_preprocessing.py)")
+    add_preprocess_arguments(parser)
+    parser.add_argument("--resume", action="store_true",
+                        help="Retomar una corrida interrumpida saltando las páginas ya procesadas")
+    parser.add_argument("--manifest",
+                        help=f"Manifiesto de la corrida (por defecto: <salida>/{MANIFEST_NAME})")
+    parser.add_argument("--store", metavar="DIR",
+                        help="Añadir cada página a un almacén Parquet particionado (ver corpus_store.py)")
+    parser.add_argument("--index", metavar="SQLITE",
+                        help="Actualizar el índice de búsqueda con cada página (ver search_index.py)")
+    parser.add_argument("--segment", action="store_true",
+                        help="Extraer por columnas/artículos en paralelo (ver layout_segmentation.py)")
+    parser.add_argument("--region-workers", type=int, default=DEFAULT_REGION_WORKERS,
+                        help="Regiones por página extrayéndose a la vez")
+    parser.add_argument("--single-pass", action="store_true",
+                        help="Transcribir y estructurar con una sola llamada por página "
+                             "(ver single_pass_ocr.py)")
+    parser.add_argument("--chunked", action="store_true",
+                        help="Estructurar las páginas largas por secciones en paralelo "
+                             "(ver chunked_structuring.py)")
+    parser.add_argument("--chunk-chars", type=int, default=DEFAULT_TARGET_CHARS,
+                        help=f"Tamaño objetivo de cada fragmento con --chunked (por defecto: "
+                             f"{DEFAULT_TARGET_CHARS})")
+    parser.add_argument("--ad-index", metavar="SQLITE",
+                        help="Reutilizar la estructura de los anuncios recurrentes y enlazarlos "
+                             "(ver ad_dedup.py)")
+    parser.add_argument("--entities", nargs="?", const="", metavar="JSON",
+                        help="Registrar las menciones de periódicos, personas y lugares "
+                             "(por defecto en <salida>/menciones.json; ver entity_index.py)")
+    parser.add_argument("--gazetteer", default=DEFAULT_GAZETTEER_PATH,
+                        help=f"Gazetteer de entidades (por defecto: {DEFAULT_GAZETTEER_PATH})")
+    parser.add_argument("--stats", nargs="?", const="", metavar="SQLITE",
+                        help=f"Mantener las estadísticas del corpus página a página (por defecto "
+                             f"en <salida>/{BATCH_STATS_NAME}; ver corpus_stats.py)")
+    add_backend_arguments(parser)
+    add_rate_limit_arguments(parser)
+    add_instrumentation_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.ocr_backend != CLAUDE and (args.segment or args.single_pass):
+        parser.error(f"--ocr-backend {args.ocr_backend} no se combina con --segment ni con "
+                     "--single-pass")
+    if args.workers is None:
+        # Cada página local ocupa un núcleo con tesseract: usarlos todos
+        args.workers = (max(DEFAULT_WORKERS, os.cpu_count() or 1)
+                        if args.ocr_backend != CLAUDE else DEFAULT_WORKERS)
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    pages = discover_pages(args.source)
+    if not pages:
+        print(f"⚠️  No se encontraron páginas en: {args.source}")
+        return
+
+    # Un único cliente para todos los hilos, con pool de conexiones a la medida
+    max_requests = max(args.sweep or [args.workers])
+    if args.segment:
+        max_requests *= args.region_workers
+    limiter, retry_policy = rate_limiter_from_args(args)
+    provider = ClientProvider(max_connections=max_requests, limiter=limiter,
+                              retry_policy=retry_policy)
+    set_provider(provider)
+    if args.fake:
+        from fake_anthropic import FakeAnthropic
+        provider.set_client(FakeAnthropic(latency=args.fake_latency))
+    client = provider.get_client()
+
+    tracer = tracer_from_args(args)
+    if tracer is not None:
+        set_tracer(tracer)
+
+    # Las respuestas del cliente falso no deben acabar en la caché real, y en un
+    # barrido los niveles siguientes serían aciertos de caché en vez de llamadas
+    cache = cache_from_args(args)
+
+    print("\n" + "="*80)
+    print(f"📚 PROCESAMIENTO POR LOTES - {len(pages)} páginas")
+    print("="*80)
+
+    preprocess = preprocess_options_from_args(args) if args.preprocess else None
+    backend = backend_from_args(args, client=client, cache=cache, preprocess=preprocess)
+
+    manifest_path = args.manifest or os.path.join(args.output_dir, MANIFEST_NAME)
+
+    store = None
+    if args.store:
+        # pyarrow solo hace falta si se usa el almacén
+        from corpus_store import CorpusStore
+        store = CorpusStore(args.store)
+
+    index = None
+    if args.index:
+        from search_index import SearchIndex
+        index = SearchIndex(args.index)
+
+    ad_index = None
+    if args.ad_index:
+        from ad_dedup import AdIndex
+        ad_index = AdIndex(args.ad_index)
+
+    entities = None
+    if args.entities is not None:
+        from entity_index import MentionIndex
+        entities = MentionIndex(args.entities or os.path.join(args.output_dir, BATCH_MENTIONS_NAME),
+                                args.gazetteer)
+
+    stats = None
+    if args.stats is not None:
+        from corpus_stats import CorpusStats
+        stats = CorpusStats(args.stats or os.path.join(args.output_dir, BATCH_STATS_NAME))
+
+    levels = args.sweep or [args.workers]
+    for workers in levels:
+        # Sin --resume cada corrida (y cada nivel del barrido) empieza de cero
+        manifest = RunManifest(manifest_path, fresh=not args.resume)
+        print(f"\n🔄 Procesando con {workers} hilos...")
+        summary = run_batch(pages, args.output_dir, max_workers=workers, client=client,
+                            cache=cache, preprocess=preprocess, segment=args.segment,
+                            region_workers=args.region_workers, manifest=manifest,
+                            store=store, index=index, single_pass=args.single_pass,
+                            chunk_chars=args.chunk_chars if args.chunked else None,
+                            ad_index=ad_index, entities=entities, backend=backend,
+                            stats=stats)
+        print(f"\n⏱️  {summary['elapsed_seconds']:.2f} s - "
+              f"{summary['pages_per_minute']:.1f} páginas/minuto "
+              f"({len(summary['results'])} correctas, {len(summary['errors'])} con error)")
+        resumed = sum(1 for r in summary["results"] if r["resumed"])
+        if resumed:
+            print(f"⏭️  {resumed} páginas retomadas del manifiesto sin llamar a la API")
+
+    print(f"📋 Manifiesto: {manifest_path}")
+    if index is not None:
+        index_stats = index.stats()
+        print(f"🔍 Índice de búsqueda: {index_stats['pages']} páginas, "
+              f"{index_stats['documents']} documentos ({args.index})")
+        index.close()
+    if ad_index is not None:
+        ad_stats = ad_index.stats()
+        print(f"📢 Anuncios: {ad_index.reused_items} reutilizados sin llamar al modelo "
+              f"({ad_index.skipped_chars} caracteres no enviados), {ad_stats['ads']} canónicos, "
+              f"{ad_stats['occurrences']} apariciones ({args.ad_index})")
+        ad_index.close()
+    if entities is not None:
+        entities.save()
+        entity_stats = entities.stats()
+        print(f"🏷️  Menciones: {entity_stats['mentions']} en {entity_stats['pages']} páginas "
+              f"({entities.path})")
+    if stats is not None:
+        print(f"📊 Estadísticas del corpus ({stats.path}):")
+        print_corpus_summary(stats.summary(CORPUS))
+        stats.close()
+    if store is not None:
+        store_summary = store.summary()
+        print(f"🗄️  Almacén Parquet: {store_summary['pages']} páginas, {store_summary['rows']} filas "
+              f"en {store_summary['partitions']} ediciones ({args.store})")
+
+    usages = [r["usage"] for r in summary["results"] if r["usage"] is not None]
+    if usages:
+        print(f"\n🎯 Una llamada por página: {sum(u.total_input_tokens for u in usages)} tokens de "
+              f"entrada ({sum(u.cache_read_input_tokens for u in usages)} leídos de caché), "
+              f"{sum(u.output_tokens for u in usages)} de salida, "
+              f"{sum(u.latency_seconds for u in usages) / len(usages):.2f} s por página")
+
+    if backend is not None:
+        print(f"\n🔎 Motores de OCR ({args.ocr_backend}):")
+        print_backend_stats(backend.stats)
+
+    reports = [r["preprocess"] for r in summary["results"] if r["preprocess"] is not None]
+    if reports:
+        original = sum(r.original_bytes for r in reports)
+        saved = sum(r.bytes_saved for r in reports)
+        encode_ms = sum(r.encode_seconds for r in reports) / len(reports) * 1000
+        print(f"\n🖼️  Imágenes: {saved / 1024 / 1024:.1f} MB ahorrados "
+              f"({saved / original:.0%} de {original / 1024 / 1024:.1f} MB), "
+              f"{encode_ms:.0f} ms de preprocesamiento por página")
+
+    if cache is not None:
+        cache_stats = cache.stats()
+        print(f"\n💾 Caché: {cache_stats['hits']} aciertos, {cache_stats['misses']} fallos, "
+              f"{cache_stats['entries']} entradas ({cache_stats['bytes'] / 1024:.0f} KB)")
+
+    if limiter is not None:
+        print_metrics(limiter.metrics)
+    connection_stats = provider.stats.as_dict()
+    if connection_stats["requests"]:
+        print(f"🔌 Conexiones: {connection_stats['requests']} peticiones, "
+              f"{connection_stats['new_connections']} nuevas, "
+              f"{connection_stats['reused_connections']} reutilizadas")
+
+    if tracer is not None:
+        tracer.close()
+        print("\n📈 Etapas instrumentadas:")
+        print_summary(tracer.summary())
+        print(f"   Traza: {args.trace or '-'} - Métricas: {args.metrics or '-'}")
+
+    print(f"\n📁 Corpus combinado en: {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,641 @@
+#!/usr/bin/env python3
+"""
+Envío masivo de páginas con la API de lotes de mensajes (Message Batches)
+
+Para digitalizar el archivo completo la latencia no importa, pero el costo y
+el rendimiento sí: la API de lotes cobra la mitad por token y acepta miles de
+peticiones por envío. Este módulo empaqueta las peticiones de
+process_ocr.py (las mismas que enviaría messages.create) en lotes, espera a
+que terminen, descarga los resultados y los guarda con los mismos escritores
+que batch_ocr.py (.txt, .json y .csv por página y el corpus combinado).
+
+- Dos fases, extracción y estructuración (o una sola con --single-pass,
+  ver single_pass_ocr.py), cada una en tantos lotes como haga falta para
+  respetar los límites de la API (peticiones y bytes por lote)
+- Cada petición lleva como custom_id el identificador de la página
+- Las peticiones con error, vencidas o canceladas se reenvían en un lote
+  nuevo, hasta --max-rounds rondas; los errores de petición inválida no
+- Una respuesta cortada por max_tokens se repite al final con la llamada
+  síncrona de siempre (structure_text_with_claude, que sigue pidiendo en
+  continuaciones la parte del texto que faltó)
+- El manifiesto de la corrida (run_manifest.py) y el registro de lotes
+  enviados permiten retomar con --resume: los lotes ya enviados se vuelven a
+  consultar en lugar de pagarse dos veces
+- Con --fake todo el flujo corre sin red contra el cliente falso
+  (fake_anthropic.py), que también imita la API de lotes
+
+Ejemplos:
+    python3 batch_submission.py data/paginas --output-dir data/el_martillo/archivo
+    python3 batch_submission.py data/paginas --fake --fake-batch-seconds 2 \\
+        --fake-error-rate 0.1 --max-requests 50 --poll-seconds 1
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+
+from batch_ocr import (
+    DEFAULT_OUTPUT_DIR,
+    discover_pages,
+    load_image_base64,
+    page_id_for,
+    write_corpus,
+    write_structured_outputs,
+)
+from instrumentation import (
+    add_instrumentation_arguments,
+    payload_bytes,
+    print_summary,
+    set_tracer,
+    span,
+    tracer_from_args,
+)
+from process_ocr import (
+    build_extraction_request,
+    build_structure_request,
+    extraction_cache_key,
+    read_extracted_text,
+    request_cache_key,
+    structure_text_with_claude,
+    structured_data_to_dataframe,
+    write_extracted_text,
+)
+from response_cache import add_cache_arguments, cache_from_args, make_key
+from run_manifest import (
+    EXTRACTED,
+    MANIFEST_NAME,
+    STRUCTURED,
+    RunManifest,
+    atomic_write_json,
+    file_sha256,
+)
+from single_pass_ocr import (
+    build_single_pass_request,
+    extract_and_structure,
+    parse_single_pass_response,
+    single_pass_cache_key,
+)
+from structured_output import structure_from_message
+
+EXTRACT = "extract"
+STRUCTURE = "structure"
+SINGLE_PASS = "single_pass"
+
+# Límites de la API por lote
+MAX_BATCH_REQUESTS = 100_000
+MAX_BATCH_BYTES = 256 * 1024 * 1024
+CUSTOM_ID_MAX_CHARS = 64
+# Bytes del envoltorio de cada petición en el cuerpo del lote (custom_id, claves)
+REQUEST_OVERHEAD_BYTES = 128
+
+DEFAULT_POLL_SECONDS = 60.0
+DEFAULT_MAX_ROUNDS = 3
+BATCH_STATE_NAME = "lotes_api.json"
+BATCH_STATE_VERSION = 1
+
+# Errores que se repetirían igual al reenviar la petición
+PERMANENT_ERRORS = ("invalid_request_error",)
+
+
+def custom_id_for(page_id):
+    """
+    custom_id de la petición de una página (letras, dígitos, _ y -; hasta 64)
+
+    Si el identificador no cumple el formato se sanea y se le añade un hash,
+    para que dos páginas distintas no compartan custom_id.
+    """
+    safe = re.sub(r'[^A-Za-z0-9_-]', '_', page_id)
+    if safe == page_id and len(safe) <= CUSTOM_ID_MAX_CHARS:
+        return safe
+    suffix = make_key(page_id)[:12]
+    return f"{safe[:CUSTOM_ID_MAX_CHARS - len(suffix) - 1]}-{suffix}"
+
+
+def request_bytes(request):
+    """
+    Tamaño aproximado de una petición dentro del cuerpo de un lote
+
+    Los mensajes se miden con instrumentation.payload_bytes (sin serializar las
+    imágenes); el resto (sistema, herramientas) es pequeño y se serializa.
+    """
+    rest = {key: value for key, value in request.items() if key != "messages"}
+    return (payload_bytes(request) + len(json.dumps(rest, ensure_ascii=False).encode("utf-8"))
+            + REQUEST_OVERHEAD_BYTES)
+
+
+def chunk_requests(entries, max_requests=MAX_BATCH_REQUESTS, max_bytes=MAX_BATCH_BYTES):
+    """
+    Agrupa las peticiones en lotes que respetan los límites de la API
+
+    Args:
+        entries: Iterable de (custom_id, petición); se consume de a poco, así que
+                 solo un lote de imágenes en base64 está en memoria a la vez
+        max_requests: Peticiones por lote
+        max_bytes: Bytes por lote
+
+    Yields:
+        tuple: (lista de {"custom_id", "params"}, bytes del lote)
+
+    Raises:
+        ValueError: Si una petición sola supera max_bytes
+    """
+    chunk = []
+    size = 0
+    for custom_id, request in entries:
+        entry_size = request_bytes(request)
+        if entry_size > max_bytes:
+            raise ValueError(f"La petición {custom_id} ocupa {entry_size} bytes, "
+                             f"más que el límite de un lote ({max_bytes})")
+        if chunk and (len(chunk) >= max_requests or size + entry_size > max_bytes):
+            yield chunk, size
+            chunk = []
+            size = 0
+        chunk.append({"custom_id": custom_id, "params": request})
+        size += entry_size
+    if chunk:
+        yield chunk, size
+
+
+class BatchSubmitter:
+    """
+    Envía las fases del OCR como lotes y guarda los resultados por página
+
+    Args:
+        client: Cliente de Anthropic (real o falso) con messages.batches
+        output_dir: Directorio de salida del lote (<salida>/paginas por página)
+        manifest: RunManifest de la corrida
+        images: {page_id: ruta de la imagen}
+        cache: ResponseCache opcional; las peticiones con respuesta guardada no
+               se envían y las respuestas de los lotes se guardan
+        preprocess: Opciones de preprocesamiento de imagen (dict), o None
+        poll_seconds: Segundos entre consultas del estado de un lote
+        max_requests: Peticiones por lote
+        max_bytes: Bytes por lote
+        max_rounds: Envíos por petición (el primero y los reenvíos)
+        resume: Consultar los lotes enviados por una corrida anterior en lugar
+                de empezar un registro nuevo
+    """
+
+    def __init__(self, client, output_dir, manifest, images, cache=None, preprocess=None,
+                 poll_seconds=DEFAULT_POLL_SECONDS, max_requests=MAX_BATCH_REQUESTS,
+                 max_bytes=MAX_BATCH_BYTES, max_rounds=DEFAULT_MAX_ROUNDS, resume=False):
+        self.client = client
+        self.pages_dir = os.path.join(output_dir, "paginas")
+        os.makedirs(self.pages_dir, exist_ok=True)
+        self.manifest = manifest
+        self.images = images
+        self.cache = cache
+        self.preprocess = preprocess
+        self.poll_seconds = poll_seconds
+        self.max_requests = max_requests
+        self.max_bytes = max_bytes
+        self.max_rounds = max_rounds
+        self.state_path = os.path.join(output_dir, BATCH_STATE_NAME)
+        self.batches = []
+        if resume and os.path.exists(self.state_path):
+            with open(self.state_path, encoding='utf-8') as f:
+                self.batches = json.load(f).get("batches", [])
+        # Resultado de la corrida
+        self.failed = {}
+        self.incomplete = {}
+        self.cached = 0
+        self.usage = dict.fromkeys(("input_tokens", "output_tokens"), 0)
+
+    def _save_state(self):
+        atomic_write_json(self.state_path, {"version": BATCH_STATE_VERSION,
+                                            "batches": self.batches})
+
+    def _load_image(self, page_id):
+        if self.preprocess is not None:
+            from image_preprocessing import load_preprocessed_base64
+
+            image_data, media_type, _ = load_preprocessed_base64(self.images[page_id],
+                                                                 **self.preprocess)
+            return image_data, media_type
+        return load_image_base64(self.images[page_id])
+
+    def _text_path(self, page_id):
+        return os.path.join(self.pages_dir, f"{page_id}.txt")
+
+    def build_request(self, phase, page_id):
+        """
+        Petición de una fase para una página, con su clave de caché
+
+        Returns:
+            tuple: (argumentos de messages.create, clave de caché o None)
+        """
+        if phase == STRUCTURE:
+            request = build_structure_request(read_extracted_text(self._text_path(page_id)))
+            key = request_cache_key("structure", request) if self.cache is not None else None
+            return request, key
+
+        image_data, media_type = self._load_image(page_id)
+        if phase == SINGLE_PASS:
+            request = build_single_pass_request(image_data, media_type)
+            key = single_pass_cache_key(image_data, media_type) if self.cache is not None else None
+        else:
+            request = build_extraction_request(image_data, media_type)
+            key = extraction_cache_key(image_data, media_type) if self.cache is not None else None
+        return request, key
+
+    def _save_text(self, page_id, text):
+        text_path = self._text_path(page_id)
+        write_extracted_text(text_path, text, page_id)
+        self.manifest.mark(page_id, EXTRACTED, [text_path])
+
+    def _save_structure(self, page_id, structured_data):
+        write_structured_outputs(self.pages_dir, page_id, structured_data)
+        self.manifest.mark(page_id, STRUCTURED, [
+            os.path.join(self.pages_dir, f"{page_id}.json"),
+            os.path.join(self.pages_dir, f"{page_id}.csv"),
+        ])
+
+    def apply_response(self, phase, page_id, response_text=None, structured_data=None):
+        """
+        Guarda la respuesta de una fase para una página
+
+        Args:
+            phase: EXTRACT, STRUCTURE o SINGLE_PASS
+            page_id: Identificador de la página
+            response_text: Texto de la respuesta (extracción o una llamada)
+            structured_data: Estructura ya interpretada (estructuración)
+
+        Raises:
+            ValueError: Si la respuesta de una llamada no se puede interpretar o llegó cortada
+        """
+        if phase == EXTRACT:
+            self._save_text(page_id, response_text)
+        elif phase == STRUCTURE:
+            self._save_structure(page_id, structured_data)
+        else:
+            text, structured_data, complete = parse_single_pass_response(response_text)
+            if not complete:
+                raise ValueError("Respuesta de una llamada incompleta")
+            self._save_text(page_id, text)
+            self._save_structure(page_id, structured_data)
+
+    def _apply_cached(self, phase, page_id, cached):
+        if phase == STRUCTURE:
+            self.apply_response(phase, page_id, structured_data=json.loads(cached))
+        else:
+            self.apply_response(phase, page_id, response_text=cached)
+
+    def _apply_message(self, phase, page_id, message, cache_key):
+        usage = getattr(message, "usage", None)
+        for name in self.usage:
+            self.usage[name] += getattr(usage, name, 0) or 0
+
+        if phase == STRUCTURE:
+            structured_data, complete = structure_from_message(message)
+            if not complete:
+                self.incomplete[page_id] = phase
+                return
+            self.apply_response(phase, page_id, structured_data=structured_data)
+            cached = json.dumps(structured_data, ensure_ascii=False)
+        elif phase == EXTRACT and getattr(message, "stop_reason", None) == "max_tokens":
+            # Transcripción cortada: no se guarda ni se cachea, se rehace al final
+            self.incomplete[page_id] = phase
+            return
+        else:
+            cached = message.content[0].text
+            try:
+                self.apply_response(phase, page_id, response_text=cached)
+            except ValueError:
+                # Respuesta de una llamada cortada: se repite de forma síncrona
+                self.incomplete[page_id] = phase
+                return
+        if self.cache is not None and cache_key is not None:
+            self.cache.put(cache_key, cached)
+
+    def _entries(self, phase, page_ids, custom_ids):
+        """
+        Peticiones de las páginas sin respuesta en caché, construidas de a una
+        """
+        for page_id in page_ids:
+            request, cache_key = self.build_request(phase, page_id)
+            cached = self.cache.get(cache_key) if cache_key is not None else None
+            if cached is not None:
+                self._apply_cached(phase, page_id, cached)
+                self.cached += 1
+                continue
+            custom_id = custom_id_for(page_id)
+            custom_ids[custom_id] = [page_id, cache_key]
+            yield custom_id, request
+
+    def submit(self, phase, page_ids, round_number=1):
+        """
+        Envía una fase para las páginas dadas, en tantos lotes como haga falta
+
+        Returns:
+            list: Registros de los lotes enviados
+        """
+        custom_ids = {}
+        submitted = []
+        for chunk, size in chunk_requests(self._entries(phase, page_ids, custom_ids),
+                                          self.max_requests, self.max_bytes):
+            with span("batch_submit", phase=phase, requests=len(chunk)) as current:
+                current.request_bytes = size
+                batch = self.client.messages.batches.create(requests=chunk)
+            entry = {
+                "id": batch.id,
+                "phase": phase,
+                "round": round_number,
+                "submitted_at": time.time(),
+                "collected": False,
+                "custom_ids": {request["custom_id"]: custom_ids.pop(request["custom_id"])
+                               for request in chunk},
+            }
+            self.batches.append(entry)
+            self._save_state()
+            submitted.append(entry)
+            print(f"   📤 Lote {batch.id}: {len(chunk)} peticiones "
+                  f"({size / 1024 / 1024:.1f} MB, fase {phase}, ronda {round_number})")
+        return submitted
+
+    def wait(self, entry):
+        """
+        Consulta un lote hasta que termine
+
+        Returns:
+            MessageBatch: Lote terminado
+        """
+        last_counts = None
+        while True:
+            batch = self.client.messages.batches.retrieve(entry["id"])
+            if batch.processing_status == "ended":
+                return batch
+            counts = batch.request_counts
+            if counts != last_counts:
+                print(f"   ⏳ Lote {entry['id']}: {counts.processing} en proceso")
+                last_counts = counts
+            time.sleep(self.poll_seconds)
+
+    def collect(self, entry):
+        """
+        Espera a que termine un lote, descarga sus resultados y los guarda
+
+        Returns:
+            list: page_id de las peticiones que hay que reenviar
+        """
+        batch = self.wait(entry)
+        retry = []
+        with span("batch_collect", phase=entry["phase"], batch_id=entry["id"]) as current:
+            for response in self.client.messages.batches.results(entry["id"]):
+                page_id, cache_key = entry["custom_ids"][response.custom_id]
+                result = response.result
+                if result.type == "succeeded":
+                    current.record_usage(getattr(result.message, "usage", None))
+                    self._apply_message(entry["phase"], page_id, result.message, cache_key)
+                    continue
+                error_type = None
+                if result.type == "errored":
+                    error_type = result.error.error.type
+                if error_type in PERMANENT_ERRORS:
+                    self.failed[page_id] = f"{error_type}: {result.error.error.message}"
+                    self.manifest.record_error(page_id, entry["phase"], self.failed[page_id])
+                else:
+                    retry.append(page_id)
+            current.set(requests=len(entry["custom_ids"]), retry=len(retry))
+
+        counts = batch.request_counts
+        print(f"   📥 Lote {entry['id']}: {counts.succeeded} correctas, {counts.errored} con error, "
+              f"{counts.expired} vencidas, {counts.canceled} canceladas")
+        entry["collected"] = True
+        self._save_state()
+        return retry
+
+    def run_phase(self, phase, page_ids):
+        """
+        Envía una fase, reenvía lo que falló y descarga todos los resultados
+
+        Los lotes de esta fase enviados por una corrida anterior (--resume) se
+        consultan primero; sus páginas no se vuelven a enviar.
+        """
+        in_flight = [entry for entry in self.batches
+                     if entry["phase"] == phase and not entry["collected"]]
+        waiting = {page_id for entry in in_flight for page_id, _ in entry["custom_ids"].values()}
+        retry = []
+        for entry in in_flight:
+            print(f"   🔁 Lote {entry['id']} enviado en una corrida anterior")
+            retry += self.collect(entry)
+
+        pending = [page_id for page_id in page_ids if page_id not in waiting] + retry
+        for round_number in range(1, self.max_rounds + 1):
+            if not pending:
+                return
+            retry = []
+            for entry in self.submit(phase, pending, round_number):
+                retry += self.collect(entry)
+            pending = retry
+
+        for page_id in pending:
+            self.failed[page_id] = f"Sin resultado tras {self.max_rounds} envíos"
+            self.manifest.record_error(page_id, phase, self.failed[page_id])
+
+    def complete_incomplete(self):
+        """
+        Repite de forma síncrona las respuestas cortadas por max_tokens
+
+        La estructuración síncrona continúa por su cuenta si vuelve a cortarse.
+        Una transcripción cortada se rehace en una sola llamada (texto y
+        estructura), porque la fase de estructuración ya no la incluyó.
+        """
+        for page_id, phase in sorted(self.incomplete.items()):
+            print(f"   ✂️  {page_id}: respuesta incompleta en el lote, se completa sin lote")
+            try:
+                if phase == STRUCTURE:
+                    text = read_extracted_text(self._text_path(page_id))
+                    self._save_structure(page_id, structure_text_with_claude(
+                        text, client=self.client, cache=self.cache))
+                else:
+                    image_data, media_type = self._load_image(page_id)
+                    text, structured_data, _ = extract_and_structure(
+                        image_data, media_type, client=self.client, cache=self.cache)
+                    self._save_text(page_id, text)
+                    self._save_structure(page_id, structured_data)
+            except Exception as exc:
+                self.failed[page_id] = repr(exc)
+                self.manifest.record_error(page_id, phase, exc)
+        self.incomplete = {}
+
+
+def load_page_results(pages_dir, page_ids):
+    """
+    Lee de disco las salidas de las páginas estructuradas, para el corpus
+
+    Returns:
+        list: Resultados con page_id, text, structured y rows (como los de batch_ocr)
+    """
+    results = []
+    for page_id in page_ids:
+        with open(os.path.join(pages_dir, f"{page_id}.json"), encoding='utf-8') as f:
+            structured_data = json.load(f)
+        results.append({
+            "page_id": page_id,
+            "text": read_extracted_text(os.path.join(pages_dir, f"{page_id}.txt")),
+            "structured": structured_data,
+            "rows": structured_data_to_dataframe(structured_data),
+        })
+    return results
+
+
+def run_backfill(pages, output_dir=DEFAULT_OUTPUT_DIR, client=None, cache=None, preprocess=None,
+                 single_pass=False, resume=False, poll_seconds=DEFAULT_POLL_SECONDS,
+                 max_requests=MAX_BATCH_REQUESTS, max_bytes=MAX_BATCH_BYTES,
+                 max_rounds=DEFAULT_MAX_ROUNDS):
+    """
+    Procesa un conjunto de páginas con la API de lotes
+
+    Args:
+        pages: Rutas de las imágenes
+        output_dir: Directorio de salida
+        client: Cliente de Anthropic (por defecto, el cliente compartido del proceso)
+        cache: ResponseCache opcional
+        preprocess: Opciones de preprocesamiento de imagen (dict), o None
+        single_pass: Transcribir y estructurar con una sola petición por página
+        resume: Retomar una corrida anterior (manifiesto y lotes ya enviados)
+        poll_seconds: Segundos entre consultas del estado de un lote
+        max_requests: Peticiones por lote
+        max_bytes: Bytes por lote
+        max_rounds: Envíos por petición
+
+    Returns:
+        dict: Resumen con el corpus, las páginas fallidas, los lotes enviados y el uso
+    """
+    if client is None:
+        from client_provider import get_client
+        client = get_client()
+
+    manifest = RunManifest(os.path.join(output_dir, MANIFEST_NAME), fresh=not resume)
+    images = {}
+    for image_path in pages:
+        page_id = page_id_for(image_path)
+        images[page_id] = image_path
+        manifest.register(page_id, image_path, file_sha256(image_path))
+
+    submitter = BatchSubmitter(client, output_dir, manifest, images, cache=cache,
+                               preprocess=preprocess, poll_seconds=poll_seconds,
+                               max_requests=max_requests, max_bytes=max_bytes,
+                               max_rounds=max_rounds, resume=resume)
+    page_ids = list(images)
+    start = time.perf_counter()
+
+    phases = [SINGLE_PASS] if single_pass else [EXTRACT, STRUCTURE]
+    for phase in phases:
+        # Una fase solo toma las páginas que llegaron a la anterior y no a esta
+        target = STRUCTURED if phase != EXTRACT else EXTRACTED
+        todo = [page_id for page_id in page_ids if not manifest.reached(page_id, target)
+                and (phase != STRUCTURE or manifest.reached(page_id, EXTRACTED))]
+        print(f"\n🔄 Fase {phase}: {len(todo)} páginas "
+              f"({len(page_ids) - len(todo)} ya hechas o sin la fase anterior)")
+        if todo:
+            submitter.run_phase(phase, todo)
+    submitter.complete_incomplete()
+    manifest.flush()
+
+    done = [page_id for page_id in page_ids if manifest.reached(page_id, STRUCTURED)]
+    corpus_df = write_corpus(load_page_results(submitter.pages_dir, done), output_dir)
+    return {
+        "corpus": corpus_df,
+        "pages": len(done),
+        "failed": submitter.failed,
+        "cached": submitter.cached,
+        "batches": len(submitter.batches),
+        "usage": submitter.usage,
+        "elapsed_seconds": time.perf_counter() - start,
+    }
+
+
+def parse_args(argv=None):
+    from image_preprocessing import add_preprocess_arguments
+
+    parser = argparse.ArgumentParser(description="OCR de El Martillo con la API de lotes")
+    parser.add_argument("source", help="Directorio de imágenes o manifiesto (.txt/.json)")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR,
+                        help=f"Directorio de salida (por defecto: {DEFAULT_OUTPUT_DIR})")
+    parser.add_argument("--single-pass", action="store_true",
+                        help="Transcribir y estructurar con una sola petición por página")
+    parser.add_argument("--resume", action="store_true",
+                        help="Retomar una corrida: saltar lo hecho y consultar los lotes ya enviados")
+    parser.add_argument("--poll-seconds", type=float, default=DEFAULT_POLL_SECONDS,
+                        help=f"Segundos entre consultas de un lote (por defecto: {DEFAULT_POLL_SECONDS})")
+    parser.add_argument("--max-requests", type=int, default=MAX_BATCH_REQUESTS,
+                        help=f"Peticiones por lote (por defecto: {MAX_BATCH_REQUESTS})")
+    parser.add_argument("--max-mb", type=float, default=MAX_BATCH_BYTES / 1024 / 1024,
+                        help=f"MB por lote (por defecto: {MAX_BATCH_BYTES // 1024 // 1024})")
+    parser.add_argument("--max-rounds", type=int, default=DEFAULT_MAX_ROUNDS,
+                        help="Envíos por petición antes de darla por fallida")
+    add_cache_arguments(parser, refresh=False)
+    parser.add_argument("--preprocess", action="store_true",
+                        help="Reducir las imágenes antes de enviarlas (ver image_preprocessing.py)")
+    add_preprocess_arguments(parser)
+    parser.add_argument("--fake", action="store_true",
+                        help="Usar el cliente falso local, con su API de lotes "
+                             "(sin red ni API key ni caché de respuestas)")
+    parser.add_argument("--fake-batch-seconds", type=float, default=1.0,
+                        help="Segundos que tarda en terminar un lote del cliente falso")
+    parser.add_argument("--fake-error-rate", type=float, default=0.0,
+                        help="Fracción de peticiones con error en los lotes del cliente falso")
+    add_instrumentation_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    pages = discover_pages(args.source)
+    if not pages:
+        print(f"⚠️  No se encontraron páginas en: {args.source}")
+        return
+
+    client = None
+    if args.fake:
+        from fake_anthropic import FakeAnthropic
+        client = FakeAnthropic(batch_seconds=args.fake_batch_seconds,
+                               batch_error_rate=args.fake_error_rate)
+
+    tracer = tracer_from_args(args)
+    if tracer is not None:
+        set_tracer(tracer)
+
+    # Las respuestas del cliente falso no deben acabar en la caché real
+    cache = cache_from_args(args)
+    preprocess = None
+    if args.preprocess:
+        from image_preprocessing import preprocess_options_from_args
+        preprocess = preprocess_options_from_args(args)
+
+    print("\n" + "="*80)
+    print(f"📦 ENVÍO POR LOTES (Message Batches) - {len(pages)} páginas")
+    print("="*80)
+
+    summary = run_backfill(pages, args.output_dir, client=client, cache=cache,
+                           preprocess=preprocess, single_pass=args.single_pass,
+                           resume=args.resume, poll_seconds=args.poll_seconds,
+                           max_requests=args.max_requests,
+                           max_bytes=int(args.max_mb * 1024 * 1024), max_rounds=args.max_rounds)
+
+    print(f"\n⏱️  {summary['elapsed_seconds']:.1f} s - {summary['pages']} de {len(pages)} páginas "
+          f"estructuradas en {summary['batches']} lotes")
+    print(f"🎯 Tokens en lotes: {summary['usage']['input_tokens']} de entrada, "
+          f"{summary['usage']['output_tokens']} de salida")
+    if summary["cached"]:
+        print(f"💾 {summary['cached']} respuestas tomadas de la caché sin enviarlas")
+    for page_id, reason in sorted(summary["failed"].items()):
+        print(f"   ❌ {page_id}: {reason}")
+
+    if cache is not None:
+        cache.close()
+    if tracer is not None:
+        tracer.close()
+        print("\n📈 Etapas instrumentadas:")
+        print_summary(tracer.summary())
+
+    print(f"\n📁 Corpus combinado en: {args.output_dir}")
+    print(f"📋 Lotes enviados: {os.path.join(args.output_dir, BATCH_STATE_NAME)}")
+
+
+if __name__ == "__main__":
+    main()
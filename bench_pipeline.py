@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+"""
+Banco de pruebas del flujo con un corpus sintético y la API falsa
+
+Genera páginas sintéticas (texto con la forma de texto_completo_extraido.txt
+e imágenes del tamaño elegido) y mide, para cada escala (por defecto 1, 100 y
+10 000 páginas):
+1. generate_basic_structure: estructuración por patrones de cada página
+2. step2_generate_csv: paso 2 por página contra la API falsa (servidor HTTP
+   local con latencia y tasa de errores 529 configurables, a través del SDK
+   real y de los reintentos de rate_limiter.py), con un pool de hilos
+3. step3_generate_visualizations: visualizaciones del corpus resultante
+4. Flujo completo: batch_ocr.main() sobre el directorio de páginas (extracción,
+   estructuración y corpus combinado); con una página, también process_ocr.main()
+
+De cada etapa se guarda el tiempo y el pico de memoria de Python
+(tracemalloc), además del máximo de memoria residente del proceso. El
+resultado es un JSON con el commit, la plataforma y los parámetros, para
+comparar mediciones entre commits.
+
+Las imágenes se generan una vez por cada --distinct-images páginas y se
+enlazan para el resto; lo que devuelve la extracción falsa es el texto
+sintético de la imagen enviada.
+
+Ejemplo:
+    python3 bench_pipeline.py --scales 1 100 --latency 0.01 --error-rate 0.02 \\
+        --output data/bench/pipeline.json
+"""
+
+import argparse
+import base64
+import contextlib
+import hashlib
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_SCALES = (1, 100, 10000)
+DEFAULT_IMAGE_SIZE = (850, 1100)
+DEFAULT_DISTINCT_IMAGES = 50
+DEFAULT_WORKERS = 8
+DEFAULT_LATENCY = 0.0
+DEFAULT_ERROR_RATE = 0.0
+# El paso 3 dibujaba una barra y una etiqueta por fila (más de un minuto con
+# 1000 filas); ahora agrega antes de dibujar y su costo casi no depende de las
+# filas, así que por defecto no se omite. Por encima del límite se marca como omitido
+DEFAULT_MAX_RENDER_ROWS = 10 ** 9
+DEFAULT_SEED = 1916
+DEFAULT_OUTPUT = "data/bench/pipeline.json"
+
+FIRST_ISSUE = 1609
+FIRST_DATE = date(1916, 8, 5)
+MONTH_NAMES = ('enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio', 'julio', 'agosto',
+               'septiembre', 'octubre', 'noviembre', 'diciembre')
+# Límites sin efecto para el limitador: solo interesan sus reintentos
+UNLIMITED = 10 ** 9
+
+SEPARATOR = "=" * 58
+SUBSEPARATOR = "-" * 50
+
+TOWNS = ('Chiclayo', 'Monsefú', 'Ferreñafe', 'Lambayeque', 'Eten', 'Reque', 'Pimentel',
+         'Zaña', 'Túcume', 'Íllimo')
+NEWSPAPERS = ('El Ferrocarril', 'El Pueblo', 'El Siglo XX', 'La Prensa Libre', 'El Tiempo',
+              'La Voz del Pueblo', 'El Progreso', 'El Centinela', 'La Alianza', 'El Heraldo')
+SURNAMES = ('Herrera', 'Carmona', 'Soto', 'Menchola', 'Leguía', 'Gálvez', 'Orrego', 'Piedra',
+            'Castañeda', 'Velezmoro')
+INITIALS = ('F. A.', 'J. M.', 'N. M.', 'R.', 'C. E.', 'M.')
+TOPICS = ('EL PERIODISMO DEPARTAMENTAL', 'CRÓNICA DE LA SEMANA', 'NOTICIAS DE LA PROVINCIA',
+          'EL FERROCARRIL DE ETEN', 'LA INSTRUCCIÓN PÚBLICA', 'MOVIMIENTO COMERCIAL',
+          'SOCIEDAD DE ARTESANOS', 'EL CONCEJO PROVINCIAL', 'COSECHA DE ARROZ',
+          'CORRESPONDENCIA DE LIMA', 'HIGIENE PÚBLICA', 'EL NUEVO MERCADO')
+SUBJECTS = ('El concejo provincial', 'La sociedad de artesanos', 'El señor prefecto',
+            'La prensa departamental', 'El vecindario', 'La junta de notables',
+            'El comercio de la plaza', 'La juventud estudiosa')
+VERBS = ('ha acordado', 'reclama con justicia', 'ha emprendido', 'espera con ansia',
+         'no ha descuidado', 'ha dispuesto', 'celebra', 'denuncia')
+OBJECTS = ('la reparación del camino real', 'la apertura de una escuela nocturna',
+           'el alumbrado de las calles', 'la fundación de un nuevo periódico',
+           'el arreglo del mercado', 'la mejora del servicio de aguas',
+           'la exportación de azúcar y arroz', 'la construcción del muelle')
+ADS = (
+    ("RÓMULO MENCHOLA", "VENDEDOR Y COBRADOR", "de las afamadas máquinas Singer Sewing Machine"),
+    ("BOTICA DEL PUEBLO", "Medicinas frescas y de patente", "Calle Real 24, {town}"),
+    ("GRAN SASTRERÍA LA MODERNA", "Casimires ingleses recién llegados", "Precios sin competencia"),
+    ("AGENCIA DE VAPORES", "Pasajes a Lima y Guayaquil", "Informes en el muelle de {town}"),
+    ("PANADERÍA LA ESPIGA", "Pan caliente mañana y tarde", "Reparto a domicilio en {town}"),
+)
+
+
+def synthetic_page_text(number, seed=DEFAULT_SEED):
+    """
+    Texto sintético de una página con la forma de texto_completo_extraido.txt
+
+    Encabezado con edición y fecha, artículos entre separadores ==== o ----
+    con títulos en mayúsculas, anuncios y pie de imprenta. Es reproducible:
+    la misma página y semilla dan el mismo texto.
+
+    Args:
+        number: Número de página (0, 1, ...)
+        seed: Semilla del corpus
+
+    Returns:
+        str: Texto de la página
+    """
+    rng = random.Random(seed * 1_000_003 + number)
+    issue_date = FIRST_DATE + timedelta(days=7 * number)
+    lines = [
+        "",
+        "PERIÓDICO EL MARTILLO",
+        f"Edición No. {FIRST_ISSUE + number} - {issue_date.day} de "
+        f"{MONTH_NAMES[issue_date.month - 1]} de {issue_date.year}",
+        "Chiclayo, Perú",
+        "",
+    ]
+
+    for position, topic in enumerate(rng.sample(TOPICS, rng.randint(4, 7))):
+        if position == 0 or rng.random() < 0.3:
+            author = f"{rng.choice(INITIALS)} {rng.choice(SURNAMES)}"
+            lines += [SEPARATOR, topic, f"Por {author}", SEPARATOR, ""]
+        else:
+            lines += [topic, SUBSEPARATOR]
+        for _ in range(rng.randint(1, 3)):
+            sentences = []
+            for _ in range(rng.randint(2, 5)):
+                sentences.append(f"{rng.choice(SUBJECTS)} de {rng.choice(TOWNS)} "
+                                 f"{rng.choice(VERBS)} {rng.choice(OBJECTS)}.")
+            if rng.random() < 0.4:
+                sentences.append("Entre los periódicos de entonces figuraban " + ", ".join(
+                    f"'{name}'" for name in rng.sample(NEWSPAPERS, 3)) + ".")
+            lines += textwrap.wrap(" ".join(sentences), 90) + [""]
+
+    lines += [SEPARATOR, "ANUNCIOS", SEPARATOR, ""]
+    town = rng.choice(TOWNS)
+    for ad in rng.sample(ADS, rng.randint(1, 3)):
+        lines += [line.format(town=town) for line in ad] + [""]
+
+    lines += [SEPARATOR, "Dirección: Calle Verónica 18, Chiclayo",
+              "Fundado: 8 de febrero de 1903", "Precio: 4 centavos por número", SEPARATOR, ""]
+    return "\n".join(lines)
+
+
+def write_synthetic_image(path, text, size=DEFAULT_IMAGE_SIZE, seed=DEFAULT_SEED):
+    """
+    Dibuja una página escaneada sintética (texto negro sobre papel con manchas)
+
+    Args:
+        path: Archivo PNG de salida
+        text: Texto a dibujar (se recorta a lo que cabe)
+        size: (ancho, alto) en píxeles
+        seed: Semilla de las manchas
+    """
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    width, height = size
+    image = Image.new("L", size, 232)
+    draw = ImageDraw.Draw(image)
+    for _ in range(width * height // 2000):
+        x, y = rng.randrange(width), rng.randrange(height)
+        draw.point((x, y), fill=rng.randint(120, 200))
+
+    margin = max(10, width // 20)
+    y = margin
+    for line in text.splitlines():
+        if y > height - margin:
+            break
+        draw.text((margin, y), line, fill=20)
+        y += 14
+    image.save(path, format="PNG", optimize=False)
+
+
+def build_page_dir(directory, pool, pages):
+    """
+    Directorio con pages imágenes de página, repitiendo las del pool
+
+    Returns:
+        list: Rutas de las páginas, en orden
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for number in range(pages):
+        path = os.path.join(directory, f"page_{number:05d}.png")
+        source = os.path.abspath(pool[number % len(pool)])
+        try:
+            os.symlink(source, path)
+        except OSError:
+            shutil.copyfile(source, path)
+        paths.append(path)
+    return paths
+
+
+def measure_stage(function, *args, **kwargs):
+    """
+    Ejecuta una etapa sin su salida por consola y mide tiempo y memoria
+
+    Returns:
+        tuple: (valor devuelto, dict con 'seconds' y 'peak_memory_bytes')
+    """
+    tracemalloc.reset_peak()
+    baseline, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        value = function(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    return value, {"seconds": seconds, "peak_memory_bytes": max(0, peak - baseline)}
+
+
+@contextlib.contextmanager
+def fake_api(texts_by_image, latency, error_rate, workers, seed=DEFAULT_SEED):
+    """
+    Servidor de API falso y entorno del proceso apuntando a él
+
+    Mientras dura el contexto, ANTHROPIC_API_KEY y ANTHROPIC_BASE_URL apuntan
+    al servidor, y el proveedor de clientes por defecto usa el limitador (sin
+    límites efectivos) para reintentar los 529 simulados.
+
+    Args:
+        texts_by_image: dict sha256 de la imagen en base64 → texto de la página
+        latency: Latencia simulada por petición, en segundos
+        error_rate: Fracción de peticiones que reciben 529
+        workers: Conexiones simultáneas del pool
+        seed: Semilla de los errores simulados
+
+    Yields:
+        FakeAnthropicServer
+    """
+    from client_provider import ClientProvider, get_provider, set_provider
+    from fake_anthropic import FakeAnthropicServer
+    from process_ocr import EXAMPLE_TEXT
+    from rate_limiter import RateLimiter
+
+    def page_text(image_data):
+        digest = hashlib.sha256((image_data or "").encode('ascii')).hexdigest()
+        return texts_by_image.get(digest, EXAMPLE_TEXT)
+
+    saved_env = {name: os.environ.get(name) for name in ("ANTHROPIC_API_KEY", "ANTHROPIC_BASE_URL")}
+    saved_provider = get_provider()
+    with FakeAnthropicServer(overload_rate=error_rate, latency=latency, page_text=page_text,
+                             seed=seed) as server:
+        os.environ["ANTHROPIC_API_KEY"] = "clave-falsa-de-benchmark"
+        os.environ["ANTHROPIC_BASE_URL"] = server.base_url
+        set_provider(ClientProvider(base_url=server.base_url, max_connections=workers,
+                                    limiter=RateLimiter(UNLIMITED, UNLIMITED, UNLIMITED)))
+        try:
+            yield server
+        finally:
+            set_provider(saved_provider)
+            for name, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+
+def run_scale(pages, texts, pool, work_dir, server, workers, max_render_rows):
+    """
+    Mide todas las etapas con las primeras pages páginas del corpus
+
+    Returns:
+        dict: Métricas por etapa
+    """
+    import pandas as pd
+
+    from batch_ocr import main as batch_main
+    from process_ocr import generate_basic_structure, step2_generate_csv, \
+        step3_generate_visualizations
+
+    scale_dir = os.path.join(work_dir, f"escala_{pages}")
+    outputs_dir = os.path.join(scale_dir, "paso2")
+    os.makedirs(outputs_dir, exist_ok=True)
+    results = {}
+
+    def with_errors(function, *args, **kwargs):
+        before = server.overloaded
+        value, metrics = measure_stage(function, *args, **kwargs)
+        metrics["simulated_errors"] = server.overloaded - before
+        return value, metrics
+
+    # 1. Estructuración por patrones
+    structures, metrics = measure_stage(lambda: [generate_basic_structure(text)
+                                                 for text in texts[:pages]])
+    metrics["items"] = sum(len(structured["content"]) for structured in structures)
+    metrics["pages_per_second"] = pages / metrics["seconds"] if metrics["seconds"] else None
+    results["generate_basic_structure"] = metrics
+    print(f"   🧩 generate_basic_structure: {metrics['seconds']:.3f} s")
+
+    # 2. Paso 2 por página contra la API falsa
+    def step2(number):
+        return step2_generate_csv(texts[number], page_id=f"p{number:05d}",
+                                  json_path=os.path.join(outputs_dir, f"p{number:05d}.json"),
+                                  csv_path=os.path.join(outputs_dir, f"p{number:05d}.csv"))
+
+    def run_step2():
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(step2, range(pages)))
+
+    frames, metrics = with_errors(run_step2)
+    corpus = pd.concat([frame.assign(page_id=f"p{number:05d}") for number, frame in enumerate(frames)],
+                       ignore_index=True)
+    metrics["rows"] = len(corpus)
+    metrics["pages_per_second"] = pages / metrics["seconds"] if metrics["seconds"] else None
+    results["step2_generate_csv"] = metrics
+    print(f"   🤖 step2_generate_csv: {metrics['seconds']:.3f} s ({len(corpus)} filas, "
+          f"{metrics['simulated_errors']} errores simulados)")
+
+    # 3. Visualizaciones del corpus
+    if len(corpus) > max_render_rows:
+        results["step3_generate_visualizations"] = {
+            "skipped": True, "rows": len(corpus),
+            "reason": f"más de {max_render_rows} filas (--max-render-rows)",
+        }
+        print(f"   📈 step3_generate_visualizations: omitido ({len(corpus)} filas)")
+    else:
+        _, metrics = measure_stage(step3_generate_visualizations, corpus,
+                                   viz_dir=os.path.join(scale_dir, "graficos"))
+        metrics["rows"] = len(corpus)
+        results["step3_generate_visualizations"] = metrics
+        print(f"   📈 step3_generate_visualizations: {metrics['seconds']:.3f} s")
+
+    # 4. Flujo completo
+    pages_dir = os.path.join(scale_dir, "paginas")
+    build_page_dir(pages_dir, pool, pages)
+    _, metrics = with_errors(batch_main, [
+        pages_dir, "--output-dir", os.path.join(scale_dir, "lote"), "--no-cache",
+        "--workers", str(workers), "--rate-limit", "--rpm", str(UNLIMITED),
+        "--input-tpm", str(UNLIMITED), "--output-tpm", str(UNLIMITED),
+    ])
+    metrics["pages_per_minute"] = pages / metrics["seconds"] * 60 if metrics["seconds"] else None
+    results["batch_ocr.main"] = metrics
+    print(f"   📚 batch_ocr.main: {metrics['seconds']:.3f} s "
+          f"({metrics['pages_per_minute']:.0f} páginas/minuto)")
+
+    if pages == 1:
+        from process_ocr import main as process_main
+
+        single_dir = os.path.join(scale_dir, "process_ocr")
+        os.makedirs(single_dir, exist_ok=True)
+        _, metrics = with_errors(process_main, [
+            "all", "--image", pool[0], "--no-cache", "--no-index", "--no-entities",
+            "--text", os.path.join(single_dir, "pagina.txt"),
+            "--json", os.path.join(single_dir, "pagina.json"),
+            "--csv", os.path.join(single_dir, "pagina.csv"),
+            "--stats", os.path.join(single_dir, "estadisticas.sqlite"),
+            "--viz-dir", os.path.join(single_dir, "graficos"),
+        ])
+        results["process_ocr.main"] = metrics
+        print(f"   🔍 process_ocr.main: {metrics['seconds']:.3f} s")
+
+    return results
+
+
+def git_commit():
+    """
+    Commit actual del repositorio (None si no se puede saber)
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)),
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(scales=DEFAULT_SCALES, image_size=DEFAULT_IMAGE_SIZE,
+                  distinct_images=DEFAULT_DISTINCT_IMAGES, latency=DEFAULT_LATENCY,
+                  error_rate=DEFAULT_ERROR_RATE, workers=DEFAULT_WORKERS,
+                  max_render_rows=DEFAULT_MAX_RENDER_ROWS, seed=DEFAULT_SEED):
+    """
+    Genera el corpus sintético y mide todas las escalas
+
+    Returns:
+        dict: Resultado completo (commit, plataforma, parámetros y métricas)
+    """
+    params = {
+        "scales": list(scales), "image_size": list(image_size),
+        "distinct_images": distinct_images, "latency": latency, "error_rate": error_rate,
+        "workers": workers, "max_render_rows": max_render_rows, "seed": seed,
+    }
+    report = {
+        "commit": git_commit(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": params,
+        "scales": {},
+    }
+
+    tracemalloc.start()
+    with tempfile.TemporaryDirectory(prefix="bench_martillo_") as work_dir:
+        # Una imagen por página distinta; la extracción falsa devuelve el texto
+        # de la imagen, así que la página N repite el texto de la imagen N % distintas
+        pool_dir = os.path.join(work_dir, "imagenes")
+        os.makedirs(pool_dir)
+        pool = []
+        pool_texts = []
+        texts_by_image = {}
+        start = time.perf_counter()
+        for number in range(min(distinct_images, max(scales))):
+            text = synthetic_page_text(number, seed)
+            path = os.path.join(pool_dir, f"imagen_{number:03d}.png")
+            write_synthetic_image(path, text, image_size, seed + number)
+            with open(path, 'rb') as f:
+                image_data = base64.standard_b64encode(f.read()).decode('ascii')
+            texts_by_image[hashlib.sha256(image_data.encode('ascii')).hexdigest()] = text
+            pool.append(path)
+            pool_texts.append(text)
+        texts = [pool_texts[number % len(pool)] for number in range(max(scales))]
+        print(f"🏭 Corpus sintético: {len(texts)} páginas, {len(pool)} imágenes de "
+              f"{image_size[0]}x{image_size[1]} en {time.perf_counter() - start:.1f} s")
+
+        with fake_api(texts_by_image, latency, error_rate, workers, seed) as server:
+            for pages in scales:
+                print(f"\n📏 {pages} páginas")
+                report["scales"][str(pages)] = run_scale(pages, texts, pool, work_dir, server,
+                                                         workers, max_render_rows)
+    tracemalloc.stop()
+
+    if resource is not None:
+        # ru_maxrss está en KB en Linux y en bytes en macOS
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        report["max_rss_bytes"] = max_rss if sys.platform == "darwin" else max_rss * 1024
+    return report
+
+
+def parse_size(value):
+    width, _, height = value.lower().partition("x")
+    return int(width), int(height)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Medir el flujo OCR con un corpus sintético")
+    parser.add_argument("--scales", type=int, nargs="+", default=list(DEFAULT_SCALES),
+                        help="Número de páginas de cada medición (por defecto: 1 100 10000)")
+    parser.add_argument("--image-size", type=parse_size, default=DEFAULT_IMAGE_SIZE,
+                        help="Tamaño de las imágenes sintéticas, ANCHOxALTO (por defecto: 850x1100)")
+    parser.add_argument("--distinct-images", type=int, default=DEFAULT_DISTINCT_IMAGES,
+                        help="Imágenes distintas; el resto de páginas las repite")
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY,
+                        help="Latencia simulada por petición de la API falsa, en segundos")
+    parser.add_argument("--error-rate", type=float, default=DEFAULT_ERROR_RATE,
+                        help="Fracción de peticiones que reciben 529 (se reintentan)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Páginas en paralelo en el paso 2 y en el lote")
+    parser.add_argument("--max-render-rows", type=int, default=DEFAULT_MAX_RENDER_ROWS,
+                        help="Omitir el paso 3 por encima de estas filas")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="Semilla del corpus")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT,
+                        help=f"Archivo JSON de resultados (por defecto: {DEFAULT_OUTPUT})")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    report = run_benchmark(args.scales, args.image_size, args.distinct_images, args.latency,
+                           args.error_rate, args.workers, args.max_render_rows, args.seed)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n📁 Resultados guardados en: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
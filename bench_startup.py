@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Tiempo de arranque en frío de cada subcomando de process_ocr.py
+
+Cada medición lanza un proceso nuevo de Python (como hace el planificador con
+cada trabajo por página) con -X importtime. Se informa la mediana del tiempo
+total y del tiempo de importación (suma de los módulos de primer nivel,
+incluidas las importaciones diferidas del paso). Como referencia se mide
+también un intérprete vacío y la importación de anthropic, pandas,
+matplotlib.pyplot y seaborn, que antes pagaba cualquier paso.
+
+Los pasos se ejecutan sin API key ni red: extract usa el texto de ejemplo
+(imagen inexistente) y structure el análisis por patrones. Todas las salidas
+van a un directorio temporal.
+
+Ejemplo:
+    python3 bench_startup.py --runs 5 --output data/bench/startup.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "process_ocr.py")
+DEFAULT_RUNS = 5
+SUBCOMMANDS = ("extract", "structure", "render", "all")
+EAGER_IMPORTS = "import anthropic, pandas, matplotlib.pyplot, seaborn"
+
+
+def import_seconds(stderr):
+    """
+    Suma el tiempo acumulado de los módulos de primer nivel de -X importtime
+
+    Returns:
+        float: Segundos de importación
+    """
+    total_us = 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Primer nivel: una sola columna de espacio antes del nombre
+        if name.startswith("  ") or not cumulative.strip().isdigit():
+            continue
+        total_us += int(cumulative)
+    return total_us / 1e6
+
+
+def run_once(args, env):
+    """
+    Lanza un proceso de Python nuevo y mide su duración
+
+    Args:
+        args: Argumentos tras "python -X importtime"
+        env: Variables de entorno del proceso
+
+    Returns:
+        tuple: (segundos totales, segundos de importación)
+    """
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-X", "importtime", *args], env=env,
+                               capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(f"Falló {' '.join(args)}:\n{completed.stderr[-2000:]}")
+    return elapsed, import_seconds(completed.stderr)
+
+
+def command_args(command, work_dir):
+    """
+    Argumentos del subcomando con todas las salidas dentro de work_dir
+    """
+    image = ["--image", os.path.join(work_dir, "no_existe.png")]
+    text = ["--text", os.path.join(work_dir, "pagina.txt")]
+    structured = ["--json", os.path.join(work_dir, "pagina.json"),
+                  "--csv", os.path.join(work_dir, "pagina.csv"), "--no-index", "--no-entities",
+                  "--stats", os.path.join(work_dir, "estadisticas.sqlite")]
+    render = ["--viz-dir", os.path.join(work_dir, "graficos")]
+    options = {
+        "extract": image + text + ["--no-cache"],
+        "structure": text + structured + ["--no-cache"],
+        "render": ["--csv", os.path.join(work_dir, "pagina.csv")] + render,
+        "all": image + text + structured + render + ["--no-cache"],
+    }
+    return [SCRIPT, command, *options[command]]
+
+
+def measure(runs=DEFAULT_RUNS, commands=SUBCOMMANDS):
+    """
+    Mide el arranque en frío de los subcomandos y de las referencias
+
+    Returns:
+        dict: Por caso, mediana de segundos totales y de importación
+    """
+    env = {name: value for name, value in os.environ.items()
+           if name not in ("ANTHROPIC_API_KEY", "ANTHROPIC_BASE_URL")}
+    env["MPLBACKEND"] = "Agg"
+
+    cases = [("python (vacío)", ["-c", "pass"]),
+             ("importación anterior", ["-c", EAGER_IMPORTS]),
+             ("import process_ocr", ["-c", "import process_ocr"])]
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        # El texto y el CSV que leen structure y render
+        run_once(command_args("extract", work_dir), env)
+        run_once(command_args("structure", work_dir), env)
+        cases += [(command, command_args(command, work_dir)) for command in commands]
+
+        for name, args in cases:
+            samples = [run_once(args, env) for _ in range(runs)]
+            results[name] = {
+                "total_seconds": statistics.median(sample[0] for sample in samples),
+                "import_seconds": statistics.median(sample[1] for sample in samples),
+                "runs": runs,
+            }
+            print(f"   {name:<22} {results[name]['total_seconds']:.3f} s "
+                  f"(importaciones: {results[name]['import_seconds']:.3f} s)")
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Medir el arranque en frío de process_ocr.py")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS,
+                        help=f"Procesos por caso; se informa la mediana (por defecto: {DEFAULT_RUNS})")
+    parser.add_argument("--commands", nargs="+", choices=SUBCOMMANDS, default=list(SUBCOMMANDS),
+                        help="Subcomandos a medir")
+    parser.add_argument("--output", help="Guardar los resultados en este JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    print(f"⏱️  Arranque en frío (mediana de {args.runs} procesos por caso)\n")
+    results = measure(args.runs, args.commands)
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n📁 Resultados guardados en: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
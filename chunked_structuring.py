@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Estructuración por fragmentos para páginas largas
+
+structure_text_with_claude envía la página entera en un solo prompt; en una
+página larga la respuesta JSON se corta en max_tokens y json.loads falla, con
+lo que se pierde todo el paso. Aquí la transcripción se divide en los límites
+de sección que ya deja el paso 1 (líneas ==== / ---- y títulos en
+mayúsculas), los fragmentos se estructuran en paralelo y las listas
+'content' se unen en orden:
+- Los fragmentos se arman con secciones completas hasta target_chars; solo
+  una sección más larga que eso se parte por líneas, repitiendo unas líneas
+  de contexto en el siguiente fragmento
+- Los elementos repetidos en el límite entre dos fragmentos (por ese
+  contexto, o porque el modelo los ve en ambos) se descartan; dentro de un
+  mismo fragmento no se descarta nada
+- Si aun así la respuesta de un fragmento no es JSON válido (cortada), ese
+  fragmento se vuelve a partir en dos
+- La metadata se toma del primer fragmento (que tiene el encabezado) y se
+  completa con la de los demás
+
+La latencia pasa a depender del fragmento más largo, no de la página entera.
+
+Ejemplo sin red:
+    python3 chunked_structuring.py data/el_martillo/texto_completo_extraido.txt --fake
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from process_ocr import read_extracted_text, structure_text_with_claude
+from rule_structurer import LINE_KIND_RE
+from structured_output import item_key
+
+# ~1500 tokens de entrada por fragmento: la respuesta queda muy lejos de max_tokens
+DEFAULT_TARGET_CHARS = 6000
+DEFAULT_CHUNK_WORKERS = 4
+# Líneas del final de una sección partida que se repiten al inicio del siguiente fragmento
+OVERLAP_LINES = 3
+# Veces que un fragmento con respuesta inválida puede volver a partirse
+MAX_SPLIT_DEPTH = 3
+# Elementos a cada lado del límite entre fragmentos que pueden estar repetidos
+BOUNDARY_ITEMS = 2
+
+
+def iter_section_blocks(lines):
+    """
+    Agrupa las líneas en bloques que empiezan en un límite de sección
+
+    Un separador o título solo abre un bloque nuevo si el bloque en curso ya
+    tiene cuerpo, así que los títulos de varias líneas quedan con su texto
+    (igual que en rule_structurer.iter_sections).
+
+    Yields:
+        list: Líneas de cada bloque
+    """
+    block = []
+    has_body = False
+    for line in lines:
+        if LINE_KIND_RE.match(line):
+            if has_body:
+                yield block
+                block = []
+                has_body = False
+        elif line.strip():
+            has_body = True
+        block.append(line)
+    if block:
+        yield block
+
+
+def _split_long_block(block, target_chars):
+    """
+    Parte un bloque más largo que target_chars en trozos de líneas con solape
+    """
+    pieces = []
+    piece = []
+    size = 0
+    for line in block:
+        if piece and size + len(line) + 1 > target_chars:
+            pieces.append(piece)
+            piece = piece[-OVERLAP_LINES:]
+            size = sum(len(kept) + 1 for kept in piece)
+        piece.append(line)
+        size += len(line) + 1
+    if piece:
+        pieces.append(piece)
+    return pieces
+
+
+def split_into_chunks(text, target_chars=DEFAULT_TARGET_CHARS):
+    """
+    Divide una transcripción en fragmentos de secciones completas
+
+    Args:
+        text: Texto de la página
+        target_chars: Tamaño objetivo de cada fragmento, en caracteres
+
+    Returns:
+        list: Textos de los fragmentos, en orden
+    """
+    chunks = []
+    current = []
+    size = 0
+    for block in iter_section_blocks(text.splitlines()):
+        block_size = sum(len(line) + 1 for line in block)
+        if current and size + block_size > target_chars:
+            chunks.append(current)
+            current = []
+            size = 0
+        if block_size > target_chars:
+            pieces = _split_long_block(block, target_chars)
+            chunks.extend(pieces[:-1])
+            block = pieces[-1]
+            block_size = sum(len(line) + 1 for line in block)
+        current.extend(block)
+        size += block_size
+    if current:
+        chunks.append(current)
+    return ["\n".join(chunk) for chunk in chunks if any(line.strip() for line in chunk)]
+
+
+def merge_metadata(metadatas):
+    """
+    Metadata del primer fragmento, completada con la de los siguientes
+    """
+    merged = {}
+    for metadata in metadatas:
+        for field, value in (metadata or {}).items():
+            if merged.get(field) in (None, "") and value not in (None, ""):
+                merged[field] = value
+    return merged
+
+
+def merge_structures(structures):
+    """
+    Une las estructuras de los fragmentos en orden
+
+    Solo se miran los elementos junto al límite: los primeros de cada
+    fragmento se descartan mientras su clave esté entre los BOUNDARY_ITEMS
+    últimos del fragmento anterior (elementos que cruzan el límite). Dentro
+    de un fragmento no se descarta nada.
+
+    Args:
+        structures: Estructuras ('metadata' y 'content') de cada fragmento
+
+    Returns:
+        dict: Estructura de la página completa
+    """
+    content = []
+    previous_keys = set()
+    for structured in structures:
+        items = structured.get('content', [])
+        start = 0
+        while (start < min(len(items), BOUNDARY_ITEMS)
+               and item_key(items[start]) in previous_keys):
+            start += 1
+        content.extend(items[start:])
+        if items:
+            previous_keys = {item_key(item) for item in items[-BOUNDARY_ITEMS:]}
+    return {
+        "metadata": merge_metadata(structured.get('metadata') for structured in structures),
+        "content": content,
+    }
+
+
+def _halve(chunk):
+    """
+    Parte un fragmento en dos, preferentemente en el límite de sección más centrado
+    """
+    lines = chunk.splitlines()
+    blocks = list(iter_section_blocks(lines))
+    middle = len(lines) // 2
+    cut = middle
+    if len(blocks) > 1:
+        starts = []
+        position = 0
+        for block in blocks[:-1]:
+            position += len(block)
+            starts.append(position)
+        cut = min(starts, key=lambda start: abs(start - middle))
+    return "\n".join(lines[:cut]), "\n".join(lines[cut:])
+
+
+def structure_chunk(chunk, client=None, cache=None, depth=0):
+    """
+    Estructura un fragmento; si la respuesta no es JSON válido, lo parte en dos
+
+    Returns:
+        dict: Estructura del fragmento
+    """
+    try:
+        return structure_text_with_claude(chunk, client=client, cache=cache)
+    except ValueError:
+        # json.JSONDecodeError es subclase de ValueError
+        if depth >= MAX_SPLIT_DEPTH or len(chunk.splitlines()) < 2:
+            raise
+        first, second = _halve(chunk)
+        return merge_structures([structure_chunk(first, client, cache, depth + 1),
+                                 structure_chunk(second, client, cache, depth + 1)])
+
+
+def structure_text_chunked(text_content, client=None, cache=None, max_workers=DEFAULT_CHUNK_WORKERS,
+                           target_chars=DEFAULT_TARGET_CHARS):
+    """
+    Estructura una página larga por fragmentos en paralelo
+
+    Una página que cabe en un fragmento se estructura con una sola llamada,
+    igual que con structure_text_with_claude.
+
+    Args:
+        text_content: Texto completo de la página
+        client: Cliente de Anthropic compartido por los hilos
+        cache: ResponseCache opcional (cada fragmento tiene su propia entrada)
+        max_workers: Fragmentos estructurándose a la vez
+        target_chars: Tamaño objetivo de cada fragmento, en caracteres
+
+    Returns:
+        dict: Estructura JSON de la página
+    """
+    chunks = split_into_chunks(text_content, target_chars)
+    if len(chunks) <= 1:
+        return structure_chunk(text_content, client, cache)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        structures = list(executor.map(lambda chunk: structure_chunk(chunk, client, cache), chunks))
+    return merge_structures(structures)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Estructurar una transcripción larga por fragmentos")
+    parser.add_argument("text_file", help="Transcripción (.txt del paso 1)")
+    parser.add_argument("--output", help="Guardar el JSON resultante en este archivo")
+    parser.add_argument("--chunk-chars", type=int, default=DEFAULT_TARGET_CHARS,
+                        help=f"Tamaño objetivo de cada fragmento (por defecto: {DEFAULT_TARGET_CHARS})")
+    parser.add_argument("--workers", type=int, default=DEFAULT_CHUNK_WORKERS,
+                        help="Fragmentos estructurándose a la vez")
+    parser.add_argument("--fake", action="store_true",
+                        help="Usar el cliente falso local (sin red ni API key)")
+    parser.add_argument("--fake-latency", type=float, default=0.5,
+                        help="Latencia simulada por petición del cliente falso, en segundos")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    text = read_extracted_text(args.text_file)
+
+    client = None
+    if args.fake:
+        from fake_anthropic import FakeAnthropic
+        client = FakeAnthropic(latency=args.fake_latency)
+
+    chunks = split_into_chunks(text, args.chunk_chars)
+    print(f"🧱 {len(text)} caracteres en {len(chunks)} fragmentos "
+          f"(el mayor: {max((len(chunk) for chunk in chunks), default=0)})")
+
+    start = time.perf_counter()
+    structured_data = structure_text_chunked(text, client, max_workers=args.workers,
+                                             target_chars=args.chunk_chars)
+    print(f"✅ {len(structured_data['content'])} elementos en {time.perf_counter() - start:.2f} s")
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(structured_data, f, ensure_ascii=False, indent=2)
+        print(f"📁 JSON guardado en: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
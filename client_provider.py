@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Proveedor compartido de clientes de Anthropic
+
+En lugar de construir un anthropic.Anthropic nuevo en cada llamada (lo que
+descarta el pool de conexiones HTTP y repite el handshake TLS por página), el
+proceso usa un único cliente de larga duración, seguro entre hilos, con pool
+de conexiones, keep-alive y timeouts configurables. Hay una versión síncrona y
+otra asíncrona, y ambas se pueden sustituir por un cliente falso en pruebas.
+
+También registra, por petición, si la conexión HTTP fue nueva o reutilizada.
+Con un RateLimiter (rate_limiter.py), los clientes que entrega quedan
+envueltos para respetar los límites de la API y reintentar los errores
+transitorios. El proveedor por defecto del proceso no lo usa (los
+reintentos de los 429/529 aislados quedan a cargo del SDK); los programas
+lo activan con --rate-limit.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+import anthropic
+import httpx
+
+from rate_limiter import RateLimitedClient
+
+DEFAULT_MAX_CONNECTIONS = 20
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 20
+DEFAULT_KEEPALIVE_EXPIRY = 60.0
+DEFAULT_TIMEOUT = 120.0
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_MAX_RETRIES = 2
+
+
+class ConnectionStats:
+    """
+    Contadores de reutilización de conexiones, seguros entre hilos
+
+    Args:
+        history: Número de peticiones recientes que se conservan en detalle
+    """
+
+    def __init__(self, history=1000):
+        self.requests = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+        self.tls_handshakes = 0
+        self.recent = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    def record(self, method, path, new_connection, tls_handshake, elapsed):
+        with self._lock:
+            self.requests += 1
+            if new_connection:
+                self.new_connections += 1
+            else:
+                self.reused_connections += 1
+            if tls_handshake:
+                self.tls_handshakes += 1
+            self.recent.append({
+                "method": method,
+                "path": path,
+                "reused": not new_connection,
+                "tls_handshake": tls_handshake,
+                "elapsed_seconds": elapsed,
+            })
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "reused_connections": self.reused_connections,
+                "tls_handshakes": self.tls_handshakes,
+                "reuse_rate": self.reused_connections / self.requests if self.requests else 0.0,
+            }
+
+
+class _RequestTrace:
+    """
+    Recibe los eventos de traza de httpcore de una petición
+
+    httpcore emite "connection.connect_tcp.*" y "connection.start_tls.*" solo
+    cuando abre una conexión nueva; si no aparecen, la conexión se reutilizó.
+    """
+
+    def __init__(self):
+        self.new_connection = False
+        self.tls_handshake = False
+        self.started = time.perf_counter()
+
+    def __call__(self, event_name, info):
+        if event_name == "connection.connect_tcp.complete":
+            self.new_connection = True
+        elif event_name == "connection.start_tls.complete":
+            self.tls_handshake = True
+
+
+class _AsyncRequestTrace(_RequestTrace):
+    async def __call__(self, event_name, info):
+        super().__call__(event_name, info)
+
+
+class ClientProvider:
+    """
+    Crea y comparte los clientes de Anthropic del proceso
+
+    Args:
+        api_key: API key (por defecto, ANTHROPIC_API_KEY)
+        base_url: URL base de la API (por defecto, la del SDK o ANTHROPIC_BASE_URL)
+        max_connections: Tamaño máximo del pool de conexiones
+        max_keepalive_connections: Conexiones ociosas que se mantienen abiertas
+        keepalive_expiry: Segundos que una conexión ociosa sigue abierta
+        timeout: Timeout total por petición, en segundos
+        connect_timeout: Timeout de conexión, en segundos
+        max_retries: Reintentos automáticos del SDK (sin efecto con limiter, que
+                     hace sus propios reintentos)
+        limiter: RateLimiter opcional con el que envolver los clientes
+        retry_policy: RetryPolicy de los reintentos del limitador
+    """
+
+    def __init__(self, api_key=None, base_url=None,
+                 max_connections=DEFAULT_MAX_CONNECTIONS,
+                 max_keepalive_connections=DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+                 keepalive_expiry=DEFAULT_KEEPALIVE_EXPIRY,
+                 timeout=DEFAULT_TIMEOUT, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 max_retries=DEFAULT_MAX_RETRIES, limiter=None, retry_policy=None):
+        self.api_key = api_key or os.environ.get("ANTHROPIC_API_KEY")
+        self.base_url = base_url
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        self.limiter = limiter
+        self.retry_policy = retry_policy
+        self.stats = ConnectionStats()
+        self._client = None
+        self._async_client = None
+        self._lock = threading.Lock()
+
+    def _client_kwargs(self):
+        # Con limitador los reintentos son suyos; si no, se sumarían a los del SDK
+        max_retries = 0 if self.limiter is not None else self.max_retries
+        kwargs = {"api_key": self.api_key, "timeout": self.timeout, "max_retries": max_retries}
+        if self.base_url:
+            kwargs["base_url"] = self.base_url
+        return kwargs
+
+    def _attach_trace(self, request):
+        request.extensions["trace"] = _RequestTrace()
+
+    def _record_response(self, response):
+        trace = response.request.extensions.get("trace")
+        if isinstance(trace, _RequestTrace):
+            self.stats.record(response.request.method, response.request.url.path,
+                              trace.new_connection, trace.tls_handshake,
+                              time.perf_counter() - trace.started)
+
+    async def _attach_async_trace(self, request):
+        request.extensions["trace"] = _AsyncRequestTrace()
+
+    async def _record_async_response(self, response):
+        self._record_response(response)
+
+    def _wrap(self, client, is_async=False):
+        if self.limiter is None or client is None:
+            return client
+        return RateLimitedClient(client, self.limiter, self.retry_policy, is_async=is_async)
+
+    def get_client(self):
+        """
+        Devuelve el cliente síncrono compartido (se crea la primera vez)
+
+        Returns:
+            anthropic.Anthropic: Cliente seguro para usar desde varios hilos
+        """
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    http_client = httpx.Client(
+                        limits=self.limits,
+                        timeout=self.timeout,
+                        event_hooks={"request": [self._attach_trace],
+                                     "response": [self._record_response]},
+                    )
+                    self._client = self._wrap(anthropic.Anthropic(http_client=http_client,
+                                                                  **self._client_kwargs()))
+        return self._client
+
+    def get_async_client(self):
+        """
+        Devuelve el cliente asíncrono compartido (se crea la primera vez)
+
+        Returns:
+            anthropic.AsyncAnthropic: Cliente para usar desde el event loop
+        """
+        if self._async_client is None:
+            with self._lock:
+                if self._async_client is None:
+                    http_client = httpx.AsyncClient(
+                        limits=self.limits,
+                        timeout=self.timeout,
+                        event_hooks={"request": [self._attach_async_trace],
+                                     "response": [self._record_async_response]},
+                    )
+                    self._async_client = self._wrap(
+                        anthropic.AsyncAnthropic(http_client=http_client, **self._client_kwargs()),
+                        is_async=True)
+        return self._async_client
+
+    def set_client(self, client):
+        """
+        Sustituye el cliente síncrono (por ejemplo, por FakeAnthropic en pruebas)
+        """
+        with self._lock:
+            self._client = self._wrap(client)
+
+    def set_async_client(self, client):
+        """
+        Sustituye el cliente asíncrono (por ejemplo, por FakeAsyncAnthropic en pruebas)
+        """
+        with self._lock:
+            self._async_client = self._wrap(client, is_async=True)
+
+    def close(self):
+        """
+        Cierra el cliente síncrono y libera sus conexiones
+
+        El cliente asíncrono debe cerrarse desde su event loop con aclose().
+        """
+        with self._lock:
+            if self._client is not None and hasattr(self._client, "close"):
+                self._client.close()
+            self._client = None
+
+    async def aclose(self):
+        if self._async_client is not None and hasattr(self._async_client, "close"):
+            await self._async_client.close()
+        self._async_client = None
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_provider():
+    """
+    Devuelve el proveedor por defecto del proceso (se crea la primera vez)
+
+    Sin limitador: un 429 o 529 aislado lo reintenta el SDK (max_retries), y
+    los programas que quieren limitar el ritmo instalan su propio proveedor
+    con set_provider (--rate-limit).
+    """
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = ClientProvider()
+    return _provider
+
+
+def set_provider(provider):
+    """
+    Reemplaza el proveedor por defecto (configuración del pool o pruebas)
+    """
+    global _provider
+    with _provider_lock:
+        _provider = provider
+
+
+def get_client():
+    """
+    Cliente síncrono compartido del proveedor por defecto
+    """
+    return get_provider().get_client()
+
+
+def get_async_client():
+    """
+    Cliente asíncrono compartido del proveedor por defecto
+    """
+    return get_provider().get_async_client()
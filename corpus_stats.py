@@ -0,0 +1,508 @@
+#!/usr/bin/env python3
+"""
+Estadísticas del corpus mantenidas de forma incremental
+
+Las estadísticas del paso 2 y los gráficos del paso 3 salían de value_counts,
+str.len, mean y sum sobre el DataFrame completo: para sumar una página había
+que volver a leer todo el corpus. Este módulo guarda los agregados en un
+archivo SQLite y los actualiza página a página:
+- Por cada página se guarda su aporte (elementos, caracteres, conteos por
+  tipo, sección y autor, e histograma de longitudes en intervalos fijos de
+  LENGTH_BIN_CHARS caracteres)
+- Los totales se guardan por ámbito: todo el corpus, cada edición
+  ("issue:1609") y cada año ("year:1916"); las ediciones y los años llevan
+  páginas, elementos, caracteres, tipos y longitudes
+- Volver a registrar una página resta su aporte anterior y suma el nuevo,
+  así que los totales no dependen del orden ni de las repeticiones
+- summary(ámbito) lee solo las filas de ese ámbito: su costo depende del
+  número de tipos, secciones y autores distintos, no del tamaño del corpus
+- check compara los totales con los que salen de recorrer los datos
+  originales (JSON de un lote o almacén Parquet) y rebuild los reconstruye
+
+Ejemplos:
+    python3 corpus_stats.py summary --issue 1609
+    python3 corpus_stats.py check --batch data/el_martillo/lote
+    python3 corpus_stats.py rebuild --store data/el_martillo/corpus_parquet
+"""
+
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import date
+
+DEFAULT_STATS_PATH = "data/el_martillo/estadisticas.sqlite"
+# Archivo de estadísticas de un lote de batch_ocr.py (en su directorio de salida)
+BATCH_STATS_NAME = "estadisticas.sqlite"
+
+# Ancho de los intervalos del histograma de longitudes (fijo para poder sumar y restar)
+LENGTH_BIN_CHARS = 50
+
+CORPUS = "corpus"
+# Dimensiones de cada ámbito; las ediciones y los años no llevan secciones ni autores
+DIMENSIONS = ("pages", "items", "chars", "type", "section", "author", "length")
+ROLLUP_DIMENSIONS = ("pages", "items", "chars", "type", "length")
+ROLLUP_KINDS = ("issue", "year")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS page_stats (
+    page_id TEXT PRIMARY KEY,
+    issue_number INTEGER,
+    year INTEGER,
+    counters TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS totals (
+    scope TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value INTEGER NOT NULL,
+    PRIMARY KEY (scope, dimension, key)
+) WITHOUT ROWID;
+"""
+
+
+def issue_scope(issue_number):
+    return f"issue:{issue_number}"
+
+
+def year_scope(year):
+    return f"year:{year}"
+
+
+def page_edition(metadata):
+    """
+    Número de edición y año de una página (None si faltan o no son válidos)
+
+    Returns:
+        tuple: (issue_number, year)
+    """
+    try:
+        issue_number = int(metadata.get('issue_number') or 0) or None
+    except (TypeError, ValueError):
+        issue_number = None
+    value = metadata.get('date')
+    try:
+        year = (value if isinstance(value, date) else date.fromisoformat(str(value)[:10])).year
+    except ValueError:
+        year = None
+    return issue_number, year
+
+
+def page_counters(structured_data):
+    """
+    Aporte de una página a las estadísticas, en todos sus ámbitos
+
+    Las longitudes son las de text_excerpt (vacío si falta); los tipos,
+    secciones y autores vacíos no se cuentan.
+
+    Args:
+        structured_data: Estructura con 'metadata' y 'content'
+
+    Returns:
+        Counter: {(ámbito, dimensión, clave): valor}
+    """
+    issue_number, year = page_edition(structured_data.get('metadata', {}))
+    scopes = [(CORPUS, DIMENSIONS)]
+    if issue_number is not None:
+        scopes.append((issue_scope(issue_number), ROLLUP_DIMENSIONS))
+    if year is not None:
+        scopes.append((year_scope(year), ROLLUP_DIMENSIONS))
+
+    page = Counter({("pages", ""): 1})
+    for item in structured_data.get('content', []):
+        length = len(str(item.get('text_excerpt') or ''))
+        page["items", ""] += 1
+        page["chars", ""] += length
+        page["length", str(length // LENGTH_BIN_CHARS * LENGTH_BIN_CHARS)] += 1
+        for dimension in ("type", "section", "author"):
+            value = item.get(dimension)
+            if value:
+                page[dimension, str(value)] += 1
+
+    counters = Counter()
+    for scope, dimensions in scopes:
+        for (dimension, key), value in page.items():
+            if dimension in dimensions:
+                counters[scope, dimension, key] = value
+    return counters
+
+
+def _summary_from_rows(scope, rows):
+    values = {dimension: {} for dimension in DIMENSIONS}
+    for dimension, key, value in rows:
+        values[dimension][key] = value
+    items = values["items"].get("", 0)
+    chars = values["chars"].get("", 0)
+
+    def ranked(dimension):
+        # Del más frecuente al menos, como value_counts
+        return dict(sorted(values[dimension].items(), key=lambda entry: (-entry[1], entry[0])))
+
+    return {
+        "scope": scope,
+        "pages": values["pages"].get("", 0),
+        "items": items,
+        "chars": chars,
+        "mean_chars": chars / items if items else 0.0,
+        "types": ranked("type"),
+        "sections": ranked("section"),
+        "authors": ranked("author"),
+        "length_bins": dict(sorted((int(start), count)
+                                   for start, count in values["length"].items())),
+        "length_bin_chars": LENGTH_BIN_CHARS,
+    }
+
+
+def summarize_counters(counters, scope=CORPUS):
+    """
+    Resumen de un ámbito a partir de aportes ya sumados (sin pasar por SQLite)
+    """
+    return _summary_from_rows(scope, [(dimension, key, value)
+                                      for (row_scope, dimension, key), value in counters.items()
+                                      if row_scope == scope and value])
+
+
+class CorpusStats:
+    """
+    Agregados persistentes del corpus, actualizados página a página
+
+    Args:
+        path: Archivo SQLite de las estadísticas
+    """
+
+    def __init__(self, path=DEFAULT_STATS_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def _apply_locked(self, delta):
+        self._conn.executemany(
+            "INSERT INTO totals (scope, dimension, key, value) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (scope, dimension, key) DO UPDATE SET value = value + excluded.value",
+            [(scope, dimension, key, value) for (scope, dimension, key), value in delta.items()
+             if value],
+        )
+        self._conn.executemany(
+            "DELETE FROM totals WHERE scope = ? AND dimension = ? AND key = ? AND value = 0",
+            list(delta),
+        )
+
+    def _stored_counters_locked(self, page_id):
+        row = self._conn.execute("SELECT counters FROM page_stats WHERE page_id = ?",
+                                 (page_id,)).fetchone()
+        if row is None:
+            return Counter()
+        return Counter({(scope, dimension, key): value
+                        for scope, dimension, key, value in json.loads(row[0])})
+
+    def add_page(self, page_id, structured_data):
+        """
+        Registra (o reemplaza) el aporte de una página
+
+        Args:
+            page_id: Identificador de la página
+            structured_data: Estructura con 'metadata' y 'content'
+
+        Returns:
+            bool: True si los totales cambiaron
+        """
+        counters = page_counters(structured_data)
+        issue_number, year = page_edition(structured_data.get('metadata', {}))
+        with self._lock, self._conn:
+            old = self._stored_counters_locked(page_id)
+            delta = Counter(counters)
+            delta.subtract(old)
+            delta = {row: value for row, value in delta.items() if value}
+            if delta:
+                self._apply_locked(delta)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO page_stats (page_id, issue_number, year, counters, "
+                "updated_at) VALUES (?, ?, ?, ?, ?)",
+                (page_id, issue_number, year,
+                 json.dumps([[*row, value] for row, value in sorted(counters.items())],
+                            ensure_ascii=False),
+                 time.time()),
+            )
+        return bool(delta)
+
+    def remove_page(self, page_id):
+        """
+        Quita el aporte de una página
+
+        Returns:
+            bool: True si la página estaba registrada
+        """
+        with self._lock, self._conn:
+            old = self._stored_counters_locked(page_id)
+            if not old:
+                return False
+            self._apply_locked({row: -value for row, value in old.items()})
+            self._conn.execute("DELETE FROM page_stats WHERE page_id = ?", (page_id,))
+        return True
+
+    def summary(self, scope=CORPUS):
+        """
+        Agregados de un ámbito (CORPUS, issue_scope(n) o year_scope(n))
+
+        Returns:
+            dict: Páginas, elementos, caracteres (total y media), conteos por
+                  tipo, sección y autor, e histograma de longitudes
+                  {inicio del intervalo: elementos}
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT dimension, key, value FROM totals WHERE scope = ?", (scope,)).fetchall()
+        return _summary_from_rows(scope, rows)
+
+    def rollups(self, kind="issue"):
+        """
+        Páginas, elementos, caracteres y tipos de cada edición (o de cada año)
+
+        Args:
+            kind: "issue" o "year"
+
+        Returns:
+            dict: {número de edición o año: {pages, items, chars, mean_chars, types}}
+        """
+        if kind not in ROLLUP_KINDS:
+            raise ValueError(f"Agregado desconocido: {kind} (opciones: {', '.join(ROLLUP_KINDS)})")
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT scope, dimension, key, value FROM totals "
+                "WHERE scope >= ? AND scope < ? AND dimension IN ('pages', 'items', 'chars', 'type')",
+                (f"{kind}:", f"{kind};"),
+            ).fetchall()
+        grouped = {}
+        for scope, dimension, key, value in rows:
+            grouped.setdefault(scope, []).append((dimension, key, value))
+        result = {}
+        for scope, scope_rows in grouped.items():
+            summary = _summary_from_rows(scope, scope_rows)
+            result[int(scope.split(":", 1)[1])] = {
+                name: summary[name] for name in ("pages", "items", "chars", "mean_chars", "types")
+            }
+        return dict(sorted(result.items()))
+
+    def page_ids(self):
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT page_id FROM page_stats")}
+
+    def check(self, pages):
+        """
+        Compara los totales guardados con los que salen de los datos originales
+
+        Args:
+            pages: Iterable de (page_id, structured_data), p. ej. iter_batch_pages
+
+        Returns:
+            dict: Páginas revisadas, páginas que faltan o sobran en las
+                  estadísticas y diferencias [(ámbito, dimensión, clave,
+                  guardado, esperado)]; consistente si las tres listas están vacías
+        """
+        expected = Counter()
+        raw_ids = set()
+        for page_id, structured_data in pages:
+            raw_ids.add(page_id)
+            expected.update(page_counters(structured_data))
+
+        with self._lock:
+            stored = {(scope, dimension, key): value for scope, dimension, key, value in
+                      self._conn.execute("SELECT scope, dimension, key, value FROM totals")}
+        stored_ids = self.page_ids()
+        differences = sorted((*row, stored.get(row, 0), expected.get(row, 0))
+                             for row in set(stored) | set(expected)
+                             if stored.get(row, 0) != expected.get(row, 0))
+        return {
+            "pages": len(raw_ids),
+            "missing_pages": sorted(raw_ids - stored_ids),
+            "extra_pages": sorted(stored_ids - raw_ids),
+            "differences": differences,
+            "consistent": not differences and raw_ids == stored_ids,
+        }
+
+    def rebuild(self, pages):
+        """
+        Reconstruye las estadísticas desde cero a partir de los datos originales
+
+        Args:
+            pages: Iterable de (page_id, structured_data)
+
+        Returns:
+            int: Páginas registradas
+        """
+        totals = Counter()
+        page_rows = []
+        now = time.time()
+        for page_id, structured_data in pages:
+            counters = page_counters(structured_data)
+            issue_number, year = page_edition(structured_data.get('metadata', {}))
+            totals.update(counters)
+            page_rows.append((page_id, issue_number, year,
+                              json.dumps([[*row, value] for row, value in sorted(counters.items())],
+                                         ensure_ascii=False),
+                              now))
+
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM totals")
+            self._conn.execute("DELETE FROM page_stats")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO page_stats (page_id, issue_number, year, counters, "
+                "updated_at) VALUES (?, ?, ?, ?, ?)", page_rows)
+            self._conn.executemany(
+                "INSERT INTO totals (scope, dimension, key, value) VALUES (?, ?, ?, ?)",
+                [(*row, value) for row, value in totals.items() if value])
+        return len({row[0] for row in page_rows})
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def iter_batch_pages(output_dir):
+    """
+    Páginas de las salidas de un lote de batch_ocr.py (<salida>/paginas/*.json)
+
+    Yields:
+        tuple: (page_id, structured_data)
+    """
+    for json_path in sorted(glob.glob(os.path.join(output_dir, "paginas", "*.json"))):
+        with open(json_path, encoding='utf-8') as f:
+            yield os.path.splitext(os.path.basename(json_path))[0], json.load(f)
+
+
+def iter_store_pages(store_dir):
+    """
+    Páginas del almacén Parquet (corpus_store.py), reagrupando sus filas
+
+    Yields:
+        tuple: (page_id, structured_data)
+    """
+    from corpus_store import CorpusStore
+
+    table = CorpusStore(store_dir).scanner(
+        ["page_id", "item_index", "date", "issue_number", "section", "type", "author",
+         "text_excerpt"]).to_table()
+    pages = {}
+    for row in table.to_pylist():
+        page = pages.setdefault(row["page_id"], {
+            "metadata": {"date": row["date"], "issue_number": row["issue_number"]},
+            "content": [],
+        })
+        page["content"].append(row)
+    for page_id in sorted(pages):
+        page = pages[page_id]
+        page["content"].sort(key=lambda item: item["item_index"])
+        yield page_id, page
+
+
+def print_corpus_summary(summary, indent="   "):
+    """
+    Imprime los agregados de un ámbito
+    """
+    print(f"{indent}- Páginas: {summary['pages']}")
+    for tipo, count in summary["types"].items():
+        print(f"{indent}- {tipo.capitalize()}: {count}")
+    print(f"{indent}- Total de elementos: {summary['items']}")
+    print(f"{indent}- Caracteres: {summary['chars']} (promedio {summary['mean_chars']:.0f} "
+          f"por elemento)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Estadísticas incrementales del corpus")
+    parser.add_argument("--stats", default=DEFAULT_STATS_PATH,
+                        help=f"Archivo de estadísticas (por defecto: {DEFAULT_STATS_PATH})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    summary = subparsers.add_parser("summary", help="Agregados del corpus, de una edición o de un año")
+    scope = summary.add_mutually_exclusive_group()
+    scope.add_argument("--issue", type=int, help="Solo esta edición")
+    scope.add_argument("--year", type=int, help="Solo este año")
+    scope.add_argument("--by", choices=ROLLUP_KINDS, help="Una línea por edición o por año")
+    summary.add_argument("--top", type=int, default=10,
+                         help="Secciones y autores a mostrar (por defecto: 10)")
+
+    for name, description in (("check", "Comparar con los datos originales"),
+                              ("rebuild", "Reconstruir desde los datos originales")):
+        command = subparsers.add_parser(name, help=description)
+        source = command.add_mutually_exclusive_group(required=True)
+        source.add_argument("--batch", metavar="DIR", help="Directorio de salida de batch_ocr.py")
+        source.add_argument("--store", metavar="DIR", help="Almacén Parquet (corpus_store.py)")
+        if name == "check":
+            command.add_argument("--repair", action="store_true",
+                                 help="Reconstruir si no coinciden")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    with CorpusStats(args.stats) as stats:
+        if args.command == "summary":
+            if args.by:
+                rollups = stats.rollups(args.by)
+                print(f"📊 {len(rollups)} {'ediciones' if args.by == 'issue' else 'años'}\n")
+                for key, rollup in rollups.items():
+                    types = ", ".join(f"{tipo} {count}" for tipo, count in rollup["types"].items())
+                    print(f"{key:>6}  {rollup['pages']:>5} páginas  {rollup['items']:>7} elementos  "
+                          f"{rollup['mean_chars']:>6.0f} caracteres/elemento  {types}")
+                return
+            scope = (issue_scope(args.issue) if args.issue is not None else
+                     year_scope(args.year) if args.year is not None else CORPUS)
+            start = time.perf_counter()
+            summary = stats.summary(scope)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            print(f"📊 Estadísticas ({scope}, leídas en {elapsed_ms:.1f} ms):")
+            print_corpus_summary(summary)
+            for name, label in (("sections", "Secciones"), ("authors", "Autores")):
+                if summary[name]:
+                    top = list(summary[name].items())[:args.top]
+                    print(f"\n   {label}: " + ", ".join(f"{key} ({count})" for key, count in top))
+            return
+
+        pages = iter_batch_pages(args.batch) if args.batch else iter_store_pages(args.store)
+        start = time.perf_counter()
+        if args.command == "rebuild":
+            count = stats.rebuild(pages)
+            print(f"✅ Estadísticas reconstruidas: {count} páginas en "
+                  f"{time.perf_counter() - start:.2f} s ({args.stats})")
+            return
+
+        result = stats.check(pages)
+        if result["consistent"]:
+            print(f"✅ Estadísticas consistentes con {result['pages']} páginas "
+                  f"({time.perf_counter() - start:.2f} s)")
+            return
+        print(f"⚠️  Estadísticas inconsistentes con {result['pages']} páginas:")
+        if result["missing_pages"]:
+            print(f"   {len(result['missing_pages'])} páginas sin registrar: "
+                  f"{', '.join(result['missing_pages'][:10])}")
+        if result["extra_pages"]:
+            print(f"   {len(result['extra_pages'])} páginas que ya no están en los datos: "
+                  f"{', '.join(result['extra_pages'][:10])}")
+        for scope, dimension, key, stored, expected in result["differences"][:20]:
+            print(f"   {scope} {dimension} {key!r}: guardado {stored}, esperado {expected}")
+        if args.repair:
+            pages = iter_batch_pages(args.batch) if args.batch else iter_store_pages(args.store)
+            count = stats.rebuild(pages)
+            print(f"🔧 Reconstruidas desde {count} páginas")
+
+
+if __name__ == "__main__":
+    main()
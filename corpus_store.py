@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Almacén columnar del corpus (Parquet particionado)
+
+Guarda las filas estructuradas de cada página en archivos Parquet
+particionados por año y número de edición:
+
+    corpus_parquet/year=1916/issue_number=1609/<page_id>.parquet
+
+- Escritura incremental: cada página es un archivo; volver a escribir una
+  página reemplaza solo ese archivo (de forma atómica)
+- Columnas tipadas: date como fecha, issue_number entero, type/section
+  categóricas (diccionario)
+- Lecturas con proyección de columnas y filtros que se aplican a nivel de
+  partición y de row group (no se leen los archivos que no hacen falta)
+- El CSV sigue disponible como artefacto derivado (export_csv)
+
+Ejemplo:
+    python3 corpus_store.py data/el_martillo/corpus_parquet --export-csv corpus.csv --year 1916
+"""
+
+import argparse
+import glob
+import os
+import re
+from datetime import date
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+DEFAULT_STORE_DIR = "data/el_martillo/corpus_parquet"
+
+# Año de partición para las páginas sin fecha reconocible
+UNKNOWN_YEAR = 0
+
+PARTITION_SCHEMA = pa.schema([
+    ("year", pa.int16()),
+    ("issue_number", pa.int32()),
+])
+
+# Columnas guardadas en cada archivo (las de partición van en la ruta)
+FILE_SCHEMA = pa.schema([
+    ("page_id", pa.string()),
+    ("item_index", pa.int32()),
+    ("date", pa.date32()),
+    ("headline", pa.string()),
+    ("section", pa.dictionary(pa.int32(), pa.string())),
+    ("type", pa.dictionary(pa.int32(), pa.string())),
+    ("author", pa.string()),
+    ("text_excerpt", pa.string()),
+])
+
+# Columnas del CSV derivado, en orden
+EXPORT_COLUMNS = ['page_id', 'date', 'issue_number', 'headline', 'section', 'type', 'author',
+                  'text_excerpt']
+
+_UNSAFE_CHARS_RE = re.compile(r'[^\w.-]')
+
+
+def parse_iso_date(value):
+    """
+    Convierte 'AAAA-MM-DD' en date (None si falta o no es válida)
+    """
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def _page_filename(page_id):
+    return _UNSAFE_CHARS_RE.sub('_', page_id) + ".parquet"
+
+
+class CorpusStore:
+    """
+    Corpus en Parquet particionado por year/issue_number
+
+    Args:
+        root: Directorio raíz del almacén
+    """
+
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _page_files(self, page_id):
+        return glob.glob(os.path.join(glob.escape(self.root), "year=*", "issue_number=*",
+                                      glob.escape(_page_filename(page_id))))
+
+    def has_page(self, page_id):
+        return bool(self._page_files(page_id))
+
+    def append_page(self, page_id, structured_data):
+        """
+        Escribe (o reemplaza) las filas de una página
+
+        Args:
+            page_id: Identificador de la página
+            structured_data: Estructura con 'metadata' y 'content'
+
+        Returns:
+            int: Número de filas escritas
+        """
+        metadata = structured_data.get('metadata', {})
+        page_date = parse_iso_date(metadata.get('date'))
+        try:
+            issue_number = int(metadata.get('issue_number') or 0)
+        except (TypeError, ValueError):
+            issue_number = 0
+        year = page_date.year if page_date else UNKNOWN_YEAR
+
+        items = structured_data.get('content', [])
+        table = pa.table({
+            "page_id": [page_id] * len(items),
+            "item_index": list(range(len(items))),
+            "date": [page_date] * len(items),
+            "headline": [item.get('headline', '') for item in items],
+            "section": [item.get('section', '') for item in items],
+            "type": [item.get('type', '') for item in items],
+            "author": [item.get('author', '') for item in items],
+            "text_excerpt": [item.get('text_excerpt', '') for item in items],
+        }, schema=FILE_SCHEMA)
+
+        partition_dir = os.path.join(self.root, f"year={year}", f"issue_number={issue_number}")
+        os.makedirs(partition_dir, exist_ok=True)
+        path = os.path.join(partition_dir, _page_filename(page_id))
+
+        # Si la fecha o la edición cambiaron, la página estaba en otra partición
+        for old_path in self._page_files(page_id):
+            if os.path.abspath(old_path) != os.path.abspath(path):
+                os.remove(old_path)
+
+        # El prefijo "." hace que los lectores ignoren el temporal
+        tmp_path = os.path.join(partition_dir, "." + _page_filename(page_id) + ".tmp")
+        pq.write_table(table, tmp_path, compression="zstd")
+        os.replace(tmp_path, path)
+        return table.num_rows
+
+    def dataset(self):
+        """
+        Dataset de pyarrow sobre todo el almacén
+        """
+        return ds.dataset(
+            self.root,
+            schema=pa.unify_schemas([FILE_SCHEMA, PARTITION_SCHEMA]),
+            format="parquet",
+            partitioning=ds.partitioning(PARTITION_SCHEMA, flavor="hive"),
+            exclude_invalid_files=False,
+        )
+
+    def scanner(self, columns=None, filters=None, batch_size=65536):
+        """
+        Scanner con proyección y filtros
+
+        Args:
+            columns: Columnas a leer (por defecto, todas)
+            filters: Lista de tuplas (columna, operador, valor), p. ej.
+                     [("year", "=", 1916), ("type", "=", "anuncio")], o una
+                     expresión de pyarrow.dataset
+            batch_size: Filas por lote
+        """
+        expression = filters
+        if isinstance(filters, list):
+            expression = pq.filters_to_expression(filters) if filters else None
+        return self.dataset().scanner(columns=columns, filter=expression, batch_size=batch_size)
+
+    def read(self, columns=None, filters=None):
+        """
+        Lee filas del corpus como DataFrame (type y section como categorías)
+
+        Returns:
+            pd.DataFrame: Filas que cumplen los filtros, con las columnas pedidas
+        """
+        return self.scanner(columns, filters).to_table().to_pandas()
+
+    def export_csv(self, path, columns=None, filters=None):
+        """
+        Genera un CSV derivado del almacén, lote a lote (memoria acotada)
+
+        Returns:
+            int: Filas escritas
+        """
+        columns = columns or EXPORT_COLUMNS
+        rows = 0
+        writer = None
+        try:
+            for batch in self.scanner(columns, filters).to_batches():
+                # CSV de texto plano: las columnas categóricas se decodifican
+                arrays = [column.dictionary_decode() if pa.types.is_dictionary(column.type) else column
+                          for column in batch.columns]
+                batch = pa.RecordBatch.from_arrays(arrays, names=batch.schema.names)
+                if writer is None:
+                    writer = pa_csv.CSVWriter(path, batch.schema)
+                writer.write_batch(batch)
+                rows += batch.num_rows
+        finally:
+            if writer is not None:
+                writer.close()
+        if writer is None:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(",".join(f'"{column}"' for column in columns) + "\n")
+        return rows
+
+    def summary(self):
+        """
+        Páginas, filas y particiones del almacén
+        """
+        table = self.scanner(["page_id", "year", "issue_number"]).to_table()
+        return {
+            "rows": table.num_rows,
+            "pages": len(set(table.column("page_id").to_pylist())),
+            "partitions": len(set(zip(table.column("year").to_pylist(),
+                                      table.column("issue_number").to_pylist()))),
+        }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Consultar y exportar el corpus en Parquet")
+    parser.add_argument("store", nargs="?", default=DEFAULT_STORE_DIR,
+                        help=f"Directorio del almacén (por defecto: {DEFAULT_STORE_DIR})")
+    parser.add_argument("--export-csv", help="Exportar las filas seleccionadas a este CSV")
+    parser.add_argument("--year", type=int, help="Filtrar por año")
+    parser.add_argument("--issue", type=int, help="Filtrar por número de edición")
+    parser.add_argument("--type", help="Filtrar por tipo (artículo, anuncio, ...)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    store = CorpusStore(args.store)
+
+    filters = []
+    if args.year is not None:
+        filters.append(("year", "=", args.year))
+    if args.issue is not None:
+        filters.append(("issue_number", "=", args.issue))
+    if args.type:
+        filters.append(("type", "=", args.type))
+
+    summary = store.summary()
+    print(f"🗄️  {summary['pages']} páginas, {summary['rows']} filas, "
+          f"{summary['partitions']} ediciones en {args.store}")
+
+    if args.export_csv:
+        rows = store.export_csv(args.export_csv, filters=filters)
+        print(f"📁 {rows} filas exportadas a: {args.export_csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+Índice de menciones de entidades: periódicos, personas y lugares
+
+Las entidades salen de un gazetteer configurable (data/el_martillo/gazetteer.json):
+por tipo, una lista de nombres canónicos con sus variantes (alias), por
+ejemplo las lecturas del OCR ("El Zurriago" / "El Zurriaga"). Todos los
+nombres se compilan en un único autómata de Aho-Corasick sobre el texto
+normalizado con text_normalization.fold_text (sin tildes, mayúsculas ni
+ortografía antigua). Así cada texto se recorre una sola vez, sea cual sea el
+número de entidades, en lugar de buscar cada nombre por separado.
+
+- Solo cuentan las coincidencias de palabras completas; si dos se solapan
+  gana la que empieza antes y, a igualdad, la más larga ("La Voz del Pueblo"
+  y no "El Pueblo")
+- Con "capitalized", las mayúsculas del nombre deben estar también en el
+  texto: "El Tiempo" es un periódico, "el tiempo" no
+- fold_text conserva las posiciones, así que el desplazamiento de cada
+  mención es el del texto original
+
+El índice es un JSON compacto junto a los datos estructurados (entidad →
+[página, edición, elemento, desplazamiento]). El elemento es el del
+'content' estructurado en cuya sección cae la mención (None antes del
+primero), y se actualiza por página: una página sin cambios no se vuelve a
+recorrer.
+
+Ejemplos:
+    python3 entity_index.py build data/el_martillo/lote
+    python3 entity_index.py report --kind periodico --limit 20
+    python3 entity_index.py query "Nicanor M. Carmona"
+"""
+
+import argparse
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from response_cache import make_key
+from text_normalization import fold_text
+
+DEFAULT_GAZETTEER_PATH = "data/el_martillo/gazetteer.json"
+DEFAULT_MENTIONS_PATH = "data/el_martillo/menciones.json"
+BATCH_MENTIONS_NAME = "menciones.json"
+DEFAULT_REPORT_LIMIT = 20
+INDEX_VERSION = 1
+
+# Saltos de línea y tabuladores cuentan como espacios (sin cambiar posiciones)
+_SPACE_TABLE = str.maketrans("\n\r\t", "   ")
+
+
+def normalize_for_matching(text):
+    """
+    Texto normalizado para el autómata, de la misma longitud que el original
+    """
+    return fold_text(text).translate(_SPACE_TABLE)
+
+
+def load_gazetteer(path=DEFAULT_GAZETTEER_PATH):
+    """
+    Lee el gazetteer: {tipo: {"capitalized": bool, "entities": [nombre o
+    {"name": ..., "aliases": [...]}]}}
+
+    Returns:
+        dict: Gazetteer
+    """
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def gazetteer_hash(gazetteer):
+    return make_key("gazetteer", json.dumps(gazetteer, ensure_ascii=False, sort_keys=True))
+
+
+class EntityMatcher:
+    """
+    Autómata de Aho-Corasick con todos los nombres y alias del gazetteer
+
+    Args:
+        gazetteer: Diccionario de load_gazetteer
+    """
+
+    def __init__(self, gazetteer):
+        self.gazetteer = gazetteer
+        self.hash = gazetteer_hash(gazetteer)
+        # Por patrón: (entidad canónica, tipo, longitud, posiciones de sus mayúsculas)
+        self.patterns = []
+        self.kinds = {}
+        # Nombre o alias normalizado → entidad canónica
+        self.names = {}
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+        seen = set()
+        for kind, group in gazetteer.items():
+            for entry in group.get("entities", []):
+                if isinstance(entry, str):
+                    entry = {"name": entry}
+                self.kinds[entry["name"]] = kind
+                for surface in [entry["name"]] + entry.get("aliases", []):
+                    surface = " ".join(surface.split())
+                    pattern = normalize_for_matching(surface)
+                    if not pattern or (pattern, entry["name"]) in seen:
+                        continue
+                    seen.add((pattern, entry["name"]))
+                    self.names.setdefault(pattern, entry["name"])
+                    capitals = tuple(i for i, char in enumerate(surface) if char.isupper()) \
+                        if group.get("capitalized") else ()
+                    self._add(pattern, len(self.patterns))
+                    self.patterns.append((entry["name"], kind, len(pattern), capitals))
+        self._build_failure_links()
+
+    def _add(self, pattern, pattern_id):
+        state = 0
+        for char in pattern:
+            following = self._goto[state].get(char)
+            if following is None:
+                following = len(self._goto)
+                self._goto[state][char] = following
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = following
+        self._output[state].append(pattern_id)
+
+    def _build_failure_links(self):
+        # Recorrido en anchura: el enlace de fallo de un estado es el sufijo más
+        # largo que también es prefijo de algún patrón (los de profundidad 1
+        # fallan a la raíz)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, following in self._goto[state].items():
+                queue.append(following)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                link = self._goto[fallback].get(char, 0)
+                self._fail[following] = link
+                self._output[following] = self._output[following] + self._output[link]
+
+    def _candidates(self, folded):
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for end, char in enumerate(folded, start=1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for pattern_id in output[state]:
+                yield pattern_id, end - self.patterns[pattern_id][2]
+
+    def find(self, text):
+        """
+        Menciones de entidades en un texto, en una sola pasada
+
+        Args:
+            text: Texto original
+
+        Returns:
+            list: (entidad, tipo, inicio, fin) por mención, en orden y sin solapes
+        """
+        folded = normalize_for_matching(text)
+        matches = []
+        for pattern_id, start in self._candidates(folded):
+            name, kind, length, capitals = self.patterns[pattern_id]
+            end = start + length
+            # Palabra completa: sin letras ni dígitos pegados a los lados
+            if (start > 0 and folded[start - 1].isalnum()) or (end < len(folded) and folded[end].isalnum()):
+                continue
+            if any(not text[start + offset].isupper() for offset in capitals):
+                continue
+            matches.append((start, -length, name, kind))
+
+        matches.sort()
+        mentions = []
+        last_end = 0
+        for start, negative_length, name, kind in matches:
+            if start >= last_end:
+                mentions.append((name, kind, start, start - negative_length))
+                last_end = start - negative_length
+        return mentions
+
+
+def item_starts(text, items):
+    """
+    Posición en el texto de la sección de cada elemento estructurado
+
+    Cada titular se busca en el texto normalizado a partir del anterior; los
+    que no aparecen no delimitan sección.
+
+    Returns:
+        tuple: (posiciones ordenadas, índice del elemento de cada posición)
+    """
+    folded = normalize_for_matching(text)
+    starts, indices = [], []
+    position = 0
+    for item_index, item in enumerate(items):
+        needle = normalize_for_matching((item.get('headline') or '').split(" / ")[0]).strip()
+        if not needle:
+            continue
+        found = folded.find(needle, position)
+        if found >= 0:
+            starts.append(found)
+            indices.append(item_index)
+            position = found + len(needle)
+    return starts, indices
+
+
+def page_text_for_mentions(text, structured_data):
+    """
+    Texto en el que se buscan las menciones de una página
+
+    Es la transcripción del paso 1; si no la hay, los titulares y extractos
+    del JSON unidos en orden (los desplazamientos son entonces sobre ese texto).
+    """
+    if text:
+        return text
+    return "\n\n".join(f"{item.get('headline') or ''}\n{item.get('text_excerpt') or ''}"
+                       for item in structured_data.get('content', []))
+
+
+def page_mentions(matcher, text, structured_data):
+    """
+    Menciones de una página, cada una con el elemento en cuya sección cae
+
+    Args:
+        matcher: EntityMatcher
+        text: Transcripción de la página (puede estar vacía)
+        structured_data: JSON estructurado de la página
+
+    Returns:
+        list: (entidad, elemento o None, desplazamiento) por mención
+    """
+    text = page_text_for_mentions(text, structured_data)
+    starts, indices = item_starts(text, structured_data.get('content', []))
+    mentions = []
+    for name, _, start, _ in matcher.find(text):
+        section = bisect.bisect_right(starts, start) - 1
+        mentions.append((name, indices[section] if section >= 0 else None, start))
+    return mentions
+
+
+class MentionIndex:
+    """
+    Índice de menciones persistido como JSON compacto, actualizable por página
+
+    Es seguro entre hilos (batch_ocr.py indexa las páginas a medida que terminan).
+
+    Args:
+        path: Archivo JSON del índice
+        gazetteer_path: Gazetteer con el que buscar; si cambió desde la última
+                        vez, todas las páginas se vuelven a recorrer
+    """
+
+    def __init__(self, path=DEFAULT_MENTIONS_PATH, gazetteer_path=DEFAULT_GAZETTEER_PATH):
+        self.path = path
+        self.matcher = EntityMatcher(load_gazetteer(gazetteer_path))
+        # page_id → {"issue_number", "hash", "mentions": [(entidad, elemento, desplazamiento)]}
+        self.pages = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get("version") != INDEX_VERSION or data.get("gazetteer") != self.matcher.hash:
+            return
+        for page_id, (issue_number, content_hash) in data["pages"].items():
+            self.pages[page_id] = {"issue_number": issue_number, "hash": content_hash, "mentions": []}
+        for name, entry in data["entities"].items():
+            for page_id, _, item_index, offset in entry["mentions"]:
+                self.pages[page_id]["mentions"].append((name, item_index, offset))
+
+    def index_page(self, page_id, text, structured_data):
+        """
+        Busca las menciones de una página y reemplaza las anteriores
+
+        Returns:
+            bool: False si la página no cambió desde la última vez
+        """
+        # Solo lo que influye en las menciones (otros campos, como los que agrega
+        # structured_data_to_dataframe, no obligan a recorrer la página de nuevo)
+        items = [(item.get('headline'), item.get('text_excerpt'))
+                 for item in structured_data.get('content', [])]
+        issue_number = (structured_data.get('metadata') or {}).get('issue_number')
+        content_hash = make_key(text or "", issue_number, json.dumps(items, ensure_ascii=False))
+        with self._lock:
+            previous = self.pages.get(page_id)
+            if previous is not None and previous["hash"] == content_hash:
+                return False
+        mentions = page_mentions(self.matcher, text, structured_data)
+        with self._lock:
+            self.pages[page_id] = {"issue_number": issue_number, "hash": content_hash,
+                                   "mentions": mentions}
+        return True
+
+    def remove_page(self, page_id):
+        with self._lock:
+            self.pages.pop(page_id, None)
+
+    def entities(self):
+        """
+        Vista entidad → menciones, la misma que se guarda en disco
+
+        Returns:
+            dict: {entidad: {"kind": tipo, "mentions": [[página, edición, elemento, desplazamiento]]}}
+        """
+        with self._lock:
+            entities = {}
+            for page_id in sorted(self.pages):
+                page = self.pages[page_id]
+                for name, item_index, offset in page["mentions"]:
+                    entry = entities.setdefault(name, {"kind": self.matcher.kinds.get(name),
+                                                       "mentions": []})
+                    entry["mentions"].append([page_id, page["issue_number"], item_index, offset])
+            return entities
+
+    def save(self):
+        """
+        Escribe el índice de forma atómica (temporal y os.replace)
+        """
+        entities = self.entities()
+        with self._lock:
+            pages = {page_id: [page["issue_number"], page["hash"]]
+                     for page_id, page in sorted(self.pages.items())}
+        data = {"version": INDEX_VERSION, "gazetteer": self.matcher.hash,
+                "pages": pages, "entities": entities}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+    def counts(self, kind=None):
+        """
+        Menciones y páginas por entidad, de la más mencionada a la menos
+
+        Returns:
+            list: (entidad, tipo, menciones, páginas)
+        """
+        rows = [(name, entry["kind"], len(entry["mentions"]),
+                 len({mention[0] for mention in entry["mentions"]}))
+                for name, entry in self.entities().items()
+                if kind is None or entry["kind"] == kind]
+        return sorted(rows, key=lambda row: (-row[2], row[0]))
+
+    def mentions_of(self, name):
+        """
+        Menciones de una entidad (se acepta cualquier nombre o alias, con o sin tildes)
+
+        Returns:
+            tuple: (entidad canónica o None, lista de [página, edición, elemento, desplazamiento])
+        """
+        canonical = self.matcher.names.get(normalize_for_matching(" ".join(name.split())))
+        if canonical is None:
+            return None, []
+        return canonical, self.entities().get(canonical, {}).get("mentions", [])
+
+    def stats(self):
+        with self._lock:
+            return {"pages": len(self.pages),
+                    "mentions": sum(len(page["mentions"]) for page in self.pages.values())}
+
+    def close(self):
+        self.save()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def index_batch_output(index, output_dir):
+    """
+    Indexa las menciones de las salidas por página de un lote de batch_ocr.py
+
+    Returns:
+        tuple: (páginas recorridas, páginas sin cambios)
+    """
+    from process_ocr import read_extracted_text
+
+    indexed = unchanged = 0
+    for json_path in sorted(glob.glob(os.path.join(output_dir, "paginas", "*.json"))):
+        page_id = os.path.splitext(os.path.basename(json_path))[0]
+        text_path = os.path.splitext(json_path)[0] + ".txt"
+        with open(json_path, encoding='utf-8') as f:
+            structured_data = json.load(f)
+        text = read_extracted_text(text_path) if os.path.exists(text_path) else ""
+        if index.index_page(page_id, text, structured_data):
+            indexed += 1
+        else:
+            unchanged += 1
+    return indexed, unchanged
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Índice de menciones de periódicos, personas y lugares")
+    parser.add_argument("--index",
+                        help=f"Archivo del índice (por defecto: {DEFAULT_MENTIONS_PATH}, o "
+                             f"{BATCH_MENTIONS_NAME} en el directorio del lote con build)")
+    parser.add_argument("--gazetteer", default=DEFAULT_GAZETTEER_PATH,
+                        help=f"Gazetteer de entidades (por defecto: {DEFAULT_GAZETTEER_PATH})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Indexar las páginas de un lote de batch_ocr.py")
+    build.add_argument("output_dir", help="Directorio de salida del lote")
+
+    report = subparsers.add_parser("report", help="Entidades más mencionadas")
+    report.add_argument("--kind", help="Solo un tipo del gazetteer (periodico, persona, lugar...)")
+    report.add_argument("--limit", type=int, default=DEFAULT_REPORT_LIMIT, help="Número de entidades")
+
+    query = subparsers.add_parser("query", help="Menciones de una entidad")
+    query.add_argument("name", help="Nombre o alias de la entidad")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.command == "build":
+        index_path = args.index or os.path.join(args.output_dir, BATCH_MENTIONS_NAME)
+        with MentionIndex(index_path, args.gazetteer) as index:
+            start = time.perf_counter()
+            indexed, unchanged = index_batch_output(index, args.output_dir)
+            stats = index.stats()
+        print(f"✅ {indexed} páginas recorridas, {unchanged} sin cambios "
+              f"en {time.perf_counter() - start:.2f} s")
+        print(f"🏷️  Índice: {stats['mentions']} menciones en {stats['pages']} páginas ({index_path})")
+        return
+
+    index = MentionIndex(args.index or DEFAULT_MENTIONS_PATH, args.gazetteer)
+    if args.command == "report":
+        rows = index.counts(args.kind)
+        print(f"🏷️  {len(rows)} entidades mencionadas en {index.stats()['pages']} páginas\n")
+        for name, kind, mentions, pages in rows[:args.limit]:
+            print(f"   {name:<32} {kind:<10} {mentions:>6} menciones en {pages:>5} páginas")
+        return
+
+    canonical, mentions = index.mentions_of(args.name)
+    if canonical is None:
+        print(f"⚠️  '{args.name}' no está en el gazetteer ({args.gazetteer})")
+        return
+    print(f"🏷️  {canonical}: {len(mentions)} menciones\n")
+    for page_id, issue_number, item_index, offset in mentions:
+        item = f"#{item_index + 1}" if item_index is not None else "(encabezado)"
+        print(f"   {page_id:<20} edición {issue_number}  elemento {item:<14} posición {offset}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,787 @@
+#!/usr/bin/env python3
+"""
+Cliente y servidor falsos de Anthropic para pruebas y mediciones sin red
+
+Imita la parte de la API que usa el proyecto (client.messages.create, en sus
+versiones síncrona y asíncrona) con una latencia configurable, de modo que se
+pueda medir el rendimiento del flujo (páginas por minuto, concurrencia, etc.)
+sin gastar tokens ni depender de la red.
+
+También imita la API de lotes (client.messages.batches: create, retrieve,
+results y cancel), con un tiempo de procesamiento y una fracción de errores
+configurables, para probar batch_submission.py sin red.
+
+Puede levantarse como servidor HTTP local compatible con /v1/messages y
+/v1/messages/batches, para ejercitar el SDK real (pool de conexiones,
+reintentos, descarga de resultados, etc.):
+    python3 fake_anthropic.py --port 8765 --latency 0.5
+    export ANTHROPIC_BASE_URL=http://127.0.0.1:8765
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from types import SimpleNamespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STRUCTURE_TEXT_MARKER = "TEXTO A ANALIZAR:\n"
+STRUCTURE_TEXT_END = "\n\nRegistra el resultado con la herramienta"
+# Etiqueta que pide el prompt de sistema del modo de una llamada (single_pass_ocr)
+SINGLE_PASS_TAG = "<transcripcion>"
+# Peticiones por lote que acepta la API de lotes
+BATCH_MAX_REQUESTS = 100_000
+
+
+@dataclass
+class FakeTextBlock:
+    text: str
+    type: str = "text"
+
+
+@dataclass
+class FakeToolUseBlock:
+    id: str
+    name: str
+    input: dict
+    type: str = "tool_use"
+    # JSON tal como se "generó" (cortado si se llegó a max_tokens); solo para streaming
+    raw_json: str = field(default="", repr=False)
+
+
+@dataclass
+class FakeUsage:
+    input_tokens: int
+    output_tokens: int
+    cache_creation_input_tokens: int = 0
+    cache_read_input_tokens: int = 0
+
+
+@dataclass
+class FakeMessage:
+    content: list
+    usage: FakeUsage
+    model: str
+    stop_reason: str = "end_turn"
+    role: str = "assistant"
+    type: str = "message"
+
+    def to_dict(self, message_id):
+        """
+        Representación JSON igual a la de la API de mensajes
+        """
+        data = asdict(self)
+        data["id"] = message_id
+        data["stop_sequence"] = None
+        for block in data["content"]:
+            block.pop("raw_json", None)
+        return data
+
+
+def message_events(message, message_id, chunk_size):
+    """
+    Eventos de streaming (nombre, datos) de un mensaje, igual que la API con stream=true
+
+    Los bloques de texto se envían como text_delta y los de herramienta como
+    input_json_delta con el JSON generado (parcial si la respuesta se cortó).
+    """
+    message_data = message.to_dict(message_id)
+    start = dict(message_data, content=[], stop_reason=None,
+                 usage=dict(message_data["usage"], output_tokens=0))
+    events = [("message_start", {"type": "message_start", "message": start})]
+    for index, block in enumerate(message.content):
+        if block.type == "tool_use":
+            content_block = {"type": "tool_use", "id": block.id, "name": block.name, "input": {}}
+            deltas = [{"type": "input_json_delta", "partial_json": chunk}
+                      for chunk in split_chunks(block.raw_json, chunk_size)]
+        else:
+            content_block = {"type": "text", "text": ""}
+            deltas = [{"type": "text_delta", "text": chunk}
+                      for chunk in split_chunks(block.text, chunk_size)]
+        events.append(("content_block_start", {"type": "content_block_start", "index": index,
+                                               "content_block": content_block}))
+        events += [("content_block_delta", {"type": "content_block_delta", "index": index,
+                                            "delta": delta}) for delta in deltas]
+        events.append(("content_block_stop", {"type": "content_block_stop", "index": index}))
+    events += [
+        ("message_delta", {"type": "message_delta",
+                           "delta": {"stop_reason": message_data["stop_reason"],
+                                     "stop_sequence": None},
+                           "usage": {"output_tokens": message_data["usage"]["output_tokens"]}}),
+        ("message_stop", {"type": "message_stop"}),
+    ]
+    return events
+
+
+def _as_event_objects(events):
+    """
+    Convierte los eventos en objetos con atributos (como los del SDK)
+    """
+    for _, data in events:
+        yield json.loads(json.dumps(data), object_hook=lambda d: SimpleNamespace(**d))
+
+
+def estimate_tokens(text):
+    """
+    Estimación aproximada de tokens (4 caracteres por token)
+    """
+    return max(1, len(text) // 4)
+
+
+def _request_text(messages):
+    """
+    Concatena los bloques de texto de los mensajes de una petición
+    """
+    parts = []
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, str):
+            parts.append(content)
+            continue
+        for block in content:
+            if block.get("type") == "text":
+                parts.append(block["text"])
+    return "\n".join(parts)
+
+
+def _system_blocks(system):
+    """
+    Normaliza el parámetro system (texto o lista de bloques) a lista de bloques
+    """
+    if not system:
+        return []
+    if isinstance(system, str):
+        return [{"type": "text", "text": system}]
+    return list(system)
+
+
+def _has_image(messages):
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, list) and any(b.get("type") == "image" for b in content):
+            return True
+    return False
+
+
+def _image_data(messages):
+    """
+    Imagen en base64 del primer bloque de imagen de una petición (o None)
+    """
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, list):
+            for block in content:
+                if block.get("type") == "image":
+                    return block["source"].get("data")
+    return None
+
+
+def split_chunks(text, size):
+    """
+    Divide un texto en fragmentos de longitud fija (deltas de streaming)
+    """
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class FakeMessageStream:
+    """
+    Equivalente falso del MessageStream que devuelve client.messages.stream()
+
+    La latencia configurada se espera antes del primer fragmento (tiempo hasta
+    el primer token) y luego se emiten fragmentos con chunk_delay entre ellos.
+    """
+
+    def __init__(self, client, model, max_tokens, messages, system=None):
+        self._client = client
+        self._model = model
+        self._max_tokens = max_tokens
+        self._messages = messages
+        self._system = system
+        self._final_message = None
+        self.text_stream = self._iter_text()
+
+    def _iter_text(self):
+        delay = self._client._next_delay()
+        if delay > 0:
+            time.sleep(delay)
+        self._final_message = self._client._respond(self._model, self._max_tokens, self._messages,
+                                                    self._system)
+        for chunk in split_chunks(self._final_message.content[0].text, self._client.chunk_size):
+            if self._client.chunk_delay > 0:
+                time.sleep(self._client.chunk_delay)
+            yield chunk
+
+    def get_final_message(self):
+        for _ in self.text_stream:
+            pass
+        return self._final_message
+
+    def get_final_text(self):
+        return self.get_final_message().content[0].text
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class FakeMessages:
+    """
+    Equivalente falso de client.messages
+    """
+
+    def __init__(self, client):
+        self._client = client
+
+    def create(self, model, max_tokens, messages, system=None, tools=None, stream=False,
+               **kwargs):
+        delay = self._client._next_delay()
+        if delay > 0:
+            time.sleep(delay)
+        message = self._client._respond(model, max_tokens, messages, system, tools)
+        if stream:
+            return _as_event_objects(message_events(message, "msg_fake_local",
+                                                    self._client.chunk_size))
+        return message
+
+    def stream(self, model, max_tokens, messages, system=None, **kwargs):
+        return FakeMessageStream(self._client, model, max_tokens, messages, system)
+
+
+class FakeBatches:
+    """
+    Equivalente falso de client.messages.batches
+
+    Un lote termina cuando han pasado batch_seconds desde su creación; entonces
+    cada petición se resuelve con el mismo generador de respuestas que
+    messages.create (sin latencia por petición). Una fracción batch_error_rate
+    de las peticiones termina con error, para probar el reenvío.
+    """
+
+    def __init__(self, client):
+        self._client = client
+        self._batches = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def create(self, requests, **kwargs):
+        requests = list(requests)
+        custom_ids = [request["custom_id"] for request in requests]
+        if not requests or len(requests) > BATCH_MAX_REQUESTS:
+            raise ValueError(f"Un lote lleva entre 1 y {BATCH_MAX_REQUESTS} peticiones")
+        if len(set(custom_ids)) != len(custom_ids):
+            raise ValueError("custom_id repetido en el lote")
+        with self._lock:
+            batch_id = f"msgbatch_fake_{next(self._ids):06d}"
+            self._batches[batch_id] = {"requests": requests, "created_at": time.time(),
+                                       "results": None, "cancel_requested": False}
+        return self.retrieve(batch_id)
+
+    def _resolve_locked(self, batch):
+        if batch["results"] is not None:
+            return
+        results = []
+        for request in batch["requests"]:
+            params = request["params"]
+            with self._client._lock:
+                errored = self._client._random.random() < self._client.batch_error_rate
+            if batch["cancel_requested"]:
+                result = {"type": "canceled"}
+            elif errored:
+                result = {"type": "errored", "error": {"type": "error", "error": {
+                    "type": "api_error", "message": "Simulado"}}}
+            else:
+                message = self._client._respond(params["model"], params["max_tokens"],
+                                                params["messages"], params.get("system"),
+                                                params.get("tools"))
+                result = {"type": "succeeded", "message": message}
+            results.append({"custom_id": request["custom_id"], "result": result})
+        batch["results"] = results
+
+    def batch_data(self, batch_id, results_url=None):
+        """
+        Representación JSON del lote, igual a la de la API
+
+        Raises:
+            KeyError: Si el lote no existe
+        """
+        with self._lock:
+            batch = self._batches[batch_id]
+            ended = (batch["cancel_requested"]
+                     or time.time() - batch["created_at"] >= self._client.batch_seconds)
+            counts = dict.fromkeys(("processing", "succeeded", "errored", "canceled", "expired"), 0)
+            if ended:
+                self._resolve_locked(batch)
+                for entry in batch["results"]:
+                    counts[entry["result"]["type"]] += 1
+            else:
+                counts["processing"] = len(batch["requests"])
+
+        def timestamp(seconds):
+            return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(seconds))
+
+        return {
+            "id": batch_id,
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": counts,
+            "created_at": timestamp(batch["created_at"]),
+            "expires_at": timestamp(batch["created_at"] + 24 * 3600),
+            "ended_at": timestamp(time.time()) if ended else None,
+            "archived_at": None,
+            "cancel_initiated_at": None,
+            "results_url": (results_url or f"fake://{batch_id}/results") if ended else None,
+        }
+
+    def retrieve(self, batch_id, **kwargs):
+        return json.loads(json.dumps(self.batch_data(batch_id)),
+                          object_hook=lambda d: SimpleNamespace(**d))
+
+    def cancel(self, batch_id, **kwargs):
+        with self._lock:
+            self._batches[batch_id]["cancel_requested"] = True
+        return self.retrieve(batch_id)
+
+    def result_entries(self, batch_id):
+        """
+        Resultados del lote terminado: {"custom_id", "result"} con FakeMessage
+
+        Raises:
+            ValueError: Si el lote aún no terminó
+        """
+        if self.batch_data(batch_id)["processing_status"] != "ended":
+            raise ValueError(f"El lote {batch_id} aún no terminó")
+        with self._lock:
+            return list(self._batches[batch_id]["results"])
+
+    def results(self, batch_id, **kwargs):
+        for entry in self.result_entries(batch_id):
+            result = dict(entry["result"])
+            if "error" in result:
+                result["error"] = json.loads(json.dumps(result["error"]),
+                                             object_hook=lambda d: SimpleNamespace(**d))
+            yield SimpleNamespace(custom_id=entry["custom_id"], result=SimpleNamespace(**result))
+
+
+class FakeAsyncMessages:
+    """
+    Equivalente falso de client.messages del cliente asíncrono
+    """
+
+    def __init__(self, client):
+        self._client = client
+
+    async def create(self, model, max_tokens, messages, system=None, tools=None, stream=False,
+                     **kwargs):
+        delay = self._client._next_delay()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        message = self._client._respond(model, max_tokens, messages, system, tools)
+        if stream:
+            return self._events(message)
+        return message
+
+    async def _events(self, message):
+        for event in _as_event_objects(message_events(message, "msg_fake_local",
+                                                      self._client.chunk_size)):
+            yield event
+
+
+class FakeAnthropic:
+    """
+    Cliente falso compatible con anthropic.Anthropic para el flujo de OCR
+
+    Args:
+        latency: Segundos de espera simulada por petición
+        jitter: Variación aleatoria (+/-) de la latencia, en segundos
+        page_text: Texto que devuelve la "extracción" de cualquier imagen, o una
+                   función que recibe la imagen en base64 y devuelve su texto
+        seed: Semilla para el generador aleatorio de la latencia
+        chunk_size: Caracteres por fragmento en las respuestas en streaming
+        chunk_delay: Segundos entre fragmentos en las respuestas en streaming
+        batch_seconds: Segundos que tarda en terminar un lote de messages.batches
+        batch_error_rate: Fracción de las peticiones de un lote que terminan con error
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, page_text=None, seed=None,
+                 chunk_size=40, chunk_delay=0.0, batch_seconds=0.0, batch_error_rate=0.0):
+        if page_text is None:
+            from process_ocr import EXAMPLE_TEXT
+            page_text = EXAMPLE_TEXT
+
+        self.latency = latency
+        self.jitter = jitter
+        self.page_text = page_text
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.batch_seconds = batch_seconds
+        self.batch_error_rate = batch_error_rate
+        self.calls = 0
+        # Prefijos de sistema marcados con cache_control ya "escritos" en la caché
+        self._cached_prefixes = set()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.messages = FakeMessages(self)
+        self.messages.batches = FakeBatches(self)
+
+    def _next_delay(self):
+        with self._lock:
+            return self.latency + self._random.uniform(-self.jitter, self.jitter)
+
+    def _respond(self, model, max_tokens, messages, system=None, tools=None):
+        blocks = _system_blocks(system)
+        system_text = "\n".join(block.get("text", "") for block in blocks)
+
+        tool_block = None
+        stop_reason = "end_turn"
+        if tools and not _has_image(messages):
+            # Respuesta con la herramienta; el JSON se corta si no cabe en max_tokens
+            text = self.structure_response(_request_text(messages))
+            stop_reason = "tool_use"
+            raw_json = text
+            if estimate_tokens(text) > max_tokens:
+                stop_reason = "max_tokens"
+                raw_json = text[:max_tokens * 4]
+            tool_block = FakeToolUseBlock(id=f"toolu_fake_{self.calls:06d}", name=tools[0]["name"],
+                                          input=json.loads(text) if raw_json == text else {},
+                                          raw_json=raw_json)
+        elif _has_image(messages) and SINGLE_PASS_TAG in system_text:
+            text = self.single_pass_response(self.extracted_text(messages))
+        elif _has_image(messages):
+            text = self.extracted_text(messages)
+        else:
+            text = self.structure_response(_request_text(messages))
+
+        # Caché de prompts simulada: el prefijo de sistema hasta el último bloque
+        # con cache_control se cobra como escritura la primera vez y como
+        # lectura las siguientes
+        cached_tokens = 0
+        prefix = None
+        marked = [i for i, block in enumerate(blocks) if block.get("cache_control")]
+        if marked:
+            prefix = "\n".join(block.get("text", "") for block in blocks[:marked[-1] + 1])
+            cached_tokens = estimate_tokens(prefix)
+        uncached_text = system_text[len(prefix):] if prefix else system_text
+
+        with self._lock:
+            self.calls += 1
+            cache_hit = prefix is not None and prefix in self._cached_prefixes
+            if prefix is not None:
+                self._cached_prefixes.add(prefix)
+
+        usage = FakeUsage(
+            input_tokens=estimate_tokens(uncached_text + _request_text(messages)),
+            output_tokens=min(max_tokens, estimate_tokens(text)),
+        )
+        if cache_hit:
+            usage.cache_read_input_tokens = cached_tokens
+        elif prefix is not None:
+            usage.cache_creation_input_tokens = cached_tokens
+
+        content = [tool_block] if tool_block is not None else [FakeTextBlock(text=text)]
+        return FakeMessage(content=content, usage=usage, model=model, stop_reason=stop_reason)
+
+    def extracted_text(self, messages):
+        """
+        Texto que devuelve la "extracción" de la imagen de una petición
+        """
+        if callable(self.page_text):
+            return self.page_text(_image_data(messages))
+        return self.page_text
+
+    def single_pass_response(self, page_text=None):
+        """
+        Respuesta del modo de una llamada: transcripción y JSON entre etiquetas
+        """
+        if page_text is None:
+            page_text = self.page_text
+        return (f"<transcripcion>\n{page_text}\n</transcripcion>\n<estructura>\n"
+                f"{self.structure_response(page_text)}\n</estructura>")
+
+    def structure_response(self, prompt):
+        """
+        Genera la respuesta JSON de estructuración usando el análisis por patrones
+
+        Args:
+            prompt: Prompt de estructuración enviado por structure_text_with_claude
+
+        Returns:
+            str: JSON con 'metadata' y 'content'
+        """
+        from process_ocr import generate_basic_structure
+
+        text = prompt
+        if STRUCTURE_TEXT_MARKER in text:
+            text = text.split(STRUCTURE_TEXT_MARKER, 1)[1]
+            text = text.split(STRUCTURE_TEXT_END, 1)[0]
+
+        return json.dumps(generate_basic_structure(text), ensure_ascii=False)
+
+
+class FakeAsyncAnthropic(FakeAnthropic):
+    """
+    Cliente falso compatible con anthropic.AsyncAnthropic
+
+    Acepta los mismos argumentos que FakeAnthropic; la latencia se simula con
+    asyncio.sleep, así que varias peticiones pueden estar en curso a la vez.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.messages = FakeAsyncMessages(self)
+
+
+class _FakeAPIHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 para que los clientes puedan reutilizar la conexión (keep-alive)
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.fake.record_connection()
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        batches = self.server.fake.backend.messages.batches
+        parts = path.strip("/").split("/")
+        if parts[:3] != ["v1", "messages", "batches"] or len(parts) not in (4, 5):
+            self._send_json(404, {"type": "error",
+                                  "error": {"type": "not_found_error", "message": path}})
+            return
+        try:
+            if len(parts) == 4:
+                self._send_json(200, batches.batch_data(parts[3], self._results_url(parts[3])))
+                return
+            entries = batches.result_entries(parts[3])
+        except (KeyError, ValueError) as exc:
+            self._send_json(404, {"type": "error",
+                                  "error": {"type": "not_found_error", "message": str(exc)}})
+            return
+
+        lines = []
+        for entry in entries:
+            result = dict(entry["result"])
+            if "message" in result:
+                result["message"] = result["message"].to_dict(self.server.fake.next_message_id())
+            lines.append(json.dumps({"custom_id": entry["custom_id"], "result": result},
+                                    ensure_ascii=False))
+        body = ("\n".join(lines) + "\n").encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/binary")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _results_url(self, batch_id):
+        return f"{self.server.fake.base_url}/v1/messages/batches/{batch_id}/results"
+
+    def _handle_batch_post(self, path, payload):
+        batches = self.server.fake.backend.messages.batches
+        parts = path.strip("/").split("/")
+        try:
+            if len(parts) == 3:
+                batch = batches.create(payload["requests"])
+            elif len(parts) == 5 and parts[4] == "cancel":
+                batch = batches.cancel(parts[3])
+            else:
+                raise KeyError(path)
+            self._send_json(200, batches.batch_data(batch.id, self._results_url(batch.id)))
+        except KeyError as exc:
+            self._send_json(404, {"type": "error",
+                                  "error": {"type": "not_found_error", "message": str(exc)}})
+        except ValueError as exc:
+            self._send_json(400, {"type": "error",
+                                  "error": {"type": "invalid_request_error", "message": str(exc)}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+
+        if self.path.split("?")[0].startswith("/v1/messages/batches"):
+            self._handle_batch_post(self.path.split("?")[0], payload)
+            return
+
+        if self.path.split("?")[0] != "/v1/messages":
+            self._send_json(404, {"type": "error",
+                                  "error": {"type": "not_found_error", "message": self.path}})
+            return
+
+        throttle = self.server.fake.check_throttle()
+        if throttle is not None:
+            status, error_type, headers = throttle
+            self._send_json(status, {"type": "error",
+                                     "error": {"type": error_type, "message": "Simulado"}}, headers)
+            return
+
+        backend = self.server.fake.backend
+        delay = backend._next_delay()
+        if delay > 0:
+            time.sleep(delay)
+        message = backend._respond(payload["model"], payload["max_tokens"], payload["messages"],
+                                   payload.get("system"), payload.get("tools"))
+        message_id = self.server.fake.next_message_id()
+
+        if payload.get("stream"):
+            self._send_stream(message_events(message, message_id, backend.chunk_size), backend)
+        else:
+            self._send_json(200, message.to_dict(message_id))
+
+    def _send_stream(self, events, backend):
+        """
+        Envía los eventos como SSE, igual que la API con stream=true
+        """
+        # Sin Content-Length: el fin de la respuesta lo marca el cierre de la conexión
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for name, data in events:
+            if name == "content_block_delta" and backend.chunk_delay > 0:
+                time.sleep(backend.chunk_delay)
+            self.wfile.write(f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+                             .encode("utf-8"))
+            self.wfile.flush()
+        self.close_connection = True
+
+    def _send_json(self, status, data, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeAnthropicServer:
+    """
+    Servidor HTTP local que responde como la API de mensajes de Anthropic
+
+    Puede simular los límites de la API para probar reintentos: por encima de
+    rpm_limit peticiones en los últimos 60 s responde 429 con retry-after, y
+    una fracción overload_rate de las peticiones recibe 529 (sobrecarga).
+
+    Args:
+        host: Dirección en la que escuchar
+        port: Puerto (0 elige uno libre)
+        rpm_limit: Peticiones por minuto aceptadas (None: sin límite)
+        overload_rate: Probabilidad de responder 529 a una petición
+        **client_kwargs: Argumentos de FakeAnthropic (latency, jitter, page_text, seed,
+                         batch_seconds, batch_error_rate)
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, rpm_limit=None, overload_rate=0.0,
+                 **client_kwargs):
+        self.backend = FakeAnthropic(**client_kwargs)
+        self.rpm_limit = rpm_limit
+        self.overload_rate = overload_rate
+        self.throttled = 0
+        self.overloaded = 0
+        self._recent = deque()
+        self._random = random.Random(client_kwargs.get("seed"))
+        self.connections = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.httpd = ThreadingHTTPServer((host, port), _FakeAPIHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.fake = self
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def check_throttle(self):
+        """
+        Decide si una petición se rechaza por límite de ritmo o sobrecarga
+
+        Returns:
+            tuple: (código HTTP, tipo de error, cabeceras), o None si se atiende
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self.rpm_limit:
+                while self._recent and now - self._recent[0] >= 60:
+                    self._recent.popleft()
+                if len(self._recent) >= self.rpm_limit:
+                    self.throttled += 1
+                    retry_after = max(1, math.ceil(self._recent[0] + 60 - now))
+                    return 429, "rate_limit_error", {"retry-after": str(retry_after)}
+                self._recent.append(now)
+            if self.overload_rate and self._random.random() < self.overload_rate:
+                self.overloaded += 1
+                return 529, "overloaded_error", {}
+        return None
+
+    def next_message_id(self):
+        with self._lock:
+            return f"msg_fake_{next(self._ids):06d}"
+
+    def start(self):
+        """
+        Atiende peticiones en un hilo en segundo plano
+        """
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor local falso de la API de Anthropic")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5,
+                        help="Latencia simulada por petición, en segundos")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="Variación aleatoria de la latencia, en segundos")
+    parser.add_argument("--rpm-limit", type=int,
+                        help="Responder 429 por encima de estas peticiones por minuto")
+    parser.add_argument("--overload-rate", type=float, default=0.0,
+                        help="Fracción de peticiones que reciben 529 (sobrecarga)")
+    parser.add_argument("--batch-seconds", type=float, default=5.0,
+                        help="Segundos que tarda en terminar un lote de /v1/messages/batches")
+    parser.add_argument("--batch-error-rate", type=float, default=0.0,
+                        help="Fracción de las peticiones de un lote que terminan con error")
+    args = parser.parse_args(argv)
+
+    server = FakeAnthropicServer(args.host, args.port, rpm_limit=args.rpm_limit,
+                                 overload_rate=args.overload_rate, latency=args.latency,
+                                 jitter=args.jitter, batch_seconds=args.batch_seconds,
+                                 batch_error_rate=args.batch_error_rate)
+    print(f"🧪 API falsa escuchando en {server.base_url} (latencia {args.latency}s)")
+    print(f"   export ANTHROPIC_BASE_URL={server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
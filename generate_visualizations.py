@@ -1,101 +1,572 @@
 #!/usr/bin/env python3
 """
 Script para generar visualizaciones del análisis OCR de El Martillo
+
+Es el único renderizador de los gráficos: también lo usa el paso 3 de
+process_ocr.py (render_visualizations). Para que escale a corpus grandes:
+- Los datos de cada gráfico se agregan primero con operaciones vectorizadas
+  de pandas/numpy (conteos por tipo, longitudes, estadísticas), y solo esos
+  agregados, que son pequeños, llegan a matplotlib
+- Con muchas filas, el gráfico de longitudes pasa de una barra por fila a
+  las N más largas (top) o a un histograma
+- Los gráficos se dibujan en paralelo en procesos aparte
+- Un gráfico no se vuelve a dibujar si su imagen existe y el hash de sus
+  datos y opciones no cambió (se guarda en .visualizations.json)
+- Opcionalmente se generan en SVG o como vista previa de baja resolución
+- Con --stats, los conteos, las estadísticas y el histograma salen de los
+  agregados incrementales de corpus_stats.py, sin leer las filas (solo hacen
+  falta para el gráfico de una barra por fila o de las N más largas)
+
+Siempre dibuja con el backend no interactivo Agg, y el estilo se aplica solo
+mientras se dibuja (sin tocar los rcParams globales del proceso).
+
+Ejemplo:
+    python3 generate_visualizations.py --csv data/el_martillo/el_martillo_1609_structured.csv
+    python3 generate_visualizations.py --preview --length-mode histogram
+    python3 generate_visualizations.py --stats data/el_martillo/lote/estadisticas.sqlite
 """
 
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-
-# Configurar estilo
-sns.set_style("whitegrid")
-plt.rcParams['figure.figsize'] = (10, 6)
-plt.rcParams['font.size'] = 10
-
-# Cargar datos
-df = pd.read_csv('data/el_martillo/el_martillo_1609_structured.csv')
-
-print(f"✅ Datos cargados: {len(df)} registros")
-
-# Visualización 1: Distribución de tipos de contenido
-fig, axes = plt.subplots(1, 2, figsize=(14, 5))
-
-# Gráfico de barras
-type_counts = df['type'].value_counts()
-axes[0].bar(type_counts.index, type_counts.values, color=['#2E86AB', '#A23B72'])
-axes[0].set_title('Distribución de Tipos de Contenido\nEl Martillo - Edición 1609',
-                   fontsize=12, fontweight='bold')
-axes[0].set_xlabel('Tipo de Contenido')
-axes[0].set_ylabel('Cantidad')
-axes[0].grid(axis='y', alpha=0.3)
-
-# Añadir valores en las barras
-for i, (tipo, valor) in enumerate(zip(type_counts.index, type_counts.values)):
-    axes[0].text(i, valor + 0.1, str(valor), ha='center', fontweight='bold')
-
-# Gráfico circular
-colors = ['#2E86AB', '#A23B72']
-axes[1].pie(type_counts.values, labels=type_counts.index, autopct='%1.1f%%',
-            startangle=90, colors=colors)
-axes[1].set_title('Proporción de Contenido\nArtículos vs Anuncios',
-                   fontsize=12, fontweight='bold')
-
-plt.tight_layout()
-plt.savefig('data/el_martillo/visualization_content_distribution.png', dpi=300, bbox_inches='tight')
-print("✅ Visualización 1 guardada: visualization_content_distribution.png")
-plt.close()
-
-# Visualización 2: Longitud de los textos extraídos
-df['text_length'] = df['text_excerpt'].str.len()
-
-plt.figure(figsize=(12, 6))
-bars = plt.barh(range(len(df)), df['text_length'], color='#F18F01')
-plt.yticks(range(len(df)), [f"{row['headline'][:35]}..." if len(row['headline']) > 35
-                             else row['headline'] for _, row in df.iterrows()], fontsize=9)
-plt.xlabel('Longitud del texto (caracteres)', fontsize=10)
-plt.title('Longitud de los Textos Extraídos por Sección\nEl Martillo - Edición 1609',
-          fontsize=12, fontweight='bold')
-plt.grid(axis='x', alpha=0.3)
-
-# Añadir valores en las barras
-for i, (bar, length) in enumerate(zip(bars, df['text_length'])):
-    plt.text(length + 5, i, str(length), va='center', fontsize=8)
-
-plt.tight_layout()
-plt.savefig('data/el_martillo/visualization_text_lengths.png', dpi=300, bbox_inches='tight')
-print("✅ Visualización 2 guardada: visualization_text_lengths.png")
-plt.close()
-
-# Visualización 3: Estadísticas generales
-fig, ax = plt.subplots(figsize=(10, 6))
-
-stats = {
-    'Total de elementos': len(df),
-    'Artículos': len(df[df['type'] == 'artículo']),
-    'Anuncios': len(df[df['type'] == 'anuncio']),
-    'Promedio caracteres': int(df['text_length'].mean()),
-    'Total caracteres': df['text_length'].sum()
-}
-
-y_pos = range(len(stats))
-values = list(stats.values())
-
-bars = ax.barh(y_pos, values, color=['#06AED5', '#086788', '#DD1C1A', '#F0A202', '#2E86AB'])
-ax.set_yticks(y_pos)
-ax.set_yticklabels(stats.keys())
-ax.set_xlabel('Valor', fontsize=10)
-ax.set_title('Estadísticas Generales del Análisis\nEl Martillo - Edición 1609',
-             fontsize=12, fontweight='bold')
-ax.grid(axis='x', alpha=0.3)
-
-# Añadir valores
-for i, (bar, val) in enumerate(zip(bars, values)):
-    ax.text(val + max(values)*0.02, i, str(val), va='center', fontsize=9, fontweight='bold')
-
-plt.tight_layout()
-plt.savefig('data/el_martillo/visualization_statistics.png', dpi=300, bbox_inches='tight')
-print("✅ Visualización 3 guardada: visualization_statistics.png")
-plt.close()
-
-print("\n📊 Todas las visualizaciones han sido generadas exitosamente")
-print(f"📁 Ubicación: data/el_martillo/")
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from instrumentation import Span, get_tracer
+from response_cache import make_key
+
+DEFAULT_CSV_PATH = 'data/el_martillo/el_martillo_1609_structured.csv'
+# Almacén Parquet: si existe, se leen de él solo las columnas y la edición que se grafican
+DEFAULT_STORE_DIR = 'data/el_martillo/corpus_parquet'
+DEFAULT_OUTPUT_DIR = 'data/el_martillo/'
+DEFAULT_ISSUE_NUMBER = 1609
+
+PLOT_RC = {'figure.figsize': (10, 6), 'font.size': 10}
+
+FORMATS = ("png", "svg")
+DEFAULT_DPI = 300
+PREVIEW_DPI = 72
+
+# Gráfico de longitudes: una barra por fila hasta MAX_ROW_BARS filas; con más,
+# las TOP_N más largas o un histograma de BINS intervalos
+LENGTH_MODES = ("auto", "rows", "top", "histogram")
+MAX_ROW_BARS = 40
+DEFAULT_TOP_N = 30
+DEFAULT_BINS = 30
+HEADLINE_LABEL_CHARS = 35
+
+DEFAULT_WORKERS = 3
+# Registro de los hashes de los gráficos ya dibujados, en el directorio de salida
+RENDER_STATE_NAME = ".visualizations.json"
+# Cambiarlo invalida los gráficos ya dibujados (cambios en el código de dibujo)
+RENDER_VERSION = 2
+
+
+def load_pyplot():
+    """
+    Importa matplotlib.pyplot con el backend Agg (sin pantalla ni ventanas)
+
+    Returns:
+        module: matplotlib.pyplot
+    """
+    import matplotlib
+    matplotlib.use("Agg", force=True)
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def plot_style():
+    """
+    rcParams del estilo de los gráficos (whitegrid de seaborn y tamaños por defecto)
+    """
+    import seaborn as sns
+    return {**sns.axes_style("whitegrid"), **PLOT_RC}
+
+
+def load_visualization_data(csv_path=DEFAULT_CSV_PATH, store_dir=DEFAULT_STORE_DIR,
+                            issue_number=DEFAULT_ISSUE_NUMBER):
+    """
+    Carga las filas a graficar: del almacén Parquet si existe, si no del CSV
+
+    Returns:
+        pd.DataFrame: Filas con headline, type y text_excerpt
+    """
+    if store_dir and os.path.isdir(store_dir):
+        from corpus_store import CorpusStore
+        df = CorpusStore(store_dir).read(columns=['headline', 'type', 'text_excerpt'],
+                                         filters=[('issue_number', '=', issue_number)])
+        df['type'] = df['type'].astype(str)
+        return df
+
+    import pandas as pd
+    return pd.read_csv(csv_path, usecols=['headline', 'type', 'text_excerpt'])
+
+
+def headline_labels(headlines):
+    """
+    Titulares recortados a HEADLINE_LABEL_CHARS caracteres para las etiquetas
+
+    Args:
+        headlines: pd.Series de titulares
+
+    Returns:
+        list: Etiquetas, con "..." en las recortadas
+    """
+    headlines = headlines.fillna('').astype(str)
+    long = headlines.str.len() > HEADLINE_LABEL_CHARS
+    return headlines.where(~long, headlines.str.slice(0, HEADLINE_LABEL_CHARS) + "...").tolist()
+
+
+def text_length_data(df, lengths, mode="auto", top_n=DEFAULT_TOP_N, bins=DEFAULT_BINS):
+    """
+    Datos del gráfico de longitudes según el modo
+
+    Args:
+        df: DataFrame con headline
+        lengths: pd.Series de longitudes (mismo índice que df)
+        mode: "rows" (una barra por fila), "top" (las top_n más largas),
+              "histogram" o "auto" (rows hasta MAX_ROW_BARS filas, si no histogram)
+        top_n: Barras del modo top
+        bins: Intervalos del histograma
+
+    Returns:
+        dict: Datos del gráfico (modo, etiquetas y valores, o bordes y conteos)
+    """
+    import numpy as np
+
+    mode = resolve_length_mode(mode, len(df))
+
+    if mode == "histogram":
+        counts, edges = np.histogram(lengths.to_numpy(), bins=bins) if len(lengths) else ([], [0, 1])
+        return {"mode": mode, "rows": len(df), "counts": [int(c) for c in counts],
+                "edges": [float(e) for e in edges]}
+
+    if mode == "top":
+        # nlargest no ordena todo el corpus, solo las top_n
+        lengths = lengths.nlargest(top_n)
+    return {"mode": mode, "rows": len(df),
+            "labels": headline_labels(df['headline'].loc[lengths.index]),
+            "values": [int(v) for v in lengths]}
+
+
+def summarize_for_plots(df, length_mode="auto", top_n=DEFAULT_TOP_N, bins=DEFAULT_BINS):
+    """
+    Agrega el DataFrame en los datos (pequeños) de cada gráfico
+
+    Todo es vectorizado: un value_counts para los tipos y una sola pasada de
+    str.len para las longitudes, sin recorrer las filas ni filtrar el
+    DataFrame por cada estadística.
+
+    Args:
+        df: DataFrame con headline, type y text_excerpt
+        length_mode: Modo del gráfico de longitudes (ver text_length_data)
+        top_n: Barras del modo top
+        bins: Intervalos del histograma
+
+    Returns:
+        dict: {nombre del gráfico: datos serializables}
+    """
+    lengths = df['text_excerpt'].fillna('').astype(str).str.len()
+    type_counts = df['type'].value_counts()
+
+    return {
+        "content_distribution": {
+            "labels": [str(label) for label in type_counts.index],
+            "counts": [int(count) for count in type_counts.values],
+        },
+        "text_lengths": text_length_data(df, lengths, length_mode, top_n, bins),
+        "statistics": {
+            "labels": ['Total de elementos', 'Artículos', 'Anuncios',
+                       'Promedio caracteres', 'Total caracteres'],
+            "values": [len(df), int(type_counts.get('artículo', 0)),
+                       int(type_counts.get('anuncio', 0)),
+                       int(lengths.mean()) if len(lengths) else 0, int(lengths.sum())],
+        },
+    }
+
+
+def resolve_length_mode(mode, rows):
+    """
+    Modo efectivo del gráfico de longitudes ("auto" según el número de filas)
+    """
+    if mode == "auto":
+        return "rows" if rows <= MAX_ROW_BARS else "histogram"
+    return mode
+
+
+def histogram_from_bins(length_bins, bin_chars, rows, bins=DEFAULT_BINS):
+    """
+    Histograma de longitudes a partir de los intervalos fijos de corpus_stats.py
+
+    Los intervalos contiguos se agrupan para no pasar de bins barras.
+
+    Args:
+        length_bins: {inicio del intervalo: elementos}
+        bin_chars: Ancho de cada intervalo
+        rows: Elementos en total
+        bins: Barras como máximo
+
+    Returns:
+        dict: Datos del gráfico en modo histogram (como text_length_data)
+    """
+    if not length_bins:
+        return {"mode": "histogram", "rows": rows, "counts": [], "edges": [0.0, 1.0]}
+    first = min(length_bins)
+    span_bins = (max(length_bins) - first) // bin_chars + 1
+    group = -(-span_bins // bins)
+    counts = [0] * -(-span_bins // group)
+    for start, count in length_bins.items():
+        counts[(start - first) // bin_chars // group] += count
+    edges = [float(first + index * group * bin_chars) for index in range(len(counts) + 1)]
+    return {"mode": "histogram", "rows": rows, "counts": counts, "edges": edges}
+
+
+def summary_for_plots(summary, df=None, length_mode="auto", top_n=DEFAULT_TOP_N,
+                      bins=DEFAULT_BINS):
+    """
+    Datos de cada gráfico a partir de un resumen de corpus_stats.CorpusStats
+
+    Es lo mismo que summarize_for_plots sin recorrer las filas; el histograma
+    usa los intervalos fijos del resumen.
+
+    Args:
+        summary: CorpusStats.summary() del ámbito a graficar
+        df: DataFrame con headline y text_excerpt; solo hace falta si el modo
+            de longitudes es "rows" o "top"
+        length_mode: Modo del gráfico de longitudes (ver text_length_data)
+        top_n: Barras del modo top
+        bins: Barras del histograma como máximo
+
+    Returns:
+        dict: {nombre del gráfico: datos serializables}
+    """
+    types = summary["types"]
+    length_mode = resolve_length_mode(length_mode, summary["items"])
+    if length_mode == "histogram":
+        text_lengths = histogram_from_bins(summary["length_bins"], summary["length_bin_chars"],
+                                           summary["items"], bins)
+    elif df is None:
+        raise ValueError(f"El gráfico de longitudes en modo {length_mode} necesita las filas")
+    else:
+        lengths = df['text_excerpt'].fillna('').astype(str).str.len()
+        text_lengths = text_length_data(df, lengths, length_mode, top_n, bins)
+
+    return {
+        "content_distribution": {
+            "labels": list(types),
+            "counts": list(types.values()),
+        },
+        "text_lengths": text_lengths,
+        "statistics": {
+            "labels": ['Total de elementos', 'Artículos', 'Anuncios',
+                       'Promedio caracteres', 'Total caracteres'],
+            "values": [summary["items"], types.get('artículo', 0), types.get('anuncio', 0),
+                       int(summary["mean_chars"]), summary["chars"]],
+        },
+    }
+
+
+def plot_content_distribution(plt, data):
+    """
+    Visualización 1: distribución de tipos de contenido (barras y circular)
+    """
+    fig, axes = plt.subplots(1, 2, figsize=(14, 5))
+
+    # Gráfico de barras
+    axes[0].bar(data['labels'], data['counts'], color=['#2E86AB', '#A23B72'])
+    axes[0].set_title('Distribución de Tipos de Contenido\nEl Martillo - Edición 1609',
+                      fontsize=12, fontweight='bold')
+    axes[0].set_xlabel('Tipo de Contenido')
+    axes[0].set_ylabel('Cantidad')
+    axes[0].grid(axis='y', alpha=0.3)
+
+    # Añadir valores en las barras
+    for i, valor in enumerate(data['counts']):
+        axes[0].text(i, valor + 0.1, str(valor), ha='center', fontweight='bold')
+
+    # Gráfico circular
+    colors = ['#2E86AB', '#A23B72']
+    axes[1].pie(data['counts'], labels=data['labels'], autopct='%1.1f%%',
+                startangle=90, colors=colors)
+    axes[1].set_title('Proporción de Contenido\nArtículos vs Anuncios',
+                      fontsize=12, fontweight='bold')
+
+
+def plot_text_lengths(plt, data):
+    """
+    Visualización 2: longitud de los textos extraídos (por fila, top N o histograma)
+    """
+    fig, ax = plt.subplots(figsize=(12, 6))
+
+    if data['mode'] == "histogram":
+        edges = data['edges']
+        widths = [right - left for left, right in zip(edges, edges[1:])]
+        ax.bar(edges[:-1], data['counts'], width=widths, align='edge', color='#F18F01',
+               edgecolor='white')
+        ax.set_xlabel('Longitud del texto (caracteres)', fontsize=10)
+        ax.set_ylabel('Cantidad de textos', fontsize=10)
+        ax.set_title(f"Distribución de la Longitud de los Textos ({data['rows']} textos)\n"
+                     f"El Martillo - Edición 1609", fontsize=12, fontweight='bold')
+        ax.grid(axis='y', alpha=0.3)
+        return
+
+    positions = range(len(data['values']))
+    ax.barh(positions, data['values'], color='#F18F01')
+    ax.set_yticks(positions)
+    ax.set_yticklabels(data['labels'], fontsize=9)
+    ax.set_xlabel('Longitud del texto (caracteres)', fontsize=10)
+    if data['mode'] == "top":
+        title = f"Los {len(data['values'])} Textos Más Largos (de {data['rows']})"
+    else:
+        title = 'Longitud de los Textos Extraídos por Sección'
+    ax.set_title(f"{title}\nEl Martillo - Edición 1609", fontsize=12, fontweight='bold')
+    ax.grid(axis='x', alpha=0.3)
+
+    # Añadir valores en las barras
+    for i, length in enumerate(data['values']):
+        ax.text(length + 5, i, str(length), va='center', fontsize=8)
+
+
+def plot_statistics(plt, data):
+    """
+    Visualización 3: estadísticas generales del análisis
+    """
+    fig, ax = plt.subplots(figsize=(10, 6))
+
+    y_pos = range(len(data['values']))
+    values = data['values']
+
+    ax.barh(y_pos, values, color=['#06AED5', '#086788', '#DD1C1A', '#F0A202', '#2E86AB'])
+    ax.set_yticks(y_pos)
+    ax.set_yticklabels(data['labels'])
+    ax.set_xlabel('Valor', fontsize=10)
+    ax.set_title('Estadísticas Generales del Análisis\nEl Martillo - Edición 1609',
+                 fontsize=12, fontweight='bold')
+    ax.grid(axis='x', alpha=0.3)
+
+    # Añadir valores
+    for i, val in enumerate(values):
+        ax.text(val + max(values)*0.02, i, str(val), va='center', fontsize=9, fontweight='bold')
+
+
+# Visualizaciones del análisis: (nombre, descripción, función, archivo sin extensión)
+FIGURES = (
+    ("content_distribution", "Distribución de contenido", plot_content_distribution,
+     'visualization_content_distribution'),
+    ("text_lengths", "Longitud de textos", plot_text_lengths, 'visualization_text_lengths'),
+    ("statistics", "Estadísticas generales", plot_statistics, 'visualization_statistics'),
+)
+PLOTTERS = {name: plot for name, _, plot, _ in FIGURES}
+
+
+def render_figure(name, data, path, dpi):
+    """
+    Dibuja y guarda un gráfico (se ejecuta en un proceso del pool)
+
+    Args:
+        name: Nombre del gráfico en FIGURES
+        data: Datos de summarize_for_plots
+        path: Imagen de salida (.png o .svg)
+        dpi: Resolución
+
+    Returns:
+        dict: Segundos de reloj y de CPU, y bytes escritos
+    """
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    plt = load_pyplot()
+    with plt.rc_context(plot_style()):
+        PLOTTERS[name](plt, data)
+        plt.tight_layout()
+        plt.savefig(path, dpi=dpi, bbox_inches='tight')
+        plt.close()
+    return {"wall_seconds": time.perf_counter() - wall_start,
+            "cpu_seconds": time.process_time() - cpu_start,
+            "output_bytes": os.path.getsize(path)}
+
+
+def figure_hash(name, data, fmt, dpi):
+    """
+    Hash del contenido de un gráfico: datos agregados, formato, resolución y versión
+    """
+    return make_key("render", RENDER_VERSION, name, fmt, dpi,
+                    json.dumps(data, ensure_ascii=False, sort_keys=True))
+
+
+def load_render_state(output_dir):
+    try:
+        with open(os.path.join(output_dir, RENDER_STATE_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_render_state(output_dir, state):
+    path = os.path.join(output_dir, RENDER_STATE_NAME)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def record_render_span(name, rows, metrics):
+    """
+    Registra en el Tracer del proceso el tramo "render" medido en un proceso del pool
+    """
+    current = Span("render", {"figure": name, "rows": rows})
+    current.wall_seconds = metrics["wall_seconds"]
+    current.cpu_seconds = metrics["cpu_seconds"]
+    current.output_bytes = metrics["output_bytes"]
+    get_tracer().record(current)
+
+
+def render_visualizations(df, output_dir=DEFAULT_OUTPUT_DIR, fmt="png", preview=False, dpi=None,
+                          length_mode="auto", top_n=DEFAULT_TOP_N, bins=DEFAULT_BINS,
+                          workers=DEFAULT_WORKERS, force=False, summary=None):
+    """
+    Genera las tres visualizaciones del análisis
+
+    Solo se dibujan los gráficos cuyo hash cambió (o cuya imagen falta). Cada
+    gráfico dibujado se registra como un tramo "render" de instrumentation.py.
+
+    Args:
+        df: DataFrame con headline, type y text_excerpt
+        output_dir: Directorio donde guardar las imágenes
+        fmt: "png" o "svg"
+        preview: Vista previa de baja resolución (PREVIEW_DPI)
+        dpi: Resolución explícita (por defecto DEFAULT_DPI, o PREVIEW_DPI con preview)
+        length_mode: Modo del gráfico de longitudes (ver text_length_data)
+        top_n: Barras del modo top
+        bins: Intervalos del histograma
+        workers: Procesos para dibujar en paralelo, como mucho uno por núcleo
+                 (1: en este proceso)
+        force: Dibujar aunque el hash no haya cambiado
+        summary: Resumen de corpus_stats.CorpusStats opcional; si se indica, los
+                 datos salen de él y df solo se usa para los modos rows y top
+
+    Returns:
+        list: Rutas de las imágenes (generadas o ya al día)
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato no soportado: {fmt} (opciones: {', '.join(FORMATS)})")
+    dpi = dpi or (PREVIEW_DPI if preview else DEFAULT_DPI)
+    os.makedirs(output_dir, exist_ok=True)
+
+    if summary is not None:
+        figure_data = summary_for_plots(summary, df, length_mode, top_n, bins)
+        rows = summary["items"]
+    else:
+        figure_data = summarize_for_plots(df, length_mode, top_n, bins)
+        rows = len(df)
+    state = load_render_state(output_dir)
+
+    paths = []
+    pending = []
+    for number, (name, description, _, basename) in enumerate(FIGURES, start=1):
+        path = os.path.join(output_dir, f"{basename}.{fmt}")
+        paths.append(path)
+        digest = figure_hash(name, figure_data[name], fmt, dpi)
+        if not force and state.get(os.path.basename(path)) == digest and os.path.exists(path):
+            print(f"\n⏭️  Visualización {number} sin cambios: {path}")
+            continue
+        print(f"\n📊 Generando visualización {number}: {description}...")
+        pending.append((name, path, digest))
+
+    # Más procesos que núcleos solo suma el costo de arrancarlos (cada uno importa matplotlib)
+    workers = min(workers, len(pending), os.cpu_count() or 1)
+    if workers > 1:
+        # spawn y no fork: el proceso que llama puede tener hilos (lotes, cliente HTTP)
+        import multiprocessing
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            futures = [pool.submit(render_figure, name, figure_data[name], path, dpi)
+                       for name, path, _ in pending]
+            results = [future.result() for future in futures]
+    else:
+        results = [render_figure(name, figure_data[name], path, dpi) for name, path, _ in pending]
+
+    for (name, path, digest), metrics in zip(pending, results):
+        record_render_span(name, rows, metrics)
+        state[os.path.basename(path)] = digest
+        print(f"   ✅ Guardada: {path} ({metrics['wall_seconds']:.2f} s)")
+
+    if pending:
+        save_render_state(output_dir, state)
+    return paths
+
+
+def add_render_arguments(parser, format_flag="--format"):
+    """
+    Agrega al parser las opciones del renderizador
+
+    Args:
+        parser: ArgumentParser
+        format_flag: Nombre de la opción de formato
+    """
+    parser.add_argument(format_flag, dest="viz_format", choices=FORMATS, default="png",
+                        help="Formato de las imágenes (por defecto: png)")
+    parser.add_argument("--preview", action="store_true",
+                        help=f"Vista previa de baja resolución ({PREVIEW_DPI} dpi)")
+    parser.add_argument("--dpi", type=int,
+                        help=f"Resolución (por defecto: {DEFAULT_DPI}, o {PREVIEW_DPI} con --preview)")
+    parser.add_argument("--length-mode", choices=LENGTH_MODES, default="auto",
+                        help=f"Gráfico de longitudes: una barra por fila, las N más largas o "
+                             f"histograma (auto: por fila hasta {MAX_ROW_BARS} filas)")
+    parser.add_argument("--top-n", type=int, default=DEFAULT_TOP_N,
+                        help=f"Barras del modo top (por defecto: {DEFAULT_TOP_N})")
+    parser.add_argument("--render-workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"Procesos para dibujar en paralelo (por defecto: {DEFAULT_WORKERS})")
+    parser.add_argument("--force-render", action="store_true",
+                        help="Dibujar aunque los datos no hayan cambiado")
+
+
+def render_options_from_args(args):
+    """
+    Argumentos de render_visualizations a partir de las opciones del parser
+    """
+    return {"fmt": args.viz_format, "preview": args.preview, "dpi": args.dpi,
+            "length_mode": args.length_mode, "top_n": args.top_n,
+            "workers": args.render_workers, "force": args.force_render}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generar las visualizaciones del análisis OCR")
+    parser.add_argument("--csv", default=DEFAULT_CSV_PATH,
+                        help=f"CSV estructurado (por defecto: {DEFAULT_CSV_PATH})")
+    parser.add_argument("--store", default=DEFAULT_STORE_DIR,
+                        help="Almacén Parquet del que leer si existe (cadena vacía para usar el CSV)")
+    parser.add_argument("--issue", type=int, default=DEFAULT_ISSUE_NUMBER,
+                        help="Edición a graficar desde el almacén")
+    parser.add_argument("--stats", metavar="SQLITE",
+                        help="Graficar la edición desde las estadísticas incrementales "
+                             "(ver corpus_stats.py)")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR,
+                        help=f"Directorio de las imágenes (por defecto: {DEFAULT_OUTPUT_DIR})")
+    add_render_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    summary = None
+    df = None
+    if args.stats:
+        from corpus_stats import CorpusStats, issue_scope
+
+        with CorpusStats(args.stats) as stats:
+            summary = stats.summary(issue_scope(args.issue))
+        print(f"✅ Estadísticas de la edición {args.issue}: {summary['items']} registros "
+              f"en {summary['pages']} páginas")
+    if summary is None or resolve_length_mode(args.length_mode, summary["items"]) != "histogram":
+        df = load_visualization_data(args.csv, args.store, args.issue)
+        print(f"✅ Datos cargados: {len(df)} registros")
+
+    render_visualizations(df, args.output_dir, summary=summary, **render_options_from_args(args))
+
+    print("\n📊 Todas las visualizaciones han sido generadas exitosamente")
+    print(f"📁 Ubicación: {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
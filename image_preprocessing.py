@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Preprocesamiento de imágenes antes del OCR con Claude
+
+Un escaneo de 600 dpi de una página completa pesa decenas de MB, pero el
+modelo redimensiona internamente las imágenes cuyo lado largo supera ~1568 px
+(o ~1,15 megapíxeles), así que esa resolución extra solo encarece la petición.
+Este módulo reduce el tamaño enviado:
+1. Conversión a escala de grises
+2. Corrección de inclinación (deskew) por perfil de proyección
+3. Reducción adaptativa a la resolución útil del modelo
+4. Recodificación opcional en JPEG/WebP con una calidad objetivo
+
+Y reporta los bytes ahorrados y el tiempo de codificación de cada página.
+
+Ejemplo:
+    python3 image_preprocessing.py data/el_martillo/page_01.png --format jpeg --quality 80
+"""
+
+import argparse
+import base64
+import io
+import mimetypes
+import os
+import time
+from dataclasses import asdict, dataclass
+
+import numpy as np
+from PIL import Image, ImageOps
+
+# Resolución útil del modelo: lado largo máximo y número máximo de píxeles
+MAX_LONG_EDGE = 1568
+MAX_PIXELS = 1_150_000
+
+DEFAULT_QUALITY = 85
+MIN_QUALITY = 40
+
+# Búsqueda del ángulo de inclinación, en grados
+MAX_SKEW_ANGLE = 3.0
+SKEW_ANGLE_STEP = 0.25
+SKEW_ANALYSIS_WIDTH = 800
+# Mejora mínima de la varianza respecto a no rotar para aceptar un ángulo
+SKEW_MIN_GAIN = 1.05
+
+FORMAT_MEDIA_TYPES = {
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+    "PNG": "image/png",
+}
+
+
+@dataclass
+class PreprocessReport:
+    original_bytes: int
+    output_bytes: int
+    original_size: tuple
+    output_size: tuple
+    skew_angle: float
+    media_type: str
+    quality: int
+    encode_seconds: float
+
+    @property
+    def bytes_saved(self):
+        return self.original_bytes - self.output_bytes
+
+    @property
+    def reduction(self):
+        return self.bytes_saved / self.original_bytes if self.original_bytes else 0.0
+
+    def as_dict(self):
+        data = asdict(self)
+        data["bytes_saved"] = self.bytes_saved
+        data["reduction"] = self.reduction
+        return data
+
+
+def estimate_skew(image, max_angle=MAX_SKEW_ANGLE, step=SKEW_ANGLE_STEP):
+    """
+    Estima la inclinación del texto por perfil de proyección horizontal
+
+    Con el texto bien alineado, las filas alternan entre líneas de tinta y
+    espacios en blanco, y la varianza de la suma de tinta por fila es máxima.
+    Se prueba cada ángulo sobre una copia reducida de la imagen.
+
+    Args:
+        image: Imagen PIL en escala de grises
+        max_angle: Ángulo máximo a probar (en ambos sentidos), en grados
+        step: Paso entre ángulos, en grados
+
+    Returns:
+        float: Ángulo (en grados) que hay que rotar para enderezar la imagen
+    """
+    if image.width > SKEW_ANALYSIS_WIDTH:
+        height = max(1, round(image.height * SKEW_ANALYSIS_WIDTH / image.width))
+        image = image.resize((SKEW_ANALYSIS_WIDTH, height), Image.BILINEAR)
+
+    pixels = np.asarray(image, dtype=np.uint8)
+    # Tinta = píxeles más oscuros que el umbral (media menos una desviación)
+    threshold = pixels.mean() - pixels.std()
+    ink = Image.fromarray(((pixels < threshold) * 255).astype(np.uint8))
+
+    def score(angle):
+        rotated = np.asarray(ink.rotate(angle, resample=Image.NEAREST, fillcolor=0))
+        return float(rotated.sum(axis=1, dtype=np.int64).var())
+
+    level_score = score(0.0)
+    best_angle, best_score = 0.0, level_score
+    for angle in np.arange(-max_angle, max_angle + step / 2, step):
+        angle_score = score(float(angle))
+        if angle_score > best_score:
+            best_angle, best_score = float(angle), angle_score
+
+    # Sin una mejora clara (páginas casi vacías, grabados) no se rota
+    if best_score < level_score * SKEW_MIN_GAIN:
+        return 0.0
+    return best_angle
+
+
+def adaptive_downscale(image, max_long_edge=MAX_LONG_EDGE, max_pixels=MAX_PIXELS):
+    """
+    Reduce la imagen hasta la resolución útil del modelo (nunca la amplía)
+
+    Args:
+        image: Imagen PIL
+        max_long_edge: Lado largo máximo en píxeles
+        max_pixels: Número máximo de píxeles
+
+    Returns:
+        Image: Imagen reducida (o la misma si ya cabe)
+    """
+    width, height = image.size
+    scale = min(1.0, max_long_edge / max(width, height), (max_pixels / (width * height)) ** 0.5)
+    if scale >= 1.0:
+        return image
+    new_size = (max(1, int(width * scale)), max(1, int(height * scale)))
+    return image.resize(new_size, Image.LANCZOS)
+
+
+def _encode(image, output_format, quality=DEFAULT_QUALITY):
+    buffer = io.BytesIO()
+    if output_format == "PNG":
+        image.save(buffer, format="PNG", optimize=True)
+    else:
+        image.save(buffer, format=output_format, quality=quality)
+    return buffer.getvalue()
+
+
+def preprocess_image(image_bytes, grayscale=True, deskew=True, max_long_edge=MAX_LONG_EDGE,
+                     max_pixels=MAX_PIXELS, output_format="JPEG", quality=DEFAULT_QUALITY,
+                     max_bytes=None):
+    """
+    Prepara una imagen de página para enviarla al modelo de visión
+
+    Args:
+        image_bytes: Contenido del archivo de imagen original
+        grayscale: Convertir a escala de grises
+        deskew: Corregir la inclinación
+        max_long_edge: Lado largo máximo en píxeles
+        max_pixels: Número máximo de píxeles
+        output_format: "JPEG", "WEBP" o "PNG"
+        quality: Calidad de codificación JPEG/WebP (1-95)
+        max_bytes: Tamaño máximo deseado; si se supera, se baja la calidad
+                   (hasta MIN_QUALITY) hasta cumplirlo
+
+    Si el resultado ocupa más que el original y este ya cabe en los límites
+    de píxeles, se devuelven los bytes y el media type originales.
+
+    Returns:
+        tuple: (bytes codificados, media type, PreprocessReport)
+    """
+    start = time.perf_counter()
+    output_format = output_format.upper()
+    if output_format == "JPG":
+        output_format = "JPEG"
+
+    image = Image.open(io.BytesIO(image_bytes))
+    original_size = image.size
+    original_format = image.format
+    image = ImageOps.exif_transpose(image)
+
+    if grayscale:
+        image = image.convert("L")
+    elif image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    skew_angle = 0.0
+    if deskew:
+        gray = image if image.mode == "L" else image.convert("L")
+        skew_angle = estimate_skew(gray)
+
+    # Reducir antes de rotar: la rotación a resolución completa es lo más caro
+    image = adaptive_downscale(image, max_long_edge, max_pixels)
+    if skew_angle:
+        # Sin expand para no superar el tamaño máximo (solo se pierden los márgenes)
+        fill = 255 if image.mode == "L" else (255, 255, 255)
+        image = image.rotate(skew_angle, resample=Image.BICUBIC, fillcolor=fill)
+
+    encoded = _encode(image, output_format, quality)
+    if max_bytes and output_format != "PNG":
+        while len(encoded) > max_bytes and quality > MIN_QUALITY:
+            quality = max(MIN_QUALITY, quality - 10)
+            encoded = _encode(image, output_format, quality)
+
+    # En páginas casi sin tonos grises (texto limpio) PNG puede comprimir mejor
+    if output_format != "PNG" and len(encoded) > len(image_bytes):
+        png_encoded = _encode(image, "PNG")
+        if len(png_encoded) < len(encoded):
+            encoded, output_format = png_encoded, "PNG"
+
+    # Si recodificar no ahorra nada y el original ya cabe, se envía tal cual
+    fits = (max(original_size) <= max_long_edge
+            and original_size[0] * original_size[1] <= max_pixels)
+    if fits and original_format in FORMAT_MEDIA_TYPES and len(encoded) >= len(image_bytes):
+        encoded, output_format = image_bytes, original_format
+        output_size = original_size
+    else:
+        output_size = image.size
+
+    report = PreprocessReport(
+        original_bytes=len(image_bytes),
+        output_bytes=len(encoded),
+        original_size=original_size,
+        output_size=output_size,
+        skew_angle=skew_angle,
+        media_type=FORMAT_MEDIA_TYPES[output_format],
+        quality=quality,
+        encode_seconds=time.perf_counter() - start,
+    )
+    return encoded, report.media_type, report
+
+
+def load_preprocessed_base64(image_path, **options):
+    """
+    Lee una imagen, la preprocesa y la codifica en base64
+
+    Args:
+        image_path: Ruta de la imagen
+        **options: Argumentos de preprocess_image
+
+    Returns:
+        tuple: (datos en base64, media type, PreprocessReport)
+    """
+    with open(image_path, "rb") as image_file:
+        image_bytes = image_file.read()
+    encoded, media_type, report = preprocess_image(image_bytes, **options)
+    return base64.standard_b64encode(encoded).decode("utf-8"), media_type, report
+
+
+def add_preprocess_arguments(parser):
+    """
+    Añade las opciones de preprocesamiento a un parser de argparse
+    """
+    parser.add_argument("--format", default="JPEG", choices=["JPEG", "WEBP", "PNG"],
+                        type=str.upper, help="Formato de salida (por defecto: JPEG)")
+    parser.add_argument("--quality", type=int, default=DEFAULT_QUALITY,
+                        help=f"Calidad JPEG/WebP (por defecto: {DEFAULT_QUALITY})")
+    parser.add_argument("--max-edge", type=int, default=MAX_LONG_EDGE,
+                        help=f"Lado largo máximo en píxeles (por defecto: {MAX_LONG_EDGE})")
+    parser.add_argument("--max-kb", type=int,
+                        help="Tamaño máximo deseado en KB (baja la calidad si hace falta)")
+    parser.add_argument("--color", action="store_true",
+                        help="Mantener el color (por defecto se convierte a grises)")
+    parser.add_argument("--no-deskew", action="store_true",
+                        help="No corregir la inclinación")
+
+
+def preprocess_options_from_args(args):
+    """
+    Convierte las opciones de add_preprocess_arguments en argumentos de preprocess_image
+    """
+    return {
+        "grayscale": not args.color,
+        "deskew": not args.no_deskew,
+        "max_long_edge": args.max_edge,
+        "output_format": args.format,
+        "quality": args.quality,
+        "max_bytes": args.max_kb * 1024 if args.max_kb else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Preprocesar imágenes de páginas para el OCR")
+    parser.add_argument("images", nargs="+", help="Imágenes a preprocesar")
+    parser.add_argument("--output-dir", help="Guardar las imágenes preprocesadas en este directorio")
+    add_preprocess_arguments(parser)
+    args = parser.parse_args(argv)
+
+    options = preprocess_options_from_args(args)
+    total_original = total_output = 0
+
+    for image_path in args.images:
+        with open(image_path, "rb") as image_file:
+            image_bytes = image_file.read()
+        encoded, media_type, report = preprocess_image(image_bytes, **options)
+        total_original += report.original_bytes
+        total_output += report.output_bytes
+
+        print(f"🖼️  {image_path}: {report.original_bytes / 1024:.0f} KB → "
+              f"{report.output_bytes / 1024:.0f} KB ({report.reduction:.0%} menos), "
+              f"{report.original_size[0]}x{report.original_size[1]} → "
+              f"{report.output_size[0]}x{report.output_size[1]}, "
+              f"inclinación {report.skew_angle:+.2f}°, {report.encode_seconds * 1000:.0f} ms")
+
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+            stem = os.path.splitext(os.path.basename(image_path))[0]
+            extension = mimetypes.guess_extension(media_type) or ".img"
+            with open(os.path.join(args.output_dir, stem + extension), "wb") as f:
+                f.write(encoded)
+
+    if total_original:
+        print(f"\n📊 Total: {total_original / 1024:.0f} KB → {total_output / 1024:.0f} KB "
+              f"({1 - total_output / total_original:.0%} menos)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+Instrumentación por etapa: tiempos, tokens y bytes enviados a la API
+
+Las etapas del flujo (extracción, estructuración, escritura de JSON/CSV y
+cada gráfico del paso 3) se envuelven en un tramo (span) que registra:
+- Tiempo de reloj y de CPU del hilo
+- Tokens de entrada, de salida y leídos/escritos en la caché de prompts
+  (message.usage)
+- Bytes de la petición (texto del prompt y la imagen en base64) y bytes
+  escritos en disco
+- Si la respuesta salió de la caché local (response_cache.py)
+
+Cada tramo se escribe como una línea de un archivo JSON lines (--trace), y
+los totales por etapa se exportan en el formato de texto de Prometheus
+(--metrics) para el textfile collector de node_exporter. Con --profile se
+perfila la página con cProfile.
+
+Sin configuración el proceso usa un Tracer que solo acumula los totales en
+memoria, así que las funciones instrumentadas no necesitan saber si hay traza:
+    with span("extract", page_id="p001") as s:
+        s.request_bytes = len(image_data)
+        message = client.messages.create(...)
+        s.record_usage(message.usage)
+
+Resumen de una traza:
+    python3 instrumentation.py data/el_martillo/traza.jsonl
+"""
+
+import argparse
+import io
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+METRIC_PREFIX = "el_martillo"
+PROFILE_TOP_FUNCTIONS = 15
+
+# Contadores acumulados por etapa: (nombre de la métrica, ayuda)
+COUNTERS = (
+    ("calls", "Tramos registrados"),
+    ("errors", "Tramos que terminaron con una excepción"),
+    ("wall_seconds", "Tiempo de reloj"),
+    ("cpu_seconds", "Tiempo de CPU del hilo"),
+    ("input_tokens", "Tokens de entrada (message.usage)"),
+    ("output_tokens", "Tokens de salida (message.usage)"),
+    ("cache_read_input_tokens", "Tokens de entrada leídos de la caché de prompts"),
+    ("cache_creation_input_tokens", "Tokens de entrada escritos en la caché de prompts"),
+    ("request_bytes", "Bytes del prompt y de las imágenes en base64 enviados a la API"),
+    ("output_bytes", "Bytes escritos en disco"),
+    ("cache_hits", "Respuestas servidas desde la caché local"),
+    ("cache_misses", "Consultas a la caché local sin respuesta guardada"),
+)
+USAGE_FIELDS = ("input_tokens", "output_tokens", "cache_read_input_tokens",
+                "cache_creation_input_tokens")
+
+
+def payload_bytes(request):
+    """
+    Bytes de texto e imágenes (base64) de una petición a messages.create
+
+    Se suman los bloques sin serializar la petición entera (una imagen en
+    base64 puede ocupar varios MB).
+
+    Args:
+        request: Argumentos de messages.create
+
+    Returns:
+        int: Bytes en UTF-8 del texto de los mensajes más los datos base64
+    """
+    total = 0
+    for message in request.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            total += len(content.encode("utf-8"))
+            continue
+        for block in content or []:
+            if block.get("type") == "text":
+                total += len(block["text"].encode("utf-8"))
+            elif block.get("source", {}).get("type") == "base64":
+                # base64 es ASCII: un carácter por byte
+                total += len(block["source"]["data"])
+    return total
+
+
+class Span:
+    """
+    Medición de una etapa; los campos se rellenan dentro del bloque with
+
+    Args:
+        stage: Nombre de la etapa ("extract", "structure", "write_json", ...)
+        attrs: Atributos que solo van a la traza (page_id, ruta, gráfico...)
+    """
+
+    def __init__(self, stage, attrs):
+        self.stage = stage
+        self.attrs = attrs
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache_read_input_tokens = 0
+        self.cache_creation_input_tokens = 0
+        self.request_bytes = 0
+        self.output_bytes = 0
+        self.cache_hit = None
+        self.error = None
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.started_at = time.time()
+
+    def record_usage(self, usage):
+        """
+        Suma el uso de tokens de una respuesta (objeto usage o diccionario)
+        """
+        if usage is None:
+            return
+        for name in USAGE_FIELDS:
+            value = usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
+            setattr(self, name, getattr(self, name) + (value or 0))
+
+    def record_file(self, path):
+        """
+        Suma el tamaño de un archivo escrito por la etapa
+        """
+        self.output_bytes += os.path.getsize(path)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def as_dict(self):
+        record = {
+            "ts": round(self.started_at, 6),
+            "stage": self.stage,
+            "wall_seconds": round(self.wall_seconds, 6),
+            "cpu_seconds": round(self.cpu_seconds, 6),
+            "thread": threading.current_thread().name,
+        }
+        for name in USAGE_FIELDS + ("request_bytes", "output_bytes"):
+            if getattr(self, name):
+                record[name] = getattr(self, name)
+        if self.cache_hit is not None:
+            record["cache_hit"] = self.cache_hit
+        if self.error is not None:
+            record["error"] = self.error
+        record.update(self.attrs)
+        return record
+
+
+class Tracer:
+    """
+    Acumula los tramos por etapa y, opcionalmente, los escribe en JSON lines
+
+    Es seguro entre hilos: los trabajadores de batch_ocr.py y los fragmentos
+    de chunked_structuring.py registran sus tramos en el mismo Tracer.
+
+    Args:
+        trace_path: Archivo .jsonl con un tramo por línea (None: sin traza)
+        metrics_path: Archivo .prom que escribe write_metrics() (None: sin métricas)
+    """
+
+    def __init__(self, trace_path=None, metrics_path=None):
+        self.trace_path = trace_path
+        self.metrics_path = metrics_path
+        self.totals = {}
+        self._lock = threading.Lock()
+        self._trace_file = None
+        if trace_path:
+            os.makedirs(os.path.dirname(trace_path) or ".", exist_ok=True)
+            self._trace_file = open(trace_path, "a", encoding="utf-8")
+
+    @contextmanager
+    def span(self, stage, **attrs):
+        """
+        Mide el bloque with como un tramo de la etapa indicada
+
+        Una excepción se registra en el tramo y se vuelve a lanzar.
+
+        Yields:
+            Span: Tramo en el que registrar tokens, bytes y aciertos de caché
+        """
+        current = Span(stage, attrs)
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield current
+        except BaseException as exc:
+            current.error = type(exc).__name__
+            raise
+        finally:
+            current.wall_seconds = time.perf_counter() - wall_start
+            current.cpu_seconds = time.thread_time() - cpu_start
+            self.record(current)
+
+    def record(self, current):
+        line = json.dumps(current.as_dict(), ensure_ascii=False) if self._trace_file else None
+        with self._lock:
+            totals = self.totals.setdefault(current.stage, dict.fromkeys(
+                (name for name, _ in COUNTERS), 0))
+            totals["calls"] += 1
+            totals["errors"] += current.error is not None
+            for name in ("wall_seconds", "cpu_seconds", "request_bytes", "output_bytes") + USAGE_FIELDS:
+                totals[name] += getattr(current, name)
+            if current.cache_hit is not None:
+                totals["cache_hits" if current.cache_hit else "cache_misses"] += 1
+            if line is not None:
+                self._trace_file.write(line + "\n")
+                self._trace_file.flush()
+
+    def summary(self):
+        """
+        Totales por etapa
+
+        Returns:
+            dict: {etapa: {contador: valor}}
+        """
+        with self._lock:
+            return {stage: dict(totals) for stage, totals in self.totals.items()}
+
+    def prometheus_text(self):
+        """
+        Totales por etapa en el formato de texto de Prometheus
+
+        Returns:
+            str: Una familia de métricas *_total por contador, con la etiqueta stage
+        """
+        summary = self.summary()
+        lines = []
+        for name, help_text in COUNTERS:
+            metric = f"{METRIC_PREFIX}_stage_{name}_total"
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            for stage in sorted(summary):
+                lines.append(f'{metric}{{stage="{stage}"}} {summary[stage][name]:g}')
+        return "\n".join(lines) + "\n"
+
+    def write_metrics(self, path=None):
+        """
+        Escribe las métricas de Prometheus de forma atómica
+
+        node_exporter puede leer el archivo en cualquier momento: se escribe
+        uno temporal y se reemplaza.
+
+        Args:
+            path: Archivo .prom (por defecto, metrics_path)
+
+        Returns:
+            str: Ruta escrita, o None si no hay ruta
+        """
+        path = path or self.metrics_path
+        if not path:
+            return None
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+        return path
+
+    def close(self):
+        """
+        Escribe las métricas (si hay metrics_path) y cierra la traza
+        """
+        self.write_metrics()
+        with self._lock:
+            if self._trace_file is not None:
+                self._trace_file.close()
+                self._trace_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+_tracer = Tracer()
+_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    """
+    Devuelve el Tracer del proceso (por defecto, solo acumula en memoria)
+    """
+    return _tracer
+
+
+def set_tracer(tracer):
+    """
+    Reemplaza el Tracer del proceso (por ejemplo, uno con traza y métricas)
+
+    Returns:
+        Tracer: El Tracer anterior, para restaurarlo
+    """
+    global _tracer
+    with _tracer_lock:
+        previous, _tracer = _tracer, tracer
+    return previous
+
+
+def span(stage, **attrs):
+    """
+    Tramo en el Tracer del proceso (ver Tracer.span)
+    """
+    return get_tracer().span(stage, **attrs)
+
+
+@contextmanager
+def profile(path=None, top=PROFILE_TOP_FUNCTIONS):
+    """
+    Perfila el bloque with con cProfile (sin ruta no hace nada)
+
+    Al terminar guarda las estadísticas en path (para pstats o snakeviz) y
+    muestra las funciones con más tiempo acumulado.
+
+    Args:
+        path: Archivo .prof de salida
+        top: Funciones a mostrar
+    """
+    if not path:
+        yield
+        return
+    # Solo se importan al perfilar: process_ocr.py importa este módulo al arrancar
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        profiler.dump_stats(path)
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(top)
+        print(f"\n🧪 Perfil guardado en: {path} (python3 -m pstats {path})")
+        print(report.getvalue().rstrip())
+
+
+def add_instrumentation_arguments(parser, profile_help=None):
+    """
+    Agrega al parser las opciones de traza, métricas y (opcionalmente) perfil
+
+    Args:
+        parser: ArgumentParser
+        profile_help: Ayuda de --profile; None no agrega la opción
+    """
+    parser.add_argument("--trace", metavar="JSONL",
+                        help="Escribir un tramo por etapa en este archivo JSON lines")
+    parser.add_argument("--metrics", metavar="PROM",
+                        help="Escribir los totales por etapa en formato Prometheus (textfile)")
+    if profile_help:
+        parser.add_argument("--profile", metavar="PROF", help=profile_help)
+
+
+def tracer_from_args(args):
+    """
+    Construye el Tracer de --trace y --metrics
+
+    Returns:
+        Tracer: Tracer con traza y métricas, o None si no se pidió ninguna
+    """
+    if not (args.trace or args.metrics):
+        return None
+    return Tracer(args.trace, args.metrics)
+
+
+def print_summary(summary):
+    """
+    Muestra los totales por etapa (de Tracer.summary() o summarize_trace())
+    """
+    print(f"   {'etapa':<14} {'tramos':>7} {'reloj s':>9} {'CPU s':>8} {'entrada':>9} "
+          f"{'salida':>8} {'KB enviados':>12} {'caché':>9}")
+    for stage, totals in sorted(summary.items(), key=lambda item: -item[1]["wall_seconds"]):
+        lookups = totals["cache_hits"] + totals["cache_misses"]
+        cache = f"{totals['cache_hits']}/{lookups}" if lookups else "-"
+        print(f"   {stage:<14} {totals['calls']:>7} {totals['wall_seconds']:>9.2f} "
+              f"{totals['cpu_seconds']:>8.2f} {totals['input_tokens']:>9} "
+              f"{totals['output_tokens']:>8} {totals['request_bytes'] / 1024:>12.0f} {cache:>9}")
+
+
+def summarize_trace(path):
+    """
+    Recalcula los totales por etapa desde un archivo de traza
+
+    Args:
+        path: Archivo .jsonl escrito por Tracer
+
+    Returns:
+        dict: {etapa: {contador: valor}}, como Tracer.summary()
+    """
+    tracer = Tracer()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            current = Span(record["stage"], {})
+            for name in ("wall_seconds", "cpu_seconds", "request_bytes", "output_bytes") + USAGE_FIELDS:
+                setattr(current, name, record.get(name, 0))
+            current.cache_hit = record.get("cache_hit")
+            current.error = record.get("error")
+            tracer.record(current)
+    return tracer.summary()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Resumir una traza de instrumentación por etapa")
+    parser.add_argument("trace", help="Archivo .jsonl escrito con --trace")
+    parser.add_argument("--metrics", metavar="PROM",
+                        help="Escribir también los totales en formato Prometheus")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    summary = summarize_trace(args.trace)
+    print(f"📈 Etapas de {args.trace}\n")
+    print_summary(summary)
+
+    if args.metrics:
+        tracer = Tracer()
+        tracer.totals = summary
+        tracer.write_metrics(args.metrics)
+        print(f"\n📁 Métricas guardadas en: {args.metrics}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+Segmentación de páginas en columnas y artículos para OCR por regiones
+
+Las páginas de El Martillo son de formato sábana y a varias columnas; con una
+sola llamada de visión por página la respuesta es lenta y a veces se corta al
+llegar a max_tokens. Este módulo:
+1. Separa las franjas que ocupan todo el ancho (cabecera, títulos grandes)
+2. Detecta las columnas con el perfil de proyección vertical (calles en blanco
+   o filetes verticales) y divide cada una en artículos por los espacios
+   horizontales
+3. Extrae el texto de cada región en paralelo con extract_text_with_claude,
+   reintentando solo las regiones que fallan
+4. Une los textos en orden de lectura (columna a columna, de arriba a abajo)
+
+Ejemplo:
+    python3 layout_segmentation.py data/el_martillo/page_01.png --preview regiones.png
+"""
+
+import argparse
+import base64
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from process_ocr import extract_text_with_claude, write_extracted_text
+
+# Umbrales del perfil de proyección (fracción de píxeles con tinta)
+BLANK_FRACTION = 0.005
+RULE_FRACTION = 0.6
+
+# Tamaños mínimos, como fracción del ancho/alto de la página
+MIN_COLUMN_GAP = 0.008
+MIN_COLUMN_WIDTH = 0.08
+MIN_ROW_GAP = 0.012
+MIN_REGION_HEIGHT = 0.08
+
+# Margen alrededor de cada región recortada, en píxeles
+REGION_PADDING = 8
+
+DEFAULT_REGION_WORKERS = 4
+DEFAULT_MAX_RETRIES = 2
+RETRY_BASE_DELAY = 1.0
+
+REGION_SEPARATOR = "\n\n"
+
+
+@dataclass
+class Region:
+    index: int
+    column: int
+    left: int
+    top: int
+    right: int
+    bottom: int
+
+    @property
+    def box(self):
+        return (self.left, self.top, self.right, self.bottom)
+
+
+def ink_mask(image):
+    """
+    Convierte la página en una matriz booleana (True = tinta)
+
+    El umbral es la media menos una desviación estándar, que separa bien la
+    tinta del papel amarillento de los escaneos.
+    """
+    pixels = np.asarray(image.convert("L"), dtype=np.uint8)
+    return pixels < pixels.mean() - pixels.std()
+
+
+def find_runs(profile, blank, min_gap, min_length=1):
+    """
+    Busca los tramos con contenido de un perfil de proyección
+
+    Args:
+        profile: Fracción de tinta por fila o columna
+        blank: Máscara booleana de las posiciones que cuentan como vacías
+        min_gap: Longitud mínima de un hueco para separar dos tramos
+        min_length: Longitud mínima de un tramo
+
+    Returns:
+        list: Tuplas (inicio, fin) de cada tramo, con fin exclusivo
+    """
+    runs = []
+    start = None
+    gap = 0
+    for position, is_blank in enumerate(blank):
+        if is_blank:
+            gap += 1
+            if start is not None and gap >= min_gap:
+                runs.append((start, position - gap + 1))
+                start = None
+        else:
+            if start is None:
+                start = position
+            gap = 0
+    if start is not None:
+        runs.append((start, len(profile) - gap))
+
+    return [(begin, end) for begin, end in runs if end - begin >= min_length]
+
+
+def find_columns(mask, min_column_gap=MIN_COLUMN_GAP):
+    """
+    Detecta las columnas de una franja de la página
+
+    Returns:
+        list: Tuplas (izquierda, derecha) de cada columna
+    """
+    width = mask.shape[1]
+    profile = mask.mean(axis=0)
+    # Calles en blanco o filetes verticales de casi todo el alto
+    blank = (profile < BLANK_FRACTION) | (profile > RULE_FRACTION)
+    columns = find_runs(profile, blank, max(1, int(width * min_column_gap)),
+                        max(1, int(width * MIN_COLUMN_WIDTH)))
+    return columns or [(0, width)]
+
+
+def _same_columns(first, second, tolerance):
+    return len(first) == len(second) and all(
+        abs(a[0] - b[0]) <= tolerance and abs(a[1] - b[1]) <= tolerance
+        for a, b in zip(first, second)
+    )
+
+
+def segment_page(image, min_column_gap=MIN_COLUMN_GAP, min_row_gap=MIN_ROW_GAP,
+                 min_region_height=MIN_REGION_HEIGHT):
+    """
+    Divide una página en regiones (columnas y artículos) en orden de lectura
+
+    Primero se separan franjas horizontales que ocupan todo el ancho (la
+    cabecera, títulos a varias columnas), luego las columnas de cada franja y
+    por último los artículos de cada columna. Las franjas contiguas con las
+    mismas columnas se unen, para no cortar el orden de lectura cuando dos
+    artículos terminan a la misma altura en todas las columnas.
+
+    Args:
+        image: Imagen PIL de la página
+        min_column_gap: Ancho mínimo de la calle entre columnas (fracción del ancho)
+        min_row_gap: Alto mínimo del espacio entre artículos (fracción del alto)
+        min_region_height: Alto mínimo de una región; los bloques menores se
+                           unen con el siguiente (fracción del alto)
+
+    Returns:
+        list: Regiones (Region), franja a franja, columna a columna y de arriba a abajo
+    """
+    mask = ink_mask(image)
+    height, width = mask.shape
+    row_gap = max(1, int(height * min_row_gap))
+
+    page_profile = mask.mean(axis=1)
+    bands = []
+    for top, bottom in find_runs(page_profile, page_profile < BLANK_FRACTION, row_gap):
+        columns = find_columns(mask[top:bottom], min_column_gap)
+        if bands and len(columns) > 1 and _same_columns(bands[-1][2], columns, width * 0.02):
+            band_top = bands[-1][0]
+            bands[-1] = (band_top, bottom, find_columns(mask[band_top:bottom], min_column_gap))
+        else:
+            bands.append((top, bottom, columns))
+
+    regions = []
+    column_index = 0
+    for band_top, band_bottom, columns in bands:
+        for left, right in columns:
+            row_profile = mask[band_top:band_bottom, left:right].mean(axis=1)
+            blocks = find_runs(row_profile, row_profile < BLANK_FRACTION, row_gap)
+
+            # Unir bloques pequeños (títulos, líneas sueltas) con el siguiente
+            merged = []
+            for top, bottom in blocks:
+                if merged and merged[-1][1] - merged[-1][0] < height * min_region_height:
+                    merged[-1] = (merged[-1][0], bottom)
+                else:
+                    merged.append((top, bottom))
+
+            for top, bottom in merged:
+                regions.append(Region(
+                    index=len(regions),
+                    column=column_index,
+                    left=max(0, left - REGION_PADDING),
+                    top=max(0, band_top + top - REGION_PADDING),
+                    right=min(width, right + REGION_PADDING),
+                    bottom=min(height, band_top + bottom + REGION_PADDING),
+                ))
+            column_index += 1
+
+    if not regions:
+        regions = [Region(index=0, column=0, left=0, top=0, right=width, bottom=height)]
+    return regions
+
+
+def encode_region(image, region, preprocess=None):
+    """
+    Recorta una región y la codifica en base64
+
+    Args:
+        image: Imagen PIL de la página
+        region: Region a recortar
+        preprocess: Opciones de image_preprocessing.preprocess_image (dict), o
+                    None para enviar el recorte en PNG
+
+    Returns:
+        tuple: (datos en base64, media type)
+    """
+    buffer = io.BytesIO()
+    image.crop(region.box).save(buffer, format="PNG")
+    data = buffer.getvalue()
+    media_type = "image/png"
+
+    if preprocess is not None:
+        from image_preprocessing import preprocess_image
+        data, media_type, _ = preprocess_image(data, **preprocess)
+
+    return base64.standard_b64encode(data).decode("utf-8"), media_type
+
+
+def extract_region(image_data, media_type, client=None, cache=None, max_retries=DEFAULT_MAX_RETRIES):
+    """
+    Extrae el texto de una región, reintentando con espera exponencial
+
+    Solo se reintentan los errores transitorios de la API (los mismos que
+    rate_limiter.classify_error), respetando retry-after; cualquier otro error
+    se propaga de inmediato.
+
+    Returns:
+        tuple: (texto extraído, intentos realizados)
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return extract_text_with_claude(image_data, media_type, client=client, cache=cache), attempt + 1
+        except Exception as exc:
+            # Importación diferida: rate_limiter carga el SDK de Anthropic
+            from rate_limiter import classify_error
+
+            retryable, _, retry_after = classify_error(exc)
+            if not retryable or attempt == max_retries:
+                raise
+            time.sleep(retry_after if retry_after is not None else RETRY_BASE_DELAY * 2 ** attempt)
+
+
+def extract_page_regions(image_path, client=None, cache=None, max_workers=DEFAULT_REGION_WORKERS,
+                         max_retries=DEFAULT_MAX_RETRIES, preprocess=None):
+    """
+    Segmenta una página y extrae el texto de sus regiones en paralelo
+
+    Si una región falla tras sus reintentos, las demás se conservan (y con
+    caché, volver a procesar la página solo repite las regiones fallidas).
+
+    Args:
+        image_path: Ruta de la imagen de la página
+        client: Cliente de Anthropic (por defecto, el cliente compartido)
+        cache: ResponseCache opcional
+        max_workers: Regiones extrayéndose a la vez
+        max_retries: Reintentos por región
+        preprocess: Opciones de preprocesamiento aplicadas a cada recorte
+
+    Returns:
+        dict: 'text' (texto unido en orden de lectura), 'regions' (lista de
+              dicts con la región, texto, intentos y segundos) y 'errors'
+              (índice de región → error)
+    """
+    with Image.open(image_path) as page:
+        image = page.convert("L")
+    regions = segment_page(image)
+
+    def run(region):
+        start = time.perf_counter()
+        image_data, media_type = encode_region(image, region, preprocess)
+        text, attempts = extract_region(image_data, media_type, client, cache, max_retries)
+        return {"region": region, "text": text, "attempts": attempts,
+                "seconds": time.perf_counter() - start}
+
+    results = []
+    errors = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [(region, executor.submit(run, region)) for region in regions]
+        for region, future in futures:
+            try:
+                results.append(future.result())
+            except Exception as exc:
+                errors[region.index] = repr(exc)
+
+    text = REGION_SEPARATOR.join(result["text"].strip() for result in results)
+    return {"text": text, "regions": results, "errors": errors}
+
+
+def draw_regions(image, regions, output_path):
+    """
+    Guarda una vista previa de la página con las regiones numeradas
+    """
+    preview = image.convert("RGB")
+    draw = ImageDraw.Draw(preview)
+    for region in regions:
+        draw.rectangle(region.box, outline=(220, 30, 30), width=3)
+        draw.text((region.left + 6, region.top + 4), str(region.index + 1), fill=(220, 30, 30))
+    preview.save(output_path)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="OCR por columnas y artículos")
+    parser.add_argument("image", help="Imagen de la página")
+    parser.add_argument("--output", help="Guardar el texto unido en este archivo .txt")
+    parser.add_argument("--preview", help="Guardar una imagen con las regiones detectadas")
+    parser.add_argument("--segment-only", action="store_true",
+                        help="Solo segmentar, sin llamar a la API")
+    parser.add_argument("--workers", type=int, default=DEFAULT_REGION_WORKERS,
+                        help="Regiones extrayéndose a la vez")
+    parser.add_argument("--retries", type=int, default=DEFAULT_MAX_RETRIES,
+                        help="Reintentos por región")
+    parser.add_argument("--fake", action="store_true",
+                        help="Usar el cliente falso local (sin red ni API key)")
+    parser.add_argument("--fake-latency", type=float, default=0.5,
+                        help="Latencia simulada por petición del cliente falso, en segundos")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    with Image.open(args.image) as page:
+        image = page.convert("L")
+    regions = segment_page(image)
+    columns = len({region.column for region in regions})
+    print(f"🧩 {len(regions)} regiones en {columns} columnas: {args.image}")
+
+    if args.preview:
+        draw_regions(image, regions, args.preview)
+        print(f"🖼️  Vista previa guardada en: {args.preview}")
+
+    if args.segment_only:
+        return
+
+    client = None
+    if args.fake:
+        from fake_anthropic import FakeAnthropic
+        client = FakeAnthropic(latency=args.fake_latency)
+
+    start = time.perf_counter()
+    result = extract_page_regions(args.image, client=client, max_workers=args.workers,
+                                  max_retries=args.retries)
+    elapsed = time.perf_counter() - start
+
+    for region_result in result["regions"]:
+        region = region_result["region"]
+        print(f"   ✅ Región {region.index + 1} (columna {region.column + 1}): "
+              f"{len(region_result['text'])} caracteres, {region_result['seconds']:.2f} s, "
+              f"{region_result['attempts']} intento(s)")
+    for index, error in result["errors"].items():
+        print(f"   ❌ Región {index + 1}: {error}")
+
+    print(f"\n⏱️  {elapsed:.2f} s - {len(result['text'])} caracteres en total")
+    if args.output:
+        write_extracted_text(args.output, result["text"])
+        print(f"📁 Texto guardado en: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
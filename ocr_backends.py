@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+"""
+Motores de OCR intercambiables y enrutamiento local → remoto
+
+Hoy cada página va al modelo de visión, incluidas las páginas en blanco
+(versos, tapas) que no tienen nada que transcribir. Este módulo pone el
+motor de OCR detrás de una interfaz común (extract(image_path) → OCRResult),
+con tres opciones:
+
+- claude: extract_text_with_claude, como hasta ahora
+- tesseract: OCR local con pytesseract, sin costo por página; cada proceso de
+  tesseract usa un núcleo, así que varias páginas en paralelo ocupan todos
+- auto: primero se mide la tinta de la página (una página en blanco no se
+  transcribe); si tiene contenido se hace el OCR local, y solo se envía a
+  Claude si la confianza media de Tesseract queda por debajo del umbral, si
+  tiene muchas palabras (contenido rico, --rich-words) o si está marcada
+  (--escalate)
+
+Cada motor registra sus páginas y su tiempo en un BackendStats compartido,
+que informa el rendimiento por motor y la fracción de páginas escaladas.
+
+pytesseract (y el programa tesseract con el idioma "spa") solo hace falta
+con los motores tesseract y auto.
+
+Ejemplo:
+    python3 ocr_backends.py data/paginas --ocr-backend auto --min-confidence 75
+"""
+
+import argparse
+import base64
+import mimetypes
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+
+from instrumentation import span
+
+CLAUDE = "claude"
+TESSERACT = "tesseract"
+AUTO = "auto"
+BACKENDS = (CLAUDE, TESSERACT, AUTO)
+# Motor "virtual" de las páginas en blanco que no se transcriben
+BLANK = "blank"
+
+DEFAULT_BACKEND = CLAUDE
+DEFAULT_TESSERACT_LANG = "spa"
+# Red LSTM y segmentación automática de la página (respeta las columnas)
+DEFAULT_TESSERACT_CONFIG = "--oem 1 --psm 3"
+DEFAULT_MIN_CONFIDENCE = 70.0
+DEFAULT_BLANK_INK_RATIO = 0.005
+
+# Ancho al que se reduce la página para medir la tinta
+INK_SAMPLE_WIDTH = 800
+# Un píxel es tinta si es más oscuro que esta fracción del tono del papel (la mediana)
+INK_DARKNESS = 0.6
+
+
+@dataclass
+class OCRResult:
+    """
+    Texto de una página y cómo se obtuvo
+    """
+    text: str
+    backend: str
+    seconds: float
+    # Confianza media por palabra de Tesseract (0-100); None con Claude
+    confidence: float = None
+    words: int = 0
+    ink_ratio: float = None
+    escalated: bool = False
+    reason: str = ""
+
+    def as_dict(self):
+        return asdict(self)
+
+
+class BackendStats:
+    """
+    Páginas y tiempo por motor, y páginas escaladas, seguros entre hilos
+    """
+
+    def __init__(self):
+        self.backends = {}
+        self.pages = 0
+        self.escalated = 0
+        self.blank = 0
+        self._lock = threading.Lock()
+
+    def record(self, backend, seconds):
+        with self._lock:
+            totals = self.backends.setdefault(backend, {"pages": 0, "seconds": 0.0})
+            totals["pages"] += 1
+            totals["seconds"] += seconds
+
+    def record_page(self, result):
+        with self._lock:
+            self.pages += 1
+            self.escalated += result.escalated
+            self.blank += result.backend == BLANK
+
+    def as_dict(self):
+        """
+        Returns:
+            dict: Páginas, escaladas (número y fracción), en blanco y, por motor,
+                  páginas, segundos y páginas por minuto de cada hilo
+        """
+        with self._lock:
+            backends = {
+                name: dict(totals, pages_per_minute=(totals["pages"] / totals["seconds"] * 60
+                                                     if totals["seconds"] > 0 else 0.0))
+                for name, totals in self.backends.items()
+            }
+            return {
+                "pages": self.pages,
+                "escalated": self.escalated,
+                "escalated_fraction": self.escalated / self.pages if self.pages else 0.0,
+                "blank": self.blank,
+                "backends": backends,
+            }
+
+
+def print_backend_stats(stats):
+    """
+    Imprime el rendimiento por motor y la fracción escalada
+    """
+    print_backend_totals(stats.as_dict())
+
+
+def print_backend_totals(data):
+    """
+    Igual que print_backend_stats, a partir de BackendStats.as_dict()
+    (por ejemplo, el campo "backends" de GET /stats del worker)
+    """
+    for name, totals in sorted(data["backends"].items()):
+        print(f"   🔎 {name:<10} {totals['pages']:>5} páginas, "
+              f"{totals['seconds'] / totals['pages']:.2f} s por página "
+              f"({totals['pages_per_minute']:.1f} páginas/minuto por hilo)")
+    if data["pages"]:
+        print(f"   ⬆️  {data['escalated']} de {data['pages']} páginas escaladas a Claude "
+              f"({data['escalated_fraction']:.0%}), {data['blank']} en blanco")
+
+
+def ink_ratio(image_path, sample_width=INK_SAMPLE_WIDTH):
+    """
+    Fracción de la página cubierta de tinta (medida sobre una copia reducida)
+
+    Returns:
+        float: Entre 0 (página en blanco) y 1
+    """
+    import numpy as np
+    from PIL import Image, ImageOps
+
+    with Image.open(image_path) as image:
+        # En JPEG, draft decodifica directamente a una resolución menor
+        image.draft("L", (sample_width, sample_width * 4))
+        gray = ImageOps.grayscale(image)
+    gray.thumbnail((sample_width, sample_width * 4))
+    pixels = np.asarray(gray, dtype=np.float32)
+    paper = float(np.median(pixels))
+    if paper <= 0:
+        return 1.0
+    return float(np.mean(pixels < paper * INK_DARKNESS))
+
+
+def text_from_tesseract_data(data):
+    """
+    Texto y confianza a partir de pytesseract.image_to_data (Output.DICT)
+
+    Las palabras se unen por línea y los párrafos se separan con una línea en blanco.
+
+    Returns:
+        tuple: (texto, confianza media por palabra o None, número de palabras)
+    """
+    paragraphs = []
+    confidences = []
+    last_paragraph = None
+    last_line = None
+    for index, word in enumerate(data["text"]):
+        word = (word or "").strip()
+        confidence = float(data["conf"][index])
+        if not word or confidence < 0:
+            continue
+        paragraph = (data["block_num"][index], data["par_num"][index])
+        line = paragraph + (data["line_num"][index],)
+        if paragraph != last_paragraph:
+            paragraphs.append([[word]])
+        elif line != last_line:
+            paragraphs[-1].append([word])
+        else:
+            paragraphs[-1][-1].append(word)
+        last_paragraph, last_line = paragraph, line
+        confidences.append(confidence)
+
+    text = "\n\n".join("\n".join(" ".join(words) for words in lines) for lines in paragraphs)
+    confidence = sum(confidences) / len(confidences) if confidences else None
+    return text, confidence, len(confidences)
+
+
+class ClaudeBackend:
+    """
+    OCR con el modelo de visión (extract_text_with_claude)
+
+    Args:
+        client: Cliente de Anthropic (por defecto, el cliente compartido)
+        cache: ResponseCache opcional
+        preprocess: Opciones de image_preprocessing.preprocess_image (dict), o None
+        stats: BackendStats donde registrar las páginas
+    """
+
+    name = CLAUDE
+
+    def __init__(self, client=None, cache=None, preprocess=None, stats=None):
+        self.client = client
+        self.cache = cache
+        self.preprocess = preprocess
+        self.stats = stats or BackendStats()
+
+    def extract(self, image_path, record_page=True):
+        from process_ocr import extract_text_with_claude
+
+        start = time.perf_counter()
+        if self.preprocess is not None:
+            from image_preprocessing import load_preprocessed_base64
+
+            image_data, media_type, _ = load_preprocessed_base64(image_path, **self.preprocess)
+        else:
+            media_type = mimetypes.guess_type(image_path)[0] or "image/png"
+            with open(image_path, "rb") as f:
+                image_data = base64.standard_b64encode(f.read()).decode("utf-8")
+        text = extract_text_with_claude(image_data, media_type, client=self.client, cache=self.cache)
+        result = OCRResult(text=text, backend=self.name, seconds=time.perf_counter() - start)
+        self.stats.record(self.name, result.seconds)
+        if record_page:
+            self.stats.record_page(result)
+        return result
+
+
+class TesseractBackend:
+    """
+    OCR local con Tesseract (pytesseract)
+
+    Cada llamada lanza un proceso de tesseract limitado a un hilo
+    (OMP_THREAD_LIMIT=1): el paralelismo viene de procesar varias páginas a
+    la vez, una por núcleo, sin que los hilos internos de tesseract compitan.
+
+    Args:
+        lang: Idiomas de Tesseract ("spa", "spa+eng"...)
+        config: Opciones de línea de comandos de tesseract
+        stats: BackendStats donde registrar las páginas
+
+    Raises:
+        ImportError: Si pytesseract no está instalado
+    """
+
+    name = TESSERACT
+
+    def __init__(self, lang=DEFAULT_TESSERACT_LANG, config=DEFAULT_TESSERACT_CONFIG, stats=None):
+        try:
+            import pytesseract
+        except ImportError as exc:
+            raise ImportError("El motor tesseract necesita pytesseract (pip install pytesseract) "
+                              f"y el programa tesseract con el idioma '{lang}'") from exc
+        self._pytesseract = pytesseract
+        self.lang = lang
+        self.config = config
+        self.stats = stats or BackendStats()
+        os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+    def extract(self, image_path, record_page=True):
+        from PIL import Image
+
+        start = time.perf_counter()
+        with span("ocr_local", backend=self.name, path=image_path) as current:
+            with Image.open(image_path) as image:
+                data = self._pytesseract.image_to_data(image, lang=self.lang, config=self.config,
+                                                       output_type=self._pytesseract.Output.DICT)
+            text, confidence, words = text_from_tesseract_data(data)
+            current.set(confidence=confidence, words=words)
+        result = OCRResult(text=text, backend=self.name, seconds=time.perf_counter() - start,
+                           confidence=confidence, words=words)
+        self.stats.record(self.name, result.seconds)
+        if record_page:
+            self.stats.record_page(result)
+        return result
+
+
+class RoutingBackend:
+    """
+    OCR local primero; Claude solo para las páginas que lo necesitan
+
+    Args:
+        local: Motor local (TesseractBackend)
+        remote: Motor remoto (ClaudeBackend)
+        min_confidence: Confianza media de Tesseract por debajo de la cual se escala
+        blank_ink_ratio: Tinta por debajo de la cual la página se da por en blanco
+        rich_words: Escalar las páginas con al menos estas palabras (None: nunca)
+        flagged: page_id (nombre del archivo sin extensión) que siempre se escalan
+        stats: BackendStats compartido con los dos motores
+    """
+
+    name = AUTO
+
+    def __init__(self, local, remote, min_confidence=DEFAULT_MIN_CONFIDENCE,
+                 blank_ink_ratio=DEFAULT_BLANK_INK_RATIO, rich_words=None, flagged=(), stats=None):
+        self.local = local
+        self.remote = remote
+        self.min_confidence = min_confidence
+        self.blank_ink_ratio = blank_ink_ratio
+        self.rich_words = rich_words
+        self.flagged = set(flagged)
+        self.stats = stats or BackendStats()
+        self.local.stats = self.remote.stats = self.stats
+
+    def escalation_reason(self, page_id, result):
+        """
+        Motivo para enviar a Claude una página ya leída localmente
+
+        Returns:
+            str: Motivo, o None si basta con el OCR local
+        """
+        if page_id in self.flagged:
+            return "marcada para Claude"
+        if result.confidence is None or result.confidence < self.min_confidence:
+            confidence = "sin palabras" if result.confidence is None else f"{result.confidence:.0f}"
+            return f"confianza {confidence} < {self.min_confidence:g}"
+        if self.rich_words and result.words >= self.rich_words:
+            return f"contenido rico ({result.words} palabras)"
+        return None
+
+    def extract(self, image_path):
+        page_id = os.path.splitext(os.path.basename(image_path))[0]
+        start = time.perf_counter()
+        with span("triage", path=image_path) as current:
+            ink = ink_ratio(image_path)
+            current.set(ink_ratio=ink)
+
+        if ink < self.blank_ink_ratio and page_id not in self.flagged:
+            result = OCRResult(text="", backend=BLANK, seconds=time.perf_counter() - start,
+                               ink_ratio=ink, reason=f"en blanco (tinta {ink:.2%})")
+            self.stats.record(BLANK, result.seconds)
+        else:
+            local = self.local.extract(image_path, record_page=False)
+            reason = self.escalation_reason(page_id, local)
+            result = local
+            if reason is not None:
+                result = self.remote.extract(image_path, record_page=False)
+                result.escalated = True
+                result.reason = reason
+                result.confidence, result.words = local.confidence, local.words
+            result.ink_ratio = ink
+            result.seconds = time.perf_counter() - start
+        self.stats.record_page(result)
+        return result
+
+
+def create_backend(name=DEFAULT_BACKEND, client=None, cache=None, preprocess=None,
+                   lang=DEFAULT_TESSERACT_LANG, config=DEFAULT_TESSERACT_CONFIG,
+                   min_confidence=DEFAULT_MIN_CONFIDENCE, blank_ink_ratio=DEFAULT_BLANK_INK_RATIO,
+                   rich_words=None, flagged=()):
+    """
+    Construye un motor de OCR por nombre (claude, tesseract o auto)
+
+    Returns:
+        Motor con extract(image_path) → OCRResult y su BackendStats en .stats
+    """
+    stats = BackendStats()
+    if name == CLAUDE:
+        return ClaudeBackend(client, cache, preprocess, stats)
+    local = TesseractBackend(lang, config, stats)
+    if name == TESSERACT:
+        return local
+    if name != AUTO:
+        raise ValueError(f"Motor de OCR desconocido: {name} (opciones: {', '.join(BACKENDS)})")
+    return RoutingBackend(local, ClaudeBackend(client, cache, preprocess, stats),
+                          min_confidence=min_confidence, blank_ink_ratio=blank_ink_ratio,
+                          rich_words=rich_words, flagged=flagged, stats=stats)
+
+
+def add_backend_arguments(parser):
+    """
+    Agrega al parser la elección del motor de OCR y la política de enrutamiento
+    """
+    parser.add_argument("--ocr-backend", choices=BACKENDS, default=DEFAULT_BACKEND,
+                        help="Motor de OCR: claude, tesseract (local) o auto (local y, si hace "
+                             f"falta, Claude; ver ocr_backends.py). Por defecto: {DEFAULT_BACKEND}")
+    parser.add_argument("--tesseract-lang", default=DEFAULT_TESSERACT_LANG,
+                        help=f"Idiomas de Tesseract (por defecto: {DEFAULT_TESSERACT_LANG})")
+    parser.add_argument("--min-confidence", type=float, default=DEFAULT_MIN_CONFIDENCE,
+                        help=f"Con auto, escalar a Claude por debajo de esta confianza media "
+                             f"(0-100, por defecto: {DEFAULT_MIN_CONFIDENCE:g})")
+    parser.add_argument("--blank-ink", type=float, default=DEFAULT_BLANK_INK_RATIO,
+                        help=f"Con auto, fracción de tinta bajo la cual la página se da por en "
+                             f"blanco (por defecto: {DEFAULT_BLANK_INK_RATIO})")
+    parser.add_argument("--rich-words", type=int,
+                        help="Con auto, escalar también las páginas con al menos estas palabras")
+    parser.add_argument("--escalate", nargs="+", default=[], metavar="PAGE_ID",
+                        help="Con auto, páginas que siempre se envían a Claude")
+
+
+def backend_from_args(args, client=None, cache=None, preprocess=None):
+    """
+    Construye el motor de --ocr-backend
+
+    Returns:
+        Motor de OCR, o None con claude (se mantiene el camino de siempre)
+    """
+    if args.ocr_backend == CLAUDE:
+        return None
+    return create_backend(args.ocr_backend, client=client, cache=cache, preprocess=preprocess,
+                          lang=args.tesseract_lang, min_confidence=args.min_confidence,
+                          blank_ink_ratio=args.blank_ink, rich_words=args.rich_words,
+                          flagged=args.escalate)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Comparar motores de OCR y su enrutamiento")
+    parser.add_argument("source", help="Directorio de imágenes o manifiesto (.txt/.json)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Páginas en paralelo (por defecto: una por núcleo)")
+    parser.add_argument("--fake", action="store_true",
+                        help="Usar el cliente falso local para las páginas escaladas")
+    add_backend_arguments(parser)
+    parser.set_defaults(ocr_backend=AUTO)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    from batch_ocr import discover_pages
+
+    pages = discover_pages(args.source)
+    client = None
+    if args.fake:
+        from fake_anthropic import FakeAnthropic
+        client = FakeAnthropic()
+    backend = create_backend(args.ocr_backend, client=client, lang=args.tesseract_lang,
+                             min_confidence=args.min_confidence, blank_ink_ratio=args.blank_ink,
+                             rich_words=args.rich_words, flagged=args.escalate)
+
+    print(f"🔎 {len(pages)} páginas con el motor {args.ocr_backend} ({args.workers} hilos)\n")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        for page, result in zip(pages, executor.map(backend.extract, pages)):
+            confidence = f"{result.confidence:.0f}" if result.confidence is not None else "-"
+            print(f"   {os.path.basename(page):<28} {result.backend:<10} confianza {confidence:>3}  "
+                  f"{len(result.text):>6} caracteres  {result.reason}")
+    elapsed = time.perf_counter() - start
+
+    print(f"\n⏱️  {elapsed:.2f} s - {len(pages) / elapsed * 60:.1f} páginas/minuto")
+    print_backend_stats(backend.stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1023 @@
+#!/usr/bin/env python3
+"""
+Servicio local de OCR con cola de trabajos persistente
+
+Cada ejecución de process_ocr.py paga el arranque del intérprete, las
+importaciones pesadas y la construcción del cliente para procesar una sola
+página. Este servicio se arranca una vez y mantiene calientes el cliente de
+Anthropic (con su pool de conexiones), la caché de respuestas y los índices;
+los escáneres de digitalización le envían páginas a medida que las producen.
+
+- Cola durable en SQLite: un trabajo aceptado no se pierde aunque el servicio
+  se detenga; al volver a arrancar, los trabajos que estaban en curso vuelven
+  a la cola
+- Un pool de hilos toma los trabajos en orden de llegada y ejecuta las mismas
+  etapas que batch_ocr.py (extracción, estructuración y guardado), con
+  reintentos hasta --max-attempts
+- API HTTP (JSON):
+    POST /jobs            {"image_path": ...} o {"image_paths": [...]}; o los
+                          bytes de la imagen (Content-Type image/*) con ?page_id=
+    GET  /jobs[?status=]  Últimos trabajos
+    GET  /jobs/<id>       Estado de un trabajo
+    GET  /stats           Cola, rendimiento (páginas/minuto) y latencias
+    GET  /metrics         Etapas y cola en formato Prometheus
+    GET  /health
+
+Un solo proceso sirve cada cola. Todo funciona en una sola máquina y sin red
+con el cliente falso (--fake).
+
+Ejemplos:
+    python3 ocr_worker.py serve --fake --fake-latency 0.5 --workers 4
+    python3 ocr_worker.py submit data/paginas --wait
+    python3 ocr_worker.py status
+    python3 ocr_worker.py stats
+"""
+
+import argparse
+import json
+import mimetypes
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_OUTPUT_DIR = "data/el_martillo/servicio"
+QUEUE_NAME = "cola.sqlite"
+UPLOADS_DIR_NAME = "entrada"
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8770
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_LIST_LIMIT = 20
+
+# Espera máxima de un hilo sin trabajo antes de volver a mirar la cola
+POLL_SECONDS = 1.0
+# Ventana del rendimiento reciente y trabajos usados para las latencias
+THROUGHPUT_WINDOW_SECONDS = 60
+LATENCY_SAMPLE = 500
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+STATUSES = (PENDING, RUNNING, DONE, FAILED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id INTEGER PRIMARY KEY,
+    page_id TEXT NOT NULL,
+    image_path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    submitted_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    extract_seconds REAL,
+    structure_seconds REAL,
+    items INTEGER
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, job_id);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs(finished_at);
+"""
+
+_JOB_COLUMNS = ("job_id", "page_id", "image_path", "status", "attempts", "error", "submitted_at",
+                "started_at", "finished_at", "extract_seconds", "structure_seconds", "items")
+
+
+def percentile(values, fraction):
+    """
+    Percentil por rango más cercano de una lista ya ordenada
+
+    Returns:
+        float: Valor del percentil, o None si la lista está vacía
+    """
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, round(fraction * len(values)) - 1))]
+
+
+def latency_summary(values):
+    """
+    Resumen de una lista de duraciones en segundos
+
+    Returns:
+        dict: Media, p50, p95 y máximo (None sin datos)
+    """
+    values = sorted(v for v in values if v is not None)
+    return {
+        "mean": sum(values) / len(values) if values else None,
+        "p50": percentile(values, 0.50),
+        "p95": percentile(values, 0.95),
+        "max": values[-1] if values else None,
+    }
+
+
+class JobQueue:
+    """
+    Cola de trabajos de OCR persistente en SQLite
+
+    Args:
+        path: Archivo SQLite de la cola
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def _row_to_job(self, row):
+        return dict(zip(_JOB_COLUMNS, row)) if row else None
+
+    def _get_locked(self, job_id):
+        row = self._conn.execute(f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs WHERE job_id = ?",
+                                 (job_id,)).fetchone()
+        return self._row_to_job(row)
+
+    def submit(self, image_path, page_id=None):
+        """
+        Encola una página
+
+        Args:
+            image_path: Ruta de la imagen
+            page_id: Identificador de la página (por defecto, el nombre del archivo)
+
+        Returns:
+            dict: Trabajo creado
+        """
+        page_id = page_id or os.path.splitext(os.path.basename(image_path))[0]
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (page_id, image_path, status, submitted_at) VALUES (?, ?, ?, ?)",
+                (page_id, image_path, PENDING, time.time()),
+            )
+            return self._get_locked(cursor.lastrowid)
+
+    def claim(self):
+        """
+        Toma el trabajo pendiente más antiguo y lo marca en curso
+
+        Returns:
+            dict: Trabajo tomado, o None si la cola está vacía
+        """
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, started_at = ?, error = NULL "
+                "WHERE job_id = (SELECT job_id FROM jobs WHERE status = ? ORDER BY job_id LIMIT 1) "
+                "RETURNING job_id",
+                (RUNNING, time.time(), PENDING),
+            ).fetchone()
+            return self._get_locked(row[0]) if row else None
+
+    def complete(self, job_id, extract_seconds=None, structure_seconds=None, items=None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, extract_seconds = ?, "
+                "structure_seconds = ?, items = ? WHERE job_id = ?",
+                (DONE, time.time(), extract_seconds, structure_seconds, items, job_id),
+            )
+
+    def fail(self, job_id, error, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """
+        Registra un intento fallido; el trabajo vuelve a la cola si le quedan intentos
+
+        Returns:
+            str: Nuevo estado del trabajo (PENDING o FAILED)
+        """
+        with self._lock, self._conn:
+            job = self._get_locked(job_id)
+            status = PENDING if job["attempts"] < max_attempts else FAILED
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE job_id = ?",
+                (status, error, time.time() if status == FAILED else None, job_id),
+            )
+            return status
+
+    def recover(self):
+        """
+        Devuelve a la cola los trabajos que quedaron en curso (servicio interrumpido)
+
+        Returns:
+            int: Trabajos recuperados
+        """
+        with self._lock, self._conn:
+            return self._conn.execute("UPDATE jobs SET status = ? WHERE status = ?",
+                                      (PENDING, RUNNING)).rowcount
+
+    def get(self, job_id):
+        with self._lock:
+            return self._get_locked(job_id)
+
+    def jobs(self, status=None, limit=DEFAULT_LIST_LIMIT):
+        """
+        Últimos trabajos, del más reciente al más antiguo
+
+        Returns:
+            list: Trabajos (dict)
+        """
+        query = f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs"
+        params = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY job_id DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            return [self._row_to_job(row) for row in self._conn.execute(query, params)]
+
+    def counts(self):
+        """
+        Trabajos por estado
+
+        Returns:
+            dict: {estado: número de trabajos}
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update(rows)
+        return counts
+
+    def latencies(self, sample=LATENCY_SAMPLE):
+        """
+        Latencias de los últimos trabajos terminados
+
+        Returns:
+            dict: Resúmenes (media, p50, p95, máximo) de la espera en cola, el
+                  procesamiento, el total y las etapas de extracción y estructuración
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT submitted_at, started_at, finished_at, extract_seconds, structure_seconds "
+                "FROM jobs WHERE status = ? ORDER BY finished_at DESC LIMIT ?",
+                (DONE, sample),
+            ).fetchall()
+        return {
+            "jobs": len(rows),
+            "queue_seconds": latency_summary(started - submitted
+                                             for submitted, started, _, _, _ in rows),
+            "processing_seconds": latency_summary(finished - started
+                                                  for _, started, finished, _, _ in rows),
+            "total_seconds": latency_summary(finished - submitted
+                                             for submitted, _, finished, _, _ in rows),
+            "extract_seconds": latency_summary(row[3] for row in rows),
+            "structure_seconds": latency_summary(row[4] for row in rows),
+        }
+
+    def finished_since(self, since):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ? AND finished_at >= ?",
+                                      (DONE, since)).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def safe_page_id(name):
+    """
+    Identificador de página apto para nombre de archivo
+    """
+    return re.sub(r'[^\w.-]', '_', name).strip('._') or "pagina"
+
+
+class OCRWorker:
+    """
+    Pool de hilos que procesa los trabajos de una JobQueue con recursos compartidos
+
+    El cliente, la caché y los índices se crean una vez y los comparten todos
+    los trabajos. Los índices (store, index, ad_index, entities, corpus_stats)
+    se actualizan de a una página.
+
+    Args:
+        queue: JobQueue de la que tomar los trabajos
+        output_dir: Directorio de salida (<salida>/paginas y <salida>/entrada)
+        client: Cliente de Anthropic (real o falso)
+        cache: ResponseCache opcional
+        workers: Páginas procesándose a la vez
+        max_attempts: Intentos por trabajo antes de marcarlo como fallido
+        process_options: Argumentos de batch_ocr.process_page (preprocess, segment,
+                         region_workers, single_pass, chunk_chars, ad_index, backend)
+        store: CorpusStore opcional
+        index: SearchIndex opcional
+        entities: MentionIndex opcional; se guarda cada vez que la cola se vacía
+        corpus_stats: CorpusStats opcional con los agregados del corpus
+    """
+
+    def __init__(self, queue, output_dir=DEFAULT_OUTPUT_DIR, client=None, cache=None,
+                 workers=DEFAULT_WORKERS, max_attempts=DEFAULT_MAX_ATTEMPTS, process_options=None,
+                 store=None, index=None, entities=None, corpus_stats=None):
+        self.queue = queue
+        self.output_dir = output_dir
+        self.pages_dir = os.path.join(output_dir, "paginas")
+        self.uploads_dir = os.path.join(output_dir, UPLOADS_DIR_NAME)
+        os.makedirs(self.pages_dir, exist_ok=True)
+        self.client = client
+        self.cache = cache
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.process_options = process_options or {}
+        self.store = store
+        self.index = index
+        self.entities = entities
+        self.corpus_stats = corpus_stats
+        self.started_at = None
+        self.processed = 0
+        self.failed = 0
+        self._entities_dirty = False
+        self._stopping = False
+        self._threads = []
+        self._wakeup = threading.Condition()
+        self._sinks_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    def start(self):
+        """
+        Recupera los trabajos interrumpidos y arranca los hilos
+
+        Returns:
+            int: Trabajos devueltos a la cola
+        """
+        recovered = self.queue.recover()
+        self.started_at = time.time()
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"ocr-worker-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return recovered
+
+    def stop(self):
+        """
+        Termina los trabajos en curso, detiene los hilos y guarda los índices
+        """
+        self._stopping = True
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._flush_sinks()
+
+    def notify(self):
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def submit_path(self, image_path, page_id=None):
+        """
+        Encola una imagen que ya está en disco
+
+        Returns:
+            dict: Trabajo creado
+
+        Raises:
+            ValueError: Si la imagen no existe
+        """
+        if not os.path.isfile(image_path):
+            raise ValueError(f"No existe la imagen: {image_path}")
+        job = self.queue.submit(os.path.abspath(image_path), page_id and safe_page_id(page_id))
+        self.notify()
+        return job
+
+    def submit_upload(self, data, page_id, content_type):
+        """
+        Guarda una imagen recibida por HTTP en <salida>/entrada y la encola
+
+        Cada subida va en su propio subdirectorio, así que reutilizar un
+        page_id no pisa la imagen de un trabajo que aún está pendiente.
+
+        Returns:
+            dict: Trabajo creado
+        """
+        if not data:
+            raise ValueError("La imagen está vacía")
+        page_id = safe_page_id(page_id)
+        extension = mimetypes.guess_extension(content_type.split(";")[0].strip()) or ".png"
+        os.makedirs(self.uploads_dir, exist_ok=True)
+        upload_dir = tempfile.mkdtemp(prefix=f"{page_id}_", dir=self.uploads_dir)
+        image_path = os.path.join(upload_dir, page_id + extension)
+        temp_path = image_path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, image_path)
+        return self.submit_path(image_path, page_id)
+
+    def _run(self):
+        while not self._stopping:
+            job = self.queue.claim()
+            if job is None:
+                self._flush_sinks()
+                with self._wakeup:
+                    if not self._stopping:
+                        self._wakeup.wait(POLL_SECONDS)
+                continue
+            self._process(job)
+
+    def _process(self, job):
+        # Importación diferida: submit, status y stats no cargan pandas ni el cliente
+        from batch_ocr import process_page
+        from instrumentation import span
+
+        try:
+            with span("job", page_id=job["page_id"], job_id=job["job_id"]):
+                result = process_page(job["image_path"], self.pages_dir, self.client, self.cache,
+                                      manifest=None, page_id=job["page_id"],
+                                      **self.process_options)
+                self._update_sinks(job["page_id"], result)
+        except Exception as exc:
+            status = self.queue.fail(job["job_id"], repr(exc), self.max_attempts)
+            if status == FAILED:
+                with self._stats_lock:
+                    self.failed += 1
+            retry = " (se reintentará)" if status == PENDING else ""
+            print(f"   ❌ #{job['job_id']} {job['page_id']}: {exc}{retry}")
+            return
+
+        self.queue.complete(job["job_id"], result["extract_seconds"], result["structure_seconds"],
+                            len(result["structured"].get("content", [])))
+        with self._stats_lock:
+            self.processed += 1
+        print(f"   ✅ #{job['job_id']} {job['page_id']} "
+              f"({result['extract_seconds'] + result['structure_seconds']:.2f} s)")
+
+    def _update_sinks(self, page_id, result):
+        from instrumentation import span
+
+        with self._sinks_lock:
+            if self.store is not None:
+                self.store.append_page(page_id, result["structured"])
+            if self.index is not None:
+                self.index.index_page(page_id, result["text"], result["structured"])
+            if self.entities is not None:
+                with span("entities", page_id=page_id):
+                    self.entities.index_page(page_id, result["text"], result["structured"])
+                self._entities_dirty = True
+            if self.corpus_stats is not None:
+                with span("stats", page_id=page_id):
+                    self.corpus_stats.add_page(page_id, result["structured"])
+
+    def _flush_sinks(self):
+        with self._sinks_lock:
+            if self.entities is not None and self._entities_dirty:
+                self.entities.save()
+                self._entities_dirty = False
+
+    def stats(self):
+        """
+        Estado del servicio: cola, rendimiento y latencias
+
+        Returns:
+            dict: Estadísticas serializables en JSON
+        """
+        now = time.time()
+        uptime = now - self.started_at if self.started_at else 0.0
+        recent = self.queue.finished_since(now - THROUGHPUT_WINDOW_SECONDS)
+        window = min(THROUGHPUT_WINDOW_SECONDS, uptime) or THROUGHPUT_WINDOW_SECONDS
+        with self._stats_lock:
+            processed, failed = self.processed, self.failed
+        stats = {
+            "uptime_seconds": uptime,
+            "workers": self.workers,
+            "queue": self.queue.counts(),
+            "processed": processed,
+            "failed": failed,
+            "pages_per_minute": processed / uptime * 60 if uptime > 0 else 0.0,
+            "recent_pages_per_minute": recent / window * 60,
+            "latency": self.queue.latencies(),
+        }
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats()
+        if self.process_options.get("backend") is not None:
+            stats["backends"] = self.process_options["backend"].stats.as_dict()
+        if self.corpus_stats is not None:
+            corpus = self.corpus_stats.summary()
+            stats["corpus"] = {name: corpus[name]
+                               for name in ("pages", "items", "chars", "mean_chars", "types")}
+        return stats
+
+
+class _WorkerHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = urllib.parse.parse_qs(url.query)
+        worker = self.server.worker
+        parts = [part for part in url.path.split("/") if part]
+
+        if parts == ["health"]:
+            self._send_json(200, {"status": "ok"})
+        elif parts == ["stats"]:
+            stats = worker.stats()
+            stats["connections"] = self.server.provider.stats.as_dict() if self.server.provider else None
+            self._send_json(200, stats)
+        elif parts == ["metrics"]:
+            self._send_text(200, metrics_text(worker, self.server.tracer))
+        elif parts == ["jobs"]:
+            status = params.get("status", [None])[0]
+            try:
+                limit = int(params.get("limit", [DEFAULT_LIST_LIMIT])[0])
+            except ValueError:
+                self._send_json(400, {"error": "limit debe ser un número entero"})
+                return
+            self._send_json(200, {"jobs": worker.queue.jobs(status, limit)})
+        elif len(parts) == 2 and parts[0] == "jobs" and parts[1].isdigit():
+            job = worker.queue.get(int(parts[1]))
+            if job is None:
+                self._send_json(404, {"error": f"No existe el trabajo {parts[1]}"})
+            else:
+                self._send_json(200, job)
+        else:
+            self._send_json(404, {"error": f"Ruta desconocida: {url.path}"})
+
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = urllib.parse.parse_qs(url.query)
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        content_type = self.headers.get("Content-Type", "application/json")
+        worker = self.server.worker
+
+        if url.path.rstrip("/") != "/jobs":
+            self._send_json(404, {"error": f"Ruta desconocida: {url.path}"})
+            return
+        try:
+            if content_type.startswith("image/"):
+                page_id = params.get("page_id", [f"pagina_{time.time_ns()}"])[0]
+                jobs = [worker.submit_upload(body, page_id, content_type)]
+            else:
+                payload = json.loads(body or b"{}")
+                if not isinstance(payload, dict):
+                    raise ValueError("El cuerpo debe ser un objeto JSON")
+                paths = payload.get("image_paths") or [payload.get("image_path")]
+                if not isinstance(paths, list) or not all(isinstance(path, str) for path in paths):
+                    raise ValueError("image_paths debe ser una lista de rutas")
+                if not all(paths):
+                    raise ValueError("Falta image_path o image_paths")
+                page_id = payload.get("page_id") if len(paths) == 1 else None
+                jobs = [worker.submit_path(path, page_id) for path in paths]
+        except ValueError as exc:
+            self._send_json(400, {"error": str(exc)})
+            return
+        self._send_json(202, {"jobs": jobs})
+
+    def _send_json(self, status, data):
+        self._send_body(status, json.dumps(data, ensure_ascii=False).encode("utf-8"),
+                        "application/json")
+
+    def _send_text(self, status, text):
+        self._send_body(status, text.encode("utf-8"), "text/plain; version=0.0.4")
+
+    def _send_body(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def metrics_text(worker, tracer=None):
+    """
+    Métricas del servicio en formato de texto de Prometheus
+
+    Returns:
+        str: Trabajos por estado, páginas procesadas y, con tracer, los totales por etapa
+    """
+    from instrumentation import METRIC_PREFIX
+
+    metric = f"{METRIC_PREFIX}_worker_jobs"
+    lines = [f"# HELP {metric} Trabajos en la cola por estado", f"# TYPE {metric} gauge"]
+    for status, count in worker.queue.counts().items():
+        lines.append(f'{metric}{{status="{status}"}} {count}')
+    for name, value, help_text in (("processed", worker.processed, "Páginas procesadas"),
+                                   ("failed", worker.failed, "Trabajos fallidos sin más intentos")):
+        metric = f"{METRIC_PREFIX}_worker_{name}_total"
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter", f"{metric} {value}"]
+    text = "\n".join(lines) + "\n"
+    return text + tracer.prometheus_text() if tracer is not None else text
+
+
+class OCRService:
+    """
+    Servidor HTTP de la API del servicio, en un hilo en segundo plano
+
+    Args:
+        worker: OCRWorker que atiende los trabajos
+        host: Dirección en la que escuchar
+        port: Puerto (0 elige uno libre)
+        provider: ClientProvider opcional (sus estadísticas de conexiones salen en /stats)
+        tracer: Tracer opcional (sus totales por etapa salen en /metrics)
+    """
+
+    def __init__(self, worker, host=DEFAULT_HOST, port=DEFAULT_PORT, provider=None, tracer=None):
+        self.worker = worker
+        self.httpd = ThreadingHTTPServer((host, port), _WorkerHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.worker = worker
+        self.httpd.provider = provider
+        self.httpd.tracer = tracer
+        self.recovered = 0
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.recovered = self.worker.start()
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.worker.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def api_request(url, path, payload=None, data=None, content_type=None):
+    """
+    Llama a la API del servicio
+
+    Args:
+        url: URL base del servicio
+        path: Ruta (con parámetros de consulta si hacen falta)
+        payload: Cuerpo JSON (POST)
+        data: Cuerpo binario (POST), con su content_type
+
+    Returns:
+        dict: Respuesta JSON
+
+    Raises:
+        RuntimeError: Si el servicio responde con un error
+    """
+    headers = {}
+    if payload is not None:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        content_type = "application/json"
+    if content_type:
+        headers["Content-Type"] = content_type
+    request = urllib.request.Request(url.rstrip("/") + path, data=data, headers=headers)
+    try:
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as exc:
+        raise RuntimeError(json.loads(exc.read() or b"{}").get("error", str(exc))) from None
+
+
+def submit_pages(url, pages, upload=False):
+    """
+    Envía páginas al servicio
+
+    Args:
+        url: URL base del servicio
+        pages: Rutas de las imágenes
+        upload: Enviar los bytes de cada imagen en lugar de su ruta
+
+    Returns:
+        list: Trabajos creados
+    """
+    if not upload:
+        paths = [os.path.abspath(page) for page in pages]
+        return api_request(url, "/jobs", {"image_paths": paths})["jobs"] if paths else []
+
+    jobs = []
+    for page in pages:
+        page_id = os.path.splitext(os.path.basename(page))[0]
+        with open(page, "rb") as f:
+            data = f.read()
+        content_type = mimetypes.guess_type(page)[0] or "image/png"
+        query = urllib.parse.urlencode({"page_id": page_id})
+        jobs += api_request(url, f"/jobs?{query}", data=data, content_type=content_type)["jobs"]
+    return jobs
+
+
+def wait_for_jobs(url, job_ids, poll_seconds=0.5):
+    """
+    Espera a que terminen los trabajos indicados
+
+    Returns:
+        list: Trabajos en su estado final
+    """
+    pending = set(job_ids)
+    finished = {}
+    while pending:
+        for job_id in sorted(pending):
+            job = api_request(url, f"/jobs/{job_id}")
+            if job["status"] in (DONE, FAILED):
+                finished[job_id] = job
+                pending.discard(job_id)
+        if pending:
+            time.sleep(poll_seconds)
+    return [finished[job_id] for job_id in job_ids]
+
+
+def _format_seconds(value):
+    return f"{value:.2f} s" if value is not None else "-"
+
+
+def print_job(job):
+    duration = (job["finished_at"] - job["started_at"]
+                if job["finished_at"] and job["started_at"] else None)
+    error = f"  {job['error']}" if job["error"] else ""
+    print(f"#{job['job_id']:<6} {job['status']:<8} {job['page_id']:<24} "
+          f"intentos {job['attempts']}  {_format_seconds(duration)}{error}")
+
+
+def print_stats(stats):
+    queue = stats["queue"]
+    print(f"⚙️  {stats['workers']} hilos, activo hace {stats['uptime_seconds']:.0f} s")
+    print(f"📥 Cola: {queue[PENDING]} pendientes, {queue[RUNNING]} en curso, "
+          f"{queue[DONE]} terminados, {queue[FAILED]} fallidos")
+    print(f"⏱️  {stats['processed']} páginas desde el arranque: "
+          f"{stats['pages_per_minute']:.1f} páginas/minuto "
+          f"({stats['recent_pages_per_minute']:.1f} en el último minuto)")
+    latency = stats["latency"]
+    if latency["jobs"]:
+        print(f"📊 Latencias de los últimos {latency['jobs']} trabajos (p50 / p95):")
+        for name, label in (("queue_seconds", "Espera en cola"), ("extract_seconds", "Extracción"),
+                            ("structure_seconds", "Estructuración"), ("total_seconds", "Total")):
+            print(f"   {label:<16} {_format_seconds(latency[name]['p50'])} / "
+                  f"{_format_seconds(latency[name]['p95'])}")
+    if stats.get("backends") and stats["backends"]["pages"]:
+        from ocr_backends import print_backend_totals
+
+        print("🔎 Motores:")
+        print_backend_totals(stats["backends"])
+    if stats.get("corpus"):
+        corpus = stats["corpus"]
+        print(f"📊 Corpus: {corpus['pages']} páginas, {corpus['items']} elementos, "
+              f"{corpus['mean_chars']:.0f} caracteres por elemento")
+    if stats.get("cache"):
+        print(f"💾 Caché: {stats['cache']['hits']} aciertos, {stats['cache']['misses']} fallos")
+    if stats.get("connections") and stats["connections"]["requests"]:
+        connections = stats["connections"]
+        print(f"🔌 Conexiones: {connections['requests']} peticiones, "
+              f"{connections['new_connections']} nuevas, "
+              f"{connections['reused_connections']} reutilizadas")
+
+
+def build_worker(args):
+    """
+    Crea el cliente, la caché, los índices y el OCRWorker de las opciones de serve
+
+    Returns:
+        tuple: (OCRWorker, ClientProvider, Tracer)
+    """
+    from client_provider import ClientProvider, set_provider
+    from image_preprocessing import preprocess_options_from_args
+    from instrumentation import Tracer, set_tracer, tracer_from_args
+    from ocr_backends import backend_from_args
+    from rate_limiter import rate_limiter_from_args
+    from response_cache import cache_from_args
+
+    max_requests = args.workers * (args.region_workers if args.segment else 1)
+    limiter, retry_policy = rate_limiter_from_args(args)
+    provider = ClientProvider(max_connections=max_requests, limiter=limiter,
+                              retry_policy=retry_policy)
+    set_provider(provider)
+    if args.fake:
+        from fake_anthropic import FakeAnthropic
+        provider.set_client(FakeAnthropic(latency=args.fake_latency))
+
+    # Siempre hay un Tracer en memoria para /metrics; --trace y --metrics lo escriben a disco
+    tracer = tracer_from_args(args) or Tracer()
+    set_tracer(tracer)
+
+    # Las respuestas del cliente falso no deben acabar en la caché real
+    cache = cache_from_args(args)
+
+    store = None
+    if args.store:
+        from corpus_store import CorpusStore
+        store = CorpusStore(args.store)
+    index = None
+    if args.index:
+        from search_index import SearchIndex
+        index = SearchIndex(args.index)
+    ad_index = None
+    if args.ad_index:
+        from ad_dedup import AdIndex
+        ad_index = AdIndex(args.ad_index)
+    entities = None
+    if args.entities is not None:
+        from entity_index import BATCH_MENTIONS_NAME, MentionIndex
+        entities = MentionIndex(args.entities or os.path.join(args.output_dir, BATCH_MENTIONS_NAME),
+                                args.gazetteer)
+    corpus_stats = None
+    if args.stats is not None:
+        from corpus_stats import BATCH_STATS_NAME, CorpusStats
+        corpus_stats = CorpusStats(args.stats or os.path.join(args.output_dir, BATCH_STATS_NAME))
+
+    preprocess = preprocess_options_from_args(args) if args.preprocess else None
+    process_options = {
+        "preprocess": preprocess,
+        "segment": args.segment,
+        "region_workers": args.region_workers,
+        "single_pass": args.single_pass,
+        "chunk_chars": args.chunk_chars if args.chunked else None,
+        "ad_index": ad_index,
+        "backend": backend_from_args(args, client=provider.get_client(), cache=cache,
+                                     preprocess=preprocess),
+    }
+    queue = JobQueue(args.queue or os.path.join(args.output_dir, QUEUE_NAME))
+    worker = OCRWorker(queue, args.output_dir, client=provider.get_client(), cache=cache,
+                       workers=args.workers, max_attempts=args.max_attempts,
+                       process_options=process_options, store=store, index=index,
+                       entities=entities, corpus_stats=corpus_stats)
+    return worker, provider, tracer
+
+
+def serve(args):
+    worker, provider, tracer = build_worker(args)
+    service = OCRService(worker, args.host, args.port, provider=provider, tracer=tracer)
+    service.start()
+    print(f"🛰️  Servicio OCR en {service.base_url} con {args.workers} hilos")
+    print(f"   Cola: {worker.queue.path} - Salidas: {worker.pages_dir}")
+    pending = worker.queue.counts()[PENDING]
+    if pending:
+        print(f"   {pending} trabajos pendientes en la cola "
+              f"({service.recovered} interrumpidos en la corrida anterior)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("\n⏹️  Deteniendo: se terminan los trabajos en curso...")
+    finally:
+        service.stop()
+        for sink in (worker.index, worker.process_options["ad_index"], worker.corpus_stats):
+            if sink is not None:
+                sink.close()
+        if worker.cache is not None:
+            worker.cache.close()
+        tracer.close()
+        provider.close()
+        worker.queue.close()
+        print(f"✅ {worker.processed} páginas procesadas, {worker.failed} fallidas")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Servicio local de OCR con cola de trabajos")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    client = argparse.ArgumentParser(add_help=False)
+    client.add_argument("--url", default=f"http://{DEFAULT_HOST}:{DEFAULT_PORT}",
+                        help="URL del servicio")
+
+    run = subparsers.add_parser("serve", help="Arrancar el servicio")
+    run.add_argument("--host", default=DEFAULT_HOST)
+    run.add_argument("--port", type=int, default=DEFAULT_PORT)
+    run.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR,
+                     help=f"Directorio de salida (por defecto: {DEFAULT_OUTPUT_DIR})")
+    run.add_argument("--queue", help=f"Archivo de la cola (por defecto: <salida>/{QUEUE_NAME})")
+    run.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                     help="Páginas procesadas en paralelo")
+    run.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS,
+                     help="Intentos por trabajo antes de marcarlo como fallido")
+    run.add_argument("--fake", action="store_true",
+                     help="Usar el cliente falso local (sin red ni API key ni caché de respuestas)")
+    run.add_argument("--fake-latency", type=float, default=0.5,
+                     help="Latencia simulada por petición del cliente falso, en segundos")
+    # Las opciones de procesamiento importan anthropic, PIL y numpy: submit, status
+    # y stats no las necesitan
+    if (sys.argv[1:] if argv is None else argv)[:1] == ["serve"]:
+        _add_processing_arguments(run)
+
+    submit = subparsers.add_parser("submit", parents=[client], help="Encolar páginas")
+    submit.add_argument("sources", nargs="+",
+                        help="Imágenes, directorios de imágenes o manifiestos (.txt/.json)")
+    submit.add_argument("--upload", action="store_true",
+                        help="Enviar los bytes de cada imagen en lugar de su ruta")
+    submit.add_argument("--wait", action="store_true", help="Esperar a que terminen")
+
+    status = subparsers.add_parser("status", parents=[client], help="Estado de los trabajos")
+    status.add_argument("job_id", nargs="?", type=int, help="Trabajo concreto")
+    status.add_argument("--status", choices=STATUSES, help="Solo los trabajos en este estado")
+    status.add_argument("--limit", type=int, default=DEFAULT_LIST_LIMIT)
+
+    subparsers.add_parser("stats", parents=[client], help="Rendimiento y latencias del servicio")
+    args = parser.parse_args(argv)
+    if args.command == "serve" and args.ocr_backend != "claude" and (args.segment
+                                                                      or args.single_pass):
+        parser.error(f"--ocr-backend {args.ocr_backend} no se combina con --segment ni con "
+                     "--single-pass")
+    return args
+
+
+def _add_processing_arguments(parser):
+    from chunked_structuring import DEFAULT_TARGET_CHARS
+    from entity_index import DEFAULT_GAZETTEER_PATH
+    from image_preprocessing import add_preprocess_arguments
+    from instrumentation import add_instrumentation_arguments
+    from layout_segmentation import DEFAULT_REGION_WORKERS
+    from ocr_backends import add_backend_arguments
+    from rate_limiter import add_rate_limit_arguments
+    from response_cache import add_cache_arguments
+
+    add_cache_arguments(parser)
+    parser.add_argument("--preprocess", action="store_true",
+                        help="Reducir las imágenes antes de enviarlas (ver image_preprocessing.py)")
+    add_preprocess_arguments(parser)
+    parser.add_argument("--segment", action="store_true",
+                        help="Extraer por columnas/artículos en paralelo (ver layout_segmentation.py)")
+    parser.add_argument("--region-workers", type=int, default=DEFAULT_REGION_WORKERS,
+                        help="Regiones por página extrayéndose a la vez")
+    parser.add_argument("--single-pass", action="store_true",
+                        help="Transcribir y estructurar con una sola llamada por página")
+    parser.add_argument("--chunked", action="store_true",
+                        help="Estructurar las páginas largas por secciones en paralelo")
+    parser.add_argument("--chunk-chars", type=int, default=DEFAULT_TARGET_CHARS,
+                        help="Tamaño objetivo de cada fragmento con --chunked")
+    parser.add_argument("--store", metavar="DIR",
+                        help="Añadir cada página a un almacén Parquet (ver corpus_store.py)")
+    parser.add_argument("--index", metavar="SQLITE",
+                        help="Actualizar el índice de búsqueda con cada página (ver search_index.py)")
+    parser.add_argument("--ad-index", metavar="SQLITE",
+                        help="Reutilizar y enlazar los anuncios recurrentes (ver ad_dedup.py)")
+    parser.add_argument("--entities", nargs="?", const="", metavar="JSON",
+                        help="Registrar las menciones de entidades (por defecto en "
+                             "<salida>/menciones.json; ver entity_index.py)")
+    parser.add_argument("--gazetteer", default=DEFAULT_GAZETTEER_PATH,
+                        help=f"Gazetteer de entidades (por defecto: {DEFAULT_GAZETTEER_PATH})")
+    parser.add_argument("--stats", nargs="?", const="", metavar="SQLITE",
+                        help="Mantener las estadísticas del corpus página a página (por defecto "
+                             "en <salida>/estadisticas.sqlite; ver corpus_stats.py)")
+    add_backend_arguments(parser)
+    add_rate_limit_arguments(parser)
+    add_instrumentation_arguments(parser)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.command == "serve":
+        serve(args)
+        return
+
+    try:
+        if args.command == "submit":
+            pages = []
+            for source in args.sources:
+                if not os.path.isdir(source) and not source.endswith(('.txt', '.json')):
+                    pages.append(source)
+                    continue
+                # Solo los directorios y manifiestos cargan batch_ocr (y pandas)
+                from batch_ocr import discover_pages
+                pages += discover_pages(source)
+            start = time.perf_counter()
+            jobs = submit_pages(args.url, pages, upload=args.upload)
+            print(f"📥 {len(jobs)} páginas encoladas en {args.url}")
+            if args.wait and jobs:
+                finished = wait_for_jobs(args.url, [job["job_id"] for job in jobs])
+                elapsed = time.perf_counter() - start
+                failed = [job for job in finished if job["status"] == FAILED]
+                for job in failed:
+                    print_job(job)
+                print(f"⏱️  {len(finished) - len(failed)} terminadas, {len(failed)} fallidas en "
+                      f"{elapsed:.2f} s ({len(finished) / elapsed * 60:.1f} páginas/minuto)")
+        elif args.command == "status":
+            if args.job_id is not None:
+                print_job(api_request(args.url, f"/jobs/{args.job_id}"))
+            else:
+                query = urllib.parse.urlencode({key: value for key, value in
+                                                (("status", args.status), ("limit", args.limit))
+                                                if value})
+                for job in api_request(args.url, f"/jobs?{query}")["jobs"]:
+                    print_job(job)
+        else:
+            print_stats(api_request(args.url, "/stats"))
+    except urllib.error.URLError as exc:
+        print(f"❌ No se pudo conectar con el servicio en {args.url}: {exc.reason}")
+    except (OSError, RuntimeError) as exc:
+        print(f"❌ {exc}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,21 +5,49 @@ Flujo:
 1. Extraer texto completo y guardarlo en .txt
 2. Estructurar datos y generar CSV
 3. Generar visualizaciones
+
+Cada paso es un subcomando, con rutas configurables; sin subcomando se
+ejecuta el flujo completo:
+    python3 process_ocr.py extract --image pagina.png --text pagina.txt
+    python3 process_ocr.py structure --text pagina.txt --json pagina.json --csv pagina.csv
+    python3 process_ocr.py render --csv pagina.csv --viz-dir graficos/
+    python3 process_ocr.py all
+
+anthropic, pandas y matplotlib se importan solo en el paso que los usa: un
+trabajo corto por página no paga su tiempo de importación (ver bench_startup.py).
 """
 
-import anthropic
+import argparse
 import base64
 import os
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 from datetime import datetime
 import json
 
-# Configurar estilo de visualización
-sns.set_style("whitegrid")
-plt.rcParams['figure.figsize'] = (10, 6)
-plt.rcParams['font.size'] = 10
+from generate_visualizations import (
+    add_render_arguments,
+    render_options_from_args,
+    resolve_length_mode,
+)
+from instrumentation import (
+    add_instrumentation_arguments,
+    payload_bytes,
+    print_summary,
+    profile,
+    set_tracer,
+    span,
+    tracer_from_args,
+)
+from corpus_stats import DEFAULT_STATS_PATH
+from ocr_backends import add_backend_arguments, backend_from_args, print_backend_stats
+from response_cache import ResponseCache, make_key, DEFAULT_CACHE_PATH
+from rule_structurer import structure_text
+from structured_output import (
+    STRUCTURE_TOOL,
+    STRUCTURE_TOOL_NAME,
+    StructureAssembler,
+    read_tool_stream,
+    salvage_structure,
+)
 
 # Rutas de archivos
 IMAGE_PATH = "data/el_martillo/page_01.png"
@@ -28,40 +56,20 @@ JSON_OUTPUT_PATH = "data/el_martillo/el_martillo_1609_structured.json"
 CSV_OUTPUT_PATH = "data/el_martillo/el_martillo_1609_structured.csv"
 VIZ_DIR = "data/el_martillo/"
 
+# Modelo usado para OCR y estructuración
+MODEL_NAME = "claude-3-5-sonnet-20241022"
+EXTRACTION_MAX_TOKENS = 4096
+STRUCTURE_MAX_TOKENS = 8000
+# Peticiones adicionales para la parte de la página que faltó en una respuesta cortada
+MAX_STRUCTURE_CONTINUATIONS = 3
 
-def extract_text_with_claude(image_data, media_type="image/png"):
-    """
-    Extrae texto de una imagen usando Claude Vision API
-
-    Args:
-        image_data: Imagen codificada en base64
-        media_type: Tipo de medio (image/png, image/jpeg, etc.)
+# Caché de respuestas de la API (ver response_cache.py)
+CACHE_PATH = DEFAULT_CACHE_PATH
 
-    Returns:
-        str: Texto extraído de la imagen
-    """
-    client = anthropic.Anthropic(
-        api_key=os.environ.get("ANTHROPIC_API_KEY")
-    )
+# Columnas del CSV estructurado, en orden
+CSV_COLUMNS = ['date', 'issue_number', 'headline', 'section', 'type', 'author', 'text_excerpt']
 
-    message = client.messages.create(
-        model="claude-3-5-sonnet-20241022",
-        max_tokens=4096,
-        messages=[
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "image",
-                        "source": {
-                            "type": "base64",
-                            "media_type": media_type,
-                            "data": image_data,
-                        },
-                    },
-                    {
-                        "type": "text",
-                        "text": """Analiza esta página de periódico histórico y extrae toda la información de forma estructurada.
+EXTRACTION_PROMPT = """Analiza esta página de periódico histórico y extrae toda la información de forma estructurada.
 
 Por favor proporciona:
 1. Información del encabezado (nombre del periódico, fecha, número de edición)
@@ -70,29 +78,9 @@ Por favor proporciona:
 4. Cualquier otra información relevante
 
 Transcribe el texto completo lo más fielmente posible, respetando la ortografía original (incluso si tiene errores)."""
-                    }
-                ],
-            }
-        ],
-    )
-
-    return message.content[0].text
-
-
-def step1_extract_text_to_txt():
-    """
-    PASO 1: Extraer texto del OCR y guardarlo en .txt
-    """
-    print("\n" + "="*80)
-    print("PASO 1: EXTRACCIÓN DE TEXTO A ARCHIVO .TXT")
-    print("="*80)
-
-    if not os.path.exists(IMAGE_PATH):
-        print(f"⚠️  La imagen no existe en: {IMAGE_PATH}")
-        print("📝 Usando texto de ejemplo para demostración...")
 
-        # Texto de ejemplo basado en el análisis previo
-        extracted_text = """
+# Texto de ejemplo basado en el análisis previo (se usa cuando no hay imagen)
+EXAMPLE_TEXT = """
 PERIÓDICO EL MARTILLO
 Edición No. 1609 - 5 de agosto de 1916
 Chiclayo, Perú
@@ -149,23 +137,189 @@ Fundado: 8 de febrero de 1903
 Precio: 4 centavos por número
 ==========================================================
 """
-    else:
-        print(f"📷 Cargando imagen desde: {IMAGE_PATH}")
-        with open(IMAGE_PATH, "rb") as image_file:
-            image_data = base64.standard_b64encode(image_file.read()).decode("utf-8")
 
-        print("🔄 Procesando con Claude Vision API...")
-        extracted_text = extract_text_with_claude(image_data)
 
-    # Guardar texto extraído
-    with open(TEXT_OUTPUT_PATH, 'w', encoding='utf-8') as f:
+def build_extraction_request(image_data, media_type="image/png"):
+    """
+    Construye los parámetros de messages.create para la extracción de texto
+
+    Args:
+        image_data: Imagen codificada en base64
+        media_type: Tipo de medio (image/png, image/jpeg, etc.)
+
+    Returns:
+        dict: Argumentos para client.messages.create (sync o async)
+    """
+    return {
+        "model": MODEL_NAME,
+        "max_tokens": EXTRACTION_MAX_TOKENS,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "image",
+                        "source": {
+                            "type": "base64",
+                            "media_type": media_type,
+                            "data": image_data,
+                        },
+                    },
+                    {
+                        "type": "text",
+                        "text": EXTRACTION_PROMPT
+                    }
+                ],
+            }
+        ],
+    }
+
+
+def extraction_cache_key(image_data, media_type="image/png"):
+    """
+    Clave de caché de la extracción de una imagen
+    """
+    return make_key("extract", MODEL_NAME, EXTRACTION_PROMPT, EXTRACTION_MAX_TOKENS,
+                    media_type, image_data)
+
+
+def extract_text_with_claude(image_data, media_type="image/png", client=None, cache=None):
+    """
+    Extrae texto de una imagen usando Claude Vision API
+
+    Args:
+        image_data: Imagen codificada en base64
+        media_type: Tipo de medio (image/png, image/jpeg, etc.)
+        client: Cliente de Anthropic a usar (por defecto, el cliente compartido)
+        cache: ResponseCache opcional; si la misma imagen ya se procesó con el
+               mismo modelo y prompt, se devuelve la respuesta guardada
+
+    Returns:
+        str: Texto extraído de la imagen
+    """
+    with span("extract", media_type=media_type) as current:
+        cache_key = None
+        if cache is not None:
+            cache_key = extraction_cache_key(image_data, media_type)
+            cached_text = cache.get(cache_key)
+            current.cache_hit = cached_text is not None
+            if cached_text is not None:
+                return cached_text
+
+        if client is None:
+            # anthropic tarda en importarse: solo se carga cuando hace falta un cliente
+            from client_provider import get_client
+            client = get_client()
+
+        request = build_extraction_request(image_data, media_type)
+        current.request_bytes = payload_bytes(request)
+        message = client.messages.create(**request)
+        current.record_usage(getattr(message, "usage", None))
+
+        extracted_text = message.content[0].text
+        if cache is not None:
+            cache.put(cache_key, extracted_text)
+
+        return extracted_text
+
+
+def write_extracted_text(path, extracted_text, issue_label="1609"):
+    """
+    Guarda el texto extraído con el encabezado estándar
+
+    Args:
+        path: Ruta del archivo .txt de salida
+        extracted_text: Texto extraído de la página
+        issue_label: Etiqueta de la edición para el encabezado
+    """
+    with open(path, 'w', encoding='utf-8') as f:
         f.write("="*80 + "\n")
-        f.write("TEXTO COMPLETO EXTRAÍDO - EL MARTILLO (Edición 1609)\n")
+        f.write(f"TEXTO COMPLETO EXTRAÍDO - EL MARTILLO (Edición {issue_label})\n")
         f.write(f"Fecha de extracción: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
         f.write("="*80 + "\n\n")
         f.write(extracted_text)
 
-    print(f"\n✅ Texto extraído y guardado en: {TEXT_OUTPUT_PATH}")
+
+def read_extracted_text(path):
+    """
+    Lee un .txt escrito por write_extracted_text, sin el encabezado
+
+    Args:
+        path: Ruta del archivo .txt
+
+    Returns:
+        str: Texto extraído de la página
+    """
+    with open(path, encoding='utf-8') as f:
+        content = f.read()
+    # Encabezado: línea, título, fecha, línea y una línea en blanco
+    return content.split("\n", 5)[5] if content.startswith("="*80) else content
+
+
+def step1_extract_text_to_txt(cache=None, stream=False, preprocess=None, image_path=IMAGE_PATH,
+                              text_path=TEXT_OUTPUT_PATH, backend=None):
+    """
+    PASO 1: Extraer texto del OCR y guardarlo en .txt
+
+    Args:
+        cache: ResponseCache opcional para no repetir el OCR de una imagen ya procesada
+        stream: Si es True, el texto se escribe en el .txt a medida que llega
+                (ver streaming_ocr.py); en este modo no se usa la caché
+        preprocess: Opciones de image_preprocessing.preprocess_image (dict) para
+                    reducir la imagen antes de enviarla; None la envía tal cual
+        image_path: Imagen de la página
+        text_path: Archivo .txt de salida
+        backend: Motor de OCR de ocr_backends.py (tesseract o auto); None usa
+                 Claude directamente, como siempre
+    """
+    print("\n" + "="*80)
+    print("PASO 1: EXTRACCIÓN DE TEXTO A ARCHIVO .TXT")
+    print("="*80)
+
+    if not os.path.exists(image_path):
+        print(f"⚠️  La imagen no existe en: {image_path}")
+        print("📝 Usando texto de ejemplo para demostración...")
+
+        extracted_text = EXAMPLE_TEXT
+    elif stream:
+        from streaming_ocr import format_seconds, stream_extract_to_file
+
+        print(f"📡 Procesando en streaming con Claude Vision API: {image_path}")
+        extracted_text, _, stats = stream_extract_to_file(image_path, text_path)
+        print(f"⏱️  Primer token: {format_seconds(stats.time_to_first_token)} - "
+              f"latencia total: {format_seconds(stats.total_latency)}")
+        print(f"\n✅ Texto extraído y guardado en: {text_path}")
+        print(f"📊 Longitud del texto: {len(extracted_text)} caracteres")
+        return extracted_text
+    elif backend is not None:
+        print(f"🔎 Procesando con el motor {backend.name}: {image_path}")
+        result = backend.extract(image_path)
+        extracted_text = result.text
+        confidence = f", confianza {result.confidence:.0f}" if result.confidence is not None else ""
+        print(f"   Motor: {result.backend}{confidence}"
+              + (f" - {result.reason}" if result.reason else ""))
+        print_backend_stats(backend.stats)
+    else:
+        print(f"📷 Cargando imagen desde: {image_path}")
+        media_type = "image/png"
+        if preprocess is not None:
+            from image_preprocessing import load_preprocessed_base64
+
+            image_data, media_type, report = load_preprocessed_base64(image_path, **preprocess)
+            print(f"🖼️  Imagen preprocesada: {report.original_bytes / 1024:.0f} KB → "
+                  f"{report.output_bytes / 1024:.0f} KB ({report.reduction:.0%} menos) "
+                  f"en {report.encode_seconds * 1000:.0f} ms")
+        else:
+            with open(image_path, "rb") as image_file:
+                image_data = base64.standard_b64encode(image_file.read()).decode("utf-8")
+
+        print("🔄 Procesando con Claude Vision API...")
+        extracted_text = extract_text_with_claude(image_data, media_type, cache=cache)
+
+    # Guardar texto extraído
+    write_extracted_text(text_path, extracted_text)
+
+    print(f"\n✅ Texto extraído y guardado en: {text_path}")
     print(f"📊 Longitud del texto: {len(extracted_text)} caracteres")
 
     return extracted_text
@@ -176,111 +330,31 @@ def generate_basic_structure(text_content):
     Genera una estructura básica del texto usando análisis de patrones simples
     (fallback cuando no hay API key de Claude)
 
+    El análisis está en rule_structurer.py (patrones precompilados, una sola
+    pasada y apto para textos grandes).
+
     Args:
         text_content: Texto completo extraído
 
     Returns:
         dict: Estructura JSON básica
     """
-    import re
-
-    # Extraer información básica del encabezado
-    lines = text_content.strip().split('\n')
-
-    # Buscar metadata básica
-    newspaper_name = "El Martillo"
-    date = "1916-08-05"
-    issue_number = 1609
-    location = "Chiclayo, Perú"
-
-    for line in lines[:10]:
-        if "Edición" in line and "No." in line:
-            match = re.search(r'No\.\s*(\d+)', line)
-            if match:
-                issue_number = int(match.group(1))
-        if re.search(r'\d{1,2}\s+de\s+\w+\s+de\s+\d{4}', line):
-            # Intentar extraer fecha
-            pass
-
-    # Dividir contenido en secciones basándose en separadores y patrones
-    content_items = []
-
-    # Buscar títulos (líneas en mayúsculas o con formato específico)
-    sections = re.split(r'={10,}|^[A-ZÁÉÍÓÚÑ\s]{10,}$', text_content, flags=re.MULTILINE)
-
-    for i, section in enumerate(sections):
-        section = section.strip()
-        if len(section) < 20:
-            continue
-
-        # Extraer título (primera línea significativa)
-        section_lines = [l for l in section.split('\n') if l.strip()]
-        if not section_lines:
-            continue
-
-        headline = section_lines[0].strip()[:100]
-
-        # Detectar si es anuncio
-        is_ad = any(keyword in section.upper() for keyword in ['VENDEDOR', 'COBRADOR', 'MÁQUINA', 'SINGER', 'RÓMULO'])
-
-        # Buscar autor
-        author = ""
-        author_match = re.search(r'Por\s+([A-Z][a-zA-Z\.\s]+)', section)
-        if author_match:
-            author = author_match.group(1).strip()
-
-        content_items.append({
-            "headline": headline,
-            "section": "Anuncios" if is_ad else "Artículo principal",
-            "type": "anuncio" if is_ad else "artículo",
-            "author": author,
-            "text_excerpt": section[:300].strip()
-        })
-
-    # Si no se encontraron secciones, crear una sola entrada
-    if not content_items:
-        content_items.append({
-            "headline": "Contenido completo",
-            "section": "Artículo principal",
-            "type": "artículo",
-            "author": "",
-            "text_excerpt": text_content[:500].strip()
-        })
+    return structure_text(text_content)
 
-    return {
-        "metadata": {
-            "newspaper_name": newspaper_name,
-            "date": date,
-            "issue_number": issue_number,
-            "location": location
-        },
-        "content": content_items
-    }
 
-
-def structure_text_with_claude(text_content):
+def build_structure_request(text_content):
     """
-    Usa Claude para analizar el texto extraído y generar un JSON estructurado automáticamente
+    Construye los parámetros de messages.create para estructurar un texto
+
+    La respuesta se pide como llamada a la herramienta registrar_estructura,
+    cuyo esquema es el de 'metadata' y 'content' (ver structured_output.py).
 
     Args:
         text_content: Texto completo extraído del OCR
 
     Returns:
-        dict: Estructura JSON con los datos organizados
+        dict: Argumentos para client.messages.create (sync o async)
     """
-    api_key = os.environ.get("ANTHROPIC_API_KEY")
-
-    if not api_key:
-        print("\n⚠️  ANTHROPIC_API_KEY no configurada")
-        print("💡 Para usar análisis automático con IA, configura tu API key:")
-        print("   export ANTHROPIC_API_KEY='tu-api-key-aqui'")
-        print("\n📝 Generando estructura de ejemplo automáticamente desde el texto...")
-
-        # Generar estructura básica analizando el texto
-        return generate_basic_structure(text_content)
-
-    client = anthropic.Anthropic(api_key=api_key)
-
     prompt = f"""Analiza el siguiente texto extraído de un periódico histórico y estructura la información en formato JSON.
 
 El JSON debe tener esta estructura:
@@ -312,52 +386,136 @@ IMPORTANTE:
 TEXTO A ANALIZAR:
 {text_content}
 
-Responde SOLO con el JSON, sin explicaciones adicionales."""
+Registra el resultado con la herramienta {STRUCTURE_TOOL_NAME}."""
 
-    message = client.messages.create(
-        model="claude-3-5-sonnet-20241022",
-        max_tokens=8000,
-        messages=[
+    return {
+        "model": MODEL_NAME,
+        "max_tokens": STRUCTURE_MAX_TOKENS,
+        "tools": [STRUCTURE_TOOL],
+        "tool_choice": {"type": "tool", "name": STRUCTURE_TOOL_NAME},
+        "messages": [
             {
                 "role": "user",
                 "content": prompt
             }
         ],
-    )
+    }
 
-    response_text = message.content[0].text.strip()
 
-    # Intentar extraer JSON si viene con markdown
-    if response_text.startswith("```json"):
-        response_text = response_text.split("```json")[1].split("```")[0].strip()
-    elif response_text.startswith("```"):
-        response_text = response_text.split("```")[1].split("```")[0].strip()
+def request_cache_key(kind, request):
+    """
+    Clave de caché de una petición de texto (modelo, prompt y max_tokens)
 
-    # Parsear JSON
-    structured_data = json.loads(response_text)
+    Args:
+        kind: Tipo de petición ("structure", ...)
+        request: Argumentos de messages.create
 
-    return structured_data
+    Returns:
+        str: Clave para ResponseCache
+    """
+    return make_key(kind, request["model"], json.dumps(request["messages"], ensure_ascii=False),
+                    json.dumps(request.get("tools"), ensure_ascii=False), request["max_tokens"])
 
 
-def step2_generate_csv(extracted_text):
+def structure_text_with_claude(text_content, client=None, cache=None):
     """
-    PASO 2: Generar CSV y JSON estructurado automáticamente desde el texto extraído
-    Usa Claude API para analizar el texto y estructurarlo
+    Usa Claude para analizar el texto extraído y generar un JSON estructurado automáticamente
+
+    Args:
+        text_content: Texto completo extraído del OCR
+        client: Cliente de Anthropic a usar (por defecto, el cliente compartido)
+        cache: ResponseCache opcional para reutilizar respuestas con el mismo prompt
+
+    Returns:
+        dict: Estructura JSON con los datos organizados
     """
-    print("\n" + "="*80)
-    print("PASO 2: GENERACIÓN AUTOMÁTICA DE JSON Y CSV ESTRUCTURADO")
-    print("="*80)
+    api_key = os.environ.get("ANTHROPIC_API_KEY")
 
-    print("\n🤖 Analizando texto con Claude para estructurar datos automáticamente...")
+    if client is None and not api_key:
+        print("\n⚠️  ANTHROPIC_API_KEY no configurada")
+        print("💡 Para usar análisis automático con IA, configura tu API key:")
+        print("   export ANTHROPIC_API_KEY='tu-api-key-aqui'")
+        print("\n📝 Generando estructura de ejemplo automáticamente desde el texto...")
 
-    # Usar Claude para estructurar el texto automáticamente
-    structured_data = structure_text_with_claude(extracted_text)
+        # Generar estructura básica analizando el texto
+        with span("structure", backend="reglas", chars=len(text_content)):
+            return generate_basic_structure(text_content)
+
+    with span("structure", chars=len(text_content)) as current:
+        request = build_structure_request(text_content)
+
+        cache_key = None
+        if cache is not None:
+            cache_key = request_cache_key("structure", request)
+            cached_text = cache.get(cache_key)
+            current.cache_hit = cached_text is not None
+            if cached_text is not None:
+                return parse_structured_response(cached_text)
+
+        if client is None:
+            from client_provider import get_client
+            client = get_client()
+
+        # En streaming se conserva el JSON parcial aunque la respuesta se corte; en
+        # ese caso se rescatan los elementos completos y solo se pide lo que falta
+        assembler = StructureAssembler(text_content, MAX_STRUCTURE_CONTINUATIONS)
+        usage = {}
+        while True:
+            current.request_bytes += payload_bytes(request)
+            raw, stop_reason = read_tool_stream(client.messages.create(stream=True, **request),
+                                                usage)
+            remaining = assembler.add_response(raw, stop_reason)
+            if remaining is None:
+                break
+            print(f"   ✂️  Respuesta incompleta ({stop_reason}): {len(assembler.content)} elementos "
+                  f"rescatados, se pide el resto ({len(remaining)} caracteres)")
+            request = build_structure_request(remaining)
+        current.record_usage(usage)
+        current.set(requests=assembler.requests, items=len(assembler.content),
+                    partial=assembler.partial)
+
+        structured_data = assembler.structure()
+
+        # Solo se guarda en caché una estructura completa
+        if assembler.partial:
+            print(f"   ⚠️  Estructura parcial ({len(assembler.content)} elementos, "
+                  f"{assembler.requests} peticiones): no se guarda en caché")
+        elif cache is not None:
+            cache.put(cache_key, json.dumps(structured_data, ensure_ascii=False))
+
+        return structured_data
+
+
+def parse_structured_response(response_text):
+    """
+    Convierte una respuesta JSON de Claude (quizá en un bloque markdown) en un diccionario
 
-    # Guardar JSON completo
-    with open(JSON_OUTPUT_PATH, 'w', encoding='utf-8') as f:
-        json.dump(structured_data, f, ensure_ascii=False, indent=2)
+    Args:
+        response_text: Texto devuelto por el modelo
+
+    Returns:
+        dict: Estructura JSON con los datos organizados
 
-    print(f"\n✅ JSON estructurado guardado en: {JSON_OUTPUT_PATH}")
+    Raises:
+        ValueError: Si la respuesta no es un JSON completo
+    """
+    structured_data, complete = salvage_structure(response_text)
+    if not complete:
+        raise ValueError("La respuesta no es un JSON completo")
+    return structured_data
+
+
+def structured_data_to_dataframe(structured_data):
+    """
+    Convierte la estructura JSON de una página en un DataFrame con las columnas del CSV
+
+    Args:
+        structured_data: Diccionario con 'metadata' y 'content'
+
+    Returns:
+        pd.DataFrame: Una fila por elemento de contenido
+    """
+    import pandas as pd
 
     # Extraer metadata
     metadata = structured_data.get('metadata', {})
@@ -375,130 +533,339 @@ def step2_generate_csv(extracted_text):
     # Crear DataFrame
     df = pd.DataFrame(content_items)
 
-    # Reordenar columnas
-    columns_order = ['date', 'issue_number', 'headline', 'section', 'type', 'author', 'text_excerpt']
-    # Solo usar columnas que existan
-    columns_order = [col for col in columns_order if col in df.columns]
-    df = df[columns_order]
+    # Reordenar columnas (solo usar columnas que existan)
+    columns_order = [col for col in CSV_COLUMNS if col in df.columns]
+    return df[columns_order]
+
+
+def step2_generate_csv(extracted_text, cache=None, store=None, page_id="1609",
+                       json_path=JSON_OUTPUT_PATH, csv_path=CSV_OUTPUT_PATH, stats=None):
+    """
+    PASO 2: Generar CSV y JSON estructurado automáticamente desde el texto extraído
+    Usa Claude API para analizar el texto y estructurarlo
+
+    Args:
+        extracted_text: Texto obtenido en el paso 1
+        cache: ResponseCache opcional para reutilizar la estructuración
+        store: CorpusStore opcional; si se indica, la página se añade también
+               al almacén Parquet
+        page_id: Identificador de la página en el almacén
+        json_path: Archivo JSON de salida
+        csv_path: Archivo CSV de salida
+        stats: CorpusStats opcional; la página se suma a las estadísticas
+               incrementales y las del corpus se leen de ahí (ver corpus_stats.py)
+    """
+    from corpus_stats import CORPUS, page_counters, summarize_counters
+
+    print("\n" + "="*80)
+    print("PASO 2: GENERACIÓN AUTOMÁTICA DE JSON Y CSV ESTRUCTURADO")
+    print("="*80)
+
+    print("\n🤖 Analizando texto con Claude para estructurar datos automáticamente...")
+
+    # Usar Claude para estructurar el texto automáticamente
+    if os.environ.get("ANTHROPIC_API_KEY"):
+        # Por secciones en paralelo: en una página larga el JSON de una sola
+        # respuesta se cortaría en max_tokens (las cortas siguen siendo una llamada)
+        from chunked_structuring import structure_text_chunked
+        structured_data = structure_text_chunked(extracted_text, cache=cache)
+    else:
+        structured_data = structure_text_with_claude(extracted_text, cache=cache)
 
-    # Guardar como CSV
-    df.to_csv(CSV_OUTPUT_PATH, index=False, encoding='utf-8')
+    # Guardar JSON completo
+    with span("write_json", page_id=page_id, path=json_path) as current:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(structured_data, f, ensure_ascii=False, indent=2)
+        current.record_file(json_path)
+
+    print(f"\n✅ JSON estructurado guardado en: {json_path}")
+
+    with span("write_csv", page_id=page_id, path=csv_path) as current:
+        df = structured_data_to_dataframe(structured_data)
+
+        # El CSV de la página sale de su DataFrame (exportarlo desde el almacén
+        # recorrería todo el corpus para filtrar una sola página)
+        df.to_csv(csv_path, index=False, encoding='utf-8')
+        current.record_file(csv_path)
 
     print(f"✅ CSV generado con {len(df)} registros")
-    print(f"📁 Guardado en: {CSV_OUTPUT_PATH}")
+    print(f"📁 Guardado en: {csv_path}")
 
-    # Estadísticas
+    if store is not None:
+        with span("store", page_id=page_id):
+            store.append_page(page_id, structured_data)
+        print(f"🗄️  Página añadida al almacén Parquet: {store.root}")
+
+    # Estadísticas: las de la página salen de su aporte, las del corpus de los agregados
+    page_summary = summarize_counters(page_counters(structured_data))
     print(f"\n📊 Estadísticas:")
-    if 'type' in df.columns:
-        type_counts = df['type'].value_counts()
-        for tipo, count in type_counts.items():
-            print(f"   - {tipo.capitalize()}: {count}")
-    print(f"   - Total de elementos: {len(df)}")
+    for tipo, count in page_summary["types"].items():
+        print(f"   - {tipo.capitalize()}: {count}")
+    print(f"   - Total de elementos: {page_summary['items']}")
+
+    if stats is not None:
+        with span("stats", page_id=page_id):
+            stats.add_page(page_id, structured_data)
+            corpus = stats.summary(CORPUS)
+        print(f"   - Corpus: {corpus['pages']} páginas, {corpus['items']} elementos, "
+              f"{corpus['chars']} caracteres ({stats.path})")
 
     return df
 
 
-def step3_generate_visualizations(df):
+def update_search_index(extracted_text, page_id="1609", json_path=JSON_OUTPUT_PATH):
+    """
+    Indexa la página en el índice de búsqueda (después del paso 2)
+
+    Usa el texto del paso 1 y el JSON estructurado del paso 2; si la página no
+    cambió desde la última vez, el índice no se toca (ver search_index.py).
+
+    Args:
+        extracted_text: Texto obtenido en el paso 1
+        page_id: Identificador de la página en el índice
+        json_path: JSON estructurado del paso 2
+    """
+    from search_index import DEFAULT_INDEX_PATH, SearchIndex
+
+    with open(json_path, encoding='utf-8') as f:
+        structured_data = json.load(f)
+
+    with SearchIndex(DEFAULT_INDEX_PATH) as index:
+        updated = index.index_page(page_id, extracted_text, structured_data)
+
+    if updated:
+        print(f"🔍 Página indexada para búsqueda en: {DEFAULT_INDEX_PATH}")
+    else:
+        print(f"🔍 Índice de búsqueda al día: {DEFAULT_INDEX_PATH}")
+
+
+def update_entity_index(extracted_text, page_id="1609", json_path=JSON_OUTPUT_PATH):
+    """
+    Registra las menciones de periódicos, personas y lugares de la página
+
+    Las entidades salen del gazetteer y el índice se guarda junto a los datos
+    estructurados (ver entity_index.py); una página sin cambios no se recorre.
+
+    Args:
+        extracted_text: Texto obtenido en el paso 1
+        page_id: Identificador de la página en el índice
+        json_path: JSON estructurado del paso 2
+    """
+    from entity_index import DEFAULT_MENTIONS_PATH, MentionIndex
+
+    with open(json_path, encoding='utf-8') as f:
+        structured_data = json.load(f)
+
+    with span("entities", page_id=page_id), MentionIndex(DEFAULT_MENTIONS_PATH) as index:
+        index.index_page(page_id, extracted_text, structured_data)
+        mentions = len(index.pages[page_id]["mentions"])
+
+    print(f"🏷️  {mentions} menciones de entidades registradas en: {DEFAULT_MENTIONS_PATH}")
+
+
+def step3_generate_visualizations(df, viz_dir=VIZ_DIR, summary=None, **render_options):
     """
     PASO 3: Generar visualizaciones desde el CSV
+
+    Los gráficos cuyos datos no cambiaron desde la última vez no se vuelven a
+    dibujar (ver generate_visualizations.py).
+
+    Args:
+        df: DataFrame del paso 2
+        viz_dir: Directorio donde guardar las imágenes
+        summary: Resumen de corpus_stats.py opcional del que sacar los datos
+                 agregados de los gráficos
+        **render_options: Opciones de render_visualizations (formato, vista
+                          previa, modo del gráfico de longitudes...)
     """
+    from generate_visualizations import render_visualizations
+
     print("\n" + "="*80)
     print("PASO 3: GENERACIÓN DE VISUALIZACIONES")
     print("="*80)
 
-    # Visualización 1: Distribución de tipos de contenido
-    print("\n📊 Generando visualización 1: Distribución de contenido...")
-    fig, axes = plt.subplots(1, 2, figsize=(14, 5))
-
-    # Gráfico de barras
-    type_counts = df['type'].value_counts()
-    axes[0].bar(type_counts.index, type_counts.values, color=['#2E86AB', '#A23B72'])
-    axes[0].set_title('Distribución de Tipos de Contenido\nEl Martillo - Edición 1609',
-                       fontsize=12, fontweight='bold')
-    axes[0].set_xlabel('Tipo de Contenido')
-    axes[0].set_ylabel('Cantidad')
-    axes[0].grid(axis='y', alpha=0.3)
-
-    # Añadir valores en las barras
-    for i, (tipo, valor) in enumerate(zip(type_counts.index, type_counts.values)):
-        axes[0].text(i, valor + 0.1, str(valor), ha='center', fontweight='bold')
-
-    # Gráfico circular
-    colors = ['#2E86AB', '#A23B72']
-    axes[1].pie(type_counts.values, labels=type_counts.index, autopct='%1.1f%%',
-                startangle=90, colors=colors)
-    axes[1].set_title('Proporción de Contenido\nArtículos vs Anuncios',
-                       fontsize=12, fontweight='bold')
-
-    plt.tight_layout()
-    viz1_path = os.path.join(VIZ_DIR, 'visualization_content_distribution.png')
-    plt.savefig(viz1_path, dpi=300, bbox_inches='tight')
-    plt.close()
-    print(f"   ✅ Guardada: {viz1_path}")
-
-    # Visualización 2: Longitud de los textos extraídos
-    print("\n📊 Generando visualización 2: Longitud de textos...")
-    df['text_length'] = df['text_excerpt'].str.len()
-
-    plt.figure(figsize=(12, 6))
-    bars = plt.barh(range(len(df)), df['text_length'], color='#F18F01')
-    plt.yticks(range(len(df)), [f"{row['headline'][:35]}..." if len(row['headline']) > 35
-                                 else row['headline'] for _, row in df.iterrows()], fontsize=9)
-    plt.xlabel('Longitud del texto (caracteres)', fontsize=10)
-    plt.title('Longitud de los Textos Extraídos por Sección\nEl Martillo - Edición 1609',
-              fontsize=12, fontweight='bold')
-    plt.grid(axis='x', alpha=0.3)
-
-    # Añadir valores en las barras
-    for i, (bar, length) in enumerate(zip(bars, df['text_length'])):
-        plt.text(length + 5, i, str(length), va='center', fontsize=8)
-
-    plt.tight_layout()
-    viz2_path = os.path.join(VIZ_DIR, 'visualization_text_lengths.png')
-    plt.savefig(viz2_path, dpi=300, bbox_inches='tight')
-    plt.close()
-    print(f"   ✅ Guardada: {viz2_path}")
-
-    # Visualización 3: Estadísticas generales
-    print("\n📊 Generando visualización 3: Estadísticas generales...")
-    fig, ax = plt.subplots(figsize=(10, 6))
-
-    stats = {
-        'Total de elementos': len(df),
-        'Artículos': len(df[df['type'] == 'artículo']),
-        'Anuncios': len(df[df['type'] == 'anuncio']),
-        'Promedio caracteres': int(df['text_length'].mean()),
-        'Total caracteres': df['text_length'].sum()
+    render_visualizations(df, viz_dir, summary=summary, **render_options)
+
+    print("\n✅ Todas las visualizaciones generadas exitosamente")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Procesamiento OCR de El Martillo (1916)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    paths = {
+        "extract": argparse.ArgumentParser(add_help=False),
+        "structure": argparse.ArgumentParser(add_help=False),
+        "render": argparse.ArgumentParser(add_help=False),
     }
+    paths["extract"].add_argument("--image", default=IMAGE_PATH,
+                                  help=f"Imagen de la página (por defecto: {IMAGE_PATH})")
+    paths["extract"].add_argument("--stream", action="store_true",
+                                  help="Escribir el .txt a medida que llega el texto (sin caché)")
+    paths["extract"].add_argument("--preprocess", action="store_true",
+                                  help="Reducir la imagen antes de enviarla (ver image_preprocessing.py)")
+    add_backend_arguments(paths["extract"])
+    for name in ("extract", "structure"):
+        paths[name].add_argument("--text", default=TEXT_OUTPUT_PATH,
+                                 help=f"Archivo .txt del texto extraído (por defecto: {TEXT_OUTPUT_PATH})")
+        paths[name].add_argument("--no-cache", action="store_true",
+                                 help="No usar la caché de respuestas")
+    paths["structure"].add_argument("--json", default=JSON_OUTPUT_PATH,
+                                    help=f"JSON estructurado (por defecto: {JSON_OUTPUT_PATH})")
+    paths["structure"].add_argument("--page-id", default="1609",
+                                    help="Identificador de la página en el índice de búsqueda")
+    paths["structure"].add_argument("--store", metavar="DIR",
+                                    help="Añadir la página a un almacén Parquet (ver corpus_store.py)")
+    paths["structure"].add_argument("--no-index", action="store_true",
+                                    help="No actualizar el índice de búsqueda")
+    paths["structure"].add_argument("--no-entities", action="store_true",
+                                    help="No actualizar el índice de menciones de entidades")
+    paths["structure"].add_argument("--stats", default=DEFAULT_STATS_PATH, metavar="SQLITE",
+                                    help=f"Estadísticas incrementales del corpus "
+                                         f"(por defecto: {DEFAULT_STATS_PATH})")
+    paths["structure"].add_argument("--no-stats", action="store_true",
+                                    help="No actualizar las estadísticas incrementales del corpus")
+    for name in ("structure", "render"):
+        paths[name].add_argument("--csv", default=CSV_OUTPUT_PATH,
+                                 help=f"CSV estructurado (por defecto: {CSV_OUTPUT_PATH})")
+    paths["render"].add_argument("--viz-dir", default=VIZ_DIR,
+                                 help=f"Directorio de las visualizaciones (por defecto: {VIZ_DIR})")
+    add_render_arguments(paths["render"], format_flag="--viz-format")
+
+    # Traza, métricas y perfil valen para cualquier subcomando (ver instrumentation.py)
+    instrumentation = argparse.ArgumentParser(add_help=False)
+    add_instrumentation_arguments(instrumentation,
+                                  profile_help="Perfilar la página con cProfile y guardar el .prof aquí")
+
+    subparsers.add_parser("extract", parents=[paths["extract"], instrumentation],
+                          help="Paso 1: extraer el texto de la imagen a .txt")
+    subparsers.add_parser("structure", parents=[paths["structure"], instrumentation],
+                          help="Paso 2: estructurar el .txt en JSON y CSV")
+    subparsers.add_parser("render", parents=[paths["render"], instrumentation],
+                          help="Paso 3: generar las visualizaciones desde el CSV")
+    subparsers.add_parser("all", conflict_handler="resolve",
+                          parents=list(paths.values()) + [instrumentation],
+                          help="Los tres pasos (por defecto)")
+    return parser.parse_args(argv)
+
+
+def run_extract(args, cache=None):
+    """
+    Subcomando extract: paso 1 con las rutas de args
+    """
+    preprocess = {} if args.preprocess else None
+    backend = backend_from_args(args, cache=cache, preprocess=preprocess)
+    return step1_extract_text_to_txt(cache=cache, stream=args.stream, preprocess=preprocess,
+                                     image_path=args.image, text_path=args.text, backend=backend)
 
-    y_pos = range(len(stats))
-    values = list(stats.values())
 
-    bars = ax.barh(y_pos, values, color=['#06AED5', '#086788', '#DD1C1A', '#F0A202', '#2E86AB'])
-    ax.set_yticks(y_pos)
-    ax.set_yticklabels(stats.keys())
-    ax.set_xlabel('Valor', fontsize=10)
-    ax.set_title('Estadísticas Generales del Análisis\nEl Martillo - Edición 1609',
-                 fontsize=12, fontweight='bold')
-    ax.grid(axis='x', alpha=0.3)
+def run_structure(args, cache=None, extracted_text=None):
+    """
+    Subcomando structure: paso 2 (y el índice de búsqueda) con las rutas de args
+    """
+    from corpus_stats import CorpusStats
+
+    if extracted_text is None:
+        extracted_text = read_extracted_text(args.text)
+    store = None
+    if args.store:
+        # pyarrow solo hace falta si se usa el almacén
+        from corpus_store import CorpusStore
+        store = CorpusStore(args.store)
+    stats = None if args.no_stats else CorpusStats(args.stats)
+    try:
+        df = step2_generate_csv(extracted_text, cache=cache, store=store, page_id=args.page_id,
+                                json_path=args.json, csv_path=args.csv, stats=stats)
+    finally:
+        if stats is not None:
+            stats.close()
+    if not args.no_index:
+        update_search_index(extracted_text, args.page_id, json_path=args.json)
+    if not args.no_entities:
+        update_entity_index(extracted_text, args.page_id, json_path=args.json)
+    return df
 
-    # Añadir valores
-    for i, (bar, val) in enumerate(zip(bars, values)):
-        ax.text(val + max(values)*0.02, i, str(val), va='center', fontsize=9, fontweight='bold')
 
-    plt.tight_layout()
-    viz3_path = os.path.join(VIZ_DIR, 'visualization_statistics.png')
-    plt.savefig(viz3_path, dpi=300, bbox_inches='tight')
-    plt.close()
-    print(f"   ✅ Guardada: {viz3_path}")
+def run_render(args, df=None, summary=None):
+    """
+    Subcomando render: paso 3 desde el CSV de args (o desde el DataFrame del paso 2)
+    """
+    if df is None:
+        import pandas as pd
+        df = pd.read_csv(args.csv)
+    step3_generate_visualizations(df, viz_dir=args.viz_dir, summary=summary,
+                                  **render_options_from_args(args))
 
-    print("\n✅ Todas las visualizaciones generadas exitosamente")
 
+def edition_summary(df, stats_path=DEFAULT_STATS_PATH):
+    """
+    Agregados de la edición de la página recién estructurada (corpus_stats.py)
+
+    Args:
+        df: DataFrame de la página
+        stats_path: Archivo SQLite de las estadísticas
 
-def main():
+    Returns:
+        dict: CorpusStats.summary() de la edición, o None sin número de edición
     """
-    Función principal que ejecuta todo el flujo
+    from corpus_stats import CorpusStats, issue_scope, page_edition
+
+    if 'issue_number' not in df.columns or df.empty:
+        return None
+    issue_number, _ = page_edition({'issue_number': df['issue_number'].iloc[0]})
+    if issue_number is None:
+        return None
+    with CorpusStats(stats_path) as stats:
+        return stats.summary(issue_scope(issue_number))
+
+
+def main(argv=None):
+    """
+    Función principal: ejecuta un paso o, sin subcomando, todo el flujo
     """
+    import sys
+
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or (argv[0].startswith("-") and argv[0] not in ("-h", "--help")):
+        argv = ["all"] + argv
+    args = parse_args(argv)
+
+    tracer = tracer_from_args(args)
+    if tracer is not None:
+        set_tracer(tracer)
+    try:
+        with profile(args.profile):
+            run_command(args)
+    finally:
+        if tracer is not None:
+            tracer.close()
+            print("\n📈 Etapas instrumentadas:")
+            print_summary(tracer.summary())
+            if args.trace:
+                print(f"   Traza: {args.trace}")
+            if args.metrics:
+                print(f"   Métricas: {args.metrics}")
+
+
+def run_command(args):
+    """
+    Ejecuta el subcomando de args (o el flujo completo con "all")
+    """
+    # Caché de respuestas: si la imagen o el texto no cambiaron, no se repite la llamada
+    cache = None
+    if args.command in ("extract", "structure", "all") and not args.no_cache:
+        cache = ResponseCache(CACHE_PATH)
+
+    if args.command == "extract":
+        run_extract(args, cache)
+        return
+    if args.command == "structure":
+        run_structure(args, cache)
+        return
+    if args.command == "render":
+        run_render(args)
+        return
+
     print("\n" + "="*80)
     print("🔍 PROCESAMIENTO OCR - EL MARTILLO (1916)")
     print("="*80)
@@ -509,23 +876,40 @@ def main():
     print("="*80)
 
     # PASO 1: Extraer texto a .txt
-    extracted_text = step1_extract_text_to_txt()
+    extracted_text = run_extract(args, cache)
 
-    # PASO 2: Generar CSV estructurado
-    df = step2_generate_csv(extracted_text)
+    # PASO 2: Generar CSV estructurado (e índice de búsqueda de texto completo)
+    df = run_structure(args, cache, extracted_text)
 
-    # PASO 3: Generar visualizaciones
-    step3_generate_visualizations(df)
+    # PASO 3: Generar visualizaciones (con los agregados de la edición, sin recorrer el corpus).
+    # Las filas de la edición no están a mano: si el gráfico de longitudes las
+    # necesita (modos rows y top), todos los gráficos salen de la página
+    summary = None if args.no_stats else edition_summary(df, args.stats)
+    if summary is not None and \
+            resolve_length_mode(args.length_mode, summary["items"]) != "histogram":
+        summary = None
+    run_render(args, df, summary)
 
     # Resumen final
     print("\n" + "="*80)
     print("✅ PROCESAMIENTO COMPLETADO")
     print("="*80)
     print(f"\n📁 Archivos generados:")
-    print(f"   1. Texto completo:     {TEXT_OUTPUT_PATH}")
-    print(f"   2. JSON estructurado:  {JSON_OUTPUT_PATH}")
-    print(f"   3. CSV estructurado:   {CSV_OUTPUT_PATH}")
-    print(f"   4. Visualizaciones:    {VIZ_DIR}visualization_*.png")
+    print(f"   1. Texto completo:     {args.text}")
+    print(f"   2. JSON estructurado:  {args.json}")
+    print(f"   3. CSV estructurado:   {args.csv}")
+    print(f"   4. Visualizaciones:    {os.path.join(args.viz_dir, f'visualization_*.{args.viz_format}')}")
+    if not args.no_index:
+        print(f"   5. Índice de búsqueda: python3 search_index.py query \"...\"")
+    if not args.no_entities:
+        print(f"   6. Menciones:          python3 entity_index.py report")
+    if not args.no_stats:
+        print(f"   7. Estadísticas:       python3 corpus_stats.py --stats {args.stats} summary")
+
+    if cache is not None:
+        cache_stats = cache.stats()
+        print(f"\n💾 Caché de respuestas: {cache_stats['hits']} aciertos, "
+              f"{cache_stats['misses']} fallos ({CACHE_PATH})")
     print("\n" + "="*80)
 
 
@@ -0,0 +1,677 @@
+#!/usr/bin/env python3
+"""
+Limitador de ritmo adaptativo y reintentos para las llamadas a la API
+
+La API limita las peticiones por minuto (RPM) y los tokens de entrada y de
+salida por minuto (ITPM / OTPM). Sin control, un error 429/529 o un timeout
+aborta la página (o todo main()), y subir la concurrencia solo hace que se
+choque antes contra el límite. Este módulo:
+- Presupuesta cada petición en tres cubetas de tokens (token bucket) que se
+  rellenan de forma continua: peticiones, tokens de entrada estimados y una
+  estimación de la salida (como mucho OUTPUT_ESTIMATE_TOKENS), que settle
+  corrige con el uso real; lo que se gastó de más queda como deuda en la cubeta
+- Comparte el estado entre hilos y, con state_path, entre procesos (un
+  archivo JSON protegido con flock), así que varios lotes en paralelo
+  respetan el mismo presupuesto
+- Reintenta los errores transitorios (429, 529, 5xx, timeouts y errores de
+  conexión) con espera exponencial con jitter, respetando retry-after
+- Se adapta: tras un 429 todos los trabajadores se detienen hasta que vence
+  retry-after y el ritmo baja a la mitad; cada éxito lo recupera poco a poco
+- Registra métricas: tiempo de espera, reintentos y errores por código
+
+Se usa envolviendo el cliente (ClientProvider(limiter=...) lo hace solo):
+    client = RateLimitedClient(anthropic.Anthropic(max_retries=0), RateLimiter(rpm=50))
+
+Prueba contra el servidor falso, que devuelve 429 por encima de 30 RPM:
+    python3 rate_limiter.py --pages 40 --rpm 60 --server-rpm 30 --workers 8
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from types import SimpleNamespace
+
+import anthropic
+
+try:
+    import fcntl
+except ImportError:
+    # Sin flock (Windows) el estado solo se comparte entre hilos
+    fcntl = None
+
+# Límites por defecto (nivel inicial de la API); 0 o None desactiva una cubeta
+DEFAULT_RPM = 50
+DEFAULT_INPUT_TPM = 30000
+DEFAULT_OUTPUT_TPM = 8000
+# Salida que se reserva por petición (o max_tokens, si es menor). Reservar
+# max_tokens entero dejaría una sola estructuración en curso por minuto con
+# el OTPM por defecto
+OUTPUT_ESTIMATE_TOKENS = 2000
+
+DEFAULT_MAX_RETRIES = 6
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 60.0
+
+# Ajuste adaptativo del ritmo (aumento aditivo, reducción multiplicativa)
+THROTTLE_FACTOR = 0.5
+RECOVERY_STEP = 0.05
+MIN_RATE_SCALE = 0.1
+
+# Espera máxima entre comprobaciones: settle() puede devolver tokens de salida
+# reservados de más antes de que se rellene la cubeta
+MAX_POLL_SECONDS = 1.0
+
+REQUESTS = "requests"
+INPUT_TOKENS = "input_tokens"
+OUTPUT_TOKENS = "output_tokens"
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+RATE_LIMITED = 429
+OVERLOADED = 529
+
+# La API reduce las imágenes a ~1.15 MP y cobra ~1 token por cada 750 píxeles
+IMAGE_PIXELS_PER_TOKEN = 750
+MAX_IMAGE_TOKENS = 1600
+
+
+class RateLimitMetrics:
+    """
+    Contadores de esperas y reintentos, seguros entre hilos
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.retries = 0
+        self.retry_seconds = 0.0
+        self.failures = 0
+        self.errors_by_status = {}
+        self._lock = threading.Lock()
+
+    def record_request(self, waited):
+        with self._lock:
+            self.requests += 1
+            if waited > 0:
+                self.waits += 1
+                self.wait_seconds += waited
+
+    def record_retry(self, status, delay):
+        with self._lock:
+            self.retries += 1
+            self.retry_seconds += delay
+            key = str(status or "conexión")
+            self.errors_by_status[key] = self.errors_by_status.get(key, 0) + 1
+
+    def record_failure(self, status):
+        with self._lock:
+            self.failures += 1
+            key = str(status or "conexión")
+            self.errors_by_status[key] = self.errors_by_status.get(key, 0) + 1
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "waits": self.waits,
+                "wait_seconds": self.wait_seconds,
+                "retries": self.retries,
+                "retry_seconds": self.retry_seconds,
+                "failures": self.failures,
+                "errors_by_status": dict(self.errors_by_status),
+            }
+
+
+class RateLimiter:
+    """
+    Cubetas de tokens para RPM, ITPM y OTPM, compartidas entre hilos y procesos
+
+    Args:
+        rpm: Peticiones por minuto
+        input_tpm: Tokens de entrada por minuto
+        output_tpm: Tokens de salida por minuto
+        state_path: Archivo de estado compartido entre procesos (None: solo
+                    este proceso)
+        metrics: RateLimitMetrics donde registrar las esperas
+    """
+
+    def __init__(self, rpm=DEFAULT_RPM, input_tpm=DEFAULT_INPUT_TPM, output_tpm=DEFAULT_OUTPUT_TPM,
+                 state_path=None, metrics=None):
+        self.limits = {REQUESTS: rpm, INPUT_TOKENS: input_tpm, OUTPUT_TOKENS: output_tpm}
+        self.state_path = state_path
+        self.metrics = metrics or RateLimitMetrics()
+        self._state = None
+        self._lock = threading.Lock()
+
+    def _initial_state(self):
+        # Cubetas llenas: se permite una ráfaga de hasta un minuto de presupuesto
+        return {
+            "updated_at": time.time(),
+            "levels": {name: float(limit or 0) for name, limit in self.limits.items()},
+            "scale": 1.0,
+            "blocked_until": 0.0,
+        }
+
+    @contextmanager
+    def _locked_state(self):
+        """
+        Estado de las cubetas bajo exclusión mutua (entre hilos y procesos)
+
+        El estado solo se guarda si el bloque termina sin excepción.
+        """
+        with self._lock:
+            if self.state_path is None:
+                if self._state is None:
+                    self._state = self._initial_state()
+                yield self._state
+                return
+
+            fd = os.open(self.state_path, os.O_RDWR | os.O_CREAT, 0o644)
+            with os.fdopen(fd, 'r+', encoding='utf-8') as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    state = json.loads(f.read())
+                except ValueError:
+                    state = self._initial_state()
+                yield state
+                f.seek(0)
+                f.truncate()
+                json.dump(state, f)
+                f.flush()
+
+    def _refill(self, state, now):
+        elapsed = max(0.0, now - state["updated_at"])
+        state["updated_at"] = now
+        for name, limit in self.limits.items():
+            if not limit:
+                continue
+            capacity = limit * state["scale"]
+            level = state["levels"].get(name, capacity)
+            state["levels"][name] = min(capacity, level + elapsed * capacity / 60)
+
+    def try_acquire(self, cost):
+        """
+        Intenta reservar el costo de una petición sin esperar
+
+        Args:
+            cost: dict con las cantidades por cubeta (REQUESTS, INPUT_TOKENS,
+                  OUTPUT_TOKENS)
+
+        Returns:
+            float: 0 si se reservó; si no, segundos a esperar antes de reintentar
+        """
+        now = time.time()
+        with self._locked_state() as state:
+            self._refill(state, now)
+            if state["blocked_until"] > now:
+                return state["blocked_until"] - now
+
+            wait = 0.0
+            for name, amount in cost.items():
+                limit = self.limits.get(name)
+                if not limit:
+                    continue
+                capacity = limit * state["scale"]
+                # Una petición mayor que la cubeta espera a que esté llena
+                needed = min(amount, capacity) - state["levels"][name]
+                if needed > 0:
+                    wait = max(wait, needed * 60 / capacity)
+            if wait > 0:
+                return wait
+
+            for name, amount in cost.items():
+                if self.limits.get(name):
+                    state["levels"][name] -= amount
+            return 0.0
+
+    def acquire(self, cost):
+        """
+        Espera hasta poder reservar el costo de una petición
+
+        Returns:
+            float: Segundos esperados
+        """
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(cost)
+            if wait <= 0:
+                self.metrics.record_request(waited)
+                return waited
+            # Un poco de jitter para que los trabajadores no despierten a la vez
+            wait = min(wait, MAX_POLL_SECONDS) + random.uniform(0, 0.05)
+            time.sleep(wait)
+            waited += wait
+
+    async def acquire_async(self, cost):
+        """
+        Igual que acquire, pero esperando con asyncio.sleep
+        """
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(cost)
+            if wait <= 0:
+                self.metrics.record_request(waited)
+                return waited
+            wait = min(wait, MAX_POLL_SECONDS) + random.uniform(0, 0.05)
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def settle(self, cost, usage):
+        """
+        Ajusta la reserva con el uso real y recupera parte del ritmo
+
+        Args:
+            cost: Costo reservado con acquire
+            usage: Objeto usage de la respuesta (input_tokens, output_tokens)
+        """
+        with self._locked_state() as state:
+            state["scale"] = min(1.0, state["scale"] + RECOVERY_STEP)
+            if usage is None:
+                return
+            for name in (INPUT_TOKENS, OUTPUT_TOKENS):
+                actual = getattr(usage, name, None)
+                if not self.limits.get(name) or actual is None or name not in cost:
+                    continue
+                capacity = self.limits[name] * state["scale"]
+                state["levels"][name] = min(capacity, state["levels"][name] + cost[name] - actual)
+
+    def throttle(self, retry_after):
+        """
+        Detiene a todos los trabajadores durante retry_after y reduce el ritmo
+
+        Args:
+            retry_after: Segundos que indicó la API (o la espera calculada)
+        """
+        with self._locked_state() as state:
+            state["blocked_until"] = max(state["blocked_until"], time.time() + retry_after)
+            state["scale"] = max(MIN_RATE_SCALE, state["scale"] * THROTTLE_FACTOR)
+            for name, level in state["levels"].items():
+                if self.limits.get(name):
+                    state["levels"][name] = min(level, self.limits[name] * state["scale"])
+
+    def rate_scale(self):
+        with self._locked_state() as state:
+            return state["scale"]
+
+
+@dataclass
+class RetryPolicy:
+    """
+    Reintentos con espera exponencial y jitter completo
+
+    Args:
+        max_retries: Reintentos tras el primer intento
+        base_delay: Espera base, en segundos
+        max_delay: Espera máxima por reintento, en segundos
+    """
+    max_retries: int = DEFAULT_MAX_RETRIES
+    base_delay: float = DEFAULT_BASE_DELAY
+    max_delay: float = DEFAULT_MAX_DELAY
+
+    def delay(self, attempt, retry_after=None):
+        """
+        Segundos a esperar antes del reintento número attempt (desde 0)
+
+        Si la API indicó retry-after se espera al menos eso, más un jitter
+        pequeño para repartir los reintentos de los distintos trabajadores.
+        """
+        if retry_after is not None:
+            return min(self.max_delay, retry_after) + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+def classify_error(exc):
+    """
+    Decide si un error de la API es transitorio
+
+    Returns:
+        tuple: (reintentable, código HTTP o None, retry-after en segundos o None)
+    """
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        retryable = status in RETRYABLE_STATUS
+    else:
+        # APITimeoutError es subclase de APIConnectionError
+        retryable = isinstance(exc, anthropic.APIConnectionError)
+
+    retry_after = None
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            retry_after = float(headers["retry-after-ms"]) / 1000
+        elif headers.get("retry-after"):
+            retry_after = float(headers["retry-after"])
+    except ValueError:
+        # retry-after también puede ser una fecha HTTP; se usa la espera calculada
+        retry_after = None
+    return retryable, status, retry_after
+
+
+def _image_tokens(block):
+    source = block.get("source", {})
+    try:
+        from PIL import Image
+        with Image.open(io.BytesIO(base64.b64decode(source.get("data", "")))) as image:
+            width, height = image.size
+        return min(MAX_IMAGE_TOKENS, width * height // IMAGE_PIXELS_PER_TOKEN + 1)
+    except Exception:
+        return MAX_IMAGE_TOKENS
+
+
+def estimate_request_cost(request):
+    """
+    Estima el costo de una petición para las tres cubetas
+
+    Args:
+        request: Argumentos de messages.create
+
+    Returns:
+        dict: Peticiones, tokens de entrada (≈4 caracteres por token, y las
+              imágenes por sus píxeles) y la salida estimada (max_tokens, como
+              mucho OUTPUT_ESTIMATE_TOKENS)
+    """
+    chars = 0
+    image_tokens = 0
+    system = request.get("system") or []
+    if isinstance(system, str):
+        chars += len(system)
+    else:
+        chars += sum(len(block.get("text", "")) for block in system)
+
+    for message in request.get("messages", []):
+        content = message["content"]
+        if isinstance(content, str):
+            chars += len(content)
+            continue
+        for block in content:
+            if block.get("type") == "image":
+                image_tokens += _image_tokens(block)
+            else:
+                chars += len(block.get("text", ""))
+
+    return {
+        REQUESTS: 1,
+        INPUT_TOKENS: chars // 4 + image_tokens,
+        OUTPUT_TOKENS: min(request.get("max_tokens", 0), OUTPUT_ESTIMATE_TOKENS),
+    }
+
+
+def _record_stream_usage(usage, event):
+    """
+    Suma al uso de una respuesta en streaming el de un evento
+
+    message_start trae los tokens de entrada y message_delta el total de salida.
+    """
+    if event.type == "message_start":
+        usage.input_tokens = getattr(event.message.usage, "input_tokens", None)
+    elif event.type == "message_delta":
+        usage.output_tokens = getattr(event.usage, "output_tokens", None)
+
+
+class _SettlingStream:
+    """
+    Eventos de messages.create(stream=True) que ajustan la reserva al terminar
+
+    El objeto Stream no tiene usage: se toma de los propios eventos y settle se
+    llama cuando el stream se agota (o se abandona), con lo que se haya visto.
+    """
+
+    def __init__(self, stream, limiter, cost):
+        self._stream = stream
+        self._limiter = limiter
+        self._cost = cost
+
+    def __iter__(self):
+        usage = SimpleNamespace(input_tokens=None, output_tokens=None)
+        try:
+            for event in self._stream:
+                _record_stream_usage(usage, event)
+                yield event
+        finally:
+            self._limiter.settle(self._cost, usage)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class _AsyncSettlingStream(_SettlingStream):
+    async def __aiter__(self):
+        usage = SimpleNamespace(input_tokens=None, output_tokens=None)
+        try:
+            async for event in self._stream:
+                _record_stream_usage(usage, event)
+                yield event
+        finally:
+            self._limiter.settle(self._cost, usage)
+
+
+class _SettlingStreamManager:
+    """
+    Envuelve messages.stream(): abre el stream con los mismos reintentos que
+    create y, al salir, ajusta la reserva con el uso de get_final_message()
+    """
+
+    def __init__(self, messages, kwargs):
+        self._messages = messages
+        self._kwargs = kwargs
+        self._cost = estimate_request_cost(kwargs)
+        self._manager = None
+        self._stream = None
+
+    def __enter__(self):
+        owner = self._messages
+        for attempt in range(owner._policy.max_retries + 1):
+            owner._limiter.acquire(self._cost)
+            try:
+                manager = owner._messages.stream(**self._kwargs)
+                stream = manager.__enter__()
+            except Exception as exc:
+                delay = owner._should_retry(exc, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            self._manager, self._stream = manager, stream
+            return stream
+
+    def __exit__(self, exc_type, exc, traceback):
+        usage = None
+        try:
+            if exc_type is None:
+                usage = getattr(self._stream.get_final_message(), "usage", None)
+        finally:
+            try:
+                # Con un error a medio stream queda reservada la estimación
+                self._messages._limiter.settle(self._cost, usage)
+            finally:
+                suppress = self._manager.__exit__(exc_type, exc, traceback)
+        return suppress
+
+
+class _RateLimitedMessages:
+    def __init__(self, messages, limiter, policy):
+        self._messages = messages
+        self._limiter = limiter
+        self._policy = policy
+
+    def _should_retry(self, exc, attempt):
+        """
+        Registra el error y devuelve la espera antes del reintento (None: no reintentar)
+        """
+        retryable, status, retry_after = classify_error(exc)
+        if not retryable or attempt == self._policy.max_retries:
+            self._limiter.metrics.record_failure(status)
+            return None
+        delay = self._policy.delay(attempt, retry_after)
+        if status == RATE_LIMITED:
+            self._limiter.throttle(delay)
+        self._limiter.metrics.record_retry(status, delay)
+        return delay
+
+    def create(self, **kwargs):
+        cost = estimate_request_cost(kwargs)
+        for attempt in range(self._policy.max_retries + 1):
+            self._limiter.acquire(cost)
+            try:
+                message = self._messages.create(**kwargs)
+            except Exception as exc:
+                delay = self._should_retry(exc, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            if kwargs.get("stream"):
+                return _SettlingStream(message, self._limiter, cost)
+            self._limiter.settle(cost, getattr(message, "usage", None))
+            return message
+
+    def stream(self, **kwargs):
+        return _SettlingStreamManager(self, kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._messages, name)
+
+
+class _AsyncRateLimitedMessages(_RateLimitedMessages):
+    async def create(self, **kwargs):
+        cost = estimate_request_cost(kwargs)
+        for attempt in range(self._policy.max_retries + 1):
+            await self._limiter.acquire_async(cost)
+            try:
+                message = await self._messages.create(**kwargs)
+            except Exception as exc:
+                delay = self._should_retry(exc, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            if kwargs.get("stream"):
+                return _AsyncSettlingStream(message, self._limiter, cost)
+            self._limiter.settle(cost, getattr(message, "usage", None))
+            return message
+
+
+class RateLimitedClient:
+    """
+    Envuelve un cliente de Anthropic (real o falso) con el limitador y los reintentos
+
+    Conviene crear el cliente real con max_retries=0 para que no se sumen los
+    reintentos del SDK a los de aquí.
+
+    Args:
+        client: anthropic.Anthropic, anthropic.AsyncAnthropic o un cliente falso
+        limiter: RateLimiter compartido
+        policy: RetryPolicy (por defecto, la estándar)
+        is_async: El cliente es asíncrono (messages.create devuelve una corrutina)
+    """
+
+    def __init__(self, client, limiter, policy=None, is_async=False):
+        self.client = client
+        self.limiter = limiter
+        self.policy = policy or RetryPolicy()
+        messages_class = _AsyncRateLimitedMessages if is_async else _RateLimitedMessages
+        self.messages = messages_class(client.messages, limiter, self.policy)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+def add_rate_limit_arguments(parser):
+    """
+    Agrega al parser las opciones del limitador
+    """
+    parser.add_argument("--rate-limit", action="store_true",
+                        help="Limitar el ritmo de llamadas y reintentar errores transitorios "
+                             "(ver rate_limiter.py)")
+    parser.add_argument("--rpm", type=int, default=DEFAULT_RPM,
+                        help=f"Peticiones por minuto (por defecto: {DEFAULT_RPM})")
+    parser.add_argument("--input-tpm", type=int, default=DEFAULT_INPUT_TPM,
+                        help=f"Tokens de entrada por minuto (por defecto: {DEFAULT_INPUT_TPM})")
+    parser.add_argument("--output-tpm", type=int, default=DEFAULT_OUTPUT_TPM,
+                        help=f"Tokens de salida por minuto (por defecto: {DEFAULT_OUTPUT_TPM})")
+    parser.add_argument("--rate-state", metavar="ARCHIVO",
+                        help="Estado compartido con otros procesos que usan la misma API key")
+    parser.add_argument("--max-retries", type=int, default=DEFAULT_MAX_RETRIES,
+                        help=f"Reintentos por llamada (por defecto: {DEFAULT_MAX_RETRIES})")
+
+
+def rate_limiter_from_args(args):
+    """
+    Construye el limitador y la política de reintentos a partir de los argumentos
+
+    Returns:
+        tuple: (RateLimiter, RetryPolicy), o (None, None) sin --rate-limit
+    """
+    if not args.rate_limit:
+        return None, None
+    limiter = RateLimiter(args.rpm, args.input_tpm, args.output_tpm, state_path=args.rate_state)
+    return limiter, RetryPolicy(max_retries=args.max_retries)
+
+
+def print_metrics(metrics):
+    stats = metrics.as_dict()
+    errors = ", ".join(f"{status}: {count}" for status, count in sorted(stats["errors_by_status"].items()))
+    print(f"🚦 Ritmo: {stats['requests']} peticiones, {stats['waits']} esperas "
+          f"({stats['wait_seconds']:.1f} s), {stats['retries']} reintentos "
+          f"({stats['retry_seconds']:.1f} s), {stats['failures']} fallos"
+          + (f" - errores: {errors}" if errors else ""))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Probar el limitador contra el servidor falso con límite de ritmo")
+    parser.add_argument("--pages", type=int, default=40, help="Peticiones de prueba")
+    parser.add_argument("--workers", type=int, default=8, help="Hilos en paralelo")
+    parser.add_argument("--server-rpm", type=int, default=30,
+                        help="RPM a partir del cual el servidor falso responde 429")
+    parser.add_argument("--overload-rate", type=float, default=0.05,
+                        help="Fracción de peticiones a las que el servidor responde 529")
+    parser.add_argument("--latency", type=float, default=0.2,
+                        help="Latencia simulada del servidor, en segundos")
+    add_rate_limit_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from fake_anthropic import FakeAnthropicServer
+    from process_ocr import build_structure_request
+
+    args = parse_args(argv)
+    limiter = RateLimiter(args.rpm, args.input_tpm, args.output_tpm, state_path=args.rate_state)
+    policy = RetryPolicy(max_retries=args.max_retries)
+
+    with FakeAnthropicServer(latency=args.latency, rpm_limit=args.server_rpm,
+                             overload_rate=args.overload_rate, seed=0) as server:
+        client = RateLimitedClient(
+            anthropic.Anthropic(api_key="fake", base_url=server.base_url, max_retries=0),
+            limiter, policy)
+        request = build_structure_request("PERIÓDICO EL MARTILLO\nEdición No. 1609")
+
+        print(f"🚦 {args.pages} peticiones con {args.workers} hilos - límite local {args.rpm} RPM, "
+              f"servidor {args.server_rpm} RPM")
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            results = list(executor.map(lambda _: client.messages.create(**request),
+                                        range(args.pages)))
+        elapsed = time.perf_counter() - start
+
+    print(f"\n⏱️  {len(results)} respuestas en {elapsed:.1f} s "
+          f"({len(results) / elapsed * 60:.1f} peticiones/minuto, ritmo final "
+          f"{limiter.rate_scale():.0%}); 429 del servidor: {server.throttled}")
+    print_metrics(limiter.metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Caché persistente de respuestas de la API de Claude
+
+Guarda en SQLite las respuestas de extracción (visión) y estructuración,
+indexadas por un hash del contenido de la petición: bytes de la imagen o texto,
+modelo, prompt y max_tokens. Si nada de eso cambia, se reutiliza la respuesta
+sin volver a llamar a la API. El tamaño total está acotado con expulsión LRU.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = "data/el_martillo/.cache/respuestas.sqlite"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def make_key(*parts):
+    """
+    Calcula la clave de caché (SHA-256) de las partes de una petición
+
+    Cada parte se antepone con su longitud para que ("ab", "c") y ("a", "bc")
+    no produzcan la misma clave.
+
+    Args:
+        *parts: Valores que identifican la petición (str, bytes o números)
+
+    Returns:
+        str: Hash hexadecimal
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = str(part).encode('utf-8')
+        digest.update(f"{len(part)}:".encode('ascii'))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """
+    Caché de respuestas en SQLite con expulsión LRU por tamaño
+
+    Args:
+        path: Ruta del archivo SQLite
+        max_bytes: Tamaño máximo total de las respuestas guardadas
+        bypass: Si es True no se leen entradas (siempre se llama a la API),
+                pero las respuestas nuevas sí se guardan
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, bypass=False):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access INTEGER NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        """
+        Devuelve la respuesta guardada para la clave, o None si no existe
+
+        Args:
+            key: Clave calculada con make_key
+
+        Returns:
+            str | None: Respuesta guardada
+        """
+        if self.bypass:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?", (time.time_ns(), key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, value):
+        """
+        Guarda una respuesta y expulsa las menos usadas si se supera max_bytes
+
+        Args:
+            key: Clave calculada con make_key
+            value: Texto de la respuesta
+        """
+        size = len(value.encode('utf-8'))
+        now = time.time_ns()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, time.time(), now),
+            )
+            self._evict_locked()
+            self._conn.commit()
+
+    def _evict_locked(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # Expulsar por orden de último acceso hasta volver al límite
+        to_delete = []
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY last_access ASC"
+        ):
+            if total <= self.max_bytes:
+                break
+            to_delete.append((key,))
+            total -= size
+
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", to_delete)
+        self.evictions += len(to_delete)
+
+    def stats(self):
+        """
+        Contadores de uso de la caché
+
+        Returns:
+            dict: hits, misses, evictions, entradas y bytes ocupados
+        """
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": total,
+        }
+
+    def clear(self):
+        """
+        Elimina todas las entradas
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def add_cache_arguments(parser, refresh=True):
+    """
+    Añade las opciones de la caché de respuestas a un parser de argparse
+
+    Args:
+        parser: Parser de argparse
+        refresh: Añadir también --refresh-cache
+    """
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH,
+                        help=f"Archivo de caché de respuestas (por defecto: {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--no-cache", action="store_true", help="No usar la caché de respuestas")
+    if refresh:
+        parser.add_argument("--refresh-cache", action="store_true",
+                            help="Ignorar las respuestas guardadas y volver a llamar a la API")
+
+
+def cache_from_args(args):
+    """
+    Crea la ResponseCache de las opciones de add_cache_arguments
+
+    Con --fake la caché se desactiva (guardaría respuestas falsas con las
+    mismas claves que las reales), y también con --sweep (batch_ocr.py) o
+    --compare (async_pipeline.py), que miden tiempos de llamadas reales.
+
+    Returns:
+        ResponseCache | None: La caché, o None si está desactivada
+    """
+    disabled_by = next((flag for flag in ("fake", "sweep", "compare") if getattr(args, flag, None)), None)
+    if disabled_by:
+        if not args.no_cache:
+            print(f"ℹ️  Caché de respuestas desactivada con --{disabled_by}")
+        return None
+    if args.no_cache:
+        return None
+    return ResponseCache(args.cache, bypass=getattr(args, "refresh_cache", False))
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Estructuración por reglas (sin API) para textos grandes
+
+Versión escalable del análisis por patrones que usa generate_basic_structure
+cuando no hay API key:
+1. Patrones compilados una sola vez al importar el módulo
+2. Tokenizador de secciones en una sola pasada, línea a línea (generador):
+   no hace falta tener el texto completo en memoria
+3. Detección de anuncios con una sola expresión para todas las palabras clave
+4. Extracción de fecha (meses en español → AAAA-MM-DD) y número de edición
+5. Archivos de corpus (corpus_texto.txt de batch_ocr.py) leídos con mmap y
+   repartidos por páginas entre un pool de procesos
+
+Ejemplo:
+    python3 rule_structurer.py data/el_martillo/lote/corpus_texto.txt --workers 4
+"""
+
+import argparse
+import io
+import itertools
+import json
+import mmap
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# Metadata por defecto (la de la página analizada) cuando no se encuentra en el texto
+DEFAULT_METADATA = {
+    "newspaper_name": "El Martillo",
+    "date": "1916-08-05",
+    "issue_number": 1609,
+    "location": "Chiclayo, Perú",
+}
+
+# Líneas del encabezado donde se buscan fecha y número de edición
+HEADER_LINES = 10
+# Secciones más cortas que esto se unen con la siguiente
+MIN_SECTION_CHARS = 20
+HEADLINE_CHARS = 100
+EXCERPT_CHARS = 300
+FALLBACK_EXCERPT_CHARS = 500
+
+# Páginas de un corpus por tarea del pool de procesos
+DEFAULT_PAGES_PER_TASK = 32
+
+AD_KEYWORDS = ('VENDEDOR', 'COBRADOR', 'MÁQUINA', 'SINGER', 'RÓMULO')
+
+MONTHS = {
+    'enero': 1, 'febrero': 2, 'marzo': 3, 'abril': 4, 'mayo': 5, 'junio': 6, 'julio': 7,
+    'agosto': 8, 'septiembre': 9, 'setiembre': 9, 'octubre': 10, 'noviembre': 11,
+    'diciembre': 12,
+}
+
+# Una sola expresión clasifica cada línea: grupo 1 = separador, grupo 2 = título
+LINE_KIND_RE = re.compile(r'^\s*(?:(={10,}|-{10,})|([A-ZÁÉÍÓÚÑÜ][A-ZÁÉÍÓÚÑÜ\s]{9,}))\s*$')
+AUTHOR_RE = re.compile(r'^[^\S\n]*Por[^\S\n]+([A-ZÁÉÍÓÚÑ][\w.]*(?:[^\S\n]+[\w.]+)*)')
+# Se aplica sobre la línea en mayúsculas: mucho más rápido que re.IGNORECASE con acentos
+AD_RE = re.compile('|'.join(re.escape(keyword) for keyword in AD_KEYWORDS))
+ISSUE_RE = re.compile(r'\bN(?:o|º|°|úm|um)\.?\s*(\d+)', re.IGNORECASE)
+DATE_RE = re.compile(r'(\d{1,2})\s+de\s+(' + '|'.join(MONTHS) + r')\s+de\s+(\d{4})', re.IGNORECASE)
+
+# Encabezado de página en corpus_texto.txt (ver batch_ocr.write_corpus)
+PAGE_HEADER_RE = re.compile(rb'^={80}\nP\xc3\x81GINA: ([^\n]+)\n={80}\n', re.MULTILINE)
+
+
+def parse_spanish_date(text):
+    """
+    Busca una fecha del tipo "5 de agosto de 1916"
+
+    Returns:
+        str: Fecha en formato AAAA-MM-DD, o None si no hay ninguna válida
+    """
+    match = DATE_RE.search(text)
+    if not match:
+        return None
+    day, month, year = int(match.group(1)), MONTHS[match.group(2).lower()], int(match.group(3))
+    if not 1 <= day <= 31:
+        return None
+    return f"{year:04d}-{month:02d}-{day:02d}"
+
+
+def extract_metadata(header_lines):
+    """
+    Extrae fecha y número de edición de las primeras líneas de una página
+
+    Args:
+        header_lines: Primeras líneas (no vacías) del texto
+
+    Returns:
+        dict: Metadata con los valores por defecto para lo que no se encuentre
+    """
+    metadata = dict(DEFAULT_METADATA)
+    found_date = found_issue = False
+    for line in header_lines:
+        if not found_issue and ("Edición" in line or "No." in line):
+            match = ISSUE_RE.search(line)
+            if match:
+                metadata["issue_number"] = int(match.group(1))
+                found_issue = True
+        if not found_date:
+            date = parse_spanish_date(line)
+            if date:
+                metadata["date"] = date
+                found_date = True
+    return metadata
+
+
+class _SectionBuilder:
+    """
+    Acumula una sección guardando solo lo necesario (memoria acotada)
+    """
+
+    def __init__(self):
+        self.titles = []
+        self.first_line = None
+        self.excerpt = []
+        self.excerpt_chars = 0
+        self.body_chars = 0
+        self.author = ""
+        self.is_ad = False
+
+    def add_title(self, line):
+        self.titles.append(line)
+        if not self.is_ad and AD_RE.search(line.upper()):
+            self.is_ad = True
+
+    def add_line(self, line):
+        stripped = line.strip()
+        if stripped and self.first_line is None:
+            self.first_line = stripped
+        if self.excerpt_chars < EXCERPT_CHARS:
+            self.excerpt.append(line)
+            self.excerpt_chars += len(line) + 1
+        self.body_chars += len(stripped)
+        if not self.author and 'Por' in line:
+            match = AUTHOR_RE.match(line)
+            if match:
+                self.author = match.group(1).strip()
+        if not self.is_ad and AD_RE.search(line.upper()):
+            self.is_ad = True
+
+    @property
+    def has_body(self):
+        return self.body_chars >= MIN_SECTION_CHARS
+
+    @property
+    def total_chars(self):
+        return self.body_chars + sum(len(title) for title in self.titles)
+
+    def build(self):
+        headline = " / ".join(self.titles) if self.titles else (self.first_line or "")
+        excerpt = "\n".join(self.excerpt).strip()[:EXCERPT_CHARS]
+        return {
+            "headline": headline[:HEADLINE_CHARS],
+            "section": "Anuncios" if self.is_ad else "Artículo principal",
+            "type": "anuncio" if self.is_ad else "artículo",
+            "author": self.author,
+            "text_excerpt": excerpt or headline[:EXCERPT_CHARS],
+        }
+
+
+def iter_sections(lines):
+    """
+    Divide un texto en secciones en una sola pasada
+
+    Las líneas separadoras (==== o ----) y los títulos en mayúsculas cierran la
+    sección en curso; los títulos pasan a ser el titular de la siguiente. Una
+    sección con menos de MIN_SECTION_CHARS caracteres de cuerpo (p. ej. solo
+    "Por F. A. Herrera") se une con la siguiente.
+
+    Args:
+        lines: Iterable de líneas (sin salto de línea final o con él)
+
+    Yields:
+        dict: Elemento de 'content' (headline, section, type, author, text_excerpt)
+    """
+    builder = _SectionBuilder()
+    match_kind = LINE_KIND_RE.match
+    for line in lines:
+        line = line.rstrip('\r\n')
+        kind = match_kind(line)
+        if kind is None:
+            builder.add_line(line)
+            continue
+        if builder.has_body:
+            yield builder.build()
+            builder = _SectionBuilder()
+        if kind.group(2):
+            builder.add_title(line.strip())
+
+    if builder.total_chars >= MIN_SECTION_CHARS:
+        yield builder.build()
+
+
+def structure_lines(lines):
+    """
+    Estructura un texto dado como iterable de líneas
+
+    Returns:
+        dict: Estructura JSON con 'metadata' y 'content'
+    """
+    header = []
+    content_items = []
+    fallback = []
+    fallback_chars = 0
+
+    def tracked(lines):
+        nonlocal fallback_chars
+        lines = iter(lines)
+        for line in lines:
+            if len(header) < HEADER_LINES and line.strip():
+                header.append(line.strip())
+            if fallback_chars < FALLBACK_EXCERPT_CHARS:
+                fallback.append(line)
+                fallback_chars += len(line)
+            yield line
+            if len(header) >= HEADER_LINES and fallback_chars >= FALLBACK_EXCERPT_CHARS:
+                break
+        yield from lines
+
+    content_items.extend(iter_sections(tracked(lines)))
+
+    # Si no se encontraron secciones, crear una sola entrada
+    if not content_items:
+        content_items.append({
+            "headline": "Contenido completo",
+            "section": "Artículo principal",
+            "type": "artículo",
+            "author": "",
+            "text_excerpt": "".join(fallback).strip()[:FALLBACK_EXCERPT_CHARS],
+        })
+
+    return {"metadata": extract_metadata(header), "content": content_items}
+
+
+def structure_text(text_content):
+    """
+    Estructura un texto completo (equivalente a generate_basic_structure)
+
+    Args:
+        text_content: Texto extraído de una página
+
+    Returns:
+        dict: Estructura JSON con 'metadata' y 'content'
+    """
+    # StringIO recorre las líneas sin crear la lista completa
+    return structure_lines(io.StringIO(text_content.strip()))
+
+
+def iter_page_spans(buffer):
+    """
+    Localiza las páginas de un corpus_texto.txt sin copiarlo
+
+    Args:
+        buffer: bytes o mmap con el contenido del archivo
+
+    Yields:
+        tuple: (page_id, inicio, fin) en bytes; un archivo sin encabezados de
+               página se devuelve como una sola página con page_id None
+    """
+    previous = None
+    for match in PAGE_HEADER_RE.finditer(buffer):
+        if previous is not None:
+            yield previous[0], previous[1], match.start()
+        previous = (match.group(1).decode('utf-8'), match.end())
+    if previous is not None:
+        yield previous[0], previous[1], len(buffer)
+    else:
+        yield None, 0, len(buffer)
+
+
+def _structure_spans(path, spans):
+    """
+    Estructura un grupo de páginas de un archivo (se ejecuta en los procesos del pool)
+    """
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return [(page_id, structure_text(mm[start:end].decode('utf-8')))
+                for page_id, start, end in spans]
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _iter_mmap_lines(mm):
+    for line in iter(mm.readline, b''):
+        yield line.decode('utf-8')
+
+
+def structure_file(path, workers=None, pages_per_task=DEFAULT_PAGES_PER_TASK):
+    """
+    Estructura un archivo de texto grande, página por página
+
+    El archivo se abre con mmap. Si tiene encabezados de página (corpus de
+    batch_ocr.py), las páginas se reparten en grupos entre un pool de
+    procesos, con como mucho dos grupos en curso por proceso; si no, se
+    procesa como un único texto leyendo línea a línea.
+
+    Args:
+        path: Ruta del archivo .txt
+        workers: Procesos del pool (por defecto, os.cpu_count(); con 1 no se crea pool)
+        pages_per_task: Páginas por tarea enviada al pool
+
+    Yields:
+        tuple: (page_id, estructura) en el orden del archivo
+    """
+    if os.path.getsize(path) == 0:
+        yield None, structure_text("")
+        return
+
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        spans = iter_page_spans(mm)
+        first = next(spans)
+        if first[0] is None:
+            # Sin encabezados de página: un solo texto, leído línea a línea
+            yield None, structure_lines(_iter_mmap_lines(mm))
+            return
+
+        workers = workers or os.cpu_count() or 1
+        tasks = _chunks(itertools.chain([first], spans), pages_per_task)
+        if workers == 1:
+            for task in tasks:
+                yield from _structure_spans(path, task)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for task in tasks:
+                if len(pending) >= workers * 2:
+                    yield from pending.popleft().result()
+                pending.append(executor.submit(_structure_spans, path, task))
+            while pending:
+                yield from pending.popleft().result()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Estructuración por reglas de textos grandes")
+    parser.add_argument("text", help="Archivo de texto (página o corpus_texto.txt)")
+    parser.add_argument("--output",
+                        help="Archivo .jsonl de salida (una página por línea; por defecto, junto al texto)")
+    parser.add_argument("--workers", type=int, help="Procesos del pool (por defecto, uno por CPU)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    output_path = args.output or os.path.splitext(args.text)[0] + "_structured.jsonl"
+
+    start = time.perf_counter()
+    pages = items = 0
+    with open(output_path, 'w', encoding='utf-8') as out:
+        for page_id, structured_data in structure_file(args.text, workers=args.workers):
+            out.write(json.dumps({"page_id": page_id, **structured_data}, ensure_ascii=False) + "\n")
+            pages += 1
+            items += len(structured_data["content"])
+    elapsed = time.perf_counter() - start
+
+    size_mb = os.path.getsize(args.text) / 1024 / 1024
+    print(f"✅ {pages} páginas, {items} elementos en {elapsed:.2f} s "
+          f"({size_mb / elapsed if elapsed > 0 else 0:.1f} MB/s)")
+    print(f"📁 Estructura guardada en: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Manifiesto persistente de una corrida del corpus
+
+Registra, por página, el estado del procesamiento (pendiente, extraída,
+estructurada, renderizada), los hashes de la imagen y de las salidas y el
+último error. Con él, una corrida interrumpida (límite de peticiones, un JSON
+mal formado, un corte de luz) se retoma saltando el trabajo ya hecho.
+
+El manifiesto se escribe de forma atómica (archivo temporal + os.replace), así
+que un fallo a mitad de escritura deja la versión anterior intacta.
+
+Ejemplo:
+    python3 run_manifest.py data/el_martillo/lote/manifiesto.json
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+MANIFEST_NAME = "manifiesto.json"
+MANIFEST_VERSION = 1
+
+# Estados de una página, en orden de avance
+PENDING = "pending"
+EXTRACTED = "extracted"
+STRUCTURED = "structured"
+RENDERED = "rendered"
+STATES = (PENDING, EXTRACTED, STRUCTURED, RENDERED)
+
+# Segundos mínimos entre escrituras del manifiesto (flush() fuerza la escritura)
+DEFAULT_SAVE_INTERVAL = 1.0
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """
+    Hash SHA-256 de un archivo, leído por bloques
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def atomic_write_json(path, data):
+    """
+    Escribe un JSON de forma atómica
+
+    Se escribe en un temporal del mismo directorio, se sincroniza a disco y se
+    renombra sobre el destino: quien lea el archivo ve la versión anterior o
+    la nueva, nunca una a medias.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".manifiesto-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class RunManifest:
+    """
+    Estado persistente por página de una corrida
+
+    Es seguro usarlo desde varios hilos. Las escrituras se agrupan: como mucho
+    una cada save_interval segundos, y flush() escribe lo pendiente.
+
+    Args:
+        path: Ruta del archivo JSON del manifiesto
+        save_interval: Segundos mínimos entre escrituras
+        fresh: Empezar vacío aunque el archivo exista (corrida nueva, sin retomar)
+    """
+
+    def __init__(self, path, save_interval=DEFAULT_SAVE_INTERVAL, fresh=False):
+        self.path = path
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_save = 0.0
+
+        if os.path.exists(path) and not fresh:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            self.pages = data.get("pages", {})
+            self.created_at = data.get("created_at")
+        else:
+            self.pages = {}
+            self.created_at = datetime.now().isoformat(timespec='seconds')
+
+    def _entry(self, page_id):
+        return self.pages.setdefault(page_id, {
+            "state": PENDING,
+            "image_path": None,
+            "image_sha256": None,
+            "outputs": {},
+            "error": None,
+            "attempts": 0,
+            "updated_at": None,
+        })
+
+    def register(self, page_id, image_path, image_sha256):
+        """
+        Añade una página (o la reinicia si su imagen cambió)
+
+        Returns:
+            str: Estado actual de la página
+        """
+        with self._lock:
+            entry = self._entry(page_id)
+            if entry["image_sha256"] not in (None, image_sha256):
+                entry.update(state=PENDING, outputs={}, error=None)
+            entry["image_path"] = image_path
+            entry["image_sha256"] = image_sha256
+            self._touch(entry)
+            return entry["state"]
+
+    def state(self, page_id):
+        with self._lock:
+            return self.pages.get(page_id, {}).get("state", PENDING)
+
+    def reached(self, page_id, state):
+        """
+        Indica si la página llegó al menos al estado dado y sus salidas siguen intactas
+        """
+        with self._lock:
+            entry = self.pages.get(page_id)
+            if entry is None or STATES.index(entry["state"]) < STATES.index(state):
+                return False
+            # Solo cuentan las salidas de los pasos hasta ese estado
+            outputs = {path: output["sha256"] for path, output in entry["outputs"].items()
+                       if STATES.index(output["state"]) <= STATES.index(state)}
+
+        for path, digest in outputs.items():
+            if not os.path.exists(path) or file_sha256(path) != digest:
+                return False
+        return True
+
+    def mark(self, page_id, state, outputs=()):
+        """
+        Avanza una página a un estado y guarda el hash de sus nuevas salidas
+
+        Args:
+            page_id: Identificador de la página
+            state: Nuevo estado (EXTRACTED, STRUCTURED o RENDERED)
+            outputs: Rutas de los archivos generados en este paso
+        """
+        hashes = {path: {"sha256": file_sha256(path), "state": state} for path in outputs}
+        with self._lock:
+            entry = self._entry(page_id)
+            entry["state"] = state
+            entry["outputs"].update(hashes)
+            entry["error"] = None
+            self._touch(entry)
+        self.save()
+
+    def record_error(self, page_id, stage, error):
+        """
+        Guarda el error de una página sin perder el avance que ya tenía
+        """
+        with self._lock:
+            entry = self._entry(page_id)
+            entry["error"] = {"stage": stage, "message": repr(error)}
+            entry["attempts"] += 1
+            self._touch(entry)
+        self.save()
+
+    def _touch(self, entry):
+        entry["updated_at"] = datetime.now().isoformat(timespec='seconds')
+        self._dirty = True
+
+    def counts(self):
+        """
+        Número de páginas en cada estado, más las que tienen error
+        """
+        with self._lock:
+            counts = {state: 0 for state in STATES}
+            counts["errors"] = 0
+            for entry in self.pages.values():
+                counts[entry["state"]] += 1
+                if entry["error"]:
+                    counts["errors"] += 1
+            return counts
+
+    def save(self, force=False):
+        with self._lock:
+            if not self._dirty:
+                return
+            if not force and time.monotonic() - self._last_save < self.save_interval:
+                return
+            data = {
+                "version": MANIFEST_VERSION,
+                "created_at": self.created_at,
+                "updated_at": datetime.now().isoformat(timespec='seconds'),
+                "pages": self.pages,
+            }
+            atomic_write_json(self.path, data)
+            self._dirty = False
+            self._last_save = time.monotonic()
+
+    def flush(self):
+        self.save(force=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resumen del manifiesto de una corrida")
+    parser.add_argument("manifest", help="Archivo del manifiesto (.json)")
+    parser.add_argument("--errors", action="store_true", help="Listar las páginas con error")
+    args = parser.parse_args(argv)
+
+    manifest = RunManifest(args.manifest)
+    counts = manifest.counts()
+    print(f"📋 {len(manifest.pages)} páginas en {args.manifest}")
+    for state in STATES:
+        print(f"   {state:<11} {counts[state]}")
+    print(f"   {'con error':<11} {counts['errors']}")
+
+    if args.errors:
+        for page_id, entry in sorted(manifest.pages.items()):
+            if entry["error"]:
+                print(f"   ❌ {page_id} ({entry['error']['stage']}, "
+                      f"{entry['attempts']} intentos): {entry['error']['message']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Índice de búsqueda de texto completo (SQLite FTS5)
+
+Indexa el texto completo de cada página y el titular, autor y extracto de
+cada elemento estructurado. El texto se normaliza con
+text_normalization.fold_text antes de indexarlo (y también la consulta), así
+que "HERRERA" encuentra "Herrera", "Monsefu" encuentra "Monsefú" y "jeneral"
+encuentra "general".
+
+- Actualización incremental por página: reindexar una página reemplaza solo
+  sus documentos, y si su contenido no cambió no se toca
+- Resultados ordenados por BM25 (titular > autor > cuerpo)
+- Fragmentos (snippets) tomados del texto original, con los términos resaltados
+
+Ejemplos:
+    python3 search_index.py build data/el_martillo/lote
+    python3 search_index.py query "periodismo monsefu" --limit 5
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from text_normalization import fold_text
+
+DEFAULT_INDEX_PATH = "data/el_martillo/indice_busqueda.sqlite"
+
+# Pesos BM25 de las columnas del índice: headline, author, body
+COLUMN_WEIGHTS = (5.0, 3.0, 1.0)
+
+DEFAULT_LIMIT = 10
+SNIPPET_CHARS = 160
+HIGHLIGHT = ("«", "»")
+
+PAGE_KIND = "page"
+ITEM_KIND = "item"
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS pages (
+    page_id TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    page_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    item_index INTEGER,
+    date TEXT,
+    issue_number INTEGER,
+    headline TEXT,
+    author TEXT,
+    body TEXT
+);
+CREATE INDEX IF NOT EXISTS documents_page ON documents(page_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    headline, author, body,
+    tokenize = 'unicode61 remove_diacritics 0'
+);
+INSERT OR REPLACE INTO documents_fts(documents_fts, rank)
+    VALUES ('rank', 'bm25({", ".join(str(w) for w in COLUMN_WEIGHTS)})');
+"""
+
+
+def _content_hash(text, structured_data):
+    payload = json.dumps([text, structured_data], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def build_match_query(query):
+    """
+    Convierte una consulta libre en una expresión MATCH de FTS5
+
+    Cada palabra se normaliza y se busca como término (todas deben aparecer);
+    una palabra terminada en * se busca como prefijo.
+
+    Returns:
+        tuple: (expresión MATCH o None si no hay palabras, lista de términos)
+    """
+    terms = []
+    parts = []
+    for word in re.findall(r'\w+\*?', query):
+        prefix = word.endswith('*')
+        term = fold_text(word.rstrip('*'))
+        terms.append((term, prefix))
+        parts.append(f'"{term}"' + ('*' if prefix else ''))
+    return (" ".join(parts) if parts else None), terms
+
+
+def make_snippet(text, terms, width=SNIPPET_CHARS):
+    """
+    Fragmento del texto original alrededor del primer término encontrado
+
+    Como fold_text conserva las posiciones, los términos se buscan en el texto
+    normalizado y se resaltan en el original.
+
+    Args:
+        text: Texto original
+        terms: Lista de (término normalizado, es_prefijo)
+        width: Longitud aproximada del fragmento
+
+    Returns:
+        str: Fragmento con los términos entre HIGHLIGHT
+    """
+    if not text:
+        return ""
+    folded = fold_text(text)
+    pattern = re.compile("|".join(
+        r'\b' + re.escape(term) + (r'\w*' if prefix else r'\b') for term, prefix in terms
+    )) if terms else None
+
+    first = pattern.search(folded) if pattern else None
+    start = max(0, first.start() - width // 3) if first else 0
+    end = min(len(text), start + width)
+
+    pieces = []
+    position = start
+    if pattern:
+        for match in pattern.finditer(folded, start, end):
+            pieces.append(text[position:match.start()])
+            pieces.append(HIGHLIGHT[0] + text[match.start():match.end()] + HIGHLIGHT[1])
+            position = match.end()
+    pieces.append(text[position:end])
+
+    snippet = " ".join("".join(pieces).split())
+    return ("…" if start > 0 else "") + snippet + ("…" if end < len(text) else "")
+
+
+class SearchIndex:
+    """
+    Índice FTS5 del corpus
+
+    Args:
+        path: Archivo SQLite del índice
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def index_page(self, page_id, text, structured_data):
+        """
+        Indexa (o reindexa) una página: texto completo y elementos estructurados
+
+        Args:
+            page_id: Identificador de la página
+            text: Texto extraído de la página
+            structured_data: Estructura con 'metadata' y 'content'
+
+        Returns:
+            bool: True si se indexó, False si no había cambios
+        """
+        content_hash = _content_hash(text, structured_data)
+        metadata = structured_data.get('metadata', {})
+        date = metadata.get('date')
+        issue_number = metadata.get('issue_number')
+
+        documents = [(PAGE_KIND, None, "", "", text)]
+        for index, item in enumerate(structured_data.get('content', [])):
+            documents.append((ITEM_KIND, index, item.get('headline', ''), item.get('author', ''),
+                              item.get('text_excerpt', '')))
+
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT content_hash FROM pages WHERE page_id = ?",
+                                     (page_id,)).fetchone()
+            if row and row[0] == content_hash:
+                return False
+
+            self._delete_page_locked(page_id)
+            for kind, item_index, headline, author, body in documents:
+                cursor = self._conn.execute(
+                    "INSERT INTO documents (page_id, kind, item_index, date, issue_number, "
+                    "headline, author, body) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (page_id, kind, item_index, date, issue_number, headline, author, body),
+                )
+                self._conn.execute(
+                    "INSERT INTO documents_fts (rowid, headline, author, body) VALUES (?, ?, ?, ?)",
+                    (cursor.lastrowid, fold_text(headline), fold_text(author), fold_text(body)),
+                )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (page_id, content_hash, indexed_at) VALUES (?, ?, ?)",
+                (page_id, content_hash, time.time()),
+            )
+        return True
+
+    def _delete_page_locked(self, page_id):
+        self._conn.execute(
+            "DELETE FROM documents_fts WHERE rowid IN (SELECT id FROM documents WHERE page_id = ?)",
+            (page_id,),
+        )
+        self._conn.execute("DELETE FROM documents WHERE page_id = ?", (page_id,))
+        self._conn.execute("DELETE FROM pages WHERE page_id = ?", (page_id,))
+
+    def remove_page(self, page_id):
+        with self._lock, self._conn:
+            self._delete_page_locked(page_id)
+
+    def search(self, query, limit=DEFAULT_LIMIT, kind=None):
+        """
+        Busca en el índice
+
+        Args:
+            query: Consulta libre (palabras; "palabra*" para prefijos)
+            limit: Número máximo de resultados
+            kind: "page", "item" o None para ambos
+
+        Returns:
+            list: Resultados (dict) ordenados por relevancia, con 'snippet'
+        """
+        match, terms = build_match_query(query)
+        if match is None:
+            return []
+
+        sql = ("SELECT d.page_id, d.kind, d.item_index, d.date, d.issue_number, d.headline, "
+               "d.author, d.body, documents_fts.rank "
+               "FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid "
+               "WHERE documents_fts MATCH ?")
+        params = [match]
+        if kind:
+            sql += " AND d.kind = ?"
+            params.append(kind)
+        sql += " ORDER BY documents_fts.rank LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        results = []
+        for page_id, doc_kind, item_index, date, issue_number, headline, author, body, rank in rows:
+            results.append({
+                "page_id": page_id,
+                "kind": doc_kind,
+                "item_index": item_index,
+                "date": date,
+                "issue_number": issue_number,
+                "headline": headline,
+                "author": author,
+                "score": -rank,
+                "snippet": make_snippet(body, terms) or make_snippet(headline, terms),
+            })
+        return results
+
+    def stats(self):
+        with self._lock:
+            pages = self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+            documents = self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+        return {"pages": pages, "documents": documents}
+
+    def optimize(self):
+        """
+        Une los segmentos del índice FTS5 (conviene tras una carga grande)
+        """
+        with self._lock, self._conn:
+            self._conn.execute("INSERT INTO documents_fts(documents_fts) VALUES ('optimize')")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def index_batch_output(index, output_dir):
+    """
+    Indexa las salidas por página de un lote de batch_ocr.py
+
+    Args:
+        index: SearchIndex
+        output_dir: Directorio de salida del lote (con paginas/*.txt y *.json)
+
+    Returns:
+        tuple: (páginas indexadas, páginas sin cambios)
+    """
+    from process_ocr import read_extracted_text
+
+    indexed = unchanged = 0
+    for json_path in sorted(glob.glob(os.path.join(output_dir, "paginas", "*.json"))):
+        page_id = os.path.splitext(os.path.basename(json_path))[0]
+        text_path = os.path.splitext(json_path)[0] + ".txt"
+        with open(json_path, encoding='utf-8') as f:
+            structured_data = json.load(f)
+        text = read_extracted_text(text_path) if os.path.exists(text_path) else ""
+        if index.index_page(page_id, text, structured_data):
+            indexed += 1
+        else:
+            unchanged += 1
+    return indexed, unchanged
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Índice de búsqueda del corpus de El Martillo")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH,
+                        help=f"Archivo del índice (por defecto: {DEFAULT_INDEX_PATH})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Indexar las páginas de un lote de batch_ocr.py")
+    build.add_argument("output_dir", help="Directorio de salida del lote")
+
+    query = subparsers.add_parser("query", help="Buscar en el índice")
+    query.add_argument("query", help="Palabras a buscar (palabra* para prefijos)")
+    query.add_argument("--limit", type=int, default=DEFAULT_LIMIT, help="Número de resultados")
+    query.add_argument("--kind", choices=[PAGE_KIND, ITEM_KIND],
+                       help="Buscar solo páginas completas o solo elementos")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    with SearchIndex(args.index) as index:
+        if args.command == "build":
+            start = time.perf_counter()
+            indexed, unchanged = index_batch_output(index, args.output_dir)
+            index.optimize()
+            stats = index.stats()
+            print(f"✅ {indexed} páginas indexadas, {unchanged} sin cambios "
+                  f"en {time.perf_counter() - start:.2f} s")
+            print(f"📚 Índice: {stats['pages']} páginas, {stats['documents']} documentos ({args.index})")
+            return
+
+        start = time.perf_counter()
+        results = index.search(args.query, limit=args.limit, kind=args.kind)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        print(f"🔍 {len(results)} resultados para '{args.query}' ({elapsed_ms:.1f} ms)\n")
+        for position, result in enumerate(results, 1):
+            where = f"{result['page_id']}"
+            if result["kind"] == ITEM_KIND:
+                where += f" #{result['item_index'] + 1}"
+            title = result["headline"] or "(texto completo de la página)"
+            print(f"{position:>2}. [{where}] {title}")
+            if result["author"]:
+                print(f"    Por {result['author']}")
+            print(f"    {result['snippet']}\n")
+
+
+if __name__ == "__main__":
+    main()
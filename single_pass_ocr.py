@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Extracción y estructuración en una sola llamada de visión
+
+El flujo normal hace dos llamadas por página: la transcripción de la imagen
+y luego la estructuración, que vuelve a enviar toda la transcripción como
+entrada (se paga ese texto dos veces y la latencia se suma). En este modo una
+sola petición de visión devuelve a la vez:
+- la transcripción fiel, entre etiquetas <transcripcion>
+- el JSON con 'metadata' y 'content', entre etiquetas <estructura>
+
+La transcripción va como texto plano (no dentro del JSON) para no pagar el
+escapado de comillas y saltos de línea. Las instrucciones, que son iguales
+para todas las páginas, van en un bloque de sistema marcado para la caché de
+prompts (cache_control); la API solo lo cachea si supera el tamaño mínimo del
+modelo, y lo informa en cache_creation_input_tokens / cache_read_input_tokens.
+
+Ejemplo sin red, comparando con el flujo de dos llamadas:
+    python3 single_pass_ocr.py data/paginas --compare --fake
+"""
+
+import argparse
+import os
+import re
+import time
+from dataclasses import asdict, dataclass
+
+from client_provider import get_client
+from instrumentation import payload_bytes, span
+from process_ocr import (
+    MODEL_NAME,
+    build_extraction_request,
+    build_structure_request,
+    structure_text_with_claude,
+    write_extracted_text,
+)
+from response_cache import make_key
+from structured_output import find_tail, salvage_structure, structure_from_message
+
+# Transcripción (hasta ~4000 tokens) + estructura en la misma respuesta
+SINGLE_PASS_MAX_TOKENS = 8192
+
+TRANSCRIPTION_TAG = "transcripcion"
+STRUCTURE_TAG = "estructura"
+
+SINGLE_PASS_SYSTEM_PROMPT = f"""Eres un archivista que digitaliza páginas del periódico histórico peruano "El Martillo" (Chiclayo, 1916).
+
+Para cada imagen de página debes hacer dos cosas en una sola respuesta.
+
+1. Transcribir el texto completo lo más fielmente posible, respetando la ortografía original (incluso si tiene errores): encabezado (nombre del periódico, fecha, número de edición), todos los artículos con sus títulos, anuncios publicitarios y cualquier otra información. Separa las secciones con una línea de signos = o -.
+
+2. Estructurar esa misma transcripción en JSON con esta forma:
+{{
+  "metadata": {{
+    "newspaper_name": "nombre del periódico",
+    "date": "YYYY-MM-DD",
+    "issue_number": número de edición,
+    "location": "ciudad, país"
+  }},
+  "content": [
+    {{
+      "headline": "título del artículo o sección",
+      "section": "sección (ej: 'Artículo principal', 'Anuncios', etc.)",
+      "type": "artículo o anuncio",
+      "author": "autor (si se menciona, sino cadena vacía)",
+      "text_excerpt": "extracto o resumen del texto"
+    }}
+  ]
+}}
+
+IMPORTANTE:
+- Extrae TODOS los artículos, secciones y anuncios que encuentres
+- Mantén la ortografía original del texto
+- Si hay información que no se puede determinar, usa valores vacíos o null
+
+Responde exactamente con este formato, sin nada más:
+<{TRANSCRIPTION_TAG}>
+(transcripción completa en texto plano)
+</{TRANSCRIPTION_TAG}>
+<{STRUCTURE_TAG}>
+(JSON)
+</{STRUCTURE_TAG}>"""
+
+SINGLE_PASS_USER_PROMPT = "Transcribe y estructura esta página."
+
+_TAG_RE = {
+    tag: re.compile(rf'<{tag}>\s*(.*?)\s*(?:</{tag}>|$)', re.DOTALL)
+    for tag in (TRANSCRIPTION_TAG, STRUCTURE_TAG)
+}
+
+
+@dataclass
+class UsageReport:
+    """
+    Tokens y latencia de una página en un modo dado
+    """
+    mode: str
+    calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_creation_input_tokens: int = 0
+    cache_read_input_tokens: int = 0
+    latency_seconds: float = 0.0
+
+    def add(self, message, seconds):
+        usage = message.usage
+        self.calls += 1
+        self.input_tokens += usage.input_tokens or 0
+        self.output_tokens += usage.output_tokens or 0
+        # Campos que solo están presentes (o no son None) si se usó la caché de prompts
+        self.cache_creation_input_tokens += getattr(usage, "cache_creation_input_tokens", 0) or 0
+        self.cache_read_input_tokens += getattr(usage, "cache_read_input_tokens", 0) or 0
+        self.latency_seconds += seconds
+
+    @property
+    def total_input_tokens(self):
+        return self.input_tokens + self.cache_creation_input_tokens + self.cache_read_input_tokens
+
+    def as_dict(self):
+        data = asdict(self)
+        data["total_input_tokens"] = self.total_input_tokens
+        return data
+
+
+def build_single_pass_request(image_data, media_type="image/png"):
+    """
+    Construye los parámetros de messages.create para el modo de una llamada
+
+    Returns:
+        dict: Argumentos para client.messages.create
+    """
+    return {
+        "model": MODEL_NAME,
+        "max_tokens": SINGLE_PASS_MAX_TOKENS,
+        "system": [
+            {
+                "type": "text",
+                "text": SINGLE_PASS_SYSTEM_PROMPT,
+                "cache_control": {"type": "ephemeral"},
+            }
+        ],
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "image",
+                        "source": {
+                            "type": "base64",
+                            "media_type": media_type,
+                            "data": image_data,
+                        },
+                    },
+                    {
+                        "type": "text",
+                        "text": SINGLE_PASS_USER_PROMPT,
+                    }
+                ],
+            }
+        ],
+    }
+
+
+def parse_single_pass_response(response_text):
+    """
+    Separa la transcripción y la estructura de una respuesta de una llamada
+
+    Una respuesta cortada por max_tokens puede no traer la etiqueta de cierre;
+    en ese caso se toma el texto hasta el final y de la estructura se rescatan
+    los elementos completos (salvage_structure).
+
+    Returns:
+        tuple: (transcripción, estructura JSON, True si la respuesta traía la
+                estructura completa)
+
+    Raises:
+        ValueError: Si falta la transcripción
+    """
+    transcription = _TAG_RE[TRANSCRIPTION_TAG].search(response_text)
+    if not transcription:
+        raise ValueError(f"La respuesta no tiene la etiqueta <{TRANSCRIPTION_TAG}>")
+    # La transcripción termina donde empieza la estructura aunque falte su cierre
+    text = transcription.group(1).split(f"<{STRUCTURE_TAG}>")[0].strip()
+    structure = _TAG_RE[STRUCTURE_TAG].search(response_text)
+    if not structure:
+        # Cortada antes de la estructura (la transcripción puede estar incompleta)
+        return text, {"metadata": {}, "content": []}, False
+    structured_data, complete = salvage_structure(structure.group(1))
+    return text, structured_data, complete
+
+
+def finish_structure(text, structured_data, client=None, cache=None):
+    """
+    Completa la estructura rescatada de una respuesta de una llamada cortada
+
+    La parte del texto posterior al último elemento rescatado se estructura
+    aparte con structure_text_with_claude (que continúa por su cuenta si
+    vuelve a cortarse).
+
+    Returns:
+        tuple: (estructura JSON, False si no se pudo ubicar en el texto el
+                último elemento rescatado y la estructura queda parcial)
+    """
+    content = structured_data.get('content', [])
+    tail = find_tail(text, content) if content else text
+    if tail is None:
+        return structured_data, False
+    if not tail.strip():
+        return structured_data, True
+    rest = structure_text_with_claude(tail, client=client, cache=cache)
+    metadata = structured_data.get('metadata') or {}
+    if not any(value not in (None, "") for value in metadata.values()):
+        metadata = rest.get('metadata', {})
+    return {"metadata": metadata, "content": content + rest.get('content', [])}, True
+
+
+def single_pass_cache_key(image_data, media_type="image/png"):
+    return make_key("single_pass", MODEL_NAME, SINGLE_PASS_SYSTEM_PROMPT, SINGLE_PASS_USER_PROMPT,
+                    SINGLE_PASS_MAX_TOKENS, media_type, image_data)
+
+
+def extract_and_structure(image_data, media_type="image/png", client=None, cache=None):
+    """
+    Transcribe y estructura una página con una sola llamada de visión
+
+    Args:
+        image_data: Imagen codificada en base64
+        media_type: Tipo de medio de la imagen
+        client: Cliente de Anthropic (por defecto, el cliente compartido)
+        cache: ResponseCache opcional
+
+    Returns:
+        tuple: (texto extraído, estructura JSON, UsageReport)
+    """
+    usage = UsageReport(mode="una llamada")
+
+    with span("single_pass", media_type=media_type) as current:
+        cache_key = None
+        if cache is not None:
+            cache_key = single_pass_cache_key(image_data, media_type)
+            cached_text = cache.get(cache_key)
+            current.cache_hit = cached_text is not None
+            if cached_text is not None:
+                text, structured_data, _ = parse_single_pass_response(cached_text)
+                return text, structured_data, usage
+
+        if client is None:
+            client = get_client()
+
+        request = build_single_pass_request(image_data, media_type)
+        current.request_bytes = payload_bytes(request)
+        start = time.perf_counter()
+        message = client.messages.create(**request)
+        usage.add(message, time.perf_counter() - start)
+        current.record_usage(message.usage)
+
+        response_text = message.content[0].text
+        text, structured_data, complete = parse_single_pass_response(response_text)
+        current.set(complete=complete)
+        if not complete:
+            print(f"   ✂️  Respuesta de una llamada incompleta ({message.stop_reason}): "
+                  f"{len(structured_data['content'])} elementos rescatados, "
+                  f"se estructura el resto aparte")
+            structured_data, located = finish_structure(text, structured_data, client, cache)
+            if not located:
+                print(f"   ⚠️  Estructura parcial ({len(structured_data['content'])} elementos): "
+                      f"no se ubicó en el texto el último elemento rescatado")
+
+        # Solo se guarda en caché una respuesta completa
+        if complete and cache is not None:
+            cache.put(cache_key, response_text)
+        return text, structured_data, usage
+
+
+def extract_two_pass(image_data, media_type="image/png", client=None):
+    """
+    Flujo normal de dos llamadas, midiendo tokens y latencia (para comparar)
+
+    Returns:
+        tuple: (texto extraído, estructura JSON, UsageReport)
+    """
+    if client is None:
+        client = get_client()
+    usage = UsageReport(mode="dos llamadas")
+
+    start = time.perf_counter()
+    message = client.messages.create(**build_extraction_request(image_data, media_type))
+    usage.add(message, time.perf_counter() - start)
+    text = message.content[0].text
+
+    start = time.perf_counter()
+    message = client.messages.create(**build_structure_request(text))
+    usage.add(message, time.perf_counter() - start)
+
+    structured_data, _ = structure_from_message(message)
+    return text, structured_data, usage
+
+
+def print_usage(page_id, usage):
+    print(f"   {page_id:<20} {usage.mode:<13} {usage.calls} llamada(s)  "
+          f"entrada {usage.total_input_tokens:>6} (caché: +{usage.cache_creation_input_tokens} "
+          f"escritos, {usage.cache_read_input_tokens} leídos)  salida {usage.output_tokens:>6}  "
+          f"{usage.latency_seconds:.2f} s")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="OCR y estructuración en una sola llamada")
+    parser.add_argument("source", help="Imagen, directorio de imágenes o manifiesto (.txt/.json)")
+    parser.add_argument("--output-dir", help="Guardar .txt/.json/.csv por página en este directorio")
+    parser.add_argument("--compare", action="store_true",
+                        help="Ejecutar también el flujo de dos llamadas y comparar tokens y latencia")
+    parser.add_argument("--fake", action="store_true",
+                        help="Usar el cliente falso local (sin red ni API key)")
+    parser.add_argument("--fake-latency", type=float, default=0.5,
+                        help="Latencia simulada por petición del cliente falso, en segundos")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    # batch_ocr importa este módulo para su opción --single-pass
+    from batch_ocr import discover_pages, load_image_base64, page_id_for, write_structured_outputs
+
+    args = parse_args(argv)
+
+    pages = [args.source] if os.path.isfile(args.source) and not args.source.endswith(
+        ('.txt', '.json')) else discover_pages(args.source)
+    if not pages:
+        print(f"⚠️  No se encontraron páginas en: {args.source}")
+        return
+
+    client = None
+    if args.fake:
+        from fake_anthropic import FakeAnthropic
+        client = FakeAnthropic(latency=args.fake_latency)
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    totals = {}
+    print(f"🎯 Extracción en una llamada - {len(pages)} páginas\n")
+    for page in pages:
+        page_id = page_id_for(page)
+        image_data, media_type = load_image_base64(page)
+
+        text, structured_data, usage = extract_and_structure(image_data, media_type, client)
+        print_usage(page_id, usage)
+        reports = [usage]
+
+        if args.compare:
+            _, _, two_pass_usage = extract_two_pass(image_data, media_type, client)
+            print_usage(page_id, two_pass_usage)
+            reports.append(two_pass_usage)
+
+        for report in reports:
+            total = totals.setdefault(report.mode, UsageReport(mode=report.mode))
+            for field in ("calls", "input_tokens", "output_tokens", "cache_creation_input_tokens",
+                          "cache_read_input_tokens", "latency_seconds"):
+                setattr(total, field, getattr(total, field) + getattr(report, field))
+
+        if args.output_dir:
+            write_extracted_text(os.path.join(args.output_dir, f"{page_id}.txt"), text, page_id)
+            write_structured_outputs(args.output_dir, page_id, structured_data)
+
+    print("\n📊 Totales:")
+    for total in totals.values():
+        print_usage("", total)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Extracción de texto en streaming
+
+Consume la API de mensajes en modo streaming y va añadiendo los fragmentos de
+texto al .txt de salida a medida que llegan, en lugar de esperar la respuesta
+completa. Mide el tiempo hasta el primer token y la latencia total, y puede
+empezar a estructurar cada sección en cuanto se completa (cuando llega el
+título o separador ==== / ---- de la siguiente), antes de que termine la
+página.
+
+Ejemplo sin red:
+    python3 streaming_ocr.py data/el_martillo/page_01.png --fake --structure-sections
+"""
+
+import argparse
+import base64
+import json
+import mimetypes
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from client_provider import get_client
+from process_ocr import (
+    TEXT_OUTPUT_PATH,
+    build_extraction_request,
+    structure_text_with_claude,
+    write_extracted_text,
+)
+from rule_structurer import LINE_KIND_RE
+
+# Tamaño mínimo de una sección antes de mandarla a estructurar
+DEFAULT_MIN_SECTION_CHARS = 1500
+
+
+class StreamStats:
+    """
+    Tiempos de una respuesta en streaming
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_token_at = None
+        self.finished_at = None
+        self.chars = 0
+        self.chunks = 0
+
+    def record_chunk(self, text):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.chars += len(text)
+        self.chunks += 1
+
+    def finish(self):
+        self.finished_at = time.perf_counter()
+
+    @property
+    def time_to_first_token(self):
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started
+
+    @property
+    def total_latency(self):
+        end = self.finished_at if self.finished_at is not None else time.perf_counter()
+        return end - self.started
+
+    def as_dict(self):
+        return {
+            "time_to_first_token": self.time_to_first_token,
+            "total_latency": self.total_latency,
+            "chars": self.chars,
+            "chunks": self.chunks,
+        }
+
+
+def format_seconds(value):
+    """
+    Segundos con dos decimales, o "-" si no hay valor (p. ej. sin primer token)
+    """
+    return f"{value:.2f} s" if value is not None else "-"
+
+
+class SectionSplitter:
+    """
+    Agrupa los fragmentos de texto en secciones completas
+
+    Una sección nueva empieza antes de un título o separador, como en
+    chunked_structuring.iter_section_blocks: solo si la sección en curso ya
+    tiene cuerpo (así el subrayado de un título queda con él) y al menos
+    min_chars caracteres. Solo se guarda en memoria la sección en curso.
+
+    Args:
+        min_chars: Tamaño mínimo de una sección
+    """
+
+    def __init__(self, min_chars=DEFAULT_MIN_SECTION_CHARS):
+        self.min_chars = min_chars
+        self._pending_line = ""
+        self._section = []
+        self._section_chars = 0
+        self._has_body = False
+
+    def feed(self, text):
+        """
+        Añade un fragmento y devuelve las secciones que quedaron completas
+
+        Returns:
+            list: Secciones completas (str)
+        """
+        completed = []
+        lines = (self._pending_line + text).split("\n")
+        self._pending_line = lines.pop()
+
+        for line in lines:
+            if LINE_KIND_RE.match(line):
+                if self._has_body and self._section_chars >= self.min_chars:
+                    completed.append("\n".join(self._section))
+                    self._section = []
+                    self._section_chars = 0
+                    self._has_body = False
+            elif line.strip():
+                self._has_body = True
+            self._section.append(line)
+            self._section_chars += len(line) + 1
+
+        return completed
+
+    def flush(self):
+        """
+        Devuelve lo que quede pendiente al terminar el stream
+        """
+        if self._pending_line:
+            self._section.append(self._pending_line)
+            self._pending_line = ""
+        section = "\n".join(self._section)
+        self._section = []
+        self._section_chars = 0
+        self._has_body = False
+        return section if section.strip() else None
+
+
+def stream_extract_text(image_data, media_type="image/png", client=None,
+                        on_text=None, on_section=None, min_section_chars=DEFAULT_MIN_SECTION_CHARS,
+                        keep_text=True):
+    """
+    Extrae texto de una imagen consumiendo la respuesta en streaming
+
+    Args:
+        image_data: Imagen codificada en base64
+        media_type: Tipo de medio de la imagen
+        client: Cliente de Anthropic (por defecto, el cliente compartido)
+        on_text: Función llamada con cada fragmento de texto recibido
+        on_section: Función llamada con cada sección completa
+        min_section_chars: Tamaño mínimo de sección para on_section
+        keep_text: Si es False no se acumula el texto completo (memoria constante)
+
+    Returns:
+        tuple: (texto completo o None, StreamStats)
+    """
+    if client is None:
+        client = get_client()
+
+    stats = StreamStats()
+    splitter = SectionSplitter(min_section_chars) if on_section else None
+    parts = [] if keep_text else None
+
+    with client.messages.stream(**build_extraction_request(image_data, media_type)) as stream:
+        for text in stream.text_stream:
+            stats.record_chunk(text)
+            if parts is not None:
+                parts.append(text)
+            if on_text:
+                on_text(text)
+            if splitter:
+                for section in splitter.feed(text):
+                    on_section(section)
+
+    if splitter:
+        tail = splitter.flush()
+        if tail:
+            on_section(tail)
+
+    stats.finish()
+    return ("".join(parts) if parts is not None else None), stats
+
+
+def merge_structured_sections(results):
+    """
+    Une las estructuras de varias secciones de una misma página
+
+    Toma la primera metadata con fecha o número de edición y concatena los
+    elementos de 'content' en orden.
+
+    Args:
+        results: Lista de estructuras (dict con 'metadata' y 'content'), en orden
+
+    Returns:
+        dict: Estructura combinada de la página
+    """
+    metadata = {}
+    content = []
+    for result in results:
+        section_metadata = result.get('metadata', {})
+        if not metadata or (not metadata.get('date') and section_metadata.get('date')):
+            metadata = section_metadata
+        content.extend(result.get('content', []))
+    return {"metadata": metadata, "content": content}
+
+
+def stream_extract_to_file(image_path, output_path=TEXT_OUTPUT_PATH, client=None,
+                           structure_sections=False, structure_workers=2,
+                           min_section_chars=DEFAULT_MIN_SECTION_CHARS):
+    """
+    Extrae una página en streaming, escribiendo el .txt de forma incremental
+
+    Args:
+        image_path: Ruta de la imagen
+        output_path: Ruta del .txt de salida
+        client: Cliente de Anthropic (por defecto, el cliente compartido)
+        structure_sections: Estructurar cada sección en cuanto se completa
+        structure_workers: Hilos para estructurar secciones en paralelo
+        min_section_chars: Tamaño mínimo de sección a estructurar
+
+    Returns:
+        tuple: (texto extraído, estructura combinada o None, StreamStats)
+    """
+    media_type = mimetypes.guess_type(image_path)[0] or "image/png"
+    with open(image_path, "rb") as image_file:
+        image_data = base64.standard_b64encode(image_file.read()).decode("utf-8")
+
+    # Encabezado primero; el cuerpo se añade fragmento a fragmento
+    write_extracted_text(output_path, "")
+
+    futures = []
+    structured_data = None
+    # El pool se cierra también si la extracción o una sección fallan
+    with (ThreadPoolExecutor(max_workers=structure_workers) if structure_sections
+          else nullcontext()) as executor:
+        def on_section(section):
+            futures.append(executor.submit(structure_text_with_claude, section, client))
+
+        with open(output_path, 'a', encoding='utf-8') as f:
+            def on_text(text):
+                f.write(text)
+                f.flush()
+
+            extracted_text, stats = stream_extract_text(
+                image_data, media_type, client=client, on_text=on_text,
+                on_section=on_section if executor else None,
+                min_section_chars=min_section_chars,
+            )
+
+        if executor:
+            structured_data = merge_structured_sections([future.result() for future in futures])
+
+    return extracted_text, structured_data, stats
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Extracción OCR en streaming")
+    parser.add_argument("image", help="Imagen de la página")
+    parser.add_argument("--output", default=TEXT_OUTPUT_PATH,
+                        help=f"Archivo .txt de salida (por defecto: {TEXT_OUTPUT_PATH})")
+    parser.add_argument("--structure-sections", action="store_true",
+                        help="Estructurar cada sección en cuanto se completa")
+    parser.add_argument("--json-output",
+                        help="Guardar la estructura combinada en este archivo .json")
+    parser.add_argument("--fake", action="store_true",
+                        help="Usar el cliente falso local (sin red ni API key)")
+    parser.add_argument("--fake-latency", type=float, default=0.5,
+                        help="Tiempo hasta el primer token del cliente falso, en segundos")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    client = None
+    if args.fake:
+        from fake_anthropic import FakeAnthropic
+        client = FakeAnthropic(latency=args.fake_latency, chunk_delay=0.01)
+
+    print(f"📡 Extrayendo en streaming: {args.image}")
+    extracted_text, structured_data, stats = stream_extract_to_file(
+        args.image, args.output, client=client, structure_sections=args.structure_sections,
+    )
+
+    print(f"\n✅ Texto guardado en: {args.output}")
+    print(f"⏱️  Primer token: {format_seconds(stats.time_to_first_token)} - "
+          f"latencia total: {format_seconds(stats.total_latency)} ({stats.chars} caracteres)")
+
+    if structured_data is not None:
+        print(f"🤖 {len(structured_data['content'])} elementos estructurados por secciones")
+        if args.json_output:
+            with open(args.json_output, 'w', encoding='utf-8') as f:
+                json.dump(structured_data, f, ensure_ascii=False, indent=2)
+            print(f"📁 JSON guardado en: {args.json_output}")
+
+
+if __name__ == "__main__":
+    main()
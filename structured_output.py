@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+"""
+Salida estructurada con herramienta (tool use), validación y rescate de JSON
+
+La estructuración pide al modelo que llame a la herramienta
+registrar_estructura, cuyo input_schema es el esquema de 'metadata' y
+'content'. Así la respuesta es JSON por construcción (sin bloques markdown
+que recortar), y este módulo se ocupa de lo que aún puede fallar:
+- Validación rápida: el esquema se compila una sola vez en funciones
+  anidadas, sin recorrerlo en cada llamada
+- Rescate: de una respuesta cortada en max_tokens o con un error de sintaxis
+  se recuperan la metadata y todos los elementos de 'content' completos
+  (json.JSONDecoder.raw_decode elemento a elemento)
+- Continuación: find_tail localiza en el texto el último elemento rescatado,
+  de modo que solo se vuelve a pedir la parte de la página que falta
+  (StructureAssembler junta las respuestas, en el flujo síncrono y en el
+  asíncrono)
+
+La respuesta se lee en streaming (eventos input_json_delta) para conservar
+el JSON parcial aunque la respuesta se corte.
+"""
+
+import json
+import re
+
+from rule_structurer import LINE_KIND_RE
+from text_normalization import fold_text
+
+STRUCTURE_TOOL_NAME = "registrar_estructura"
+
+ITEM_FIELDS = ('headline', 'section', 'type', 'author', 'text_excerpt')
+
+# Caracteres del extracto que, junto con el titular, identifican un elemento
+DEDUP_EXCERPT_CHARS = 80
+# Palabras del inicio del extracto con las que se ubica un elemento cuyo titular no aparece
+LOCATE_EXCERPT_WORDS = 4
+
+STRUCTURE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "metadata": {
+            "type": "object",
+            "properties": {
+                "newspaper_name": {"type": ["string", "null"]},
+                "date": {"type": ["string", "null"], "description": "AAAA-MM-DD"},
+                "issue_number": {"type": ["integer", "null"]},
+                "location": {"type": ["string", "null"], "description": "ciudad, país"},
+            },
+            "required": ["newspaper_name", "date", "issue_number", "location"],
+        },
+        "content": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "headline": {"type": "string", "description": "título del artículo o sección"},
+                    "section": {"type": ["string", "null"],
+                                "description": "sección (ej: 'Artículo principal', 'Anuncios')"},
+                    "type": {"type": "string", "description": "artículo o anuncio"},
+                    "author": {"type": ["string", "null"],
+                               "description": "autor (si se menciona; si no, null o cadena vacía)"},
+                    "text_excerpt": {"type": "string", "description": "extracto o resumen del texto"},
+                },
+                "required": ["headline", "type", "text_excerpt"],
+            },
+        },
+    },
+    "required": ["metadata", "content"],
+}
+
+STRUCTURE_TOOL = {
+    "name": STRUCTURE_TOOL_NAME,
+    "description": "Registra la metadata de la página y todos sus artículos, secciones y anuncios, "
+                   "en el orden en que aparecen en el texto.",
+    "input_schema": STRUCTURE_SCHEMA,
+}
+
+# Tipos JSON que admite cada tipo de Python (bool no cuenta como entero)
+_JSON_TYPE_NAMES = {
+    dict: ("object",),
+    list: ("array",),
+    str: ("string",),
+    int: ("integer", "number"),
+    float: ("number",),
+    bool: ("boolean",),
+    type(None): ("null",),
+}
+
+
+def compile_validator(schema, path="$"):
+    """
+    Compila un esquema JSON (type, properties, required, items) en una función
+
+    Args:
+        schema: Esquema JSON (subconjunto usado por STRUCTURE_SCHEMA)
+        path: Ruta del valor en los mensajes de error
+
+    Returns:
+        function: validate(value, errors) que añade a errors los problemas encontrados
+    """
+    types = schema.get("type")
+    if isinstance(types, str):
+        types = [types]
+    # Tipos de Python aceptados, resueltos una sola vez
+    accepted = {python_type for python_type, names in _JSON_TYPE_NAMES.items()
+                if types and any(name in types for name in names)}
+    required = tuple(schema.get("required", ()))
+    properties = {name: compile_validator(sub, f"{path}.{name}")
+                  for name, sub in schema.get("properties", {}).items()}
+    items = compile_validator(schema["items"], f"{path}[]") if "items" in schema else None
+
+    def validate(value, errors):
+        if types and type(value) not in accepted:
+            errors.append(f"{path}: se esperaba {'/'.join(types)}")
+            return
+        if isinstance(value, dict):
+            for name in required:
+                if name not in value:
+                    errors.append(f"{path}: falta '{name}'")
+            for name, validate_property in properties.items():
+                if name in value:
+                    validate_property(value[name], errors)
+        elif items is not None and isinstance(value, list):
+            for element in value:
+                items(element, errors)
+
+    return validate
+
+
+_validate_structure = compile_validator(STRUCTURE_SCHEMA)
+_validate_item = compile_validator(STRUCTURE_SCHEMA["properties"]["content"]["items"], "$.content[]")
+
+
+def validate_structure(data):
+    """
+    Valida una estructura con el validador precompilado
+
+    Returns:
+        list: Errores encontrados (vacía si es válida)
+    """
+    errors = []
+    _validate_structure(data, errors)
+    return errors
+
+
+def normalize_item(item):
+    """
+    Elemento de 'content' con todos los campos como texto
+    """
+    return {field: item.get(field) or "" for field in ITEM_FIELDS}
+
+
+def normalize_metadata(metadata):
+    """
+    Metadata con los cuatro campos; issue_number como entero si es posible
+    """
+    metadata = dict(metadata) if isinstance(metadata, dict) else {}
+    for field in STRUCTURE_SCHEMA["properties"]["metadata"]["required"]:
+        metadata.setdefault(field, None)
+    if isinstance(metadata["issue_number"], str):
+        try:
+            metadata["issue_number"] = int(metadata["issue_number"].strip())
+        except ValueError:
+            metadata["issue_number"] = None
+    return metadata
+
+
+def _valid_items(items):
+    """
+    Returns:
+        tuple: (elementos válidos normalizados, número de elementos descartados)
+    """
+    valid = []
+    discarded = 0
+    for item in items if isinstance(items, list) else []:
+        errors = []
+        _validate_item(item, errors)
+        if errors:
+            discarded += 1
+        else:
+            valid.append(normalize_item(item))
+    return valid, discarded
+
+
+def _skip(text, index, chars=" \t\r\n"):
+    while index < len(text) and text[index] in chars:
+        index += 1
+    return index
+
+
+def _find_key(text, key, start=0):
+    """
+    Posición justo después de los dos puntos de "key": (o -1)
+    """
+    index = text.find(f'"{key}"', start)
+    if index < 0:
+        return -1
+    index = _skip(text, index + len(key) + 2)
+    return index + 1 if index < len(text) and text[index] == ':' else -1
+
+
+def salvage_structure(raw):
+    """
+    Recupera lo que se pueda de una respuesta JSON completa, cortada o con errores
+
+    Args:
+        raw: Texto de la respuesta (JSON, quizá dentro de un bloque markdown o
+             incompleto)
+
+    Los elementos que no cumplen el esquema se descartan y la metadata se
+    normaliza (normalize_metadata).
+
+    Returns:
+        tuple: (estructura con 'metadata' y los elementos de 'content'
+                completos, True si la respuesta era un JSON completo y no se
+                descartó ningún elemento)
+    """
+    start = raw.find('{')
+    if start >= 0:
+        try:
+            data, _ = json.JSONDecoder().raw_decode(raw, start)
+            if isinstance(data, dict) and isinstance(data.get("content"), list):
+                content, discarded = _valid_items(data["content"])
+                return {"metadata": normalize_metadata(data.get("metadata")),
+                        "content": content}, not discarded
+        except ValueError:
+            pass
+
+    decoder = json.JSONDecoder()
+    metadata = {}
+    index = _find_key(raw, "metadata")
+    if index >= 0:
+        try:
+            value, _ = decoder.raw_decode(raw, _skip(raw, index))
+            if isinstance(value, dict):
+                metadata = value
+        except ValueError:
+            pass
+
+    content = []
+    index = _find_key(raw, "content")
+    if index >= 0:
+        index = _skip(raw, index)
+        if index < len(raw) and raw[index] == '[':
+            index += 1
+            while True:
+                index = _skip(raw, index, " \t\r\n,")
+                if index >= len(raw) or raw[index] != '{':
+                    break
+                try:
+                    item, index = decoder.raw_decode(raw, index)
+                except ValueError:
+                    # Elemento cortado o mal formado: lo anterior se conserva
+                    break
+                content.append(item)
+    return {"metadata": normalize_metadata(metadata), "content": _valid_items(content)[0]}, False
+
+
+def structure_from_message(message):
+    """
+    Estructura de una respuesta no streaming (bloque tool_use o texto JSON)
+
+    Returns:
+        tuple: (estructura, True si la respuesta era un JSON completo)
+    """
+    for block in message.content:
+        if block.type == "tool_use" and block.name == STRUCTURE_TOOL_NAME:
+            return salvage_structure(json.dumps(block.input, ensure_ascii=False))
+        if block.type == "text" and block.text.strip():
+            return salvage_structure(block.text)
+    return {"metadata": {}, "content": []}, False
+
+
+def _add_usage(usage, event_usage, names):
+    for name in names:
+        value = getattr(event_usage, name, None)
+        if value:
+            usage[name] = usage.get(name, 0) + value
+
+
+class _ToolStreamReader:
+    """
+    Acumula los eventos de streaming de una respuesta con herramienta
+    """
+
+    def __init__(self, usage):
+        self.usage = usage
+        self.tool_json = []
+        self.text = []
+        self.stop_reason = None
+
+    def feed(self, event):
+        if event.type == "content_block_delta":
+            if event.delta.type == "input_json_delta":
+                self.tool_json.append(event.delta.partial_json)
+            elif event.delta.type == "text_delta":
+                self.text.append(event.delta.text)
+        elif event.type == "message_delta":
+            self.stop_reason = event.delta.stop_reason
+            if self.usage is not None:
+                # El total de salida llega al final (message_start trae un valor provisional)
+                _add_usage(self.usage, event.usage, ("output_tokens",))
+        elif event.type == "message_start" and self.usage is not None:
+            _add_usage(self.usage, event.message.usage, ("input_tokens", "cache_read_input_tokens",
+                                                         "cache_creation_input_tokens"))
+
+    def result(self):
+        raw = "".join(self.tool_json) if self.tool_json else "".join(self.text)
+        return raw, self.stop_reason
+
+
+def read_tool_stream(events, usage=None):
+    """
+    Junta el JSON (quizá parcial) de la herramienta desde los eventos de streaming
+
+    Args:
+        events: Eventos de client.messages.create(..., stream=True)
+        usage: Diccionario opcional donde sumar el uso de tokens (message_start
+               trae los de entrada y message_delta los de salida)
+
+    Returns:
+        tuple: (JSON del input de la herramienta, o el texto si respondió sin
+                ella, y stop_reason)
+    """
+    reader = _ToolStreamReader(usage)
+    for event in events:
+        reader.feed(event)
+    return reader.result()
+
+
+async def read_tool_stream_async(events, usage=None):
+    """
+    Versión asíncrona de read_tool_stream (eventos de un cliente asíncrono)
+    """
+    reader = _ToolStreamReader(usage)
+    async for event in events:
+        reader.feed(event)
+    return reader.result()
+
+
+def _locate_item(folded, item, start):
+    """
+    Posición de un elemento en el texto normalizado, desde start (o -1)
+    """
+    headline = fold_text((item.get('headline') or '').split(" / ")[0]).strip()
+    if headline:
+        found = folded.find(headline, start)
+        if found >= 0:
+            return found
+    # El extracto copia el inicio del cuerpo, pero con los saltos de línea como espacios
+    words = fold_text(item.get('text_excerpt') or '').split()[:LOCATE_EXCERPT_WORDS]
+    if len(words) < LOCATE_EXCERPT_WORDS:
+        return -1
+    match = re.compile(r'\s+'.join(map(re.escape, words))).search(folded, start)
+    return match.start() if match else -1
+
+
+def item_key(item):
+    """
+    Clave para reconocer el mismo elemento en dos respuestas o fragmentos
+
+    Los titulares genéricos ("AVISO", "REMITIDO") se repiten en la misma
+    página, así que la clave incluye también el inicio del extracto.
+
+    Returns:
+        tuple: (titular normalizado, inicio del extracto normalizado)
+    """
+    headline = " ".join(fold_text(item.get('headline') or '').split())
+    excerpt = " ".join(fold_text(item.get('text_excerpt') or '').split())
+    return headline, excerpt[:DEDUP_EXCERPT_CHARS]
+
+
+def find_tail(text, items):
+    """
+    Parte del texto posterior al último elemento ya estructurado
+
+    Cada elemento se busca en orden en el texto normalizado (fold_text
+    conserva las posiciones), por su titular o, si el titular no aparece tal
+    cual, por el inicio de su extracto; el resto empieza en el siguiente
+    límite de sección (separador o título) tras el último encontrado.
+
+    Args:
+        text: Texto que se estaba estructurando
+        items: Elementos de 'content' rescatados, en orden
+
+    Returns:
+        str: Texto que falta por estructurar ("" si no queda nada), o None si
+             no se pudo ubicar ningún elemento
+    """
+    folded = fold_text(text)
+    position = -1
+    for item in items:
+        found = _locate_item(folded, item, position + 1)
+        if found >= 0:
+            position = found
+    if position < 0:
+        return None
+
+    # Fin de la línea del titular, y luego el primer límite tras algo de cuerpo
+    offset = text.find("\n", position)
+    has_body = False
+    while offset >= 0:
+        line_end = text.find("\n", offset + 1)
+        line = text[offset + 1:line_end if line_end >= 0 else len(text)]
+        if LINE_KIND_RE.match(line):
+            if has_body:
+                return text[offset + 1:]
+        elif line.strip():
+            has_body = True
+        offset = line_end
+    return ""
+
+
+class StructureAssembler:
+    """
+    Junta las respuestas (quizá cortadas) de una estructuración con continuaciones
+
+    Cada respuesta se rescata con salvage_structure; si llegó incompleta,
+    find_tail indica qué parte del texto falta pedir. Los elementos de una
+    continuación que ya estaban (misma item_key) se descartan. Si no se puede
+    ubicar lo rescatado, una continuación no trae ningún elemento o se agotan
+    las continuaciones, se conserva lo reunido y la estructura queda marcada
+    como parcial (no debe guardarse en caché, para que otra corrida lo vuelva
+    a intentar).
+
+    Args:
+        text: Texto que se estructura
+        max_continuations: Peticiones permitidas después de la primera
+    """
+
+    def __init__(self, text, max_continuations):
+        self.remaining = text
+        self.max_continuations = max_continuations
+        self.metadata = None
+        self.content = []
+        self.requests = 0
+        self.partial = False
+        self._keys = set()
+
+    def add_response(self, raw, stop_reason=None):
+        """
+        Incorpora una respuesta
+
+        Args:
+            raw: JSON de la respuesta (completo o cortado)
+            stop_reason: stop_reason de la respuesta (para los mensajes de error)
+
+        Returns:
+            str: Texto que falta por estructurar, o None si no hay que pedir más
+
+        Raises:
+            ValueError: Si la primera respuesta llegó incompleta y sin ningún
+                        elemento (no hay nada que conservar)
+        """
+        self.requests += 1
+        data, complete = salvage_structure(raw)
+        if self.metadata is None:
+            self.metadata = data['metadata']
+        # Solo se descartan los repetidos de respuestas anteriores, no los de esta
+        self.content.extend(item for item in data['content'] if item_key(item) not in self._keys)
+        self._keys.update(item_key(item) for item in data['content'])
+        if complete:
+            return None
+        if not data['content']:
+            if not self.content:
+                raise ValueError(f"Respuesta de estructuración inválida (stop_reason={stop_reason})")
+            self.partial = True
+            return None
+        tail = find_tail(self.remaining, data['content'])
+        if tail is None:
+            self.partial = True
+            return None
+        if not tail.strip():
+            # Los elementos rescatados llegan hasta el final del texto
+            return None
+        if self.requests > self.max_continuations:
+            self.partial = True
+            return None
+        self.remaining = tail
+        return tail
+
+    def structure(self):
+        return {"metadata": self.metadata, "content": self.content}
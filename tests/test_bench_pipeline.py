@@ -0,0 +1,60 @@
+import os
+
+from PIL import Image
+
+from bench_pipeline import (
+    FIRST_ISSUE,
+    build_page_dir,
+    synthetic_page_text,
+    write_synthetic_image,
+)
+from process_ocr import generate_basic_structure
+
+
+def test_synthetic_page_text_is_reproducible():
+    assert synthetic_page_text(3) == synthetic_page_text(3)
+    assert synthetic_page_text(3) != synthetic_page_text(4)
+    assert synthetic_page_text(3, seed=1) != synthetic_page_text(3, seed=2)
+
+
+def test_synthetic_page_text_has_issue_header_and_ads():
+    text = synthetic_page_text(2)
+
+    assert "PERIÓDICO EL MARTILLO" in text
+    assert f"Edición No. {FIRST_ISSUE + 2} - 19 de agosto de 1916" in text
+    assert "ANUNCIOS" in text
+
+
+def test_synthetic_page_text_structures_like_a_real_page():
+    structure = generate_basic_structure(synthetic_page_text(0))
+    types = {item["type"] for item in structure["content"]}
+
+    assert len(structure["content"]) >= 4
+    assert types == {"artículo", "anuncio"}
+
+
+def test_write_synthetic_image(tmp_path):
+    path = tmp_path / "pagina.png"
+    write_synthetic_image(str(path), synthetic_page_text(0), size=(300, 400))
+
+    with Image.open(path) as image:
+        assert image.format == "PNG"
+        assert image.size == (300, 400)
+        assert image.mode == "L"
+        # Hay tinta además del papel y las manchas
+        assert image.getextrema()[0] <= 20
+
+
+def test_build_page_dir_repeats_pool(tmp_path):
+    pool = []
+    for number in range(2):
+        path = tmp_path / f"fuente_{number}.png"
+        write_synthetic_image(str(path), synthetic_page_text(number), size=(100, 120))
+        pool.append(str(path))
+
+    paths = build_page_dir(str(tmp_path / "paginas"), pool, 5)
+
+    assert [os.path.basename(path) for path in paths] == [f"page_{n:05d}.png" for n in range(5)]
+    for number, path in enumerate(paths):
+        with open(path, "rb") as page, open(pool[number % 2], "rb") as source:
+            assert page.read() == source.read()
@@ -0,0 +1,157 @@
+import time
+
+import pytest
+
+from bench_pipeline import synthetic_page_text, write_synthetic_image
+from fake_anthropic import FakeAnthropic
+from ocr_worker import DONE, FAILED, PENDING, RUNNING, JobQueue, OCRWorker
+
+TIMEOUT_SECONDS = 30
+
+
+class FailingMessages:
+    """messages del cliente falso que falla las primeras peticiones"""
+
+    def __init__(self, messages, failures):
+        self._messages = messages
+        self.failures = failures
+
+    def create(self, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("fallo simulado de la API")
+        return self._messages.create(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._messages, name)
+
+
+class FailingClient:
+    def __init__(self, failures):
+        self.messages = FailingMessages(FakeAnthropic().messages, failures)
+
+
+@pytest.fixture
+def queue(tmp_path):
+    with JobQueue(str(tmp_path / "cola.sqlite")) as job_queue:
+        yield job_queue
+
+
+@pytest.fixture
+def page_image(tmp_path):
+    path = tmp_path / "pagina_001.png"
+    write_synthetic_image(str(path), synthetic_page_text(0), size=(400, 520))
+    return str(path)
+
+
+def wait_for(queue, job_id):
+    deadline = time.monotonic() + TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in (DONE, FAILED):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"El trabajo {job_id} no terminó en {TIMEOUT_SECONDS} s")
+
+
+def run_worker(queue, tmp_path, client, job_ids, **options):
+    worker = OCRWorker(queue, output_dir=str(tmp_path / "salida"), client=client, workers=1,
+                       **options)
+    worker.start()
+    try:
+        return worker, [wait_for(queue, job_id) for job_id in job_ids]
+    finally:
+        worker.stop()
+
+
+def test_queue_claims_oldest_pending_job(queue):
+    first = queue.submit("/tmp/a.png")
+    queue.submit("/tmp/b.png", page_id="b")
+
+    job = queue.claim()
+    assert job["job_id"] == first["job_id"]
+    assert job["page_id"] == "a"
+    assert job["status"] == RUNNING
+    assert job["attempts"] == 1
+
+    queue.complete(job["job_id"], extract_seconds=0.5, structure_seconds=0.25, items=3)
+    assert queue.get(job["job_id"])["status"] == DONE
+    assert queue.claim()["page_id"] == "b"
+    assert queue.claim() is None
+
+
+def test_queue_fail_retries_until_max_attempts(queue):
+    job_id = queue.submit("/tmp/a.png")["job_id"]
+
+    queue.claim()
+    assert queue.fail(job_id, "error 1", max_attempts=2) == PENDING
+    queue.claim()
+    assert queue.fail(job_id, "error 2", max_attempts=2) == FAILED
+
+    job = queue.get(job_id)
+    assert job["status"] == FAILED
+    assert job["attempts"] == 2
+    assert job["error"] == "error 2"
+    assert queue.claim() is None
+
+
+def test_queue_recover_returns_running_jobs(tmp_path):
+    path = str(tmp_path / "cola.sqlite")
+    with JobQueue(path) as queue:
+        job_id = queue.submit("/tmp/a.png")["job_id"]
+        queue.claim()
+
+    # Servicio interrumpido con el trabajo en curso
+    with JobQueue(path) as queue:
+        assert queue.counts()[RUNNING] == 1
+        assert queue.recover() == 1
+        assert queue.get(job_id)["status"] == PENDING
+        assert queue.claim()["attempts"] == 2
+
+
+def test_worker_processes_submitted_page(queue, tmp_path, page_image):
+    worker, [job] = run_worker(queue, tmp_path, FakeAnthropic(),
+                               [queue.submit(page_image)["job_id"]])
+
+    assert job["status"] == DONE
+    assert job["attempts"] == 1
+    assert job["items"] > 0
+    assert worker.processed == 1
+    assert (tmp_path / "salida" / "paginas" / "pagina_001.json").exists()
+
+
+def test_worker_retries_failed_page(queue, tmp_path, page_image):
+    worker, [job] = run_worker(queue, tmp_path, FailingClient(failures=1),
+                               [queue.submit(page_image)["job_id"]])
+
+    assert job["status"] == DONE
+    assert job["attempts"] == 2
+    assert worker.failed == 0
+
+
+def test_worker_marks_page_failed_after_max_attempts(queue, tmp_path, page_image):
+    client = FailingClient(failures=10)
+    worker, [job] = run_worker(queue, tmp_path, client, [queue.submit(page_image)["job_id"]],
+                               max_attempts=2)
+
+    assert job["status"] == FAILED
+    assert job["attempts"] == 2
+    assert "fallo simulado" in job["error"]
+    assert worker.failed == 1
+    assert client.messages.failures == 8
+
+
+def test_worker_start_recovers_interrupted_jobs(queue, tmp_path, page_image):
+    job_id = queue.submit(page_image)["job_id"]
+    queue.claim()
+
+    worker = OCRWorker(queue, output_dir=str(tmp_path / "salida"), client=FakeAnthropic(),
+                       workers=1)
+    assert worker.start() == 1
+    try:
+        job = wait_for(queue, job_id)
+    finally:
+        worker.stop()
+
+    assert job["status"] == DONE
+    assert job["attempts"] == 2
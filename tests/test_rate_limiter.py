@@ -0,0 +1,153 @@
+import anthropic
+import httpx
+import pytest
+
+from fake_anthropic import FakeAnthropic, FakeAnthropicServer
+from rate_limiter import (
+    OUTPUT_TOKENS,
+    RateLimitedClient,
+    RateLimiter,
+    RetryPolicy,
+    estimate_request_cost,
+)
+
+REQUEST = {
+    "model": "claude-sonnet-4-5",
+    "max_tokens": 4000,
+    "messages": [{"role": "user", "content": "PERIÓDICO EL MARTILLO\nEdición No. 1609"}],
+}
+FAST_RETRIES = RetryPolicy(max_retries=10, base_delay=0.01, max_delay=0.02)
+# Límites sin efecto: en estas pruebas solo interesan los reintentos
+UNLIMITED = 10 ** 9
+
+
+def api_error(error_class, status, headers=None):
+    request = httpx.Request("POST", "https://api.anthropic.com/v1/messages")
+    response = httpx.Response(status, headers=headers or {}, request=request)
+    return error_class("error simulado", response=response, body=None)
+
+
+class FlakyMessages:
+    """messages del cliente falso que primero lanza los errores indicados"""
+
+    def __init__(self, messages, errors):
+        self._messages = messages
+        self._errors = list(errors)
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        if self._errors:
+            raise self._errors.pop(0)
+        return self._messages.create(**kwargs)
+
+    def stream(self, **kwargs):
+        self.calls += 1
+        if self._errors:
+            raise self._errors.pop(0)
+        return self._messages.stream(**kwargs)
+
+
+class FlakyClient:
+    def __init__(self, errors):
+        self.messages = FlakyMessages(FakeAnthropic().messages, errors)
+
+
+def output_level(limiter):
+    with limiter._locked_state() as state:
+        return state["levels"][OUTPUT_TOKENS]
+
+
+def test_retries_rate_limited_and_overloaded_then_succeeds():
+    client = FlakyClient([
+        api_error(anthropic.RateLimitError, 429, {"retry-after": "0"}),
+        api_error(anthropic.InternalServerError, 529),
+    ])
+    limiter = RateLimiter()
+    limited = RateLimitedClient(client, limiter, FAST_RETRIES)
+
+    message = limited.messages.create(**REQUEST)
+
+    assert message.content[0].text
+    assert client.messages.calls == 3
+    metrics = limiter.metrics.as_dict()
+    assert metrics["retries"] == 2
+    assert metrics["failures"] == 0
+    assert metrics["errors_by_status"] == {"429": 1, "529": 1}
+    # Un 429 reduce el ritmo de todos los trabajadores
+    assert limiter.rate_scale() < 1.0
+
+
+def test_does_not_retry_invalid_request():
+    client = FlakyClient([api_error(anthropic.BadRequestError, 400)])
+    limiter = RateLimiter()
+    limited = RateLimitedClient(client, limiter, FAST_RETRIES)
+
+    with pytest.raises(anthropic.BadRequestError):
+        limited.messages.create(**REQUEST)
+
+    assert client.messages.calls == 1
+    assert limiter.metrics.as_dict()["errors_by_status"] == {"400": 1}
+
+
+def test_retries_overloaded_server():
+    with FakeAnthropicServer(overload_rate=0.5, seed=3) as server:
+        client = anthropic.Anthropic(api_key="clave-falsa", base_url=server.base_url,
+                                     max_retries=0)
+        limiter = RateLimiter(UNLIMITED, UNLIMITED, UNLIMITED)
+        limited = RateLimitedClient(client, limiter, FAST_RETRIES)
+        for _ in range(4):
+            assert limited.messages.create(**REQUEST).content[0].text
+
+    metrics = limiter.metrics.as_dict()
+    assert server.overloaded > 0
+    assert metrics["retries"] == server.overloaded
+    assert metrics["errors_by_status"] == {"529": server.overloaded}
+
+
+def test_gives_up_after_max_retries_on_rate_limit():
+    with FakeAnthropicServer(rpm_limit=1) as server:
+        client = anthropic.Anthropic(api_key="clave-falsa", base_url=server.base_url,
+                                     max_retries=0)
+        limiter = RateLimiter(UNLIMITED, UNLIMITED, UNLIMITED)
+        policy = RetryPolicy(max_retries=2, base_delay=0.01, max_delay=0.02)
+        limited = RateLimitedClient(client, limiter, policy)
+        limited.messages.create(**REQUEST)
+        with pytest.raises(anthropic.RateLimitError):
+            limited.messages.create(**REQUEST)
+
+    metrics = limiter.metrics.as_dict()
+    assert server.throttled == 3
+    assert metrics["retries"] == 2
+    assert metrics["failures"] == 1
+    assert metrics["errors_by_status"] == {"429": 3}
+
+
+def test_create_settles_reservation_with_actual_usage():
+    # Con 6000 tokens por minuto la recarga durante la prueba es despreciable
+    limiter = RateLimiter(output_tpm=6000)
+    limited = RateLimitedClient(FakeAnthropic(), limiter)
+    reserved = estimate_request_cost(REQUEST)[OUTPUT_TOKENS]
+
+    message = limited.messages.create(**REQUEST)
+
+    assert message.usage.output_tokens != reserved
+    assert output_level(limiter) == pytest.approx(6000 - message.usage.output_tokens, abs=5)
+
+
+def test_stream_settles_reservation_and_retries_open():
+    client = FlakyClient([api_error(anthropic.InternalServerError, 529)])
+    limiter = RateLimiter(output_tpm=6000)
+    limited = RateLimitedClient(client, limiter, FAST_RETRIES)
+
+    with limited.messages.stream(**REQUEST) as stream:
+        text = "".join(stream.text_stream)
+        message = stream.get_final_message()
+
+    assert text
+    assert client.messages.calls == 2
+    assert limiter.metrics.as_dict()["errors_by_status"] == {"529": 1}
+    # Como en create, el intento fallido conserva su reserva
+    reserved = estimate_request_cost(REQUEST)[OUTPUT_TOKENS]
+    expected = 6000 - reserved - message.usage.output_tokens
+    assert output_level(limiter) == pytest.approx(expected, abs=5)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Normalización de texto para búsquedas y comparaciones
+
+Los textos de 1916 mezclan mayúsculas de titulares, tildes que el OCR a veces
+pierde (Monsefú / Monsefu) y ortografía antigua o "americana" de la época
+(jeneral, estranjero, i por y). fold_text lleva todas esas variantes a una
+misma forma canónica:
+- minúsculas y sin tildes ni diéresis (ñ → n)
+- ge/gi → je/ji, x → s, y → i, v → b
+
+La transformación conserva la longitud del texto carácter a carácter, así que
+una posición en el texto normalizado es la misma posición en el original
+(útil para resaltar fragmentos del texto original).
+"""
+
+import re
+import unicodedata
+
+# Equivalencias de la ortografía antigua, aplicadas tras pasar a minúsculas
+_ORTHOGRAPHY = {'y': 'i', 'x': 's', 'v': 'b'}
+_G_BEFORE_E_I_RE = re.compile(r'g(?=[ei])')
+_WORD_RE = re.compile(r'\w+')
+
+
+def _build_fold_table():
+    """
+    Tabla de traducción para los caracteres latinos (hasta U+024F)
+
+    Solo se incluyen los caracteres cuya forma plegada ocupa un carácter, para
+    no alterar las posiciones del texto.
+    """
+    table = {}
+    for codepoint in range(0x250):
+        char = chr(codepoint)
+        folded = char.lower()
+        if len(folded) != 1:
+            continue
+        base = unicodedata.normalize('NFD', folded)[0]
+        folded = _ORTHOGRAPHY.get(base, base)
+        if folded != char:
+            table[codepoint] = folded
+    return table
+
+
+FOLD_TABLE = _build_fold_table()
+
+
+def fold_text(text):
+    """
+    Normaliza un texto para comparar sin distinguir tildes, mayúsculas ni
+    ortografía antigua
+
+    Args:
+        text: Texto original
+
+    Returns:
+        str: Texto normalizado, de la misma longitud que el original
+    """
+    return _G_BEFORE_E_I_RE.sub('j', text.translate(FOLD_TABLE))
+
+
+def fold_words(text):
+    """
+    Palabras normalizadas de un texto, en orden
+
+    Returns:
+        list: Palabras tras fold_text
+    """
+    return _WORD_RE.findall(fold_text(text))